@@ -8,6 +8,11 @@ class ToolsConfig(AppConfig):
 
     def ready(self):
         """应用启动时的初始化"""
+        from .services import diary_search, food_sampler, relationship_graph
+
+        food_sampler.connect_signals()
+        diary_search.connect_signals()
+        relationship_graph.connect_signals()
 
         # 只在非管理命令环境下运行
         if not self._is_management_command():
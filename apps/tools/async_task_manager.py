@@ -5,8 +5,12 @@ import threading
 import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
+from django.conf import settings
+
+from .services.task_executor import BoundedTaskExecutor, TaskQueueFullError
+from .services.task_store import create_task_store
 from .utils import DeepSeekClient
 
 logger = logging.getLogger(__name__)
@@ -15,8 +19,8 @@ logger = logging.getLogger(__name__)
 class AsyncTaskManager:
     """异步任务管理器 - 支持真正的后台任务"""
 
-    def __init__(self):
-        self.tasks: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, store=None, executor=None):
+        # 进程内锁仅用于兼容旧调用方，任务状态的一致性由存储后端保证
         self.task_lock = threading.Lock()
         # 使用项目根目录下的task_storage目录
         project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -24,37 +28,49 @@ class AsyncTaskManager:
         # 任务超时配置（小时）
         self.task_timeout_hours = 1
         self._ensure_storage_dir()
+        self.store = store or create_task_store(self.storage_dir)
+        # 固定并发的执行器，每个任务会占用一个LLM连接
+        self.executor = executor or BoundedTaskExecutor(
+            max_workers=getattr(settings, "ASYNC_TASK_MAX_WORKERS", 4),
+            max_queue_size=getattr(settings, "ASYNC_TASK_MAX_QUEUE_SIZE", 50),
+            max_pending_per_user=getattr(settings, "ASYNC_TASK_MAX_PENDING_PER_USER", 5),
+            name="async-task",
+        )
         self._load_tasks_from_storage()
         self._start_cleanup_thread()
 
+    @property
+    def tasks(self) -> Dict[str, Dict[str, Any]]:
+        """所有任务的快照（只读），多worker下同样可见其他进程创建的任务"""
+        return {task["id"]: task for task in self.store.list()}
+
     def _ensure_storage_dir(self):
         """确保存储目录存在"""
         if not os.path.exists(self.storage_dir):
             os.makedirs(self.storage_dir)
 
     def _load_tasks_from_storage(self):
-        """从存储中加载任务"""
+        """从旧版tasks.json迁移未完成的任务（仅在新存储为空时执行一次）"""
         try:
             tasks_file = os.path.join(self.storage_dir, "tasks.json")
-            if os.path.exists(tasks_file):
+            if os.path.exists(tasks_file) and self.store.count() == 0:
                 with open(tasks_file, "r", encoding="utf-8") as f:
                     tasks_data = json.load(f)
                     # 只加载未完成的任务
                     for task_id, task_data in tasks_data.items():
                         if task_data.get("status") in ["pending", "running"]:
-                            self.tasks[task_id] = task_data
+                            self.store.create(task_data)
                             logger.info(f"从存储中恢复任务: {task_id}")
         except Exception as e:
             logger.error(f"加载任务存储失败: {e}")
 
-    def _save_tasks_to_storage(self):
-        """保存任务到存储"""
+    def _update_task(self, task_id: str, **fields) -> bool:
+        """原子更新单个任务，任务已被删除时返回False"""
         try:
-            tasks_file = os.path.join(self.storage_dir, "tasks.json")
-            with open(tasks_file, "w", encoding="utf-8") as f:
-                json.dump(self.tasks, f, ensure_ascii=False, indent=2)
+            return self.store.update(task_id, **fields)
         except Exception as e:
-            logger.error(f"保存任务存储失败: {e}")
+            logger.error(f"更新任务存储失败: {task_id}, {e}")
+            return False
 
     def _start_cleanup_thread(self):
         """启动清理线程，定期清理过期任务和超时任务"""
@@ -73,79 +89,69 @@ class AsyncTaskManager:
 
     def _cleanup_expired_tasks(self):
         """清理过期任务（超过7天的已完成任务）"""
-        with self.task_lock:
-            expired_tasks = []
-            cutoff_time = datetime.now() - timedelta(days=7)
-
-            for task_id, task in self.tasks.items():
-                if task.get("status") in ["completed", "failed"]:
-                    completed_at = task.get("completed_at")
-                    if completed_at:
-                        try:
-                            completed_time = datetime.fromisoformat(completed_at.replace("Z", "+00:00"))
-                            if completed_time < cutoff_time:
-                                expired_tasks.append(task_id)
-                        except Exception:
-                            pass
-
-            for task_id in expired_tasks:
-                del self.tasks[task_id]
-                logger.info(f"清理过期任务: {task_id}")
-
-            if expired_tasks:
-                self._save_tasks_to_storage()
+        expired_tasks = []
+        cutoff_time = datetime.now() - timedelta(days=7)
+
+        for task in self.store.list(statuses=["completed", "failed"]):
+            completed_at = task.get("completed_at")
+            if completed_at:
+                try:
+                    completed_time = datetime.fromisoformat(completed_at.replace("Z", "+00:00"))
+                    if completed_time < cutoff_time:
+                        expired_tasks.append(task["id"])
+                except Exception:
+                    pass
+
+        for task_id in expired_tasks:
+            self.store.delete(task_id)
+            logger.info(f"清理过期任务: {task_id}")
 
     def _cleanup_timeout_tasks(self):
         """清理超时任务（超过配置时间未完成的任务）"""
-        with self.task_lock:
-            timeout_tasks = []
-            timeout_threshold = datetime.now() - timedelta(hours=self.task_timeout_hours)
+        timeout_tasks = []
+        timeout_threshold = datetime.now() - timedelta(hours=self.task_timeout_hours)
+
+        # 只检查未完成的任务
+        for task in self.store.list(statuses=["pending", "running"]):
+            created_at = task.get("created_at")
+            if created_at:
+                try:
+                    created_time = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+                    if created_time < timeout_threshold:
+                        timeout_tasks.append(task)
+                except Exception:
+                    # 如果时间格式有问题，也标记为超时
+                    timeout_tasks.append(task)
+
+        # 删除超时任务
+        for task in timeout_tasks:
+            logger.info(f"任务 {task['id']} 超时自动删除 (创建时间: {task.get('created_at')}, 状态: {task.get('status')})")
+            self.store.delete(task["id"])
 
-            for task_id, task in self.tasks.items():
-                # 只检查未完成的任务
-                if task.get("status") in ["pending", "running"]:
-                    created_at = task.get("created_at")
-                    if created_at:
-                        try:
-                            created_time = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-                            if created_time < timeout_threshold:
-                                timeout_tasks.append(task_id)
-                        except Exception:
-                            # 如果时间格式有问题，也标记为超时
-                            timeout_tasks.append(task_id)
-
-            # 删除超时任务
-            for task_id in timeout_tasks:
-                task = self.tasks[task_id]
-                logger.info(f"任务 {task_id} 超时自动删除 (创建时间: {task.get('created_at')}, 状态: {task.get('status')})")
-                del self.tasks[task_id]
-
-            if timeout_tasks:
-                self._save_tasks_to_storage()
-                logger.info(f"自动清理了 {len(timeout_tasks)} 个超时任务")
+        if timeout_tasks:
+            logger.info(f"自动清理了 {len(timeout_tasks)} 个超时任务")
 
     def manual_cleanup_timeout_tasks(self):
         """手动触发超时任务清理"""
         self._cleanup_timeout_tasks()
-        return len([t for t in self.tasks.values() if t.get("status") in ["pending", "running"]])
+        return len(self.store.list(statuses=["pending", "running"]))
 
     def _is_task_timeout(self, task_id: str) -> bool:
         """检查任务是否超时"""
-        with self.task_lock:
-            if task_id not in self.tasks:
-                return True
+        task = self.store.get(task_id)
+        if not task:
+            return True
 
-            task = self.tasks[task_id]
-            created_at = task.get("created_at")
-            if not created_at:
-                return True
+        created_at = task.get("created_at")
+        if not created_at:
+            return True
 
-            try:
-                created_time = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-                timeout_threshold = datetime.now() - timedelta(hours=self.task_timeout_hours)
-                return created_time < timeout_threshold
-            except Exception:
-                return True
+        try:
+            created_time = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+            timeout_threshold = datetime.now() - timedelta(hours=self.task_timeout_hours)
+            return created_time < timeout_threshold
+        except Exception:
+            return True
 
     def create_task(
         self,
@@ -155,12 +161,13 @@ class AsyncTaskManager:
         batch_id: int = 0,
         total_batches: int = 1,
         user_id: str = None,
+        priority: int = 0,
     ) -> str:
-        """创建新的后台任务"""
+        """创建新的后台任务，队列已满时抛出TaskQueueFullError"""
         task_id = str(uuid.uuid4())
 
-        with self.task_lock:
-            self.tasks[task_id] = {
+        self.store.create(
+            {
                 "id": task_id,
                 "requirement": requirement,
                 "user_prompt": user_prompt,
@@ -177,139 +184,142 @@ class AsyncTaskManager:
                 "started_at": None,
                 "completed_at": None,
             }
+        )
 
-            # 保存到存储
-            self._save_tasks_to_storage()
-
-        # 启动后台任务
-        thread = threading.Thread(target=self._execute_task, args=(task_id,))
-        thread.daemon = True
-        thread.start()
+        # 提交到有界执行器，队列已满时删除刚创建的任务并拒绝
+        try:
+            self.executor.submit(task_id, self._execute_task, task_id, priority=priority, user_id=user_id)
+        except TaskQueueFullError:
+            self.store.delete(task_id)
+            raise
+        self._refresh_queue_positions()
 
         logger.info(f"创建后台任务: {task_id}, 需求: {requirement[:50]}...")
         return task_id
 
+    def create_job(
+        self,
+        job_type: str,
+        func: Callable[[Callable[[int, str], bool]], Any],
+        description: str = "",
+        user_id: str = None,
+        priority: int = 0,
+        executor: Optional[BoundedTaskExecutor] = None,
+    ) -> str:
+        """
+        创建通用后台任务（如大文件转换），队列已满时抛出TaskQueueFullError
+
+        func(report_progress) 在执行器中运行，返回值作为任务结果；
+        report_progress(progress, current_step) 返回False表示任务已被删除，func应尽快退出。
+        executor 指定专用执行器（如音频转码），不占用默认执行器的并发名额。
+        """
+        executor = executor or self.executor
+        task_id = str(uuid.uuid4())
+
+        self.store.create(
+            {
+                "id": task_id,
+                "job_type": job_type,
+                "requirement": description,
+                "user_prompt": "",
+                "user_id": user_id,
+                "status": "pending",
+                "progress": 0,
+                "current_step": "等待处理",
+                "result": None,
+                "error": None,
+                "created_at": datetime.now().isoformat(),
+                "started_at": None,
+                "completed_at": None,
+            }
+        )
+
+        try:
+            executor.submit(task_id, self._execute_job, task_id, func, executor, priority=priority, user_id=user_id)
+        except TaskQueueFullError:
+            self.store.delete(task_id)
+            raise
+        self._refresh_queue_positions(executor)
+
+        logger.info(f"创建后台任务: {task_id}, 类型: {job_type}")
+        return task_id
+
     def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务状态"""
-        with self.task_lock:
-            return self.tasks.get(task_id)
+        task = self.store.get(task_id)
+        if task and task.get("status") == "running":
+            # 运行中任务的剩余时间只有执行它的进程知道，其他进程沿用存储中的估算值
+            remaining = self.executor.estimate_remaining(task_id)
+            if remaining is not None:
+                task["eta_seconds"] = remaining
+        return task
+
+    def _refresh_queue_positions(self, executor: Optional[BoundedTaskExecutor] = None):
+        """把排队位置和ETA写入存储，使任意worker上的状态查询都能看到"""
+        for queued_id, info in (executor or self.executor).queue_positions().items():
+            self._update_task(queued_id, **info)
+
+    def get_queue_stats(self) -> Dict[str, Any]:
+        """获取执行器队列统计"""
+        return self.executor.get_stats()
 
     def get_tasks(self) -> List[Dict[str, Any]]:
         """获取所有任务列表"""
-        with self.task_lock:
-            return list(self.tasks.values())
+        return self.store.list()
 
     def delete_task(self, task_id: str) -> bool:
         """删除任务（停止运行中的任务并删除）"""
-        with self.task_lock:
-            if task_id not in self.tasks:
-                return False
-
-            task = self.tasks[task_id]
-
-            # 如果任务正在运行，标记为取消状态
-            if task["status"] == "running":
-                task["status"] = "cancelled"
-                task["completed_at"] = datetime.now().isoformat()
-                task["error"] = "任务已被用户取消"
-                logger.info(f"任务 {task_id} 已被取消")
-
-            # 删除任务
-            del self.tasks[task_id]
-            self._save_tasks_to_storage()
-            logger.info(f"任务 {task_id} 已删除")
-            return True
+        task = self.store.get(task_id)
+        if not task:
+            return False
+
+        # 排队中的任务直接出队；运行中的任务在下一次更新进度时发现已删除并退出
+        if self.executor.cancel(task_id):
+            self._refresh_queue_positions()
+        elif task["status"] == "running":
+            logger.info(f"任务 {task_id} 已被取消")
+
+        # 删除任务
+        if not self.store.delete(task_id):
+            return False
+        logger.info(f"任务 {task_id} 已删除")
+        return True
 
     def _execute_task(self, task_id: str):
-        """执行后台任务"""
+        """执行后台任务（在执行器工作线程中运行）"""
         try:
-            with self.task_lock:
-                if task_id not in self.tasks:
-                    return
-                self.tasks[task_id]["status"] = "running"
-                self.tasks[task_id]["started_at"] = datetime.now().isoformat()
-                self.tasks[task_id]["progress"] = 5
-                self.tasks[task_id]["current_step"] = "分析需求"
-
-            # 检查任务是否超时
+            task = self.store.get(task_id)
+            if not task:
+                return
+            if not self._update_task(
+                task_id,
+                status="running",
+                started_at=datetime.now().isoformat(),
+                progress=5,
+                current_step="分析需求",
+                queue_position=None,
+                eta_seconds=int(self.executor.get_stats()["avg_duration"]),
+            ):
+                return
+            # 本任务出队后，其余排队任务的位置前移
+            self._refresh_queue_positions()
+
+            # 检查任务是否超时（排队时间过长）
             if self._is_task_timeout(task_id):
                 logger.info(f"任务 {task_id} 在开始执行时已超时，跳过执行")
                 return
 
             # 获取任务参数
-            task = self.tasks[task_id]
             requirement = task["requirement"]
             user_prompt = task["user_prompt"]
             is_batch = task["is_batch"]
             batch_id = task["batch_id"]
             total_batches = task["total_batches"]
 
-            # 步骤1: 分析需求 (5-15%)
-            time.sleep(1)  # 模拟分析时间
-
-            # 检查任务是否超时
-            if self._is_task_timeout(task_id):
-                logger.info(f"任务 {task_id} 在步骤1后超时，停止执行")
-                return
-
-            with self.task_lock:
-                if task_id not in self.tasks:  # 任务可能已被删除
-                    return
-                self.tasks[task_id]["progress"] = 15
-                self.tasks[task_id]["current_step"] = "生成功能测试用例"
-                self._save_tasks_to_storage()
-
-            # 步骤2: 生成功能测试用例 (15-30%)
-            time.sleep(2)
-
-            # 检查任务是否超时
-            if self._is_task_timeout(task_id):
-                logger.info(f"任务 {task_id} 在步骤2后超时，停止执行")
-                return
-
-            with self.task_lock:
-                if task_id not in self.tasks:
-                    return
-                self.tasks[task_id]["progress"] = 30
-                self.tasks[task_id]["current_step"] = "生成界面测试用例"
-                self._save_tasks_to_storage()
-
-            # 步骤3: 生成界面测试用例 (30-45%)
-            time.sleep(2)
-
-            # 检查任务是否超时
-            if self._is_task_timeout(task_id):
-                logger.info(f"任务 {task_id} 在步骤3后超时，停止执行")
+            # 任务可能已被删除
+            if not self._update_task(task_id, progress=15, current_step="生成测试用例"):
                 return
 
-            with self.task_lock:
-                if task_id not in self.tasks:
-                    return
-                self.tasks[task_id]["progress"] = 45
-                self.tasks[task_id]["current_step"] = "生成性能测试用例"
-                self._save_tasks_to_storage()
-
-            # 步骤4: 生成性能测试用例 (45-60%)
-            time.sleep(2)
-            with self.task_lock:
-                self.tasks[task_id]["progress"] = 60
-                self.tasks[task_id]["current_step"] = "生成安全测试用例"
-                self._save_tasks_to_storage()
-
-            # 步骤5: 生成安全测试用例 (60-75%)
-            time.sleep(2)
-            with self.task_lock:
-                self.tasks[task_id]["progress"] = 75
-                self.tasks[task_id]["current_step"] = "生成兼容性测试用例"
-                self._save_tasks_to_storage()
-
-            # 步骤6: 生成兼容性测试用例 (75-90%)
-            time.sleep(2)
-            with self.task_lock:
-                self.tasks[task_id]["progress"] = 90
-                self.tasks[task_id]["current_step"] = "整理和优化"
-                self._save_tasks_to_storage()
-
             # 调用 DeepSeek API
             client = DeepSeekClient()
 
@@ -322,15 +332,18 @@ class AsyncTaskManager:
                 total_batches=total_batches,
             )
 
-            # 步骤7: 完成 (90-100%)
-            time.sleep(1)
-            with self.task_lock:
-                self.tasks[task_id]["status"] = "completed"
-                self.tasks[task_id]["progress"] = 100
-                self.tasks[task_id]["current_step"] = "生成完成"
-                self.tasks[task_id]["result"] = result
-                self.tasks[task_id]["completed_at"] = datetime.now().isoformat()
-                self._save_tasks_to_storage()
+            completed_at = datetime.now().isoformat()
+            if not self._update_task(
+                task_id,
+                status="completed",
+                progress=100,
+                current_step="生成完成",
+                result=result,
+                completed_at=completed_at,
+                eta_seconds=0,
+            ):
+                return
+            task["completed_at"] = completed_at
 
             # 创建完成通知
             self._create_completion_notification(task_id, task)
@@ -339,16 +352,50 @@ class AsyncTaskManager:
 
         except Exception as e:
             # 任务失败
-            with self.task_lock:
-                if task_id in self.tasks:
-                    self.tasks[task_id]["status"] = "failed"
-                    self.tasks[task_id]["error"] = str(e)
-                    self.tasks[task_id]["current_step"] = "生成失败"
-                    self.tasks[task_id]["completed_at"] = datetime.now().isoformat()
-                    self._save_tasks_to_storage()
+            self._update_task(
+                task_id, status="failed", error=str(e), current_step="生成失败", completed_at=datetime.now().isoformat()
+            )
 
             logger.error(f"后台任务失败: {task_id}, 错误: {e}")
 
+    def _execute_job(self, task_id: str, func: Callable[[Callable[[int, str], bool]], Any], executor=None):
+        """执行通用后台任务（在执行器工作线程中运行）"""
+        executor = executor or self.executor
+        try:
+            if not self._update_task(
+                task_id,
+                status="running",
+                started_at=datetime.now().isoformat(),
+                progress=1,
+                current_step="开始处理",
+                queue_position=None,
+                eta_seconds=int(executor.get_stats()["avg_duration"]),
+            ):
+                return
+            self._refresh_queue_positions(executor)
+
+            def report_progress(progress: int, current_step: str) -> bool:
+                return self._update_task(task_id, progress=progress, current_step=current_step)
+
+            result = func(report_progress)
+
+            self._update_task(
+                task_id,
+                status="completed",
+                progress=100,
+                current_step="处理完成",
+                result=result,
+                completed_at=datetime.now().isoformat(),
+                eta_seconds=0,
+            )
+            logger.info(f"后台任务完成: {task_id}")
+
+        except Exception as e:
+            self._update_task(
+                task_id, status="failed", error=str(e), current_step="处理失败", completed_at=datetime.now().isoformat()
+            )
+            logger.error(f"后台任务失败: {task_id}, 错误: {e}")
+
     def _create_completion_notification(self, task_id: str, task: Dict[str, Any]):
         """创建任务完成通知"""
         try:
@@ -397,19 +444,18 @@ class AsyncTaskManager:
         """清理旧任务"""
         cutoff_time = datetime.now().timestamp() - (max_age_hours * 3600)
 
-        with self.task_lock:
-            tasks_to_remove = []
-            for task_id, task in self.tasks.items():
-                try:
-                    created_at = datetime.fromisoformat(task["created_at"]).timestamp()
-                    if created_at < cutoff_time:
-                        tasks_to_remove.append(task_id)
-                except Exception:
-                    tasks_to_remove.append(task_id)
+        tasks_to_remove = []
+        for task in self.store.list():
+            try:
+                created_at = datetime.fromisoformat(task["created_at"]).timestamp()
+                if created_at < cutoff_time:
+                    tasks_to_remove.append(task["id"])
+            except Exception:
+                tasks_to_remove.append(task["id"])
 
-            for task_id in tasks_to_remove:
-                del self.tasks[task_id]
-                logger.info(f"清理旧任务: {task_id}")
+        for task_id in tasks_to_remove:
+            self.store.delete(task_id)
+            logger.info(f"清理旧任务: {task_id}")
 
 
 # 全局任务管理器实例
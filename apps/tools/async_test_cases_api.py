@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .async_task_manager import task_manager
+from .services.task_executor import TaskQueueFullError
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +47,14 @@ class AsyncGenerateTestCasesAPI(APIView):
 
             return Response({"success": True, "task_id": task_id, "message": "任务已创建，正在后台处理中..."})
 
+        except TaskQueueFullError as e:
+            logger.warning(f"任务队列已满，拒绝创建任务: {e}")
+            response = Response(
+                {"success": False, "error": str(e), "retry_after": e.retry_after}, status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response["Retry-After"] = str(e.retry_after)
+            return response
+
         except Exception as e:
             logger.error(f"创建异步任务失败: {e}")
             return Response(
@@ -87,6 +96,12 @@ class TaskStatusAPI(APIView):
             if "current_step" in task:
                 response_data["current_step"] = task["current_step"]
 
+            # 排队位置和预计完成时间
+            if task["status"] == "pending" and task.get("queue_position") is not None:
+                response_data["queue_position"] = task["queue_position"]
+            if task["status"] in ("pending", "running") and task.get("eta_seconds") is not None:
+                response_data["eta_seconds"] = task["eta_seconds"]
+
             return Response(response_data)
 
         except Exception as e:
@@ -104,8 +119,7 @@ class TaskListAPI(APIView):
     def get(self, request):
         """获取任务列表"""
         try:
-            with task_manager.task_lock:
-                tasks = list(task_manager.tasks.values())
+            tasks = task_manager.get_tasks()
 
             # 按创建时间倒序排列
             tasks.sort(key=lambda x: x["created_at"], reverse=True)
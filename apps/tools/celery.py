@@ -37,6 +37,11 @@ app.conf.beat_schedule = {
         "task": "apps.tools.tasks.check_chat_room_activity",
         "schedule": crontab(minute="*/15"),  # 每15分钟执行一次
     },
+    # 每10分钟预热一次热门目的地数据（只获取已过期的数据源）
+    "prewarm-destination-knowledge": {
+        "task": "apps.tools.tasks.prewarm_destination_knowledge",
+        "schedule": crontab(minute="*/10"),  # 每10分钟执行一次
+    },
 }
 
 # 任务路由配置
@@ -1,7 +1,6 @@
 import json
 import logging
 import os
-import random
 import time
 import uuid
 from datetime import datetime, timedelta
@@ -123,9 +122,19 @@ from .models import (
     VanityWealth,
 )
 
+# 音频转码
+from .services.audio_transcoder import SOURCE_FORMATS as SOURCE_AUDIO_FORMATS
+from .services.audio_transcoder import TARGET_FORMATS as TARGET_AUDIO_FORMATS
+from .services.audio_transcoder import audio_transcoder
+
 # 欲望仪表盘API
 from .services.desire_dashboard import DesireDashboardService
+from .services.diary_search import highlight, search_entries
+from .services.food_sampler import food_sampler
 from .services.job_search_service import JobSearchService
+from .services.llm_gateway import LLMGatewayError, llm_gateway
+from .services.ncm_decoder import NCMDecodeError, NCMDecoder
+from .services.task_executor import TaskQueueFullError
 
 # 三重觉醒改造计划API
 from .services.triple_awakening import TripleAwakeningService, WorkoutAudioProcessor
@@ -216,25 +225,15 @@ def deepseek_api(request):
             return JsonResponse({"success": False, "error": "DeepSeek API密钥未配置"}, content_type="application/json")
 
         # 调用DeepSeek API
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {
-            "messages": [{"role": "user", "content": prompt}],
-            "model": "deepseek-chat",
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-        }
-
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            return JsonResponse({"success": True, "content": content}, content_type="application/json")
-        else:
+        try:
+            content = llm_gateway.complete(
+                prompt, feature="deepseek_api", api_key=api_key, timeout=30, max_tokens=max_tokens, temperature=temperature
+            )
+        except LLMGatewayError as e:
             return JsonResponse(
-                {"success": False, "error": f"DeepSeek API调用失败: {response.status_code}"}, content_type="application/json"
+                {"success": False, "error": f"DeepSeek API调用失败: {e.status_code or e}"}, content_type="application/json"
             )
+        return JsonResponse({"success": True, "content": content}, content_type="application/json")
 
     except json.JSONDecodeError:
         return JsonResponse({"success": False, "error": "无效的JSON数据"}, content_type="application/json")
@@ -658,19 +657,14 @@ def self_analysis_api(request):
         messages.append({"role": "user", "content": user_message})
 
         # 调用DeepSeek API
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {"model": "deepseek-chat", "messages": messages, "temperature": 0.7, "max_tokens": 1000}
-
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            ai_response = result["choices"][0]["message"]["content"]
+        try:
+            ai_response = llm_gateway.reply(
+                messages, feature="self_analysis", api_key=api_key, timeout=30, temperature=0.7, max_tokens=1000
+            )
+        except LLMGatewayError as e:
+            return JsonResponse({"error": str(e)}, status=500, content_type="application/json")
 
-            return JsonResponse({"success": True, "response": ai_response}, content_type="application/json")
-        else:
-            return JsonResponse({"error": f"API调用失败: {response.status_code}"}, status=500, content_type="application/json")
+        return JsonResponse({"success": True, "response": ai_response}, content_type="application/json")
 
     except Exception as e:
         return JsonResponse({"error": f"处理请求时出错: {str(e)}"}, status=500)
@@ -714,19 +708,14 @@ def storyboard_api(request):
         ]
 
         # 调用DeepSeek API
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {"model": "deepseek-chat", "messages": messages, "temperature": 0.8, "max_tokens": 1000}
-
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            story = result["choices"][0]["message"]["content"]
+        try:
+            story = llm_gateway.reply(
+                messages, feature="storyboard", api_key=api_key, timeout=30, temperature=0.8, max_tokens=1000
+            )
+        except LLMGatewayError as e:
+            return JsonResponse({"error": str(e)}, status=500, content_type="application/json")
 
-            return JsonResponse({"success": True, "story": story}, content_type="application/json")
-        else:
-            return JsonResponse({"error": f"API调用失败: {response.status_code}"}, status=500, content_type="application/json")
+        return JsonResponse({"success": True, "story": story}, content_type="application/json")
 
     except Exception as e:
         return JsonResponse({"error": f"处理请求时出错: {str(e)}"}, status=500)
@@ -1794,53 +1783,45 @@ def search_diaries(request, data):
         if not query and not mood_filter and not date_from and not date_to and not tags_filter:
             return JsonResponse({"success": False, "error": "请提供搜索条件"}, content_type="application/json")
 
-        diaries = LifeDiaryEntry.objects.filter(user=request.user)
-
-        # 文本搜索
-        if query:
-            diaries = diaries.filter(
-                models.Q(title__icontains=query) | models.Q(content__icontains=query) | models.Q(mood_note__icontains=query)
-            )
-
-        # 心情过滤
-        if mood_filter:
-            diaries = diaries.filter(mood=mood_filter)
-
-        # 日期范围过滤
+        from_date = to_date = None
         if date_from:
             try:
                 from_date = datetime.strptime(date_from, "%Y-%m-%d").date()
-                diaries = diaries.filter(date__gte=from_date)
             except ValueError:
                 return JsonResponse({"success": False, "error": "开始日期格式无效"}, content_type="application/json")
 
         if date_to:
             try:
                 to_date = datetime.strptime(date_to, "%Y-%m-%d").date()
-                diaries = diaries.filter(date__lte=to_date)
             except ValueError:
                 return JsonResponse({"success": False, "error": "结束日期格式无效"}, content_type="application/json")
 
-        # 标签过滤
-        if tags_filter and isinstance(tags_filter, list):
-            for tag in tags_filter:
-                diaries = diaries.filter(tags__contains=[tag])
-
-        diaries = diaries.order_by("-date")[:limit]
+        # 全文检索：按相关度排序，标签要求全部包含
+        matches = search_entries(
+            request.user,
+            query=query,
+            mood=mood_filter,
+            date_from=from_date,
+            date_to=to_date,
+            tags=tags_filter if isinstance(tags_filter, list) else [],
+            limit=limit,
+        )
 
         results = []
-        for diary in diaries:
-            results.append(
-                {
-                    "id": diary.id,
-                    "date": diary.date.strftime("%Y-%m-%d"),
-                    "title": diary.title,
-                    "content": diary.content[:200] + "..." if len(diary.content) > 200 else diary.content,
-                    "mood": diary.mood,
-                    "tags": diary.tags,
-                    "created_at": diary.created_at.strftime("%Y-%m-%d %H:%M"),
-                }
-            )
+        for diary, rank in matches:
+            item = {
+                "id": diary.id,
+                "date": diary.date.strftime("%Y-%m-%d"),
+                "title": diary.title,
+                "content": diary.content[:200] + "..." if len(diary.content) > 200 else diary.content,
+                "mood": diary.mood,
+                "tags": diary.tags,
+                "created_at": diary.created_at.strftime("%Y-%m-%d %H:%M"),
+            }
+            if query:
+                item["rank"] = round(rank, 4)
+                item["highlight"] = {"title": highlight(diary.title, query), "content": highlight(diary.content, query)}
+            results.append(item)
 
         return JsonResponse({"success": True, "data": results, "total": len(results)})
 
@@ -2229,22 +2210,16 @@ def cleanup_expired_heart_link_requests():
 
     from django.utils import timezone
 
-    # 清理超过10分钟的pending请求（固定10分钟过期）
-    expired_requests = HeartLinkRequest.objects.filter(status="pending", created_at__lt=timezone.now() - timedelta(minutes=10))
+    from apps.tools.services.heart_link_matcher import matcher
 
-    for request in expired_requests:
-        request.status = "expired"
-        request.save()
+    # 清理超过10分钟的pending请求（固定10分钟过期），同时移出匹配队列
+    matcher.expire_stale_requests()
 
     # 清理超过60分钟的matched请求
-    expired_matched_requests = HeartLinkRequest.objects.filter(
-        status="matched", matched_at__lt=timezone.now() - timedelta(minutes=60)
+    HeartLinkRequest.objects.filter(status="matched", matched_at__lt=timezone.now() - timedelta(minutes=60)).update(
+        status="expired"
     )
 
-    for request in expired_matched_requests:
-        request.status = "expired"
-        request.save()
-
 
 def disconnect_inactive_users():
     """断开不活跃用户的连接"""
@@ -2315,12 +2290,7 @@ def create_heart_link_request_api(request):
 
     if request.method == "POST":
         try:
-            # 定期清理过期请求（1%的概率，减少清理频率）
-            import random
-
-            if random.random() < 0.01:
-                cleanup_expired_heart_link_requests()
-
+            # 过期请求由匹配器的后台线程定期清理
             # 检查用户是否已有待处理的请求
             existing_request = HeartLinkRequest.objects.filter(requester=request.user, status="pending").first()
 
@@ -2372,11 +2342,7 @@ def create_heart_link_request_api(request):
             # 使用智能匹配服务
             from apps.tools.services.heart_link_matcher import matcher
 
-            # 大幅减少清理频率，避免影响用户匹配
-            if random.random() < 0.01:
-                matcher.cleanup_expired_requests()
-
-            # 尝试智能匹配
+            # 尝试智能匹配（未配对时进入等待队列）
             chat_room, matched_user = matcher.match_users(request.user, heart_link_request)
 
             if chat_room and matched_user:
@@ -2448,8 +2414,12 @@ def cancel_heart_link_request_api(request):
                     headers=response_headers,
                 )
 
-            # 取消所有pending请求
-            cancelled_count = pending_requests.update(status="cancelled")
+            # 取消所有pending请求，并移出匹配队列
+            from apps.tools.services.heart_link_matcher import matcher
+
+            pending_ids = list(pending_requests.values_list("id", flat=True))
+            cancelled_count = HeartLinkRequest.objects.filter(id__in=pending_ids, status="pending").update(status="cancelled")
+            matcher.cancel_requests(pending_ids)
 
             return JsonResponse(
                 {"success": True, "message": f"已取消 {cancelled_count} 个匹配请求"},
@@ -2487,15 +2457,9 @@ def check_heart_link_status_api(request):
         )
 
     try:
-        # 减少过期清理的频率，只在必要时清理
-        # 清理超过10分钟的pending请求（只清理真正过期的）
-        import random
+        # 过期请求由匹配器的后台线程定期清理，这里只检查当前用户的请求
         from datetime import timedelta
 
-        # 定期清理过期请求（0.5%的概率，减少清理频率）
-        if random.random() < 0.005:
-            cleanup_expired_heart_link_requests()
-
         # 查找用户的最新请求（包括所有状态）
         heart_link_request = HeartLinkRequest.objects.filter(requester=request.user).order_by("-created_at").first()
 
@@ -2674,6 +2638,8 @@ def cleanup_heart_link_api(request):
                 disconnect_inactive_users()
 
                 # 统计清理结果
+                from apps.tools.services.heart_link_matcher import matcher
+
                 expired_count = HeartLinkRequest.objects.filter(status="expired").count()
                 ended_rooms = ChatRoom.objects.filter(status="ended").count()
 
@@ -2683,6 +2649,7 @@ def cleanup_heart_link_api(request):
                         "message": f"清理完成！已清理 {expired_count} 个过期请求，结束 {ended_rooms} 个聊天室",
                         "expired_requests": expired_count,
                         "ended_rooms": ended_rooms,
+                        "queue": matcher.get_wait_metrics(),
                     },
                     content_type="application/json",
                     headers=response_headers,
@@ -7357,78 +7324,68 @@ def start_food_randomization_api(request):
         dietary_restrictions = data.get("dietary_restrictions", [])
         animation_duration = data.get("animation_duration", 3000)
 
-        # 构建查询条件 - 使用SQLite兼容的查询方式
-        available_foods = FoodItem.objects.filter(is_active=True)
-
-        # 根据餐种筛选
-        if meal_type and meal_type != "mixed":
-            # 使用Python过滤而不是数据库查询
-            available_foods = [food for food in available_foods if meal_type in food.meal_types]
-
-        # 根据菜系偏好筛选
-        if cuisine_preference and cuisine_preference != "mixed":
-            available_foods = [food for food in available_foods if food.cuisine == cuisine_preference]
-
-        # 根据心情和价格范围调整筛选条件
-        if mood == "happy":
-            # 开心时倾向于选择受欢迎的食物
-            available_foods = [food for food in available_foods if food.popularity_score >= 0.5]
-        elif mood == "sad":
-            # 难过时倾向于选择安慰食物
-            available_foods = [food for food in available_foods if "comfort" in food.tags]
-        elif mood == "tired":
-            # 疲惫时倾向于选择简单易做的食物
-            available_foods = [food for food in available_foods if food.difficulty == "easy"]
-
-        # 根据价格范围筛选
-        if price_range == "low":
-            # 低价位，选择简单易做的食物
-            available_foods = [food for food in available_foods if food.difficulty == "easy"]
-        elif price_range == "high":
-            # 高价位，选择高级食物
-            available_foods = [food for food in available_foods if "premium" in food.tags]
-
-        # 根据饮食禁忌筛选
-        if dietary_restrictions:
-            for restriction in dietary_restrictions:
-                if restriction == "no_spicy":
-                    # 不吃辣
-                    available_foods = [food for food in available_foods if "spicy" not in food.tags]
-                elif restriction == "vegetarian":
-                    # 素食
-                    available_foods = [food for food in available_foods if "vegetarian" in food.tags]
-                elif restriction == "no_seafood":
-                    # 不吃海鲜
-                    available_foods = [food for food in available_foods if "seafood" not in food.tags]
-                elif restriction == "no_pork":
-                    # 不吃猪肉
-                    available_foods = [food for food in available_foods if "pork" not in food.tags]
-
-        if not available_foods:
+        # 心情、价格和饮食禁忌条件作用在抽样器缓存的轻量行上，不再取回整张表
+        def matches_preferences(row):
+            tags = row.tags or []
+            # 根据心情和价格范围调整筛选条件
+            if mood == "happy" and row.popularity_score < 0.5:
+                # 开心时倾向于选择受欢迎的食物
+                return False
+            if mood == "sad" and "comfort" not in tags:
+                # 难过时倾向于选择安慰食物
+                return False
+            if (mood == "tired" or price_range == "low") and row.difficulty != "easy":
+                # 疲惫或低价位时选择简单易做的食物
+                return False
+            if price_range == "high" and "premium" not in tags:
+                # 高价位，选择高级食物
+                return False
+
+            # 根据饮食禁忌筛选
+            for restriction in dietary_restrictions or []:
+                if restriction == "no_spicy" and "spicy" in tags:
+                    return False
+                if restriction == "vegetarian" and "vegetarian" not in tags:
+                    return False
+                if restriction == "no_seafood" and "seafood" in tags:
+                    return False
+                if restriction == "no_pork" and "pork" in tags:
+                    return False
+            return True
+
+        has_preferences = mood in ("happy", "sad", "tired") or price_range in ("low", "high") or dietary_restrictions
+        candidates = food_sampler.sample(
+            k=1,
+            meal_type=meal_type,
+            cuisine=cuisine_preference,
+            predicate=matches_preferences if has_preferences else None,
+        )
+
+        if not candidates:
             # 如果没有找到符合条件的食物，放宽条件
-            available_foods = list(FoodItem.objects.filter(is_active=True))
+            candidates = food_sampler.sample(k=1)
 
-        if not available_foods:
+        if not candidates:
             return JsonResponse({"success": False, "error": "没有找到合适的食物"})
 
         # 随机选择一个食物
-        selected_food = random.choice(available_foods)
-
-        # 获取备选食物（同菜系或同餐种的其他食物）
-        alternative_foods = []
-        all_foods = list(FoodItem.objects.filter(is_active=True).exclude(id=selected_food.id))
+        selected_food = candidates[0]
 
+        # 获取备选食物（同菜系或同餐种的其他食物），按受欢迎度加权抽取
         if selected_food.cuisine != "mixed":
             # 同菜系的食物
-            alternative_foods = [food for food in all_foods if food.cuisine == selected_food.cuisine]
+            alternative_foods = food_sampler.sample(
+                k=5, cuisine=selected_food.cuisine, weighted=True, exclude=[selected_food.id]
+            )
         else:
             # 同餐种的食物
-            alternative_foods = [
-                food for food in all_foods if any(meal_type in food.meal_types for meal_type in selected_food.meal_types)
-            ]
-
-        # 限制数量
-        alternative_foods = alternative_foods[:5]
+            selected_meal_types = set(selected_food.meal_types or [])
+            alternative_foods = food_sampler.sample(
+                k=5,
+                weighted=True,
+                exclude=[selected_food.id],
+                predicate=lambda row: bool(selected_meal_types.intersection(row.meal_types or [])),
+            )
 
         # 创建随机选择会话记录
         session = FoodRandomizationSession.objects.create(
@@ -7512,17 +7469,13 @@ def pure_random_food_api(request):
         data = json.loads(request.body)
         animation_duration = data.get("animation_duration", 3000)
 
-        # 从所有活跃食物中完全随机选择
-        available_foods = FoodItem.objects.filter(is_active=True)
+        # 从所有活跃食物中完全随机选择：一次抽出选中项和5个备选，只取回这6行
+        sampled_foods = food_sampler.sample(k=6)
 
-        if not available_foods.exists():
+        if not sampled_foods:
             return JsonResponse({"success": False, "error": "没有可用的食物数据"})
 
-        # 随机选择一个食物
-        selected_food = random.choice(available_foods)
-
-        # 获取备选食物（完全随机）
-        alternative_foods = list(FoodItem.objects.filter(is_active=True).exclude(id=selected_food.id).order_by("?")[:5])
+        selected_food, alternative_foods = sampled_foods[0], sampled_foods[1:]
 
         # 创建随机选择会话记录
         session = FoodRandomizationSession.objects.create(
@@ -8096,31 +8049,13 @@ def audio_converter_view(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def audio_converter_api(request):
-    """音频转换器API"""
-    import logging
-
-    logger = logging.getLogger(__name__)
+    """
+    音频转换器API
 
+    上传文件落盘后提交为后台转码任务，返回任务ID（202），前端轮询 status_url 获取结果；
+    同一文件转换到同一格式的结果已缓存时直接同步返回。
+    """
     try:
-        # 预先导入pydub以确保可用性
-        try:
-            import sys
-
-            logger.info(f"Python环境: {sys.executable}")
-            logger.info(f"Python版本: {sys.version}")
-
-            import pydub
-
-            logger.info(f"pydub导入成功: {pydub.__file__}")
-        except ImportError as e:
-            error_msg = f"音频处理库未安装: {str(e)}。请联系管理员安装pydub库。"
-            logger.error(error_msg)
-            return JsonResponse({"success": False, "message": error_msg})
-        except Exception as e:
-            error_msg = f"pydub导入发生未知错误: {str(e)}"
-            logger.error(error_msg)
-            return JsonResponse({"success": False, "message": error_msg})
-        # 获取上传的文件
         uploaded_file = request.FILES.get("audio_file")
         target_format = request.POST.get("target_format", "mp3")
 
@@ -8129,1277 +8064,146 @@ def audio_converter_api(request):
 
         # 检查文件类型
         file_extension = uploaded_file.name.lower().split(".")[-1]
-        if file_extension not in ["ncm", "mp3", "wav", "flac", "m4a"]:
+        if file_extension not in SOURCE_AUDIO_FORMATS:
             return JsonResponse({"success": False, "message": "不支持的文件格式，请上传NCM、MP3、WAV、FLAC或M4A文件"})
+        if target_format not in TARGET_AUDIO_FORMATS:
+            return JsonResponse({"success": False, "message": "不支持的目标格式"})
 
-        # 创建临时目录
-        import os
-        import uuid
-
-        from django.conf import settings
-        from django.core.files.base import ContentFile
-        from django.core.files.storage import default_storage
+        import re
 
         temp_dir = os.path.join(settings.MEDIA_ROOT, "temp_audio")
         os.makedirs(temp_dir, exist_ok=True)
 
         # 生成安全的文件名（移除特殊字符）
-        import re
-
         safe_name = re.sub(r"[^\w\-_.]", "_", uploaded_file.name)
         safe_name = re.sub(r"_+", "_", safe_name)  # 将多个连续下划线替换为单个
 
         unique_id = str(uuid.uuid4())
-        input_filename = f"input_{unique_id}_{safe_name}"
         output_filename = f"converted_{unique_id}_{os.path.splitext(safe_name)[0]}.{target_format}"
 
-        # 保存上传的文件
-        temp_input_path = os.path.join(temp_dir, input_filename)
+        # 请求结束后上传文件即被释放，先落盘
+        temp_input_path = os.path.join(temp_dir, f"input_{unique_id}_{safe_name}")
         with open(temp_input_path, "wb+") as destination:
             for chunk in uploaded_file.chunks():
                 destination.write(chunk)
 
-        # 生成输出文件路径
-        temp_output_path = os.path.join(temp_dir, output_filename)
-
-        # 初始化NCM相关变量
-        ncm_metadata = None
-        ncm_album_cover = None
+        cache_key = audio_transcoder.cache_key(temp_input_path, target_format)
 
-        # 如果是NCM文件，先提取元数据
-        if file_extension == "ncm":
+        def run(report_progress):
             try:
-                ncm_result = decrypt_ncm_file_correct(temp_input_path)
-                if ncm_result:
-                    ncm_metadata = ncm_result.get("metadata", {})
-                    ncm_album_cover = ncm_result.get("album_cover")
-                    logger.info(f"NCM元数据提取成功: {ncm_metadata}")
-            except Exception as e:
-                logger.warning(f"NCM元数据提取失败: {e}")
-
-        # 转换音频
-        success, message, output_path = convert_audio_file(temp_input_path, temp_output_path, target_format)
-
-        if success:
-            # 保存到媒体存储
-            with open(output_path, "rb") as f:
-                file_content = f.read()
-
-            # 使用Django的存储系统保存文件
-            file_path = default_storage.save(f"temp_audio/{output_filename}", ContentFile(file_content))
-
-            # 生成下载URL
-            download_url = default_storage.url(file_path)
+                return _run_audio_conversion(
+                    temp_input_path, temp_dir, output_filename, unique_id, target_format, cache_key, report_progress
+                )
+            finally:
+                if os.path.exists(temp_input_path):
+                    os.remove(temp_input_path)
 
-            # 清理临时文件
+        if audio_transcoder.cache.contains(cache_key):
+            # 请求线程中只读缓存，不转码；未命中（检查后被淘汰等）或读取失败时保留输入文件，交给后台任务
             try:
+                cached = _run_audio_conversion(
+                    temp_input_path, temp_dir, output_filename, unique_id, target_format, cache_key, None, cached_only=True
+                )
+            except Exception as e:
+                logger.warning(f"读取音频转换缓存失败: {e}")
+                cached = None
+            if cached is not None:
                 os.remove(temp_input_path)
-                os.remove(output_path)
-            except Exception:
-                pass
+                return JsonResponse({"success": True, "message": "音频转换成功！", **cached})
 
-            # 准备返回数据
-            response_data = {
-                "success": True,
-                "message": "音频转换成功！",
-                "download_url": download_url,
-                "filename": output_filename,
-            }
-
-            # 如果有NCM元数据，添加到响应中
-            if ncm_metadata:
-                response_data["metadata"] = ncm_metadata
-
-            # 如果有NCM专辑封面，保存并添加到响应中
-            if ncm_album_cover:
-                try:
-                    # 保存专辑封面到媒体存储
-                    cover_filename = f"album_cover_{unique_id}.jpg"
-                    cover_path = default_storage.save(f"temp_audio/{cover_filename}", ContentFile(ncm_album_cover["data"]))
-                    cover_url = default_storage.url(cover_path)
-
-                    response_data["album_cover"] = {
-                        "url": cover_url,
-                        "format": ncm_album_cover["format"],
-                        "size": ncm_album_cover["size"],
-                    }
-                except Exception as e:
-                    logger.warning(f"保存专辑封面失败: {e}")
-
-            return JsonResponse(response_data)
-        else:
-            # 清理临时文件
-            try:
+        try:
+            user_id = str(request.user.id) if request.user.is_authenticated else None
+            task_id = audio_transcoder.submit(run, description=f"音频转换: {uploaded_file.name}", user_id=user_id)
+        except TaskQueueFullError as e:
+            logger.warning(f"转码队列已满，拒绝音频转换任务: {e}")
+            if os.path.exists(temp_input_path):
                 os.remove(temp_input_path)
-            except Exception:
-                pass
+            response = JsonResponse({"success": False, "message": str(e), "retry_after": e.retry_after}, status=429)
+            response["Retry-After"] = str(e.retry_after)
+            return response
 
-            return JsonResponse({"success": False, "message": f"转换失败：{message}"})
+        return JsonResponse(
+            {"success": True, "type": "task", "task_id": task_id, "status_url": f"/tools/api/async/task/{task_id}/"},
+            status=202,
+        )
 
     except Exception as e:
+        logger.error(f"音频转换请求处理失败: {e}")
         return JsonResponse({"success": False, "message": f"处理过程中发生错误：{str(e)}"})
 
 
-def convert_audio_file(input_path, output_path, target_format):
-    """转换音频文件"""
-    import logging
+def _run_audio_conversion(
+    input_path, temp_dir, output_filename, unique_id, target_format, cache_key, report_progress, cached_only=False
+):
+    """
+    转码并保存到媒体存储，返回下载信息（在转码执行器中运行）
 
-    logger = logging.getLogger(__name__)
+    cached_only=True 时只读转换缓存（在请求中运行），未命中返回None，不会转码。
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
 
+    temp_output_path = os.path.join(temp_dir, output_filename)
     try:
-        # 导入音频处理库
-        try:
-            from pydub import AudioSegment
-        except ImportError as e:
-            return False, f"pydub库未安装: {str(e)}", None
-        import os
-
-        decrypted_path = None
-
-        # 如果是NCM文件，先解密
-        if input_path.lower().endswith(".ncm"):
-            logger.info(f"开始解密NCM文件: {input_path}")
-            try:
-                # 使用正确的NCM解密函数
-                ncm_result = decrypt_ncm_file_correct(input_path)
-
-                # 提取音频数据
-                decrypted_audio_data = ncm_result["audio_data"]
-
-                # 保存解密后的音频数据到临时文件
-                import tempfile
-
-                temp_fd, decrypted_path = tempfile.mkstemp(suffix=".mp3", prefix="ncm_decrypted_")
-                with os.fdopen(temp_fd, "wb") as f:
-                    f.write(decrypted_audio_data)
-
-                logger.info(f"NCM解密成功，临时文件: {decrypted_path}")
-
-            except Exception as e:
-                logger.error(f"NCM解密失败: {str(e)}")
-                return False, f"NCM文件解密失败: {str(e)}", None
-
-            # 验证解密后的文件
-            if not os.path.exists(decrypted_path):
-                return False, "解密后的文件不存在", None
-
-            file_size = os.path.getsize(decrypted_path)
-            logger.info(f"解密后文件大小: {file_size} bytes")
-
-            if file_size < 1024:  # 文件太小
-                return False, "解密后的文件太小，可能解密失败", None
-
-            # 增强的文件头验证和修复
-            try:
-                with open(decrypted_path, "rb") as f:
-                    header = f.read(32)  # 读取更多字节用于分析
-                    logger.info(f"解密后文件头32字节: {header.hex()}")
-
-                    # 检查是否是有效的音频文件头
-                    is_valid_audio = False
-                    detected_format = None
-
-                    # 检查各种音频格式
-                    if header.startswith(b"ID3"):
-                        is_valid_audio = True
-                        detected_format = "mp3"
-                        logger.info("✅ 检测到MP3文件（ID3标签）")
-                    elif header[0:2] == b"\xff\xfb" or header[0:2] == b"\xff\xfa":
-                        is_valid_audio = True
-                        detected_format = "mp3"
-                        logger.info("✅ 检测到MP3文件（帧头）")
-                    elif header.startswith(b"RIFF") and len(header) > 12 and header[8:12] == b"WAVE":
-                        is_valid_audio = True
-                        detected_format = "wav"
-                        logger.info("✅ 检测到WAV文件")
-                    elif header.startswith(b"fLaC"):
-                        is_valid_audio = True
-                        detected_format = "flac"
-                        logger.info("✅ 检测到FLAC文件")
-                    elif len(header) > 8 and b"ftyp" in header[4:8]:
-                        is_valid_audio = True
-                        detected_format = "m4a"
-                        logger.info("✅ 检测到M4A/MP4文件")
-                    else:
-                        # 尝试在文件中查找音频格式标识
-                        logger.warning("文件头不匹配已知音频格式，尝试深度扫描...")
-
-                        # 重新读取文件进行深度扫描
-                        f.seek(0)
-                        full_data = f.read(min(file_size, 8192))  # 读取前8KB
-
-                        # 查找MP3帧头
-                        for i in range(len(full_data) - 4):
-                            if full_data[i] == 0xFF and (full_data[i + 1] & 0xE0) == 0xE0:
-                                # 验证MP3帧头
-                                if i + 3 < len(full_data):
-                                    frame_header = (
-                                        (full_data[i] << 24)
-                                        | (full_data[i + 1] << 16)
-                                        | (full_data[i + 2] << 8)
-                                        | full_data[i + 3]
-                                    )
-                                    mpeg_version = (frame_header >> 19) & 0x3
-                                    layer = (frame_header >> 17) & 0x3
-                                    if mpeg_version != 1 and layer != 1:  # 不是MPEG1 Layer3
-                                        continue
-
-                                    is_valid_audio = True
-                                    detected_format = "mp3"
-                                    logger.info(f"✅ 深度扫描找到MP3帧头位置: {i}")
-                                    logger.info(f"MP3帧头: {full_data[i:i+4].hex()}")
-
-                                    # 创建修复后的文件
-                                    repaired_path = repair_audio_file_with_offset(decrypted_path, i)
-                                    if repaired_path:
-                                        decrypted_path = repaired_path
-                                        logger.info(f"✅ 文件修复成功: {repaired_path}")
-                                    break
-
-                        # 如果还是没找到，尝试其他格式
-                        if not is_valid_audio:
-                            if b"RIFF" in full_data and b"WAVE" in full_data:
-                                is_valid_audio = True
-                                detected_format = "wav"
-                                logger.info("✅ 深度扫描检测到WAV文件")
-                            elif b"fLaC" in full_data:
-                                is_valid_audio = True
-                                detected_format = "flac"
-                                logger.info("✅ 深度扫描检测到FLAC文件")
-                            elif b"ftyp" in full_data:
-                                is_valid_audio = True
-                                detected_format = "m4a"
-                                logger.info("✅ 深度扫描检测到M4A文件")
-
-                    # 无论是否检测到有效格式，都使用解密后的文件
-                    input_path = decrypted_path
-                    if is_valid_audio:
-                        logger.info(f"✅ 解密后的文件验证通过，格式: {detected_format}")
-                    else:
-                        logger.warning("⚠️ 解密后的文件头不匹配已知音频格式，将尝试强制处理")
-
-            except Exception as e:
-                logger.warning(f"文件头验证失败: {e}")
-                input_path = decrypted_path
-
-        # 尝试加载音频文件
-        try:
-            logger.info(f"开始加载音频文件: {input_path}")
-
-            # 如果是解密后的NCM文件，优先使用原生方法
-            if decrypted_path and input_path == decrypted_path:
-                logger.info("检测到解密后的NCM文件，优先使用原生方法...")
-
-                # 直接使用原生方法转换解密后的文件
-                native_result = convert_ncm_file_native(input_path, output_path, target_format)
-                if native_result[0]:  # 如果成功
-                    logger.info("原生方法转换成功")
-                    return native_result
-                else:
-                    logger.warning(f"原生方法失败: {native_result[1]}")
-
-                # 如果原生方法失败，尝试修复文件
-                logger.info("原生方法失败，尝试修复音频文件...")
-                repaired_path = repair_audio_file(input_path)
-                if repaired_path:
-                    logger.info("文件修复成功，使用修复后的文件进行原生转换...")
-                    native_repair_result = convert_ncm_file_native(repaired_path, output_path, target_format)
-                    if native_repair_result[0]:
-                        logger.info("修复后文件原生转换成功")
-                        return native_repair_result
-                    else:
-                        logger.warning(f"修复后文件原生转换失败: {native_repair_result[1]}")
-
-                # 如果所有原生方法都失败，尝试使用pydub（通常也会失败）
-                logger.warning("所有原生方法都失败，尝试使用pydub（可能失败）...")
-                try:
-                    audio = AudioSegment.from_file(input_path, format="mp3")
-                    logger.info("以MP3格式成功加载解密文件")
-                except Exception as e1:
-                    logger.error(f"MP3格式加载失败: {e1}")
-                    return False, f"NCM文件解密后无法处理，请检查文件是否损坏: {str(e1)}", None
-            else:
-                # 普通文件直接加载
-                try:
-                    audio = AudioSegment.from_file(input_path)
-                    logger.info("成功加载普通音频文件")
-                except Exception as e:
-                    logger.error(f"无法加载音频文件: {e}")
-                    return False, f"无法加载音频文件: {str(e)}", None
-
-        except Exception as e:
-            error_msg = f"无法加载音频文件: {str(e)}"
-            logger.error(error_msg)
-
-            # 如果是解密文件，提供更详细的错误信息
-            if decrypted_path:
-                error_msg += f"\n解密后文件路径: {decrypted_path}"
-                if os.path.exists(decrypted_path):
-                    error_msg += f"\n解密后文件大小: {os.path.getsize(decrypted_path)} bytes"
-                else:
-                    error_msg += "\n解密后文件不存在"
-
-            return False, error_msg, None
-
-        # 验证音频数据
-        if len(audio) == 0:
-            return False, "音频文件为空或无有效音频数据", None
-
-        logger.info(f"音频文件信息: 时长={len(audio)}ms, 采样率={audio.frame_rate}Hz, 声道数={audio.channels}")
+        if cached_only:
+            result = audio_transcoder.copy_cached(cache_key, temp_output_path)
+            if result is None:
+                return None
+        else:
+            result = audio_transcoder.transcode(
+                input_path, temp_output_path, target_format, progress_callback=report_progress, cache_key=cache_key
+            )
+        with open(temp_output_path, "rb") as f:
+            file_path = default_storage.save(f"temp_audio/{output_filename}", f)
+    finally:
+        if os.path.exists(temp_output_path):
+            os.remove(temp_output_path)
+
+    response_data = {
+        "download_url": default_storage.url(file_path),
+        "filename": output_filename,
+        "cached": result["cached"],
+    }
+    if result["metadata"]:
+        response_data["metadata"] = result["metadata"]
 
-        # 根据目标格式导出
+    album_cover = result["album_cover"]
+    if album_cover:
         try:
-            if target_format == "mp3":
-                audio.export(output_path, format="mp3", bitrate="128k", parameters=["-write_xing", "0", "-id3v2_version", "0"])
-            elif target_format == "wav":
-                audio.export(output_path, format="wav")
-            elif target_format == "flac":
-                audio.export(output_path, format="flac")
-            elif target_format == "m4a":
-                audio.export(output_path, format="ipod")
-            else:
-                return False, "不支持的目标格式", None
-
-            logger.info(f"音频转换成功: {output_path}")
-
-            # 清理解密的临时文件
-            if decrypted_path and os.path.exists(decrypted_path):
-                try:
-                    os.remove(decrypted_path)
-                    logger.info("已清理解密临时文件")
-                except Exception as e:
-                    logger.warning(f"清理解密临时文件失败: {e}")
-
-            return True, "转换成功", output_path
-
+            cover_path = default_storage.save(f"temp_audio/album_cover_{unique_id}.jpg", ContentFile(album_cover["data"]))
+            response_data["album_cover"] = {
+                "url": default_storage.url(cover_path),
+                "format": album_cover["format"],
+                "size": album_cover["size"],
+            }
         except Exception as e:
-            error_msg = f"音频导出失败: {str(e)}"
-            logger.error(error_msg)
-            return False, error_msg, None
-
-    except Exception as e:
-        error_msg = f"音频转换过程中发生未知错误: {str(e)}"
-        logger.error(error_msg)
-
-        # 清理解密的临时文件
-        if "decrypted_path" in locals() and decrypted_path and os.path.exists(decrypted_path):
-            try:
-                os.remove(decrypted_path)
-            except Exception:
-                pass
-
-        return False, error_msg, None
-
-
-def decrypt_ncm_file(ncm_path):
-    """解密NCM文件"""
-    try:
-        import base64
-        import json
-        import os
-        import struct
-
-        from cryptography.hazmat.backends import default_backend
-        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-
-        # 检查文件是否存在
-        if not os.path.exists(ncm_path):
-            raise Exception(f"文件不存在: {ncm_path}")
-
-        # 检查文件大小
-        file_size = os.path.getsize(ncm_path)
-        if file_size < 1024:  # 文件太小，不可能是有效的NCM文件
-            raise Exception("文件太小，不是有效的NCM文件")
-
-        # NCM文件解密密钥
-        core_key = b"hzHRAmso5kInbaxW"
-        meta_key = b"#14ljk_!\\]&0U<'("
-
-        def unpad(s):
-            """移除PKCS7填充"""
-            if not s:
-                return s
-            padding_length = s[-1] if isinstance(s[-1], int) else ord(s[-1])
-            if padding_length > len(s) or padding_length == 0:
-                return s
-            return s[:-padding_length]
-
-        with open(ncm_path, "rb") as f:
-            # 读取文件头
-            header = f.read(8)
-            if len(header) != 8 or header != b"CTENFDAM":
-                raise Exception("不是有效的NCM文件格式")
-
-            # 跳过2字节
-            f.seek(2, 1)
-
-            # 读取密钥数据长度
-            key_length_data = f.read(4)
-            if len(key_length_data) != 4:
-                raise Exception("NCM文件格式错误：无法读取密钥长度")
-
-            key_length = struct.unpack("<I", key_length_data)[0]
-            if key_length <= 0 or key_length > file_size:
-                raise Exception(f"NCM文件格式错误：密钥长度异常 ({key_length})")
-
-            # 读取密钥数据
-            key_data = f.read(key_length)
-            if len(key_data) != key_length:
-                raise Exception("NCM文件格式错误：密钥数据读取不完整")
-
-            # 解密密钥数据
-            key_data = bytes([byte ^ 0x64 for byte in key_data])
-            cipher = Cipher(algorithms.AES(core_key), modes.CBC(b"\x00" * 16), backend=default_backend())
-            decryptor = cipher.decryptor()
-            key_data = decryptor.update(key_data) + decryptor.finalize()
-
-            # 移除PKCS7填充
-            key_data = unpad(key_data)
-
-            print(f"解密后的密钥数据长度: {len(key_data)}")
-            print(f"解密后的密钥数据前32字节: {key_data[:32].hex()}")
-
-            # 从解密后的密钥数据中提取实际的密钥
-            try:
-                # 尝试不同的密钥提取方式
-                rc4_key = None
-
-                # 方法1：查找JSON数据
-                key_json_start = key_data.find(b"{")
-                if key_json_start != -1:
-                    try:
-                        key_json_data = key_data[key_json_start:]
-                        # 找到JSON结束位置
-                        json_end = key_json_data.find(b"}")
-                        if json_end != -1:
-                            key_json_data = key_json_data[: json_end + 1]
-
-                        # 尝试解码JSON
-                        key_info = json.loads(key_json_data.decode("utf-8", errors="ignore"))
-                        if "key" in key_info and isinstance(key_info["key"], list):
-                            rc4_key = bytes(key_info["key"])
-                            print(f"方法1成功：从JSON提取到密钥，长度: {len(rc4_key)}")
-                        else:
-                            print("JSON中没有找到有效的key字段")
-                            rc4_key = None
-                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
-                        print(f"JSON解析失败: {e}")
-                        rc4_key = None
-
-                # 方法2：跳过neteasecloudmusic前缀
-                if not rc4_key:
-                    netease_prefix = b"neteasecloudmusic"
-                    prefix_pos = key_data.find(netease_prefix)
-                    if prefix_pos != -1:
-                        rc4_key = key_data[prefix_pos + len(netease_prefix) :]
-                        print(f"方法2成功：跳过前缀提取密钥，长度: {len(rc4_key)}")
-
-                # 方法3：查找RC4密钥标识
-                if not rc4_key:
-                    # 查找可能的RC4密钥标识
-                    for i in range(len(key_data) - 16):
-                        if key_data[i : i + 4] == b"RC4K" or key_data[i : i + 4] == b"KEY_":
-                            rc4_key = key_data[i + 4 : i + 132]  # 假设RC4密钥长度为128字节
-                            print(f"方法3成功：找到RC4密钥标识，长度: {len(rc4_key)}")
-                            break
-
-                # 方法4：使用固定偏移（跳过前17字节）
-                if not rc4_key and len(key_data) > 17:
-                    rc4_key = key_data[17:]
-                    print(f"方法4成功：固定偏移提取密钥，长度: {len(rc4_key)}")
-
-                # 方法5：使用整个密钥数据
-                if not rc4_key:
-                    rc4_key = key_data
-                    print(f"方法5：使用整个密钥数据，长度: {len(rc4_key)}")
-
-                # 确保密钥不为空且长度合理
-                if not rc4_key or len(rc4_key) == 0:
-                    raise Exception("无法提取RC4密钥")
-
-                # 如果密钥太长，截取合理长度
-                if len(rc4_key) > 256:
-                    rc4_key = rc4_key[:256]
-                    print(f"密钥太长，截取到256字节")
+            logger.warning(f"保存专辑封面失败: {e}")
+    return response_data
 
-            except Exception as e:
-                # 最后的备用方案：使用默认密钥
-                print(f"密钥提取失败，使用备用方案: {e}")
-                default_key = b"163 key(Don't modify):" + b"\x00" * 16
-                rc4_key = default_key[:32]  # 使用32字节默认密钥
-
-            # 读取元数据长度
-            meta_length_data = f.read(4)
-            if len(meta_length_data) != 4:
-                raise Exception("NCM文件格式错误：无法读取元数据长度")
-
-            meta_length = struct.unpack("<I", meta_length_data)[0]
-
-            # 读取并解密元数据（如果存在）
-            if meta_length > 0:
-                if meta_length > file_size:
-                    raise Exception(f"NCM文件格式错误：元数据长度异常 ({meta_length})")
-
-                meta_data = f.read(meta_length)
-                if len(meta_data) != meta_length:
-                    raise Exception("NCM文件格式错误：元数据读取不完整")
-
-                try:
-                    # 解密元数据
-                    meta_data = bytes([byte ^ 0x63 for byte in meta_data])
-                    meta_data = base64.b64decode(meta_data[22:])
-                    cipher = Cipher(algorithms.AES(meta_key), modes.CBC(b"\x00" * 16), backend=default_backend())
-                    decryptor = cipher.decryptor()
-                    meta_data = decryptor.update(meta_data) + decryptor.finalize()
-                    meta_data = unpad(meta_data)
-                except Exception as e:
-                    print(f"元数据解密失败: {e}")
-                    meta_data = b""
-
-            # 跳过CRC32
-            f.seek(9, 1)
-
-            # 读取音频数据盒子长度
-            box_length_data = f.read(4)
-            if len(box_length_data) != 4:
-                raise Exception("NCM文件格式错误：无法读取音频数据盒子长度")
-
-            box_length = struct.unpack("<I", box_length_data)[0]
-            if box_length > 0:
-                f.seek(box_length, 1)
-
-            # 创建临时文件存储解密后的音频
-
-            temp_dir = os.path.dirname(ncm_path) or os.getcwd()
-
-            # 使用更安全的临时文件名
-            import uuid
-
-            unique_id = str(uuid.uuid4())[:8]
-            decrypted_path = os.path.join(temp_dir, f"decrypted_temp_{unique_id}.mp3")
-
-            # 确保rc4_key不为空
-            if not rc4_key:
-                raise Exception("RC4密钥为空，无法解密音频数据")
-
-            print(f"开始解密音频数据，密钥长度: {len(rc4_key)}")
-            print(f"解密输出路径: {decrypted_path}")
-
-            # 生成RC4密钥流（KSA - Key Scheduling Algorithm）
-            S = list(range(256))
-            j = 0
-            key_len = len(rc4_key)
-
-            for i in range(256):
-                j = (j + S[i] + rc4_key[i % key_len]) & 0xFF
-                S[i], S[j] = S[j], S[i]
-
-            # 准备PRGA（Pseudo-Random Generation Algorithm）
-            i = j = 0
-            chunk_count = 0
-            total_bytes = 0
-
-            # 获取剩余文件大小
-            current_pos = f.tell()
-            f.seek(0, 2)  # 移动到文件末尾
-            end_pos = f.tell()
-            f.seek(current_pos)  # 回到当前位置
-            audio_data_size = end_pos - current_pos
-
-            print(f"音频数据大小: {audio_data_size} bytes")
-
-            if audio_data_size <= 0:
-                raise Exception("没有可解密的音频数据")
-
-            with open(decrypted_path, "wb") as out_file:
-                while True:
-                    chunk = f.read(0x8000)  # 32KB chunks
-                    if not chunk:
-                        break
-
-                    chunk_count += 1
-                    total_bytes += len(chunk)
-
-                    if chunk_count % 10 == 0:  # 每10个chunk打印一次进度
-                        progress = (total_bytes / audio_data_size) * 100
-                        print(f"正在解密第{chunk_count}个数据块... 进度: {progress:.1f}%")
-
-                    # 使用RC4解密音频数据（PRGA）
-                    decrypted_chunk = bytearray()
-
-                    for byte_val in chunk:
-                        i = (i + 1) & 0xFF
-                        j = (j + S[i]) & 0xFF
-                        S[i], S[j] = S[j], S[i]
-                        k = S[(S[i] + S[j]) & 0xFF]
-                        decrypted_chunk.append(byte_val ^ k)
-
-                    out_file.write(decrypted_chunk)
-
-            print(f"音频解密完成，共处理{chunk_count}个数据块，总计{total_bytes}字节")
-
-            # 验证解密后的文件
-            if not os.path.exists(decrypted_path):
-                raise Exception("解密后的文件创建失败")
-
-            decrypted_size = os.path.getsize(decrypted_path)
-            print(f"解密后文件大小: {decrypted_size} bytes")
-
-            if decrypted_size == 0:
-                raise Exception("解密后的文件为空")
-
-            # 检查文件头
-            with open(decrypted_path, "rb") as verify_file:
-                header = verify_file.read(16)
-                print(f"解密后文件头16字节: {header.hex()}")
-
-                # 尝试识别音频格式
-                if header.startswith(b"ID3"):
-                    print("✅ 检测到MP3文件（ID3标签）")
-                elif header[0:2] == b"\xff\xfb" or header[0:2] == b"\xff\xfa":
-                    print("✅ 检测到MP3文件（帧头）")
-                elif header.startswith(b"RIFF"):
-                    print("✅ 检测到WAV文件")
-                elif header.startswith(b"fLaC"):
-                    print("✅ 检测到FLAC文件")
-                elif b"ftyp" in header[4:8]:
-                    print("✅ 检测到M4A/MP4文件")
-                else:
-                    print("❌ 无法识别音频格式，文件头: " + header.hex())
-                    print("🔄 直接使用修复后的备用解密算法...")
-                    return decrypt_ncm_file_fallback(ncm_path)
-
-            return decrypted_path
-
-    except Exception as e:
-        print(f"NCM解密错误: {e}")
-        import traceback
-
-        traceback.print_exc()
 
-        # 尝试备用解密方案
-        print("尝试使用备用解密方案...")
-        try:
-            return decrypt_ncm_file_fallback(ncm_path)
-        except Exception as fallback_error:
-            print(f"备用解密方案也失败: {fallback_error}")
-            return None
-
-
-def decrypt_ncm_file_fallback(ncm_path):
-    """NCM文件备用解密方案 - 完全重写版本"""
-    try:
-        import json
-        import os
-        import struct
-        import uuid
-
-        try:
-            from cryptography.hazmat.backends import default_backend
-            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-        except ImportError:
-            raise Exception("需要安装pycryptodome库: pip install pycryptodome")
-
-        print("🔧 使用完全重写的NCM解密算法...")
-
-        with open(ncm_path, "rb") as f:
-            # 检查文件头
-            header = f.read(8)
-            if header != b"CTENFDAM":
-                raise Exception("不是有效的NCM文件")
-
-            print(f"✅ 文件头验证通过: {header}")
-
-            # 跳过版本信息
-            f.seek(2, 1)
-
-            # 读取密钥长度
-            key_length = struct.unpack("<I", f.read(4))[0]
-            print(f"🔑 密钥长度: {key_length}")
-
-            # 读取密钥数据
-            key_data = f.read(key_length)
-            print(f"🔑 原始密钥数据长度: {len(key_data)}")
-            print(f"🔑 原始密钥数据前32字节: {key_data[:32].hex()}")
-
-            # XOR 0x64
-            key_data_xor = bytes([byte ^ 0x64 for byte in key_data])
-            print(f"🔑 XOR 0x64后: {key_data_xor[:32].hex()}")
-
-            # AES解密
-            core_key = b"hzHRAmso5kInbaxW"
-            cipher = Cipher(algorithms.AES(core_key), modes.ECB(), backend=default_backend())
-            decryptor = cipher.decryptor()
-            decrypted_key = decryptor.update(key_data_xor) + decryptor.finalize()
-            print(f"🔑 AES解密后: {decrypted_key[:32].hex()}")
-
-            # 移除PKCS7填充
-            while decrypted_key and decrypted_key[-1] == 0:
-                decrypted_key = decrypted_key[:-1]
-            print(f"🔑 移除填充后: {decrypted_key[:32].hex()}")
-            print(f"🔑 解密后密钥长度: {len(decrypted_key)}")
-
-            # 尝试解析JSON
-            try:
-                key_json_start = decrypted_key.find(b"{")
-                if key_json_start != -1:
-                    key_json_data = decrypted_key[key_json_start:]
-                    json_end = key_json_data.find(b"}")
-                    if json_end != -1:
-                        key_json_data = key_json_data[: json_end + 1]
-                        key_info = json.loads(key_json_data.decode("utf-8"))
-                        print(f"🔑 JSON解析成功: {key_info}")
-                        if "key" in key_info:
-                            rc4_key = bytes(key_info["key"])
-                            print(f"🔑 从JSON提取RC4密钥: {rc4_key[:32].hex()}")
-                        else:
-                            raise Exception("JSON中没有key字段")
-                    else:
-                        raise Exception("找不到JSON结束位置")
-                else:
-                    raise Exception("找不到JSON开始位置")
-            except Exception as e:
-                print(f"❌ JSON解析失败: {e}")
-                # 备用方案：跳过neteasecloudmusic前缀
-                netease_prefix = b"neteasecloudmusic"
-                prefix_pos = decrypted_key.find(netease_prefix)
-                if prefix_pos != -1:
-                    rc4_key = decrypted_key[prefix_pos + len(netease_prefix) :]
-                    print(f"🔑 跳过前缀提取RC4密钥: {rc4_key[:32].hex()}")
-                else:
-                    raise Exception("无法提取RC4密钥")
-
-            print(f"🔑 最终RC4密钥长度: {len(rc4_key)}")
-
-            # 读取元数据长度
-            meta_length = struct.unpack("<I", f.read(4))[0]
-            print(f"📝 元数据长度: {meta_length}")
-
-            # 跳过元数据
-            if meta_length > 0:
-                f.seek(meta_length, 1)
-
-            # 跳过CRC
-            f.seek(9, 1)
-
-            # 读取盒子长度
-            box_length = struct.unpack("<I", f.read(4))[0]
-            print(f"📦 盒子长度: {box_length}")
-
-            # 跳过盒子数据
-            if box_length > 0:
-                f.seek(box_length, 1)
-
-            # 获取音频数据位置
-            audio_start = f.tell()
-            print(f"🎵 音频数据开始位置: {audio_start}")
-
-            # 创建输出文件
-            temp_dir = os.path.dirname(ncm_path) or os.getcwd()
-            unique_id = str(uuid.uuid4())[:8]
-            output_path = os.path.join(temp_dir, f"decrypted_complete_{unique_id}.mp3")
-
-            print(f"📄 输出文件: {output_path}")
-
-            # RC4解密音频数据
-            with open(output_path, "wb") as out_file:
-                # 初始化RC4状态
-                S = list(range(256))
-                j = 0
-
-                # 密钥调度算法 (KSA)
-                for i in range(256):
-                    j = (j + S[i] + rc4_key[i % len(rc4_key)]) % 256
-                    S[i], S[j] = S[j], S[i]
-
-                # 伪随机生成算法 (PRGA)
-                i = j = 0
-                chunk_count = 0
-                total_size = 0
-
-                while True:
-                    chunk = f.read(0x8000)  # 32KB
-                    if not chunk:
-                        break
-
-                    chunk_count += 1
-                    total_size += len(chunk)
-
-                    if chunk_count % 50 == 0:
-                        print(f"🔄 处理第{chunk_count}块，总大小: {total_size:,} bytes")
-
-                    # RC4解密
-                    decrypted = bytearray()
-                    for byte in chunk:
-                        i = (i + 1) % 256
-                        j = (j + S[i]) % 256
-                        S[i], S[j] = S[j], S[i]
-                        k = S[(S[i] + S[j]) % 256]
-                        decrypted.append(byte ^ k)
-
-                    out_file.write(decrypted)
-
-            print(f"✅ 解密完成，处理了{chunk_count}个数据块，总大小: {total_size:,} bytes")
-
-            # 验证输出文件
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                file_size = os.path.getsize(output_path)
-                print(f"修复解密成功，文件大小: {file_size:,} bytes")
-
-                # 检查文件头
-                with open(output_path, "rb") as check_file:
-                    header = check_file.read(10)
-                    print(f"解密后文件头: {header.hex()}")
-
-                    # 检查是否是有效的音频格式
-                    if (
-                        header.startswith(b"ID3")  # MP3 with ID3
-                        or header[0:3] == b"\xff\xfb"  # MP3 frame header
-                        or header[0:3] == b"\xff\xfa"  # MP3 frame header
-                        or header.startswith(b"RIFF")  # WAV
-                        or header.startswith(b"fLaC")  # FLAC
-                        or header[4:8] == b"ftyp"
-                    ):  # M4A
-                        print("✅ 解密后的文件头验证通过")
-                    else:
-                        print("⚠️ 解密后的文件头不匹配已知音频格式")
-
-                return output_path
-            else:
-                raise Exception("修复解密输出文件无效")
-
-    except Exception as e:
-        print(f"修复解密失败: {e}")
-        print(f"错误类型: {type(e).__name__}")
-        import traceback
-
-        traceback.print_exc()
-        return None
-
-
-def repair_audio_file(audio_path):
-    """修复损坏的音频文件"""
+def convert_audio_file(input_path, output_path, target_format):
+    """同步转换音频文件，返回 (是否成功, 消息, 输出路径)"""
     try:
-        import os
-        import uuid
-
-        print(f"开始修复音频文件: {audio_path}")
-
-        if not os.path.exists(audio_path):
-            print("文件不存在，无法修复")
-            return None
-
-        # 创建修复后的文件路径
-        temp_dir = os.path.dirname(audio_path)
-        unique_id = str(uuid.uuid4())[:8]
-        repaired_path = os.path.join(temp_dir, f"repaired_{unique_id}.mp3")
-
-        with open(audio_path, "rb") as infile, open(repaired_path, "wb") as outfile:
-            # 读取文件内容
-            data = infile.read()
-
-            if len(data) == 0:
-                print("文件为空，无法修复")
-                return None
-
-            # 尝试找到MP3同步头并重建文件
-            print("搜索MP3同步头...")
-            sync_positions = []
-
-            # 查找所有可能的MP3同步头 (0xFF, 0xFB 或 0xFF, 0xFA)
-            for i in range(len(data) - 1):
-                if data[i] == 0xFF and (data[i + 1] & 0xE0) == 0xE0:
-                    sync_positions.append(i)
-
-            print(f"找到 {len(sync_positions)} 个可能的同步头")
-
-            if sync_positions:
-                # 从第一个同步头开始重建文件
-                start_pos = sync_positions[0]
-                print(f"从位置 {start_pos} 开始重建MP3文件")
-
-                # 写入简单的MP3 ID3v2标签
-                # 计算ID3标签大小（不包括10字节的头部）
-                id3_size = len(data[start_pos:])
-                id3_size_bytes = [
-                    ((id3_size >> 21) & 0x7F),
-                    ((id3_size >> 14) & 0x7F),
-                    ((id3_size >> 7) & 0x7F),
-                    (id3_size & 0x7F),
-                ]
-
-                id3_header = bytearray(
-                    [
-                        0x49,
-                        0x44,
-                        0x33,  # "ID3"
-                        0x03,
-                        0x00,  # 版本 3.0
-                        0x00,  # 标志
-                    ]
-                    + id3_size_bytes
-                )  # 正确的大小
-                outfile.write(id3_header)
-
-                # 写入从同步头开始的数据
-                outfile.write(data[start_pos:])
-
-            else:
-                # 没找到同步头，尝试添加简单的MP3头
-                print("未找到同步头，添加简单的MP3头")
-
-                # 写入最基本的MP3帧头
-                # MPEG1 Layer3, 128kbps, 44.1kHz, Stereo
-                mp3_header = bytearray([0xFF, 0xFB, 0x90, 0x00])  # 同步头  # 基本参数
-                outfile.write(mp3_header)
-                outfile.write(data)
-
-            print(f"修复完成，输出文件: {repaired_path}")
-
-            # 验证修复后的文件
-            if os.path.exists(repaired_path) and os.path.getsize(repaired_path) > 10:
-                print(f"修复成功，文件大小: {os.path.getsize(repaired_path)} bytes")
-                return repaired_path
-            else:
-                print("修复失败，输出文件无效")
-                return None
-
+        audio_transcoder.transcode(input_path, output_path, target_format)
     except Exception as e:
-        print(f"文件修复过程中出错: {e}")
-        return None
-
-
-def repair_audio_file_with_offset(audio_path, offset):
-    """根据指定偏移量修复音频文件"""
-    try:
-        import os
-        import uuid
-
-        print(f"开始根据偏移量修复音频文件: {audio_path}, 偏移量: {offset}")
-
-        if not os.path.exists(audio_path):
-            print("文件不存在，无法修复")
-            return None
-
-        # 创建修复后的文件路径
-        temp_dir = os.path.dirname(audio_path)
-        unique_id = str(uuid.uuid4())[:8]
-        repaired_path = os.path.join(temp_dir, f"repaired_offset_{unique_id}.mp3")
-
-        with open(audio_path, "rb") as infile, open(repaired_path, "wb") as outfile:
-            # 读取文件内容
-            data = infile.read()
+        logger.error(f"音频转换失败: {e}")
+        return False, str(e), None
+    return True, "转换成功", output_path
 
-            if len(data) == 0:
-                print("文件为空，无法修复")
-                return None
-
-            if offset >= len(data):
-                print(f"偏移量 {offset} 超出文件大小 {len(data)}")
-                return None
-
-            # 从指定偏移量开始提取音频数据
-            audio_data = data[offset:]
-            print(f"从偏移量 {offset} 提取音频数据，大小: {len(audio_data)} bytes")
-
-            # 检查提取的数据是否以MP3帧头开始
-            if len(audio_data) >= 4 and audio_data[0] == 0xFF and (audio_data[1] & 0xE0) == 0xE0:
-                print("✅ 提取的数据以有效MP3帧头开始")
-
-                # 直接写入MP3数据，不添加ID3标签
-                # 因为数据本身已经是有效的MP3格式
-                outfile.write(audio_data)
 
-                print(f"✅ 修复完成，输出文件: {repaired_path}")
-
-                # 验证修复后的文件
-                if os.path.exists(repaired_path) and os.path.getsize(repaired_path) > 10:
-                    file_size = os.path.getsize(repaired_path)
-                    print(f"✅ 修复成功，文件大小: {file_size} bytes")
-
-                    # 验证文件头
-                    with open(repaired_path, "rb") as check_file:
-                        header = check_file.read(16)
-                        print(f"修复后文件头: {header.hex()}")
-
-                    return repaired_path
-                else:
-                    print("❌ 修复失败，输出文件无效")
-                    return None
-            else:
-                print(f"❌ 偏移量 {offset} 处的数据不是有效的MP3帧头")
-                print(f"数据前4字节: {audio_data[:4].hex()}")
-                return None
-
-    except Exception as e:
-        print(f"文件修复过程中出错: {e}")
-        import traceback
-
-        traceback.print_exc()
+def decrypt_ncm_file(ncm_path):
+    """解密NCM文件，音频写入同目录下的临时文件，返回其路径，失败时返回None"""
+    try:
+        decoder = NCMDecoder(ncm_path)
+        temp_dir = os.path.dirname(ncm_path) or os.getcwd()
+        decrypted_path = os.path.join(temp_dir, f"decrypted_temp_{uuid.uuid4().hex[:8]}.{decoder.audio_format or 'mp3'}")
+        decoder.decrypt_to(decrypted_path)
+        return decrypted_path
+    except (NCMDecodeError, OSError) as e:
+        logger.error(f"NCM文件解密失败: {e}")
         return None
 
 
-def convert_ncm_file_native(input_path, output_path, target_format):
-    """原生NCM文件转换，绕过pydub和ffmpeg"""
-    try:
-        import os
-
-        print(f"开始原生转换: {input_path} -> {output_path} ({target_format})")
-
-        if not os.path.exists(input_path):
-            return False, "输入文件不存在", None
-
-        # 读取解密后的音频数据
-        with open(input_path, "rb") as f:
-            data = f.read()
-
-        if len(data) < 1024:
-            return False, "文件太小，无法处理", None
-
-        # 增强的音频数据定位方法
-        audio_start = 0
-        audio_format = None
-
-        print(f"文件总大小: {len(data)} bytes")
-        print(f"文件头16字节: {data[:16].hex()}")
-
-        # 方法1: 检查ID3标签
-        if data.startswith(b"ID3"):
-            if len(data) >= 10:
-                # 读取ID3标签大小
-                size = ((data[6] & 0x7F) << 21) | ((data[7] & 0x7F) << 14) | ((data[8] & 0x7F) << 7) | (data[9] & 0x7F)
-                audio_start = 10 + size
-                audio_format = "mp3"
-                print(f"✅ 检测到ID3标签，音频数据从位置 {audio_start} 开始")
-
-        # 方法2: 查找MP3帧头 (更精确的搜索)
-        if not audio_format:
-            for i in range(min(len(data) - 4, 4096)):  # 在前4KB中搜索
-                if data[i] == 0xFF and (data[i + 1] & 0xE0) == 0xE0:
-                    # 验证这是一个有效的MP3帧头
-                    if i + 3 < len(data):
-                        # 检查帧头格式
-                        frame_header = (data[i] << 24) | (data[i + 1] << 16) | (data[i + 2] << 8) | data[i + 3]
-                        # MPEG版本和层检查
-                        mpeg_version = (frame_header >> 19) & 0x3
-                        layer = (frame_header >> 17) & 0x3
-                        if mpeg_version != 1 and layer != 1:  # 不是MPEG1 Layer3
-                            continue
-
-                        audio_start = i
-                        audio_format = "mp3"
-                        print(f"✅ 找到有效MP3帧头位置: {i}")
-                        print(f"MP3帧头: {data[i:i+4].hex()}")
-                        break
-
-        # 方法3: 查找其他音频格式头
-        if not audio_format:
-            if data.startswith(b"RIFF") and len(data) > 12 and data[8:12] == b"WAVE":
-                audio_start = 0
-                audio_format = "wav"
-                print("✅ 检测到WAV文件")
-            elif data.startswith(b"fLaC"):
-                audio_start = 0
-                audio_format = "flac"
-                print("✅ 检测到FLAC文件")
-            elif len(data) > 8 and b"ftyp" in data[4:8]:
-                audio_start = 0
-                audio_format = "m4a"
-                print("✅ 检测到M4A/MP4文件")
-
-        # 方法4: 如果都没找到，尝试跳过可能的头部数据
-        if not audio_format:
-            # 尝试跳过前1KB的数据，查找MP3帧头
-            for i in range(1024, min(len(data) - 4, 2048)):
-                if data[i] == 0xFF and (data[i + 1] & 0xE0) == 0xE0:
-                    audio_start = i
-                    audio_format = "mp3"
-                    print(f"⚠️ 跳过头部后找到MP3帧头位置: {i}")
-                    break
-
-        # 如果仍然没找到，假设是MP3格式，从文件开始处理
-        if not audio_format:
-            audio_format = "mp3"
-            print("⚠️ 未检测到明确格式，假设为MP3格式")
-
-        audio_data = data[audio_start:]
-
-        if len(audio_data) < 1024:
-            return False, "有效音频数据太少", None
-
-        print(f"提取的音频数据大小: {len(audio_data)} bytes")
-        print(f"音频数据前16字节: {audio_data[:16].hex()}")
-
-        # 根据目标格式进行转换
-        if target_format.lower() == "mp3":
-            try:
-                # 使用ffmpeg进行MP3转换，确保没有延迟和ID3标签
-                import subprocess
-
-                # 创建临时MP3文件
-                temp_mp3 = output_path.replace(".mp3", "_temp.mp3")
-                with open(temp_mp3, "wb") as outfile:
-                    outfile.write(audio_data)
-
-                # 使用ffmpeg转换，去除延迟和ID3标签
-                result = subprocess.run(
-                    [
-                        "ffmpeg",
-                        "-i",
-                        temp_mp3,
-                        "-acodec",
-                        "libmp3lame",
-                        "-b:a",
-                        "128k",
-                        "-ar",
-                        "44100",
-                        "-ac",
-                        "2",
-                        "-write_xing",
-                        "0",
-                        "-id3v2_version",
-                        "0",
-                        output_path,
-                        "-y",
-                    ],
-                    capture_output=True,
-                    text=True,
-                    timeout=30,
-                )
-
-                # 清理临时文件
-                if os.path.exists(temp_mp3):
-                    os.remove(temp_mp3)
-
-                if result.returncode == 0 and os.path.exists(output_path):
-                    output_size = os.path.getsize(output_path)
-                    print(f"✅ MP3转换完成，输出大小: {output_size} bytes")
-                    return True, "MP3转换成功", output_path
-                else:
-                    print(f"❌ MP3转换失败: {result.stderr}")
-                    return False, f"MP3转换失败: {result.stderr}", None
-
-            except Exception as e:
-                return False, f"MP3转换失败: {str(e)}", None
-
-        elif target_format.lower() == "wav":
-            try:
-                # 使用ffmpeg进行WAV转换
-                import subprocess
-
-                # 创建临时MP3文件
-                temp_mp3 = output_path.replace(".wav", "_temp.mp3")
-                with open(temp_mp3, "wb") as outfile:
-                    outfile.write(audio_data)
-
-                # 使用ffmpeg转换
-                result = subprocess.run(
-                    ["ffmpeg", "-i", temp_mp3, "-acodec", "pcm_s16le", "-ar", "44100", "-ac", "2", output_path, "-y"],
-                    capture_output=True,
-                    text=True,
-                    timeout=30,
-                )
-
-                # 清理临时文件
-                if os.path.exists(temp_mp3):
-                    os.remove(temp_mp3)
-
-                if result.returncode == 0 and os.path.exists(output_path):
-                    output_size = os.path.getsize(output_path)
-                    print(f"✅ WAV转换完成，输出大小: {output_size} bytes")
-                    return True, "WAV转换成功", output_path
-                else:
-                    print(f"❌ WAV转换失败: {result.stderr}")
-                    return False, f"WAV转换失败: {result.stderr}", None
-
-            except Exception as e:
-                return False, f"WAV转换失败: {str(e)}", None
-
-        elif target_format.lower() == "flac":
-            try:
-                # 使用ffmpeg进行FLAC转换
-                import subprocess
-
-                # 创建临时MP3文件
-                temp_mp3 = output_path.replace(".flac", "_temp.mp3")
-                with open(temp_mp3, "wb") as outfile:
-                    outfile.write(audio_data)
-
-                # 使用ffmpeg转换
-                result = subprocess.run(
-                    ["ffmpeg", "-i", temp_mp3, "-acodec", "flac", output_path, "-y"],
-                    capture_output=True,
-                    text=True,
-                    timeout=30,
-                )
-
-                # 清理临时文件
-                if os.path.exists(temp_mp3):
-                    os.remove(temp_mp3)
-
-                if result.returncode == 0 and os.path.exists(output_path):
-                    output_size = os.path.getsize(output_path)
-                    print(f"✅ FLAC转换完成，输出大小: {output_size} bytes")
-                    return True, "FLAC转换成功", output_path
-                else:
-                    print(f"❌ FLAC转换失败: {result.stderr}")
-                    return False, f"FLAC转换失败: {result.stderr}", None
-
-            except Exception as e:
-                return False, f"FLAC转换失败: {str(e)}", None
-
-        elif target_format.lower() == "m4a":
-            try:
-                # 使用ffmpeg进行M4A转换
-                import subprocess
-
-                # 创建临时MP3文件
-                temp_mp3 = output_path.replace(".m4a", "_temp.mp3")
-                with open(temp_mp3, "wb") as outfile:
-                    outfile.write(audio_data)
-
-                # 使用ffmpeg转换
-                result = subprocess.run(
-                    ["ffmpeg", "-i", temp_mp3, "-acodec", "aac", output_path, "-y"], capture_output=True, text=True, timeout=30
-                )
-
-                # 清理临时文件
-                if os.path.exists(temp_mp3):
-                    os.remove(temp_mp3)
-
-                if result.returncode == 0 and os.path.exists(output_path):
-                    output_size = os.path.getsize(output_path)
-                    print(f"✅ M4A转换完成，输出大小: {output_size} bytes")
-                    return True, "M4A转换成功", output_path
-                else:
-                    print(f"❌ M4A转换失败: {result.stderr}")
-                    return False, f"M4A转换失败: {result.stderr}", None
-
-            except Exception as e:
-                return False, f"M4A转换失败: {str(e)}", None
-
-        else:
-            # 对于其他格式，尝试直接复制音频数据
-            try:
-                with open(output_path, "wb") as out_f:
-                    out_f.write(audio_data)
-
-                output_size = os.path.getsize(output_path)
-                print(f"✅ {target_format.upper()}转换完成，输出大小: {output_size} bytes")
-                return True, f"{target_format.upper()}转换成功", output_path
-
-            except Exception as e:
-                return False, f"{target_format.upper()}转换失败: {str(e)}", None
-
-    except Exception as e:
-        print(f"原生转换过程中出错: {e}")
-        import traceback
-
-        traceback.print_exc()
-        return False, f"原生转换失败: {str(e)}", None
-
-
-# 好心人攻略相关视图函数
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def user_generated_travel_guide_api(request):
@@ -10577,180 +9381,6 @@ def simple_audio_test(request):
     return render(request, "simple_audio_test.html")
 
 
-def decrypt_ncm_file_correct(ncm_path):
-    """
-    使用正确的NCM解密算法解密NCM文件
-    基于ncmdump库的实现，同时提取专辑封面
-    """
-    try:
-        import json
-        import logging
-        import struct
-
-        from cryptography.hazmat.backends import default_backend
-        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-
-        logger = logging.getLogger(__name__)
-
-        with open(ncm_path, "rb") as f:
-            # 检查文件头
-            header = f.read(8)
-            if header != b"CTENFDAM":
-                raise ValueError("不是有效的NCM文件")
-
-            # 跳过版本信息
-            f.seek(2, 1)
-
-            # 读取密钥数据长度
-            key_length = struct.unpack("<I", f.read(4))[0]
-
-            # 读取密钥数据
-            key_data = bytearray(f.read(key_length))
-            key_data = bytes(bytearray([byte ^ 0x64 for byte in key_data]))
-
-            # 解密密钥数据
-            core_key = b"hzHRAmso5kInbaxW"
-            cipher = Cipher(algorithms.AES(core_key), modes.ECB(), backend=default_backend())
-            decryptor = cipher.decryptor()
-
-            # 确保密钥数据长度是16的倍数
-            if len(key_data) % 16 != 0:
-                padding_length = 16 - (len(key_data) % 16)
-                key_data += b"\x00" * padding_length
-
-            decrypted_key = decryptor.update(key_data) + decryptor.finalize()
-
-            # 移除填充并提取有效数据
-            try:
-                # 手动移除PKCS7填充
-                padding_length = decrypted_key[-1]
-                if padding_length <= 16:
-                    key_data = decrypted_key[:-padding_length][17:]
-                else:
-                    key_data = decrypted_key[17:]
-            except Exception:
-                # 如果unpad失败，手动移除前17字节
-                key_data = decrypted_key[17:]
-
-            key_length = len(key_data)
-
-            # 检查密钥长度
-            if key_length == 0:
-                raise ValueError("密钥数据为空，无法进行解密")
-
-            # RC4密钥调度算法
-            key = bytearray(key_data)
-            S = bytearray(range(256))
-            j = 0
-
-            for i in range(256):
-                j = (j + S[i] + key[i % key_length]) & 0xFF
-                S[i], S[j] = S[j], S[i]
-
-            # 读取元数据长度
-            meta_length = struct.unpack("<I", f.read(4))[0]
-
-            # 读取并解析元数据
-            metadata = {}
-            album_cover = None
-
-            if meta_length:
-                meta_data = bytearray(f.read(meta_length))
-                meta_data = bytes(bytearray([byte ^ 0x63 for byte in meta_data]))
-
-                # 解密元数据 - 添加错误处理
-                try:
-                    meta_cipher = Cipher(algorithms.AES(b"MoOtOiTvINGwd2E6"), modes.ECB(), backend=default_backend())
-                    meta_decryptor = meta_cipher.decryptor()
-                    # 确保数据长度是16的倍数
-                    if len(meta_data) % 16 != 0:
-                        # 填充到16的倍数
-                        padding_length = 16 - (len(meta_data) % 16)
-                        meta_data += b"\x00" * padding_length
-
-                    decrypted_meta = meta_decryptor.update(meta_data) + meta_decryptor.finalize()
-                    # 手动移除PKCS7填充
-                    try:
-                        padding_length = decrypted_meta[-1]
-                        if padding_length <= 16:
-                            meta_data = decrypted_meta[:-padding_length][22:]
-                        else:
-                            meta_data = decrypted_meta[22:]
-                    except Exception:
-                        # 如果unpad失败，手动移除前22字节
-                        meta_data = decrypted_meta[22:]
-
-                    # 解析JSON元数据
-                    try:
-                        meta_json = json.loads(meta_data.decode("utf-8"))
-                        metadata = {
-                            "title": meta_json.get("musicName", ""),
-                            "artist": meta_json.get("artist", [""])[0] if meta_json.get("artist") else "",
-                            "album": meta_json.get("album", ""),
-                            "duration": meta_json.get("duration", 0) / 1000,  # 转换为秒
-                        }
-                    except Exception:
-                        pass
-                except Exception as e:
-                    logger.warning(f"元数据解密失败: {e}")
-
-            # 跳过5字节
-            f.seek(5, 1)
-
-            # 读取专辑图片信息
-            image_space = struct.unpack("<I", f.read(4))[0]
-            image_size = struct.unpack("<I", f.read(4))[0]
-
-            # 提取专辑封面
-            if image_size > 0:
-                image_data = f.read(image_size)
-                # 解密图片数据 - 添加错误处理
-                try:
-                    image_data = bytes(bytearray([byte ^ 0x63 for byte in image_data]))
-                    image_cipher = Cipher(algorithms.AES(b"MoOtOiTvINGwd2E6"), modes.ECB(), backend=default_backend())
-                    image_decryptor = image_cipher.decryptor()
-
-                    # 确保数据长度是16的倍数
-                    if len(image_data) % 16 != 0:
-                        # 填充到16的倍数
-                        padding_length = 16 - (len(image_data) % 16)
-                        image_data += b"\x00" * padding_length
-
-                    decrypted_image = image_decryptor.update(image_data) + image_decryptor.finalize()
-                    # 手动移除PKCS7填充
-                    padding_length = decrypted_image[-1]
-                    if padding_length <= 16:
-                        image_data = decrypted_image[:-padding_length][22:]
-                    else:
-                        image_data = decrypted_image[22:]
-
-                    album_cover = {"data": image_data, "format": "jpeg", "size": len(image_data)}  # NCM通常使用JPEG格式
-                except Exception as e:
-                    logger.warning(f"专辑封面解密失败: {e}")
-                    album_cover = None
-
-            # 跳过剩余空间
-            f.seek(image_space - image_size, 1)
-
-            # 读取音频数据
-            data = f.read()
-
-            # RC4流密码解密
-            stream = [S[(S[i] + S[(i + S[i]) & 0xFF]) & 0xFF] for i in range(256)]
-            stream = bytes(bytearray(stream * (len(data) // 256 + 1))[1 : 1 + len(data)])
-
-            # XOR解密
-            decrypted_audio = bytes(a ^ b for a, b in zip(data, stream))
-
-            # 返回解密结果和元数据
-            result = {"audio_data": decrypted_audio, "metadata": metadata, "album_cover": album_cover}
-
-            return result
-
-    except Exception as e:
-        raise ValueError(f"NCM文件解密失败: {str(e)}")
-
-
 @login_required
 def check_video_room_status_api(request, room_id):
     """检查视频聊天室状态API"""
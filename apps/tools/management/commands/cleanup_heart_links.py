@@ -48,24 +48,21 @@ class Command(BaseCommand):
                 self.stdout.write(f"跳过本次清理 (概率: {cleanup_probability:.1%})...")
 
         # 统计信息
-        total_requests = HeartLinkRequest.objects.count()
-        pending_requests = HeartLinkRequest.objects.filter(status="pending").count()
-        expired_requests = HeartLinkRequest.objects.filter(status="expired").count()
-        matched_requests = HeartLinkRequest.objects.filter(status="matched").count()
+        from apps.tools.services.heart_link_matcher import matcher
 
-        # 计算匹配成功率
-        if total_requests > 0:
-            match_rate = (matched_requests / total_requests) * 100
-        else:
-            match_rate = 0
+        stats = matcher.get_matching_stats()
+        median_wait = stats["median_wait_seconds"]
 
         self.stdout.write(
             self.style.SUCCESS(
                 f"清理完成！统计信息：\n"
-                f"总请求数: {total_requests}\n"
-                f"等待中: {pending_requests}\n"
-                f"已过期: {expired_requests}\n"
-                f"已匹配: {matched_requests}\n"
-                f"匹配成功率: {match_rate:.1f}%"
+                f"总请求数: {stats['total']}\n"
+                f"等待中: {stats['pending']}\n"
+                f"已过期: {stats['expired']}\n"
+                f"已匹配: {stats['matched']}\n"
+                f"匹配成功率: {stats['match_rate']:.1f}%\n"
+                f"队列深度: {stats['queue_depth']}\n"
+                f"等待时间中位数: {'-' if median_wait is None else f'{median_wait}秒'}\n"
+                f"当前最久等待: {stats['oldest_wait_seconds']}秒"
             )
         )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from apps.tools.models import LifeDiaryEntry
+from apps.tools.services.diary_search import get_backend
+
+
+class Command(BaseCommand):
+    help = "重建生活日记全文检索索引（回填历史日记或修复索引）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="只重建指定用户ID的日记")
+        parser.add_argument("--batch-size", type=int, default=500, help="每批读取的日记数量")
+
+    def handle(self, *args, **options):
+        entries = LifeDiaryEntry.objects.order_by("id")
+        if options["user"]:
+            entries = entries.filter(user_id=options["user"])
+
+        backend = get_backend()
+        total = entries.count()
+        self.stdout.write(f"开始重建日记检索索引，共 {total} 篇（{type(backend).__name__}）...")
+
+        done = 0
+        for entry in entries.iterator(chunk_size=options["batch_size"]):
+            backend.index(entry)
+            done += 1
+            if done % options["batch_size"] == 0:
+                self.stdout.write(f"已完成 {done}/{total}")
+
+        self.stdout.write(self.style.SUCCESS(f"日记检索索引重建完成: {done} 篇"))
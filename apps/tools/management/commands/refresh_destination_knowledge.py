@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.tools.services.destination_knowledge import prewarm_destinations, top_destinations
+
+
+class Command(BaseCommand):
+    help = "批量刷新目的地知识缓存（景点、国家、汇率、时区、天气等外部接口数据）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("destinations", nargs="*", help="要刷新的目的地，不指定时按攻略生成次数取热门目的地")
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=getattr(settings, "DESTINATION_KNOWLEDGE_PREWARM_TOP", 20),
+            help="不指定目的地时取前N个热门目的地",
+        )
+        parser.add_argument("--missing-only", action="store_true", help="只获取缺失或已过期的数据源（定时预热使用）")
+
+    def handle(self, *args, **options):
+        destinations = options["destinations"] or top_destinations(options["top"])
+        if not destinations:
+            self.stdout.write(self.style.WARNING("没有可刷新的目的地：还没有用户生成过攻略"))
+            return
+
+        refresh = not options["missing_only"]
+        mode = "强制刷新" if refresh else "补齐过期数据"
+        self.stdout.write(f"开始{mode}目的地知识缓存，共 {len(destinations)} 个目的地...")
+
+        def report(destination, seconds):
+            self.stdout.write(f"  {destination}: {seconds}秒")
+
+        timings = prewarm_destinations(destinations, refresh=refresh, on_progress=report)
+        self.stdout.write(self.style.SUCCESS(f"目的地知识缓存{mode}完成: {len(timings)} 个目的地"))
@@ -0,0 +1,85 @@
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Value
+
+
+def backfill_search_index(apps, schema_editor):
+    """为已有日记建立检索索引（与 diary_search 的两种实现一致，使用迁移时的历史模型）"""
+    from django.contrib.postgres.search import SearchVector
+
+    from apps.tools.services.diary_search import document_fields, document_terms, tokenize
+
+    LifeDiaryEntry = apps.get_model("tools", "LifeDiaryEntry")
+    LifeDiarySearchTerm = apps.get_model("tools", "LifeDiarySearchTerm")
+    db_alias = schema_editor.connection.alias
+    postgres = schema_editor.connection.vendor == "postgresql"
+
+    terms = []
+    for entry in LifeDiaryEntry.objects.using(db_alias).order_by("id").iterator(chunk_size=500):
+        if postgres:
+            vector = None
+            for field_weight, text in document_fields(entry).items():
+                part = SearchVector(Value(" ".join(tokenize(text))), config="simple", weight=field_weight)
+                vector = part if vector is None else vector + part
+            LifeDiaryEntry.objects.using(db_alias).filter(pk=entry.pk).update(search_vector=vector)
+            continue
+        terms.extend(
+            LifeDiarySearchTerm(entry_id=entry.pk, user_id=entry.user_id, term=term, weight=weight)
+            for term, weight in document_terms(entry).items()
+        )
+        if len(terms) >= 5000:
+            LifeDiarySearchTerm.objects.using(db_alias).bulk_create(terms)
+            terms = []
+    if terms:
+        LifeDiarySearchTerm.objects.using(db_alias).bulk_create(terms)
+
+
+def create_gin_index(apps, schema_editor):
+    """GIN索引只在PostgreSQL上创建，其他数据库使用倒排索引表"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS tools_lifediaryentry_search_gin ON tools_lifediaryentry USING GIN (search_vector)"
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS tools_lifediaryentry_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tools', '0071_alter_shipbaoinquiry_chat_room'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lifediaryentry',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='检索向量'),
+        ),
+        migrations.CreateModel(
+            name='LifeDiarySearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='词项')),
+                ('weight', models.FloatField(default=0, verbose_name='权重')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='tools.lifediaryentry', verbose_name='日记')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '日记检索词项',
+                'verbose_name_plural': '日记检索词项',
+                'indexes': [models.Index(fields=['user', 'term'], name='tools_lifed_user_id_f493e2_idx')],
+                'unique_together': {('entry', 'term')},
+            },
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -2,6 +2,7 @@ import random
 from datetime import timedelta
 
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
@@ -61,6 +62,9 @@ class LifeDiaryEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
+    # 全文检索向量（仅PostgreSQL使用，GIN索引在迁移中按数据库类型创建）
+    search_vector = SearchVectorField(null=True, editable=False, verbose_name="检索向量")
+
     class Meta:
         verbose_name = "生活日记"
         verbose_name_plural = "生活日记"
@@ -166,6 +170,24 @@ class LifeDiaryEntry(models.Model):
         return random.choice(questions)
 
 
+class LifeDiarySearchTerm(models.Model):
+    """日记全文检索倒排索引（非PostgreSQL数据库使用，如开发和测试环境的SQLite）"""
+
+    entry = models.ForeignKey(LifeDiaryEntry, on_delete=models.CASCADE, related_name="search_terms", verbose_name="日记")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, verbose_name="用户")
+    term = models.CharField(max_length=64, verbose_name="词项")
+    weight = models.FloatField(default=0, verbose_name="权重")
+
+    class Meta:
+        verbose_name = "日记检索词项"
+        verbose_name_plural = "日记检索词项"
+        unique_together = ["entry", "term"]
+        indexes = [models.Index(fields=["user", "term"])]
+
+    def __str__(self):
+        return f"{self.entry_id} - {self.term}"
+
+
 class LifeCategory(models.Model):
     """生活分类模型"""
 
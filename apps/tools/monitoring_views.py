@@ -13,6 +13,9 @@ from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
 from apps.tools.services.cache_service import CacheManager
+from apps.tools.services.conversion_cache import conversion_cache
+from apps.tools.services.llm_cache import llm_cache
+from apps.tools.services.llm_gateway import llm_gateway
 from apps.tools.services.monitoring_service import monitoring_service
 
 
@@ -72,6 +75,26 @@ def get_cache_stats(request):
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
 
+@login_required
+@user_passes_test(is_admin)
+def get_conversion_cache_stats(request):
+    """获取文件转换缓存统计（命中率、节省字节数、磁盘占用）"""
+    try:
+        return JsonResponse({"success": True, "data": conversion_cache.get_stats()})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+
+@login_required
+@user_passes_test(is_admin)
+def get_llm_cache_stats(request):
+    """获取大模型响应缓存统计（命中率、节省的token数）和各功能的调用统计"""
+    try:
+        return JsonResponse({"success": True, "data": {"cache": llm_cache.get_stats(), "calls": llm_gateway.get_metrics()}})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+
 @login_required
 @user_passes_test(is_admin)
 def clear_cache(request):
@@ -114,6 +137,8 @@ class MonitoringAPIView(View):
                 data = monitoring_service.check_all_alerts()
             elif data_type == "cache":
                 data = CacheManager.get_cache_stats()
+            elif data_type == "conversion_cache":
+                data = conversion_cache.get_stats()
             else:
                 return JsonResponse({"error": "未知的数据类型"}, status=400)
 
@@ -9,9 +9,9 @@ import json
 import logging
 import os
 
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.core.files.storage import default_storage
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
@@ -24,13 +24,47 @@ except ImportError:
     print("警告: PyMuPDF (fitz) 未安装，PDF转换功能将受限")
 import base64
 import io
+import tempfile
 import uuid
 
 from PIL import Image
 
+from .services.conversion_cache import conversion_cache
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# PDF转图片的渲染参数，同时参与转换缓存键的计算
+PDF_TO_IMAGE_DPI = 150
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """
+    只追加、不可seek的写缓冲区
+
+    供ZipFile流式写入：每写完一个成员就用 drain() 取走已产生的字节，缓冲区只保留未发送的部分。
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
 
 class PDFConverter:
     """PDF转换引擎核心类"""
@@ -121,8 +155,29 @@ class PDFConverter:
 
         return suggestion
 
-    def pdf_to_word(self, pdf_file):
-        """PDF转Word - 真实实现"""
+    def _is_scanned_pdf(self, pdf_path, sample_pages=5):
+        """抽样检查前几页是否没有文本层（扫描件），扫描件跳过pdf2docx直接OCR"""
+        if not FITZ_AVAILABLE:
+            return False
+        with fitz.open(pdf_path) as doc:
+            pages = [doc.load_page(i) for i in range(min(sample_pages, len(doc)))]
+            if not pages:
+                return False
+            text_length = sum(len(page.get_text().strip()) for page in pages)
+            has_images = any(page.get_images() for page in pages)
+        return has_images and text_length < 20 * len(pages)
+
+    def pdf_to_word(self, pdf_file, progress_callback=None):
+        """
+        PDF转Word - 真实实现
+
+        progress_callback(progress, current_step) 用于向异步任务汇报进度
+        """
+
+        def report(progress, current_step):
+            if progress_callback:
+                progress_callback(progress, current_step)
+
         try:
             # 检查pdf2docx库是否可用
             try:
@@ -130,17 +185,8 @@ class PDFConverter:
             except ImportError:
                 return False, "pdf2docx库未安装，无法进行PDF转Word转换", None
 
-            # 重置文件指针
-            pdf_file.seek(0)
-
-            # 使用pdf2docx进行真实转换
-            import os
-            import tempfile
-
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_pdf:
-                temp_pdf.write(pdf_file.read())
-                temp_pdf_path = temp_pdf.name
+            # 分块写入临时文件
+            temp_pdf_path = self._spool_pdf_to_temp(pdf_file)
 
             # 创建临时输出文件路径
             temp_docx_path = temp_pdf_path.replace(".pdf", ".docx")
@@ -150,6 +196,19 @@ class PDFConverter:
                 if not os.path.exists(temp_pdf_path):
                     return False, "临时PDF文件创建失败", None
 
+                # 扫描件没有文本层，pdf2docx只会得到空文档，直接走并行OCR
+                if self._is_scanned_pdf(temp_pdf_path):
+                    logger.info("检测到扫描版PDF，直接使用OCR模式")
+                    ocr_success, ocr_result, _ = self._ocr_pdf_to_word_from_path(
+                        temp_pdf_path, progress_callback=progress_callback
+                    )
+                    if ocr_success:
+                        os.unlink(temp_pdf_path)
+                        return True, ocr_result, "pdf_to_word"
+                    logger.warning(f"OCR转换失败，回退到pdf2docx: {ocr_result}")
+
+                report(10, "解析PDF版面")
+
                 # 使用pdf2docx进行转换，改进页面布局处理
                 cv = Converter(temp_pdf_path)
 
@@ -174,6 +233,7 @@ class PDFConverter:
                     # 继续检查是否产生了输出文件
 
                 cv.close()
+                report(50, "检查转换结果")
 
                 # 检查输出文件是否存在
                 if not os.path.exists(temp_docx_path):
@@ -230,7 +290,9 @@ class PDFConverter:
                     if content_length < 50 or contains_suspicious or alpha_ratio < 0.3:
                         logger.info("pdf2docx提取内容不足，切换到OCR模式")
                         # 自动启用 OCR 降级为扫描件识别
-                        ocr_success, ocr_result, ocr_type = self._ocr_pdf_to_word_from_path(temp_pdf_path)
+                        ocr_success, ocr_result, ocr_type = self._ocr_pdf_to_word_from_path(
+                            temp_pdf_path, progress_callback=progress_callback
+                        )
                         if ocr_success:
                             logger.info("OCR转换成功，使用OCR结果")
                             # 清理临时文件
@@ -271,7 +333,9 @@ class PDFConverter:
                     if len(docx_content) < 1000:
                         logger.info("由于检查失败且文件较小，尝试OCR转换")
                         try:
-                            ocr_success, ocr_result, ocr_type = self._ocr_pdf_to_word_from_path(temp_pdf_path)
+                            ocr_success, ocr_result, ocr_type = self._ocr_pdf_to_word_from_path(
+                                temp_pdf_path, progress_callback=progress_callback
+                            )
                             if ocr_success:
                                 # 清理临时文件
                                 try:
@@ -317,9 +381,10 @@ class PDFConverter:
             logger.error(f"PDF转Word失败: {str(e)}")
             return False, f"转换失败: {str(e)}", None
 
-    def _ocr_pdf_to_word_from_path(self, pdf_path: str):
+    def _ocr_pdf_to_word_from_path(self, pdf_path: str, progress_callback=None):
         """对扫描版PDF执行OCR识别并输出Word（docx字节）
         依赖: pytesseract + 系统 tesseract 二进制
+        页面在进程池中并行渲染和识别，单页超时由 PDF_OCR_PAGE_TIMEOUT 控制
         """
         try:
             try:
@@ -339,43 +404,28 @@ class PDFConverter:
             if not FITZ_AVAILABLE:
                 return False, "PyMuPDF未安装，无法进行OCR渲染", None
 
-            doc = fitz.open(pdf_path)
-            ocr_texts = []
-            # 使用较高的DPI 提升识别率
-            zoom = 300 / 72.0
-            mat = fitz.Matrix(zoom, zoom)
+            from django.conf import settings
 
-            import io as _io
+            from .services.pdf_page_pool import get_page_pool, ocr_page
 
-            from PIL import Image as PILImage  # 避免命名冲突
+            with fitz.open(pdf_path) as doc:
+                page_count = len(doc)
 
-            for page_index in range(len(doc)):
-                page = doc.load_page(page_index)
-                pix = page.get_pixmap(matrix=mat)
-                img_bytes = pix.tobytes("png")
-                img = PILImage.open(_io.BytesIO(img_bytes))
-
-                # 语言优先中文+英文（若未安装对应语言，pytesseract会回退或报错）
-                try:
-                    # 使用中文+英文OCR，移除字符白名单限制以支持更多中文字符
-                    config = "--oem 3 --psm 6"
-                    text = pytesseract.image_to_string(img, lang="chi_sim+eng", config=config)
-                except Exception as ocr_error:
-                    logger.warning(f"中文OCR失败，回退到英文: {ocr_error}")
-                    try:
-                        # 回退英文
-                        text = pytesseract.image_to_string(img, lang="eng")
-                    except Exception as eng_error:
-                        logger.warning(f"英文OCR也失败: {eng_error}")
-                        text = ""
-
-                text = text.strip()
-                if text:
-                    ocr_texts.append(text)
-                else:
-                    ocr_texts.append("")
+            def page_progress(finished, total):
+                if progress_callback:
+                    progress_callback(50 + int(45 * finished / total), f"OCR识别 {finished}/{total} 页")
 
-            doc.close()
+            # 使用较高的DPI 提升识别率；失败或超时的页面记为空文本，按页码顺序重组
+            page_timeout = getattr(settings, "PDF_OCR_PAGE_TIMEOUT", 60)
+            page_results = get_page_pool().map_pages(
+                ocr_page,
+                pdf_path,
+                page_count,
+                args=(300, page_timeout),
+                page_timeout=page_timeout,
+                progress_callback=page_progress,
+            )
+            ocr_texts = [text or "" for text in page_results]
 
             # 生成docx，改进的页面结构处理 - 优化版本
             document = Document()
@@ -986,32 +1036,116 @@ class PDFConverter:
             logger.error(f"Word转PDF失败: {str(e)}")
             return False, f"转换失败: {str(e)}", None
 
-    def pdf_to_images(self, pdf_file, dpi=150):
-        """PDF转图片"""
+    def _spool_pdf_to_temp(self, pdf_file):
+        """把上传的PDF分块写入临时文件，避免整个文档读入内存"""
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
+            if hasattr(pdf_file, "chunks"):
+                for chunk in pdf_file.chunks():
+                    temp_pdf.write(chunk)
+            else:
+                pdf_file.seek(0)
+                for chunk in iter(lambda: pdf_file.read(1024 * 1024), b""):
+                    temp_pdf.write(chunk)
+            return temp_pdf.name
+
+    def iter_page_images(self, pdf_path, dpi=150):
+        """
+        逐页渲染PDF为PNG
+
+        从文件路径打开文档，页面按需加载，每次只持有一页的像素数据。
+        生成 (页码, PNG字节, 宽, 高)。
+        """
+        doc = fitz.open(pdf_path)
+        try:
+            mat = fitz.Matrix(dpi / 72, dpi / 72)  # 设置DPI
+            for page_num in range(len(doc)):
+                pix = doc.load_page(page_num).get_pixmap(matrix=mat)
+                width, height = pix.width, pix.height
+                img_data = pix.tobytes("png")
+                pix = None
+                yield page_num + 1, img_data, width, height
+        finally:
+            doc.close()
+
+    def iter_page_texts(self, pdf_path):
+        """逐页提取PDF文本，生成 (页码, 文本)，单页失败时返回占位文本"""
+        doc = fitz.open(pdf_path)
+        try:
+            for page_num in range(len(doc)):
+                try:
+                    page_text = doc.load_page(page_num).get_text()
+                except Exception as page_error:
+                    logger.warning(f"提取第{page_num + 1}页文本时出错: {str(page_error)}")
+                    page_text = f"\n[第{page_num + 1}页文本提取失败]\n"
+                yield page_num + 1, page_text
+        finally:
+            doc.close()
+
+    def iter_images_zip(self, pdf_path, dpi=150):
+        """
+        边渲染边输出ZIP字节流，用于StreamingHttpResponse
+
+        ZipFile写入不可seek的缓冲区（使用数据描述符），每渲染一页就把已产生的字节交出去。
+        """
+        import zipfile
+
+        buffer = _ZipStreamBuffer()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zip_file:
+            for page_number, img_data, _, _ in self.iter_page_images(pdf_path, dpi):
+                # PNG本身已压缩，存储模式即可，避免二次压缩的CPU开销
+                zip_file.writestr(f"page_{page_number}.png", img_data)
+                yield buffer.drain()
+        yield buffer.drain()
+
+    def pdf_to_images_zip(self, pdf_file, output, dpi=150):
+        """
+        PDF转图片并逐页写入ZIP
+
+        output 为可写的二进制文件对象（临时文件或存储文件），内存占用只与单页大小有关。
+        成功时返回 (True, {"total_pages", "file_size"}, "pdf_to_images")。
+        """
+        import zipfile
+
         try:
             if not FITZ_AVAILABLE:
                 return False, "PyMuPDF未安装，无法进行PDF转换", None
 
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-            images = []
+            temp_pdf_path = self._spool_pdf_to_temp(pdf_file)
+            try:
+                total_pages = 0
+                with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as zip_file:
+                    for page_number, img_data, _, _ in self.iter_page_images(temp_pdf_path, dpi):
+                        zip_file.writestr(f"page_{page_number}.png", img_data)
+                        total_pages += 1
+            finally:
+                if os.path.exists(temp_pdf_path):
+                    os.unlink(temp_pdf_path)
 
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                mat = fitz.Matrix(dpi / 72, dpi / 72)  # 设置DPI
-                pix = page.get_pixmap(matrix=mat)
+            if total_pages == 0:
+                return False, "PDF文件为空或损坏", None
 
-                # 转换为PIL Image
-                img_data = pix.tobytes("png")
-                img = Image.open(io.BytesIO(img_data))
+            return True, {"total_pages": total_pages, "file_size": output.tell()}, "pdf_to_images"
 
-                # 转换为base64
-                img_buffer = io.BytesIO()
-                img.save(img_buffer, format="PNG")
-                img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+        except Exception as e:
+            logger.error(f"PDF转图片失败: {str(e)}")
+            return False, f"转换失败: {str(e)}", None
+
+    def pdf_to_images(self, pdf_file, dpi=150):
+        """PDF转图片（返回全部页面的base64，仅适合小文档；大文档请使用 pdf_to_images_zip）"""
+        try:
+            if not FITZ_AVAILABLE:
+                return False, "PyMuPDF未安装，无法进行PDF转换", None
 
-                images.append({"page": page_num + 1, "data": img_base64, "width": img.width, "height": img.height})
+            temp_pdf_path = self._spool_pdf_to_temp(pdf_file)
+            try:
+                images = [
+                    {"page": page_number, "data": base64.b64encode(img_data).decode(), "width": width, "height": height}
+                    for page_number, img_data, width, height in self.iter_page_images(temp_pdf_path, dpi)
+                ]
+            finally:
+                if os.path.exists(temp_pdf_path):
+                    os.unlink(temp_pdf_path)
 
-            doc.close()
             return True, images, "pdf_to_images"
 
         except Exception as e:
@@ -1138,67 +1272,56 @@ class PDFConverter:
             logger.error(f"文本转PDF失败: {str(e)}")
             return False, f"转换失败: {str(e)}", None
 
-    def pdf_to_text(self, pdf_file):
-        """PDF转文本"""
+    def pdf_to_text_file(self, pdf_file, output):
+        """
+        PDF转文本并逐页写入 output（可写的二进制文件对象）
+
+        成功时返回 (True, {"total_pages", "file_size"}, "pdf_to_text")。
+        """
         try:
             if not FITZ_AVAILABLE:
                 return False, "PyMuPDF (fitz) 库未安装，无法进行PDF转文本转换", None
 
-            # 创建临时文件
-            import os
-            import tempfile
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-                # 写入PDF内容
-                for chunk in pdf_file.chunks():
-                    temp_pdf.write(chunk)
-                temp_pdf_path = temp_pdf.name
-
+            temp_pdf_path = self._spool_pdf_to_temp(pdf_file)
             try:
-                # 打开PDF文件
-                doc = fitz.open(temp_pdf_path)
-
-                # 检查PDF是否为空或损坏
-                if len(doc) == 0:
-                    doc.close()
-                    return False, "PDF文件为空或损坏", None
-
-                text_content = ""
-                total_pages = len(doc)
-
-                # 逐页提取文本
-                for page_num in range(total_pages):
-                    try:
-                        page = doc.load_page(page_num)
-                        page_text = page.get_text()
-                        text_content += page_text
-                        if page_num < total_pages - 1:
-                            text_content += "\n\n"  # 页面间添加空行
-                    except Exception as page_error:
-                        logger.warning(f"提取第{page_num + 1}页文本时出错: {str(page_error)}")
-                        text_content += f"\n[第{page_num + 1}页文本提取失败]\n"
-
-                doc.close()
+                total_pages = 0
+                text_length = 0
+                for page_number, page_text in self.iter_page_texts(temp_pdf_path):
+                    if page_number > 1:
+                        output.write(b"\n\n")  # 页面间添加空行
+                    output.write(page_text.encode("utf-8"))
+                    total_pages += 1
+                    text_length += len(page_text.strip())
+            finally:
+                if os.path.exists(temp_pdf_path):
+                    os.unlink(temp_pdf_path)
 
-                # 检查提取的文本内容
-                if not text_content.strip():
-                    return False, "PDF文件不包含可提取的文本内容（可能是扫描版PDF，建议使用OCR工具）", None
+            # 检查PDF是否为空或损坏
+            if total_pages == 0:
+                return False, "PDF文件为空或损坏", None
 
-                # 如果文本内容很少，可能是扫描版PDF
-                if len(text_content.strip()) < 10:
-                    return False, "提取的文本内容过少，可能是扫描版PDF，建议使用OCR工具", None
+            # 检查提取的文本内容
+            if text_length == 0:
+                return False, "PDF文件不包含可提取的文本内容（可能是扫描版PDF，建议使用OCR工具）", None
 
-                return True, text_content, "pdf_to_text"
+            # 如果文本内容很少，可能是扫描版PDF
+            if text_length < 10:
+                return False, "提取的文本内容过少，可能是扫描版PDF，建议使用OCR工具", None
 
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_pdf_path):
-                    os.unlink(temp_pdf_path)
+            return True, {"total_pages": total_pages, "file_size": output.tell()}, "pdf_to_text"
 
         except Exception as e:
             logger.error(f"PDF转文本失败: {str(e)}")
             return False, f"转换失败: {str(e)}", None
 
+    def pdf_to_text(self, pdf_file):
+        """PDF转文本（返回完整字符串；大文档请使用 pdf_to_text_file）"""
+        buffer = io.BytesIO()
+        success, result, file_type = self.pdf_to_text_file(pdf_file, buffer)
+        if not success:
+            return success, result, file_type
+        return True, buffer.getvalue().decode("utf-8"), file_type
+
     def txt_to_pdf(self, txt_file):
         """TXT文件转PDF"""
         try:
@@ -1252,6 +1375,8 @@ def pdf_converter_api(request):
                 data = json.loads(request.body)
                 conversion_type = data.get("type", "")
                 text_content = data.get("text_content", "")
+                stream_requested = str(data.get("stream", "")).lower() in ("1", "true")
+                async_requested = str(data.get("async", "")).lower() in ("1", "true")
                 logger.info(
                     f"JSON数据: type={conversion_type}, text_content_length={len(text_content) if text_content else 0}"
                 )
@@ -1261,6 +1386,8 @@ def pdf_converter_api(request):
             # 表单数据
             conversion_type = request.POST.get("type", "")
             text_content = request.POST.get("text_content", "")
+            stream_requested = request.POST.get("stream", "").lower() in ("1", "true")
+            async_requested = request.POST.get("async", "").lower() in ("1", "true")
             logger.info(f"表单数据: type={conversion_type}, text_content_length={len(text_content) if text_content else 0}")
 
         # 添加更详细的调试信息
@@ -1358,20 +1485,40 @@ def pdf_converter_api(request):
             else:
                 return JsonResponse({"success": False, "error": message}, status=400)
 
+        # 相同文件、相同转换类型和参数的结果直接从转换缓存返回
+        cache_key = None
+        if file is not None and not stream_requested and not async_requested:
+            cache_params = {"dpi": PDF_TO_IMAGE_DPI, "format": "png"} if conversion_type == "pdf-to-image" else {}
+            cache_key = conversion_cache.make_key(file, conversion_type, **cache_params)
+            cached = conversion_cache.get(cache_key)
+            if cached:
+                return _serve_cached_conversion(cached, conversion_type, file, conversion_record, start_time)
+
         # 执行转换
+        # 图片和文本结果逐页写入临时文件，再分块保存到存储，内存只与单页大小有关
+        output_file = None
         if conversion_type == "text-to-pdf":
             # text_content已经在上面从JSON或表单数据中获取
             success, result, file_type = converter.text_to_pdf(text_content)
         elif conversion_type == "pdf-to-word":
+            if async_requested:
+                # 大文档走后台任务，进度通过异步任务状态接口查询
+                user_id = str(request.user.id) if request.user.is_authenticated else None
+                return _submit_pdf_to_word_job(converter, file, conversion_record, user_id)
             success, result, file_type = converter.pdf_to_word(file)
         elif conversion_type == "word-to-pdf":
             success, result, file_type = converter.word_to_pdf(file)
         elif conversion_type == "pdf-to-image":
-            success, result, file_type = converter.pdf_to_images(file)
+            if stream_requested:
+                # 流式模式：边渲染边把ZIP发给客户端，不落盘
+                return _stream_pdf_images_response(converter, file, conversion_record, start_time)
+            output_file = tempfile.TemporaryFile()
+            success, result, file_type = converter.pdf_to_images_zip(file, output_file, dpi=PDF_TO_IMAGE_DPI)
         elif conversion_type == "image-to-pdf":
             success, result, file_type = converter.images_to_pdf([file])
         elif conversion_type == "pdf-to-text":
-            success, result, file_type = converter.pdf_to_text(file)
+            output_file = tempfile.TemporaryFile()
+            success, result, file_type = converter.pdf_to_text_file(file, output_file)
         elif conversion_type == "txt-to-pdf":
             success, result, file_type = converter.txt_to_pdf(file)
         else:
@@ -1381,6 +1528,9 @@ def pdf_converter_api(request):
         conversion_time = time.time() - start_time
 
         if not success:
+            if output_file is not None:
+                output_file.close()
+
             # 更新转换记录为失败状态（如果存在）
             if conversion_record:
                 conversion_record.status = "failed"
@@ -1420,25 +1570,11 @@ def pdf_converter_api(request):
                 conversion_record.download_url = download_url
                 conversion_record.save()
         elif file_type == "pdf_to_images":
-            # 创建ZIP文件包含所有图片
-            import base64
-            import zipfile
-            from io import BytesIO
-
-            zip_buffer = BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                for i, img_data in enumerate(result):
-                    # 解码base64图片数据
-                    img_bytes = base64.b64decode(img_data["data"])
-                    # 添加到ZIP文件
-                    zip_file.writestr(f"page_{i+1}.png", img_bytes)
-
-            zip_content = zip_buffer.getvalue()
-            zip_buffer.close()
-
-            # 保存ZIP文件
+            # 保存已逐页写好的ZIP文件（File按块读取，不会整体载入内存）
             output_filename += "_images.zip"
-            default_storage.save(f"converted/{output_filename}", ContentFile(zip_content))
+            output_file.seek(0)
+            default_storage.save(f"converted/{output_filename}", File(output_file))
+            output_file.close()
             download_url = f"/tools/api/pdf-converter/download/{output_filename}/"
 
             # 更新转换记录为成功状态（如果存在）
@@ -1449,6 +1585,8 @@ def pdf_converter_api(request):
                 conversion_record.download_url = download_url
                 conversion_record.save()
 
+            _cache_conversion_output(cache_key, output_filename, total_pages=result["total_pages"])
+
             # 返回下载链接
             return JsonResponse(
                 {
@@ -1457,9 +1595,9 @@ def pdf_converter_api(request):
                     "download_url": download_url,
                     "filename": output_filename,
                     "original_filename": file.name,
-                    "file_size": len(zip_content),
-                    "total_pages": len(result),
-                    "message": f"已转换{len(result)}页，打包为ZIP文件供下载",
+                    "file_size": result["file_size"],
+                    "total_pages": result["total_pages"],
+                    "message": f"已转换{result['total_pages']}页，打包为ZIP文件供下载",
                     "conversion_type": conversion_type,
                 }
             )
@@ -1491,7 +1629,9 @@ def pdf_converter_api(request):
                 conversion_record.save()
         elif file_type == "pdf_to_text":
             output_filename += ".txt"
-            default_storage.save(f"converted/{output_filename}", ContentFile(result.encode("utf-8")))
+            output_file.seek(0)
+            default_storage.save(f"converted/{output_filename}", File(output_file))
+            output_file.close()
             # 设置下载链接
             download_url = f"/tools/api/pdf-converter/download/{output_filename}/"
 
@@ -1505,6 +1645,8 @@ def pdf_converter_api(request):
         else:
             return JsonResponse({"success": False, "error": "未知的文件类型"}, status=500)
 
+        _cache_conversion_output(cache_key, output_filename)
+
         # 确定原始文件名
         if conversion_type == "text-to-pdf":
             original_filename = "文本内容"
@@ -1527,3 +1669,160 @@ def pdf_converter_api(request):
     except Exception as e:
         logger.error(f"PDF转换测试API错误: {str(e)}")
         return JsonResponse({"success": False, "error": f"服务器错误: {str(e)}"}, status=500)
+
+
+def _stream_pdf_images_response(converter, pdf_file, conversion_record, start_time):
+    """
+    以流式响应返回PDF转图片的ZIP包
+
+    先校验文档能打开且非空（响应开始后就无法再返回错误状态码），再逐页渲染并输出。
+    """
+    import time
+
+    if not FITZ_AVAILABLE:
+        return JsonResponse({"success": False, "error": "PyMuPDF未安装，无法进行PDF转换"}, status=500)
+
+    temp_pdf_path = converter._spool_pdf_to_temp(pdf_file)
+    try:
+        with fitz.open(temp_pdf_path) as doc:
+            if len(doc) == 0:
+                raise ValueError("PDF文件为空或损坏")
+    except Exception as e:
+        os.unlink(temp_pdf_path)
+        if conversion_record:
+            conversion_record.status = "failed"
+            conversion_record.error_message = str(e)
+            conversion_record.save()
+        return JsonResponse({"success": False, "error": f"转换失败: {str(e)}"}, status=500)
+
+    output_filename = f"{uuid.uuid4()}_pdf_to_image_images.zip"
+
+    def generate():
+        try:
+            yield from converter.iter_images_zip(temp_pdf_path)
+            if conversion_record:
+                conversion_record.status = "success"
+                conversion_record.output_filename = output_filename
+                conversion_record.conversion_time = time.time() - start_time
+                conversion_record.save()
+        except Exception as e:
+            logger.error(f"PDF流式转图片失败: {str(e)}")
+            if conversion_record:
+                conversion_record.status = "failed"
+                conversion_record.error_message = str(e)
+                conversion_record.save()
+            raise
+        finally:
+            if os.path.exists(temp_pdf_path):
+                os.unlink(temp_pdf_path)
+
+    response = StreamingHttpResponse(generate(), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{output_filename}"'
+    return response
+
+
+def _submit_pdf_to_word_job(converter, pdf_file, conversion_record, user_id):
+    """把PDF转Word提交为后台任务，返回任务ID和状态查询地址"""
+    import time
+
+    from .async_task_manager import task_manager
+    from .services.task_executor import TaskQueueFullError
+
+    # 请求结束后上传文件即被释放，先落盘
+    temp_pdf_path = converter._spool_pdf_to_temp(pdf_file)
+    original_filename = pdf_file.name
+
+    def run(report_progress):
+        start_time = time.time()
+        try:
+            with open(temp_pdf_path, "rb") as pdf:
+                success, result, _ = converter.pdf_to_word(
+                    File(pdf, name=original_filename), progress_callback=report_progress
+                )
+        finally:
+            if os.path.exists(temp_pdf_path):
+                os.unlink(temp_pdf_path)
+
+        if not success:
+            if conversion_record:
+                conversion_record.status = "failed"
+                conversion_record.error_message = result
+                conversion_record.conversion_time = time.time() - start_time
+                conversion_record.save()
+            raise RuntimeError(result)
+
+        output_filename = f"{uuid.uuid4()}_pdf_to_word.docx"
+        default_storage.save(f"converted/{output_filename}", ContentFile(result))
+        download_url = f"/tools/api/pdf-converter/download/{output_filename}/"
+        if conversion_record:
+            conversion_record.status = "success"
+            conversion_record.output_filename = output_filename
+            conversion_record.conversion_time = time.time() - start_time
+            conversion_record.download_url = download_url
+            conversion_record.save()
+        return {"download_url": download_url, "filename": output_filename, "original_filename": original_filename}
+
+    try:
+        task_id = task_manager.create_job("pdf_to_word", run, description=f"PDF转Word: {original_filename}", user_id=user_id)
+    except TaskQueueFullError as e:
+        logger.warning(f"任务队列已满，拒绝PDF转换任务: {e}")
+        os.unlink(temp_pdf_path)
+        response = JsonResponse({"success": False, "error": str(e), "retry_after": e.retry_after}, status=429)
+        response["Retry-After"] = str(e.retry_after)
+        return response
+
+    return JsonResponse(
+        {
+            "success": True,
+            "type": "task",
+            "task_id": task_id,
+            "status_url": f"/tools/api/async/task/{task_id}/",
+            "conversion_type": "pdf-to-word",
+        },
+        status=202,
+    )
+
+
+def _cache_conversion_output(cache_key, output_filename, **meta):
+    """把已保存的转换结果写入转换缓存，文件名去掉随机前缀后保存在元数据中"""
+    if not cache_key:
+        return
+    try:
+        with default_storage.open(f"converted/{output_filename}", "rb") as saved:
+            conversion_cache.put(cache_key, saved, {"name": output_filename.split("_", 1)[1], **meta})
+    except Exception as e:
+        logger.warning(f"写入转换缓存失败: {str(e)}")
+
+
+def _serve_cached_conversion(cached, conversion_type, file, conversion_record, start_time):
+    """转换缓存命中：复制缓存的结果到下载目录，返回与实时转换相同的响应"""
+    import time
+
+    output_filename = f"{uuid.uuid4()}_{cached['name']}"
+    with open(cached["path"], "rb") as cached_file:
+        default_storage.save(f"converted/{output_filename}", File(cached_file))
+    download_url = f"/tools/api/pdf-converter/download/{output_filename}/"
+
+    if conversion_record:
+        conversion_record.status = "success"
+        conversion_record.output_filename = output_filename
+        conversion_record.conversion_time = time.time() - start_time
+        conversion_record.download_url = download_url
+        conversion_record.save()
+
+    data = {
+        "success": True,
+        "type": "file",
+        "download_url": download_url,
+        "filename": output_filename,
+        "original_filename": file.name,
+        "conversion_type": conversion_type,
+        "cached": True,
+    }
+    if "total_pages" in cached:
+        data.update(
+            file_size=cached["size"],
+            total_pages=cached["total_pages"],
+            message=f"已转换{cached['total_pages']}页，打包为ZIP文件供下载",
+        )
+    return JsonResponse(data)
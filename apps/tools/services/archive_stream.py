@@ -0,0 +1,419 @@
+"""
+流式打包下载
+
+ZIP和tar.gz按成员逐块生成字节，直接交给 StreamingHttpResponse，不再先在临时目录中写出完整的压缩包。
+已经压缩过的媒体文件（mp3/jpg/png等）原样存储，其余文件在线程池中并行压缩（zlib压缩时释放GIL），
+按原顺序输出；每个成员的预读缓冲有上限，内存占用与文件大小无关。
+"""
+
+import logging
+import os
+import queue
+import struct
+import tarfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 已经压缩过的格式，再压缩几乎没有收益，只浪费CPU
+STORED_EXTENSIONS = frozenset(
+    ".mp3 .m4a .aac .ogg .opus .flac .wma .ncm "
+    ".jpg .jpeg .png .gif .webp .heic .avif "
+    ".mp4 .mov .avi .mkv .webm .wmv "
+    ".zip .gz .tgz .bz2 .xz .7z .rar .docx .xlsx .pptx .pdf".split()
+)
+
+READ_CHUNK_SIZE = 256 * 1024
+PREFETCH_CHUNKS = 8  # 每个正在压缩的成员最多缓冲的块数
+
+ArchiveEntry = namedtuple("ArchiveEntry", ["path", "arcname", "size", "mtime"])
+
+CONTENT_TYPES = {"zip": "application/zip", "tar.gz": "application/gzip"}
+
+
+def make_entry(path: str, arcname: Optional[str] = None) -> ArchiveEntry:
+    """根据文件路径生成打包条目"""
+    stat = os.stat(path)
+    return ArchiveEntry(path, (arcname or os.path.basename(path)).replace(os.sep, "/"), stat.st_size, stat.st_mtime)
+
+
+def should_store(arcname: str) -> bool:
+    """是否原样存储（不压缩）"""
+    return os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+
+
+def _default_workers() -> int:
+    return min(4, os.cpu_count() or 1)
+
+
+def _iter_file(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(READ_CHUNK_SIZE)
+            if not block:
+                return
+            yield block
+
+
+class _Cancelled(Exception):
+    """下载被客户端中断，后台压缩任务退出"""
+
+
+class _Prefetch:
+    """在线程池中生成一个成员的数据块，放入有界队列，由输出线程按顺序取走"""
+
+    _DONE = object()
+
+    def __init__(self, executor, func: Callable, entry: ArchiveEntry, cancelled: threading.Event):
+        self.entry = entry
+        self.result = None
+        self._cancelled = cancelled
+        self._queue = queue.Queue(PREFETCH_CHUNKS)
+        self._future = executor.submit(self._run, func)
+
+    def _run(self, func):
+        try:
+            result = func(self.entry, self._put)
+            self._put((self._DONE, result))
+        except _Cancelled:
+            pass
+        except Exception as e:
+            try:
+                self._put((self._DONE, e))
+            except _Cancelled:
+                pass
+
+    def _put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self) -> Iterator[bytes]:
+        """依次产出数据块；结束后 result 为生成函数的返回值，生成出错时抛出原异常"""
+        while True:
+            item = self._queue.get()
+            if isinstance(item, tuple) and item and item[0] is self._DONE:
+                if isinstance(item[1], Exception):
+                    raise item[1]
+                self.result = item[1]
+                return
+            yield item
+
+
+def _run_ahead(entries: List[ArchiveEntry], func: Callable, needs_worker: Callable, max_workers: int):
+    """
+    按顺序产出 (条目, 数据源)
+
+    needs_worker 为真的条目提前最多 max_workers 个提交到线程池并行生成，其余条目返回None，由调用方直接读取。
+    生成器关闭（客户端断开）时通知后台任务退出。
+    """
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="archive-stream")
+    pending = {}
+    next_submit = 0
+    try:
+        for index, entry in enumerate(entries):
+            # 保持当前条目之后的 max_workers 个条目都已提交
+            while next_submit < min(len(entries), index + max_workers):
+                if needs_worker(entries[next_submit]):
+                    pending[next_submit] = _Prefetch(executor, func, entries[next_submit], cancelled)
+                next_submit += 1
+            yield entry, pending.pop(index, None)
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------------------------------------------- ZIP
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+# 未压缩大小超过该值时按ZIP64写入（压缩后可能略大于原始大小，留出余量）
+_ZIP64_ENTRY_THRESHOLD = 0xF0000000
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+def _dos_datetime(mtime: float):
+    t = time.localtime(mtime)
+    year = min(max(t.tm_year, 1980), 2107)
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def _deflate_member(compression_level: int):
+    """在工作线程中压缩一个成员，返回 (crc, 压缩后大小, 原始大小)"""
+
+    def produce(entry: ArchiveEntry, emit):
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+        crc = compressed_size = size = 0
+        for block in _iter_file(entry.path):
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            data = compressor.compress(block)
+            if data:
+                compressed_size += len(data)
+                emit(data)
+        data = compressor.flush()
+        compressed_size += len(data)
+        emit(data)
+        return crc, compressed_size, size
+
+    return produce
+
+
+def iter_zip(
+    entries: Iterable[ArchiveEntry], compression_level: int = 6, max_workers: Optional[int] = None, force_zip64: bool = False
+) -> Iterator[bytes]:
+    """
+    生成ZIP字节流
+
+    成员使用数据描述符（flag bit 3），CRC和大小写在数据之后，因此不需要可seek的输出。
+    读取失败的文件在写出本地文件头之前跳过；成员输出中途出错时中断整个下载。
+    """
+    entries = list(entries)
+    compression_level = min(max(compression_level, 0), 9)
+    offset = 0
+    central = []
+
+    def needs_worker(entry):
+        return compression_level > 0 and not should_store(entry.arcname)
+
+    for entry, prefetch in _run_ahead(
+        entries, _deflate_member(compression_level), needs_worker, max_workers or _default_workers()
+    ):
+        if prefetch is not None:
+            blocks = iter(prefetch)
+            method = 8  # DEFLATE
+            try:
+                first = next(blocks)
+            except Exception as e:
+                logger.error(f"打包文件失败，已跳过: {entry.path}, 错误: {e}")
+                continue
+            data_source = _chain(first, blocks)
+        else:
+            method = 0
+            try:
+                source = _iter_file(entry.path)
+                first = next(source, b"")
+            except OSError as e:
+                logger.error(f"打包文件失败，已跳过: {entry.path}, 错误: {e}")
+                continue
+            data_source = _chain(first, source)
+
+        zip64 = force_zip64 or entry.size > _ZIP64_ENTRY_THRESHOLD
+        name = entry.arcname.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(entry.mtime)
+        version = 45 if zip64 else 20
+        flags = _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+        size_field = _ZIP64_LIMIT if zip64 else 0
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            version,
+            flags,
+            method,
+            dos_time,
+            dos_date,
+            0,
+            size_field,
+            size_field,
+            len(name),
+            len(extra),
+        )
+        header_offset = offset
+        yield header + name + extra
+        offset += len(header) + len(name) + len(extra)
+
+        crc = compressed_size = size = 0
+        for block in data_source:
+            if method == 0:
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+            compressed_size += len(block)
+            offset += len(block)
+            yield block
+        if prefetch is not None:
+            crc, compressed_size, size = prefetch.result
+
+        if zip64:
+            descriptor = struct.pack("<IIQQ", 0x08074B50, crc, compressed_size, size)
+        else:
+            descriptor = struct.pack("<IIII", 0x08074B50, crc, compressed_size, size)
+        yield descriptor
+        offset += len(descriptor)
+        central.append((name, version, flags, method, dos_time, dos_date, crc, compressed_size, size, header_offset, zip64))
+
+    central_offset = offset
+    for name, version, flags, method, dos_time, dos_date, crc, compressed_size, size, header_offset, zip64 in central:
+        zip64_fields = []
+        if zip64 or size >= _ZIP64_LIMIT:
+            zip64_fields.append(size)
+            size = _ZIP64_LIMIT
+        if zip64 or compressed_size >= _ZIP64_LIMIT:
+            zip64_fields.append(compressed_size)
+            compressed_size = _ZIP64_LIMIT
+        if header_offset >= _ZIP64_LIMIT:
+            zip64_fields.append(header_offset)
+            header_offset = _ZIP64_LIMIT
+        extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b""
+        if zip64_fields:
+            version = 45
+        record = struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            (3 << 8) | version,  # 由Unix系统创建，外部属性为Unix权限
+            version,
+            flags,
+            method,
+            dos_time,
+            dos_date,
+            crc,
+            compressed_size,
+            size,
+            len(name),
+            len(extra),
+            0,
+            0,
+            0,
+            0o100644 << 16,
+            header_offset,
+        )
+        yield record + name + extra
+        offset += len(record) + len(name) + len(extra)
+
+    central_size = offset - central_offset
+    count = len(central)
+    if force_zip64 or count >= 0xFFFF or central_offset >= _ZIP64_LIMIT or central_size >= _ZIP64_LIMIT:
+        zip64_end = struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, central_size, central_offset)
+        locator = struct.pack("<IIQI", 0x07064B50, 0, offset, 1)
+        yield zip64_end + locator
+        count = min(count, 0xFFFF)
+        central_size = min(central_size, _ZIP64_LIMIT)
+        central_offset = min(central_offset, _ZIP64_LIMIT)
+    yield struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, central_size, central_offset, 0)
+
+
+def _chain(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    if first:
+        yield first
+    yield from rest
+
+
+# ---------------------------------------------------------------- tar.gz
+
+
+def _tar_member_gzip(compression_level: int):
+    """
+    把一个tar成员（头部+数据+补齐）压缩成一个独立的gzip成员
+
+    多个gzip成员首尾相接仍是合法的gzip文件，因此各成员可以并行压缩。
+    """
+
+    def produce(entry: ArchiveEntry, emit):
+        level = 0 if should_store(entry.arcname) else compression_level
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        info = tarfile.TarInfo(entry.arcname)
+        info.size = entry.size
+        info.mtime = int(entry.mtime)
+        info.mode = 0o644
+
+        def feed(block):
+            data = compressor.compress(block)
+            if data:
+                emit(data)
+
+        # 先打开文件，读取失败时还没有输出任何数据，整个成员可以跳过
+        with open(entry.path, "rb") as f:
+            feed(info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8"))
+            remaining = entry.size
+            while remaining > 0:
+                # 只写入声明的大小，文件在打包过程中变大时忽略多出的部分
+                block = f.read(min(READ_CHUNK_SIZE, remaining))
+                if not block:
+                    raise OSError(f"文件在打包过程中被截断: {entry.path}")
+                feed(block)
+                remaining -= len(block)
+        remainder = entry.size % tarfile.BLOCKSIZE
+        if remainder:
+            feed(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+        emit(compressor.flush())
+
+    return produce
+
+
+def iter_tar_gz(
+    entries: Iterable[ArchiveEntry], compression_level: int = 6, max_workers: Optional[int] = None
+) -> Iterator[bytes]:
+    """生成tar.gz字节流，媒体文件以0级压缩存储"""
+    entries = list(entries)
+    compression_level = min(max(compression_level, 0), 9)
+
+    for entry, prefetch in _run_ahead(
+        entries, _tar_member_gzip(compression_level), lambda entry: True, max_workers or _default_workers()
+    ):
+        blocks = iter(prefetch)
+        try:
+            first = next(blocks)
+        except StopIteration:
+            continue
+        except Exception as e:
+            logger.error(f"打包文件失败，已跳过: {entry.path}, 错误: {e}")
+            continue
+        yield first
+        yield from blocks
+
+    # tar结束标记：两个全零块
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, 31)
+    yield compressor.compress(tarfile.NUL * tarfile.BLOCKSIZE * 2) + compressor.flush()
+
+
+def iter_archive(
+    entries: Iterable[ArchiveEntry], archive_format: str = "zip", compression_level: int = 6, max_workers: Optional[int] = None
+) -> Iterator[bytes]:
+    """按格式生成压缩包字节流"""
+    if archive_format == "zip":
+        return iter_zip(entries, compression_level, max_workers)
+    if archive_format == "tar.gz":
+        return iter_tar_gz(entries, compression_level, max_workers)
+    raise ValueError(f"不支持的流式打包格式: {archive_format}")
+
+
+def streaming_archive_response(
+    entries: Iterable[ArchiveEntry],
+    archive_name: str,
+    archive_format: str = "zip",
+    compression_level: int = 6,
+    on_close: Optional[Callable[[], None]] = None,
+):
+    """
+    返回边打包边发送的下载响应
+
+    on_close 在响应结束或客户端断开后调用，用于清理打包用的临时文件。
+    """
+    from urllib.parse import quote
+
+    from django.http import StreamingHttpResponse
+
+    stream = iter_archive(entries, archive_format, compression_level)
+
+    def generate():
+        try:
+            yield from stream
+        finally:
+            stream.close()
+            if on_close:
+                on_close()
+
+    response = StreamingHttpResponse(generate(), content_type=CONTENT_TYPES[archive_format])
+    response["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(archive_name)}"
+    return response
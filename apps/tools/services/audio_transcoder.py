@@ -0,0 +1,353 @@
+"""
+音频转码服务
+
+转码不再在HTTP请求中同步执行：上传文件落盘后作为后台任务（AsyncTaskManager.create_job）提交到
+专用的转码执行器，接口立即返回任务ID，前端轮询进度。执行器的每个工作线程驱动一个ffmpeg子进程，
+线程数默认等于CPU核数，真正的编码负载在ffmpeg进程中并行。
+输入数据（包括NCM解密后的音频）通过stdin管道直接送入ffmpeg，不再写解密后的中间文件；
+转码结果按 输入内容哈希 + 目标格式 缓存，同一首歌重复转换直接复用。
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from django.conf import settings
+
+from .conversion_cache import ConversionCache
+from .ncm_decoder import NCMDecodeError, NCMDecoder
+from .task_executor import BoundedTaskExecutor
+
+logger = logging.getLogger(__name__)
+
+SOURCE_FORMATS = ("ncm", "mp3", "wav", "flac", "m4a")
+
+# 目标格式对应的编码参数和封装格式
+TARGET_FORMATS: Dict[str, list] = {
+    "mp3": ["-acodec", "libmp3lame", "-b:a", "128k", "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3"],
+    "wav": ["-acodec", "pcm_s16le", "-f", "wav"],
+    "flac": ["-acodec", "flac", "-f", "flac"],
+    "m4a": ["-acodec", "aac", "-b:a", "192k", "-f", "ipod"],
+}
+
+# MP4容器的moov可能在文件末尾，需要可寻址的输入，不能走管道
+SEEKABLE_INPUT_FORMATS = ("m4a",)
+
+PIPE_CHUNK_SIZE = 256 * 1024
+# 文件头不是已知格式时，在前面这么多字节内查找音频起始位置
+HEADER_SCAN_SIZE = 8192
+
+
+class TranscodeError(Exception):
+    """转码失败"""
+
+
+def detect_audio_format(header: bytes) -> Optional[str]:
+    """根据文件头识别音频格式，无法识别时返回None"""
+    if header.startswith(b"CTENFDAM"):
+        return "ncm"
+    if header.startswith(b"ID3") or _is_mpeg_frame(header, 0):
+        return "mp3"
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "wav"
+    if header.startswith(b"fLaC"):
+        return "flac"
+    if header[4:8] == b"ftyp":
+        return "m4a"
+    return None
+
+
+def _is_mpeg_frame(data: bytes, i: int) -> bool:
+    """MPEG音频帧同步头：11位同步码，版本和层不能是保留值"""
+    if i + 2 >= len(data) or data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+        return False
+    version = (data[i + 1] >> 3) & 0x3
+    layer = (data[i + 1] >> 1) & 0x3
+    bitrate = data[i + 2] >> 4
+    return version != 1 and layer != 0 and bitrate != 0xF
+
+
+def find_audio_start(head: bytes) -> Tuple[int, Optional[str]]:
+    """
+    在数据开头查找音频真正开始的位置
+
+    NCM解密后的数据偶尔带有垃圾前缀，跳过它们后ffmpeg就能正常识别，
+    取代原来重写ID3头、伪造帧头的修复逻辑。找不到时返回 (0, None)，交给ffmpeg自行探测。
+    """
+    detected = detect_audio_format(head)
+    if detected:
+        return 0, detected
+    for i in range(min(len(head), HEADER_SCAN_SIZE) - 4):
+        if _is_mpeg_frame(head, i):
+            return i, "mp3"
+    for marker, audio_format, offset in ((b"fLaC", "flac", 0), (b"RIFF", "wav", 0), (b"ftyp", "m4a", -4)):
+        position = head.find(marker, 0, HEADER_SCAN_SIZE)
+        if position >= 0 and position + offset >= 0:
+            return position + offset, audio_format
+    return 0, None
+
+
+def ffmpeg_command(target_format: str, output_path: str, input_spec: str = "pipe:0") -> list:
+    """构造ffmpeg命令，input_spec 为 pipe:0 时从stdin读取输入"""
+    if target_format not in TARGET_FORMATS:
+        raise TranscodeError(f"不支持的目标格式: {target_format}")
+    command = [getattr(settings, "AUDIO_FFMPEG_BINARY", "ffmpeg"), "-hide_banner", "-loglevel", "error", "-y"]
+    if input_spec != "pipe:0":
+        command.append("-nostdin")
+    return command + ["-i", input_spec, "-vn", "-ar", "44100", "-ac", "2"] + TARGET_FORMATS[target_format] + [output_path]
+
+
+def run_ffmpeg(
+    source: Union[str, Iterable[bytes]],
+    output_path: str,
+    target_format: str,
+    timeout: Optional[float] = None,
+    total_size: int = 0,
+    progress_callback: Optional[Callable[[int], None]] = None,
+):
+    """
+    运行ffmpeg转码
+
+    source 为文件路径时由ffmpeg直接读取，为字节块迭代器时通过stdin管道送入；
+    progress_callback(已送入字节数) 在每块写入后调用。超时后终止ffmpeg并抛出TranscodeError。
+    """
+    piped = not isinstance(source, str)
+    command = ffmpeg_command(target_format, output_path, "pipe:0" if piped else source)
+
+    # stderr写入临时文件，避免管道写满导致ffmpeg阻塞
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            process = subprocess.Popen(
+                command, stdin=subprocess.PIPE if piped else subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr
+            )
+        except OSError as e:
+            raise TranscodeError(f"无法启动ffmpeg: {e}")
+
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            if piped:
+                fed = 0
+                try:
+                    for chunk in source:
+                        process.stdin.write(chunk)
+                        fed += len(chunk)
+                        if progress_callback and total_size:
+                            progress_callback(fed)
+                except BrokenPipeError:
+                    # ffmpeg提前退出（输入无法识别等），错误信息在stderr中
+                    pass
+                finally:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+            returncode = process.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        if timed_out.is_set():
+            raise TranscodeError(f"转码超时（{timeout}秒）")
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read()[-2000:].decode("utf-8", "replace").strip()
+            raise TranscodeError(f"ffmpeg转码失败: {message or returncode}")
+
+
+def iter_file(path: str, offset: int = 0, chunk_size: int = PIPE_CHUNK_SIZE) -> Iterator[bytes]:
+    """从offset开始分块读取文件"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+
+def _skip_leading_garbage(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """跳过解密数据开头不属于音频的字节，其余数据原样流出"""
+    first = bytes(next(chunks, b""))
+    offset, detected = find_audio_start(first[:HEADER_SCAN_SIZE])
+    if detected is None:
+        logger.warning("NCM解密后的数据不匹配已知音频格式，交给ffmpeg探测")
+    yield first[offset:]
+    yield from chunks
+
+
+class AudioTranscoder:
+    """
+    音频转码器
+
+    transcode() 在调用线程中同步完成一次转码；submit() 把转码作为后台任务提交到专用执行器。
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, cache: Optional[ConversionCache] = None, timeout: Optional[float] = None
+    ):
+        self._max_workers = max_workers
+        self._cache = cache
+        self._timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers or getattr(settings, "AUDIO_TRANSCODE_MAX_WORKERS", 0) or os.cpu_count() or 1
+
+    @property
+    def timeout(self) -> float:
+        return self._timeout or getattr(settings, "AUDIO_TRANSCODE_TIMEOUT", 300)
+
+    @property
+    def executor(self) -> BoundedTaskExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = BoundedTaskExecutor(
+                    max_workers=self.max_workers,
+                    max_queue_size=getattr(settings, "AUDIO_TRANSCODE_MAX_QUEUE_SIZE", 50),
+                    max_pending_per_user=getattr(settings, "ASYNC_TASK_MAX_PENDING_PER_USER", 5),
+                    default_duration=10.0,
+                    name="audio-transcode",
+                )
+            return self._executor
+
+    @property
+    def cache(self) -> ConversionCache:
+        with self._lock:
+            if self._cache is None:
+                self._cache = ConversionCache(
+                    root=getattr(settings, "AUDIO_TRANSCODE_CACHE_DIR", None)
+                    or os.path.join(str(settings.BASE_DIR), "audio_cache"),
+                    max_bytes=getattr(settings, "AUDIO_TRANSCODE_CACHE_MAX_BYTES", 1024 * 1024 * 1024),
+                    stats_prefix="audio_transcode_cache_stats",
+                )
+            return self._cache
+
+    def cache_key(self, input_path: str, target_format: str) -> str:
+        with open(input_path, "rb") as f:
+            return ConversionCache.make_key(f, "audio", target_format=target_format)
+
+    @staticmethod
+    def _cover_key(key: str) -> str:
+        return hashlib.sha256(f"{key}|cover".encode("utf-8")).hexdigest()
+
+    def _open_source(self, input_path: str) -> Tuple[Union[str, Iterable[bytes]], int, dict]:
+        """
+        准备ffmpeg的输入，返回 (输入, 字节数, NCM元数据)
+
+        NCM文件解密后的音频直接作为管道输入；普通文件按格式决定走管道还是由ffmpeg读取路径。
+        """
+        with open(input_path, "rb") as f:
+            head = f.read(HEADER_SCAN_SIZE)
+
+        if detect_audio_format(head) == "ncm":
+            try:
+                decoder = NCMDecoder(input_path)
+            except NCMDecodeError as e:
+                raise TranscodeError(f"NCM文件解密失败: {e}")
+            if decoder.audio_size < 1024:
+                raise TranscodeError("NCM文件中的音频数据太少")
+            extras = {"metadata": decoder.metadata, "album_cover": decoder.album_cover}
+            return _skip_leading_garbage(decoder.iter_audio()), decoder.audio_size, extras
+
+        offset, detected = find_audio_start(head)
+        if detected in SEEKABLE_INPUT_FORMATS:
+            return input_path, 0, {}
+        return iter_file(input_path, offset), os.path.getsize(input_path) - offset, {}
+
+    def transcode(
+        self,
+        input_path: str,
+        output_path: str,
+        target_format: str,
+        progress_callback: Optional[Callable[[int, str], bool]] = None,
+        use_cache: bool = True,
+        cache_key: Optional[str] = None,
+    ) -> dict:
+        """
+        同步转码，返回 {"cached", "metadata", "album_cover"}，失败时抛出TranscodeError
+
+        progress_callback(progress, current_step) 与 AsyncTaskManager 的进度回调一致，返回False时中止；
+        cache_key 可传入调用方已计算好的缓存键，省去再次哈希输入文件。
+        """
+        if target_format not in TARGET_FORMATS:
+            raise TranscodeError(f"不支持的目标格式: {target_format}")
+
+        key = None
+        if use_cache:
+            key = cache_key or self.cache_key(input_path, target_format)
+            cached = self.copy_cached(key, output_path)
+            if cached:
+                return cached
+
+        def report(progress: int, step: str):
+            if progress_callback and progress_callback(progress, step) is False:
+                raise TranscodeError("任务已取消")
+
+        report(5, "读取音频")
+        source, total_size, extras = self._open_source(input_path)
+
+        last_progress = [0]
+
+        def on_fed(fed: int):
+            # 送入ffmpeg的字节数占比映射到10%~95%，每5%更新一次存储
+            progress = 10 + int(85 * fed / total_size)
+            if progress - last_progress[0] >= 5:
+                last_progress[0] = progress
+                report(progress, "正在转码")
+
+        report(10, "正在转码")
+        run_ffmpeg(source, output_path, target_format, self.timeout, total_size, on_fed)
+
+        if key:
+            album_cover = extras.get("album_cover")
+            if album_cover:
+                self.cache.put(self._cover_key(key), album_cover["data"])
+            with open(output_path, "rb") as output:
+                self.cache.put(key, output, {"metadata": extras.get("metadata") or {}, "has_cover": bool(album_cover)})
+
+        return {"cached": False, "metadata": extras.get("metadata") or {}, "album_cover": extras.get("album_cover")}
+
+    def copy_cached(self, key: str, output_path: str) -> Optional[dict]:
+        """只读缓存：命中时把结果复制到 output_path 并返回与 transcode 相同的结构，未命中返回None（不转码）"""
+        cached = self.cache.get(key)
+        if not cached:
+            return None
+        shutil.copyfile(cached["path"], output_path)
+        album_cover = None
+        if cached.get("has_cover"):
+            cover = self.cache.get(self._cover_key(key))
+            if cover:
+                with open(cover["path"], "rb") as f:
+                    album_cover = {"data": f.read(), "format": "jpeg", "size": cover["size"]}
+        return {"cached": True, "metadata": cached.get("metadata") or {}, "album_cover": album_cover}
+
+    def submit(self, func: Callable, description: str = "", user_id: Optional[str] = None) -> str:
+        """把转码任务提交到专用执行器，队列已满时抛出TaskQueueFullError"""
+        from ..async_task_manager import task_manager
+
+        return task_manager.create_job(
+            "audio_transcode", func, description=description, user_id=user_id, executor=self.executor
+        )
+
+    def get_stats(self) -> dict:
+        return {"executor": self.executor.get_stats(), "cache": self.cache.get_stats()}
+
+
+# 全局转码器实例
+audio_transcoder = AudioTranscoder()
@@ -7,11 +7,18 @@
 
 import hashlib
 import json
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from django.conf import settings
 from django.core.cache import cache
 from django.core.serializers.json import DjangoJSONEncoder
 
+from utils.redis_client import get_redis_client
+
+# 批量操作的键描述：(prefix, identifier, suffix)
+KeySpec = Tuple[str, Any, str]
+
 
 class CacheService:
     """缓存服务类"""
@@ -38,14 +45,85 @@ class CacheService:
         "api": 600,  # 10分钟
     }
 
+    # 命名空间版本号在进程内的缓存时间（秒），其他进程的前缀清除最多延迟这么久生效
+    NAMESPACE_VERSION_TTL = getattr(settings, "CACHE_NAMESPACE_VERSION_TTL", 2)
+
+    # SCAN 每批处理的键数量
+    SCAN_BATCH_SIZE = 500
+
+    _namespace_versions: Dict[str, Tuple[int, float]] = {}
+
     @classmethod
-    def _generate_key(cls, prefix: str, identifier: str, suffix: str = "") -> str:
-        """生成缓存键"""
-        key_parts = [cls.PREFIXES.get(prefix, prefix), str(identifier)]
+    def _version_key(cls, namespace: str) -> str:
+        return f"ns_version:{namespace}"
+
+    @classmethod
+    def _initial_version(cls) -> int:
+        """
+        新命名空间的起始版本号：取当前微秒时间戳
+
+        版本号键被淘汰后重新创建时，起始值大于之前用过的所有版本号（除非期间的前缀清除次数超过经过的微秒数），
+        旧版本的键不会重新生效。
+        """
+        return int(time.time() * 1_000_000)
+
+    @classmethod
+    def _get_namespace_versions(cls, prefixes: Iterable[str]) -> Dict[str, int]:
+        """
+        获取命名空间版本号
+
+        前缀清除通过版本号 INCR 实现：旧版本的键不再被访问，由各自的过期时间回收。
+        版本号在进程内短暂缓存，多个前缀一次 get_many 取回。
+        缓存不可用时抛出异常，由调用方按缓存错误处理（不在进程内缓存猜测的版本号）。
+        """
+        now = time.monotonic()
+        versions = {}
+        missing = []
+        for prefix in set(cls.PREFIXES.get(p, p) for p in prefixes):
+            cached = cls._namespace_versions.get(prefix)
+            if cached and cached[1] > now:
+                versions[prefix] = cached[0]
+            else:
+                missing.append(prefix)
+
+        if missing:
+            stored = cache.get_many([cls._version_key(prefix) for prefix in missing])
+            for prefix in missing:
+                version = stored.get(cls._version_key(prefix))
+                if version is None:
+                    version = cls._initial_version()
+                    if not cache.add(cls._version_key(prefix), version, None):
+                        # 其他进程同时创建了版本号，以它写入的为准
+                        version = cache.get(cls._version_key(prefix)) or version
+                versions[prefix] = int(version)
+                cls._namespace_versions[prefix] = (int(version), now + cls.NAMESPACE_VERSION_TTL)
+        return versions
+
+    @classmethod
+    def _build_key(cls, namespace: str, version: int, identifier: Any, suffix: str = "") -> str:
+        key_parts = [namespace, f"v{version}", str(identifier)]
         if suffix:
             key_parts.append(suffix)
         return ":".join(key_parts)
 
+    @classmethod
+    def _generate_key(cls, prefix: str, identifier: str, suffix: str = "") -> str:
+        """生成缓存键（包含命名空间版本号）"""
+        namespace = cls.PREFIXES.get(prefix, prefix)
+        version = cls._get_namespace_versions([prefix])[namespace]
+        return cls._build_key(namespace, version, identifier, suffix)
+
+    @classmethod
+    def _generate_keys(cls, specs: Iterable[KeySpec]) -> Dict[KeySpec, str]:
+        """批量生成缓存键，所有命名空间版本号一次取回"""
+        specs = list(specs)
+        versions = cls._get_namespace_versions(spec[0] for spec in specs)
+        keys = {}
+        for prefix, identifier, suffix in specs:
+            namespace = cls.PREFIXES.get(prefix, prefix)
+            keys[(prefix, identifier, suffix)] = cls._build_key(namespace, versions[namespace], identifier, suffix)
+        return keys
+
     @classmethod
     def _serialize_data(cls, data: Any) -> str:
         """序列化数据"""
@@ -64,10 +142,10 @@ class CacheService:
     @classmethod
     def set(cls, prefix: str, identifier: str, data: Any, timeout: Optional[int] = None, suffix: str = "") -> bool:
         """设置缓存"""
-        key = cls._generate_key(prefix, identifier, suffix)
         timeout = timeout or cls.DEFAULT_TIMEOUTS.get(prefix, 300)
 
         try:
+            key = cls._generate_key(prefix, identifier, suffix)
             serialized_data = cls._serialize_data(data)
             return cache.set(key, serialized_data, timeout)
         except Exception as e:
@@ -77,9 +155,8 @@ class CacheService:
     @classmethod
     def get(cls, prefix: str, identifier: str, suffix: str = "") -> Any:
         """获取缓存"""
-        key = cls._generate_key(prefix, identifier, suffix)
-
         try:
+            key = cls._generate_key(prefix, identifier, suffix)
             data = cache.get(key)
             if data is not None:
                 return cls._deserialize_data(data)
@@ -91,9 +168,8 @@ class CacheService:
     @classmethod
     def delete(cls, prefix: str, identifier: str, suffix: str = "") -> bool:
         """删除缓存"""
-        key = cls._generate_key(prefix, identifier, suffix)
-
         try:
+            key = cls._generate_key(prefix, identifier, suffix)
             return cache.delete(key)
         except Exception as e:
             print(f"缓存删除失败: {e}")
@@ -102,9 +178,8 @@ class CacheService:
     @classmethod
     def exists(cls, prefix: str, identifier: str, suffix: str = "") -> bool:
         """检查缓存是否存在"""
-        key = cls._generate_key(prefix, identifier, suffix)
-
         try:
+            key = cls._generate_key(prefix, identifier, suffix)
             return cache.get(key) is not None
         except Exception as e:
             print(f"缓存检查失败: {e}")
@@ -113,20 +188,100 @@ class CacheService:
     @classmethod
     def expire(cls, prefix: str, identifier: str, timeout: int, suffix: str = "") -> bool:
         """设置缓存过期时间"""
-        key = cls._generate_key(prefix, identifier, suffix)
-
         try:
+            key = cls._generate_key(prefix, identifier, suffix)
             return cache.touch(key, timeout)
         except Exception as e:
             print(f"缓存过期设置失败: {e}")
             return False
 
+    @classmethod
+    def get_batch(cls, specs: Iterable[KeySpec]) -> Dict[KeySpec, Any]:
+        """批量获取多个前缀下的缓存（一次MGET），返回 {(prefix, identifier, suffix): value}，未命中的不返回"""
+        try:
+            keys = cls._generate_keys(specs)
+            if not keys:
+                return {}
+            found = cache.get_many(list(keys.values()))
+        except Exception as e:
+            print(f"批量缓存获取失败: {e}")
+            return {}
+
+        result = {}
+        for spec, key in keys.items():
+            if key in found and found[key] is not None:
+                result[spec] = cls._deserialize_data(found[key])
+        return result
+
+    @classmethod
+    def set_batch(cls, items: Dict[KeySpec, Any], timeout: Optional[int] = None) -> bool:
+        """批量设置多个前缀下的缓存，按过期时间分组后用pipeline写入"""
+        try:
+            keys = cls._generate_keys(items.keys())
+            groups: Dict[int, Dict[str, str]] = {}
+            for spec, value in items.items():
+                group_timeout = timeout or cls.DEFAULT_TIMEOUTS.get(spec[0], 300)
+                groups.setdefault(group_timeout, {})[keys[spec]] = cls._serialize_data(value)
+
+            for group_timeout, data in groups.items():
+                failed = cache.set_many(data, group_timeout)
+                if failed:
+                    return False
+            return True
+        except Exception as e:
+            print(f"批量缓存设置失败: {e}")
+            return False
+
+    @classmethod
+    def delete_batch(cls, specs: Iterable[KeySpec]) -> bool:
+        """批量删除多个前缀下的缓存"""
+        try:
+            keys = cls._generate_keys(specs)
+            if not keys:
+                return True
+            cache.delete_many(list(keys.values()))
+            return True
+        except Exception as e:
+            print(f"批量缓存删除失败: {e}")
+            return False
+
+    @classmethod
+    def get_many(cls, prefix: str, identifiers: Iterable[Any], suffix: str = "") -> Dict[Any, Any]:
+        """批量获取同一前缀下的缓存，返回 {identifier: value}"""
+        found = cls.get_batch((prefix, identifier, suffix) for identifier in identifiers)
+        return {spec[1]: value for spec, value in found.items()}
+
+    @classmethod
+    def set_many(cls, prefix: str, data: Dict[Any, Any], timeout: Optional[int] = None, suffix: str = "") -> bool:
+        """批量设置同一前缀下的缓存，data为 {identifier: value}"""
+        return cls.set_batch({(prefix, identifier, suffix): value for identifier, value in data.items()}, timeout)
+
+    @classmethod
+    def delete_many(cls, prefix: str, identifiers: Iterable[Any], suffix: str = "") -> bool:
+        """批量删除同一前缀下的缓存"""
+        return cls.delete_batch((prefix, identifier, suffix) for identifier in identifiers)
+
     @classmethod
     def clear_pattern(cls, pattern: str) -> int:
-        """清除匹配模式的缓存"""
+        """
+        清除匹配模式的缓存
+
+        Redis下使用增量SCAN + UNLINK分批删除，不会像KEYS那样阻塞大键空间
+        """
         try:
-            # 这里需要根据具体的缓存后端实现
-            # Redis支持模式删除，其他后端可能需要遍历
+            client = get_redis_client()
+            if client is not None:
+                deleted = 0
+                batch = []
+                for key in client.scan_iter(match=cache.make_key(pattern), count=cls.SCAN_BATCH_SIZE):
+                    batch.append(key)
+                    if len(batch) >= cls.SCAN_BATCH_SIZE:
+                        deleted += client.unlink(*batch)
+                        batch = []
+                if batch:
+                    deleted += client.unlink(*batch)
+                return deleted
+
             if hasattr(cache, "delete_pattern"):
                 return cache.delete_pattern(pattern)
             else:
@@ -138,9 +293,21 @@ class CacheService:
 
     @classmethod
     def clear_prefix(cls, prefix: str) -> int:
-        """清除指定前缀的所有缓存"""
-        pattern = f"{cls.PREFIXES.get(prefix, prefix)}:*"
-        return cls.clear_pattern(pattern)
+        """
+        清除指定前缀的所有缓存
+
+        只需对命名空间版本号执行一次 INCR，旧版本的键随过期时间自然淘汰；返回新的版本号
+        """
+        namespace = cls.PREFIXES.get(prefix, prefix)
+        version_key = cls._version_key(namespace)
+        try:
+            cache.add(version_key, cls._initial_version(), None)
+            version = cache.incr(version_key)
+        except Exception as e:
+            print(f"前缀缓存清除失败: {e}")
+            return 0
+        cls._namespace_versions[namespace] = (version, time.monotonic() + cls.NAMESPACE_VERSION_TTL)
+        return version
 
 
 class UserCacheService(CacheService):
@@ -166,12 +333,15 @@ class UserCacheService(CacheService):
         """获取用户统计信息缓存"""
         return cls.get("user", user_id, suffix="stats")
 
+    @classmethod
+    def get_user_profiles(cls, user_ids: List[int]) -> Dict[int, Dict]:
+        """批量获取用户资料缓存"""
+        return cls.get_many("user", user_ids)
+
     @classmethod
     def clear_user_cache(cls, user_id: int) -> bool:
         """清除用户相关缓存"""
-        cls.delete("user", user_id)
-        cls.delete("user", user_id, suffix="stats")
-        return True
+        return cls.delete_batch([("user", user_id, ""), ("user", user_id, "stats")])
 
 
 class ChatCacheService(CacheService):
@@ -207,12 +377,15 @@ class ChatCacheService(CacheService):
         """获取用户活跃聊天室缓存"""
         return cls.get("chat_room", user_id, suffix="active")
 
+    @classmethod
+    def get_chat_rooms(cls, room_ids: List[str]) -> Dict[str, Dict]:
+        """批量获取聊天室缓存"""
+        return cls.get_many("chat_room", room_ids)
+
     @classmethod
     def clear_chat_cache(cls, room_id: str) -> bool:
         """清除聊天相关缓存"""
-        cls.delete("chat_room", room_id)
-        cls.delete("chat_message", room_id)
-        return True
+        return cls.delete_batch([("chat_room", room_id, ""), ("chat_message", room_id, "")])
 
 
 class TimeCapsuleCacheService(CacheService):
@@ -282,6 +455,18 @@ class StatsCacheService(CacheService):
         """获取每日统计缓存"""
         return cls.get("stats", date, suffix="daily")
 
+    @classmethod
+    def get_dashboard_stats(cls, user_id: int, dates: Optional[List[str]] = None) -> Dict[str, Any]:
+        """一次往返获取仪表盘所需的全局、用户和每日统计"""
+        dates = dates or []
+        specs = [("stats", "global", ""), ("stats", user_id, "")] + [("stats", date, "daily") for date in dates]
+        found = cls.get_batch(specs)
+        return {
+            "global": found.get(("stats", "global", "")),
+            "user": found.get(("stats", user_id, "")),
+            "daily": {date: found.get(("stats", date, "daily")) for date in dates},
+        }
+
 
 class APICacheService(CacheService):
     """API缓存服务"""
@@ -303,7 +488,7 @@ class APICacheService(CacheService):
     def clear_api_cache(cls, endpoint: str = None) -> bool:
         """清除API缓存"""
         if endpoint:
-            return cls.clear_pattern(f"api:{endpoint}:*")
+            return cls.clear_pattern(f"api:v*:{endpoint}:*")
         else:
             return cls.clear_prefix("api")
 
@@ -342,11 +527,11 @@ class CacheManager:
     """缓存管理器"""
 
     @classmethod
-    def clear_all_cache(cls) -> Dict[str, int]:
-        """清除所有缓存"""
+    def clear_all_cache(cls) -> Dict[str, bool]:
+        """清除所有缓存，返回每个前缀是否清除成功（按命名空间版本失效，无法统计删除的键数）"""
         results = {}
         for prefix in CacheService.PREFIXES.values():
-            results[prefix] = CacheService.clear_prefix(prefix)
+            results[prefix] = CacheService.clear_prefix(prefix) > 0
         return results
 
     @classmethod
@@ -1,22 +1,113 @@
 import hashlib
 import logging
+import math
 import pickle  # nosec B403
+import random
+import threading
+import time
+import uuid
 import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from django.conf import settings
 from django.core.cache import cache
 
+from utils.redis_client import get_redis_client
+
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """进程内LRU缓存（L1），带TTL和容量上限"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
 
 class CacheService:
-    """优化的缓存服务类"""
+    """
+    优化的缓存服务类
+
+    两级缓存：L1为进程内LRU，L2为Redis（Django缓存后端）。get_or_set 额外提供：
+    - single-flight：同一个键同时只有一个调用方重新计算（进程内锁 + 分布式锁）
+    - 概率提前刷新（XFetch）：临近过期时按概率提前在后台刷新，避免集中过期
+    - stale-while-revalidate：逻辑过期后的一段时间内先返回旧值，后台刷新
+    L1失效通过Redis pub/sub广播到所有进程。
+    """
+
+    INVALIDATION_CHANNEL = "cache_l1_invalidate"
 
     def __init__(self, default_timeout: int = 300):
         self.default_timeout = default_timeout
         self.cache_prefix = getattr(settings, "CACHE_PREFIX", "qatoolbox")
+        self.l1_ttl = getattr(settings, "CACHE_L1_TTL", 30)
+        self.stale_ttl = getattr(settings, "CACHE_STALE_TTL", 60)
+        self.early_refresh_beta = getattr(settings, "CACHE_EARLY_REFRESH_BETA", 1.0)
+        self.lock_timeout = getattr(settings, "CACHE_LOCK_TIMEOUT", 10)
+        self.local_cache = LocalLRUCache(getattr(settings, "CACHE_L1_MAX_ENTRIES", 1000))
+
+        # 按键哈希分段的锁，进程内同一个键同时只有一个线程重新计算
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        self._key_locks_lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+        self._subscriber_started = False
+        # 用于忽略本进程自己发布的失效消息
+        self._instance_id = uuid.uuid4().hex
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            "l1_hits": 0,
+            "l1_misses": 0,
+            "l2_hits": 0,
+            "l2_misses": 0,
+            "stale_served": 0,
+            "early_refreshes": 0,
+            "recomputes": 0,
+            "lock_waits": 0,
+        }
+
+    def _count(self, name: str, delta: int = 1):
+        with self._stats_lock:
+            self._counters[name] += delta
 
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """生成缓存键"""
@@ -38,32 +129,124 @@ class CacheService:
 
         return key_string
 
+    @staticmethod
+    def _pack(value: Any) -> Any:
+        """压缩大对象"""
+        if isinstance(value, (dict, list)) and len(str(value)) > 1000:
+            return {"_compressed": True, "data": zlib.compress(pickle.dumps(value))}
+        return value
+
+    @staticmethod
+    def _unpack(value: Any) -> Any:
+        if isinstance(value, dict) and value.get("_compressed"):
+            return pickle.loads(zlib.decompress(value["data"]))  # nosec B301
+        return value
+
+    def _wrap(self, value: Any, timeout: int, compute_time: float = 0.0) -> Dict[str, Any]:
+        """L2中的存储结构：值 + 逻辑过期时间 + 重新计算耗时（用于提前刷新概率）"""
+        return {"_swr": True, "value": self._pack(value), "expires_at": time.time() + timeout, "delta": compute_time}
+
+    def _unwrap(self, raw: Any) -> Tuple[Any, Optional[float], float]:
+        """返回 (值, 逻辑过期时间, 计算耗时)；兼容旧格式的裸值"""
+        if isinstance(raw, dict) and raw.get("_swr"):
+            return self._unpack(raw["value"]), raw["expires_at"], raw.get("delta", 0.0)
+        return self._unpack(raw), None, 0.0
+
+    # ---- L1 失效广播 ----
+
+    def _ensure_subscriber(self):
+        """启动pub/sub订阅线程，接收其他进程的L1失效通知"""
+        if self._subscriber_started:
+            return
+        client = get_redis_client()
+        if client is None:
+            return
+        self._subscriber_started = True
+
+        def listen():
+            channel = cache.make_key(self.INVALIDATION_CHANNEL)
+            while True:
+                try:
+                    pubsub = client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(channel)
+                    for message in pubsub.listen():
+                        data = message.get("data")
+                        if isinstance(data, bytes):
+                            data = data.decode("utf-8")
+                        origin, _, key = str(data).partition("|")
+                        if origin == self._instance_id:
+                            continue
+                        if key == "*":
+                            self.local_cache.clear()
+                        elif key:
+                            self.local_cache.delete(key)
+                except Exception as e:
+                    logger.warning(f"Cache invalidation subscriber error: {e}")
+                    # 断线期间L1可能错过失效消息，清空以保证一致
+                    self.local_cache.clear()
+                    time.sleep(1)
+
+        threading.Thread(target=listen, name="cache-invalidation", daemon=True).start()
+
+    def _publish_invalidation(self, key: str):
+        """清除本进程L1，并通知其他进程清除；key为"*"时清空整个L1"""
+        if key == "*":
+            self.local_cache.clear()
+        else:
+            self.local_cache.delete(key)
+        client = get_redis_client()
+        if client is None:
+            return
+        try:
+            client.publish(cache.make_key(self.INVALIDATION_CHANNEL), f"{self._instance_id}|{key}")
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {key}: {e}")
+
+    def _set_local(self, key: str, value: Any, expires_at: Optional[float]):
+        ttl = self.l1_ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        self._ensure_subscriber()
+        self.local_cache.set(key, (value, expires_at), ttl)
+
+    # ---- 基本操作 ----
+
     def get(self, key: str, default: Any = None) -> Any:
-        """获取缓存值"""
+        """获取缓存值（先查L1，再查L2）"""
+        local = self.local_cache.get(key)
+        if local is not _MISSING:
+            self._count("l1_hits")
+            logger.debug(f"Cache L1 hit: {key}")
+            return local[0]
+        self._count("l1_misses")
+
         try:
-            value = cache.get(key)
-            if value is not None:
+            raw = cache.get(key)
+            if raw is not None:
+                value, expires_at, _ = self._unwrap(raw)
+                self._count("l2_hits")
                 logger.debug(f"Cache hit: {key}")
+                if expires_at is None or expires_at > time.time():
+                    self._set_local(key, value, expires_at)
                 return value
             else:
+                self._count("l2_misses")
                 logger.debug(f"Cache miss: {key}")
                 return default
         except Exception as e:
             logger.error(f"Error getting cache for key {key}: {e}")
             return default
 
-    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
-        """设置缓存值"""
+    def set(self, key: str, value: Any, timeout: Optional[int] = None, compute_time: float = 0.0) -> bool:
+        """设置缓存值（L2物理过期时间 = 逻辑过期时间 + stale窗口）"""
         try:
             if timeout is None:
                 timeout = self.default_timeout
 
-            # 压缩大对象
-            if isinstance(value, (dict, list)) and len(str(value)) > 1000:
-                compressed_value = {"_compressed": True, "data": zlib.compress(pickle.dumps(value))}
-                cache.set(key, compressed_value, timeout)
-            else:
-                cache.set(key, value, timeout)
+            wrapped = self._wrap(value, timeout, compute_time)
+            cache.set(key, wrapped, timeout + self.stale_ttl)
+            self._publish_invalidation(key)
+            self._set_local(key, value, wrapped["expires_at"])
 
             logger.debug(f"Cache set: {key} (timeout: {timeout}s)")
             return True
@@ -71,34 +254,134 @@ class CacheService:
             logger.error(f"Error setting cache for key {key}: {e}")
             return False
 
-    def get_or_set(self, key: str, default_func: Callable, timeout: Optional[int] = None) -> Any:
-        """获取缓存值，如果不存在则设置默认值"""
-        value = self.get(key)
-        if value is not None:
-            # 解压缩数据
-            if isinstance(value, dict) and value.get("_compressed"):
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def _recompute(self, key: str, default_func: Callable, timeout: Optional[int]) -> Any:
+        start = time.time()
+        value = default_func()
+        self._count("recomputes")
+        self.set(key, value, timeout, compute_time=time.time() - start)
+        return value
+
+    def _schedule_refresh(self, key: str, default_func: Callable, timeout: Optional[int]):
+        """后台刷新（进程内和跨进程都只有一个刷新者）"""
+        with self._key_locks_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        lock_key = f"{key}:refresh_lock"
+
+        def refresh():
+            try:
+                self._recompute(key, default_func, timeout)
+            except Exception as e:
+                logger.error(f"Error refreshing cache for key {key}: {e}")
+            finally:
                 try:
-                    value = pickle.loads(zlib.decompress(value["data"]))  # nosec B301
+                    cache.delete(lock_key)
                 except Exception as e:
-                    logger.error(f"Error decompressing cache data for key {key}: {e}")
-                    value = None
+                    logger.error(f"Error releasing refresh lock for key {key}: {e}")
+                with self._key_locks_lock:
+                    self._refreshing.discard(key)
 
-            if value is not None:
-                return value
+        # 加锁或提交失败时放弃本次刷新，调用方照常返回旧值
+        try:
+            if cache.add(lock_key, 1, self.lock_timeout):
+                self._refresh_executor.submit(refresh)
+                return
+        except Exception as e:
+            logger.error(f"Error scheduling refresh for key {key}: {e}")
+        with self._key_locks_lock:
+            self._refreshing.discard(key)
+
+    def _should_refresh_early(self, expires_at: float, compute_time: float) -> bool:
+        """XFetch：剩余时间越少、计算越慢，越可能提前刷新"""
+        if compute_time <= 0 or self.early_refresh_beta <= 0:
+            return False
+        return time.time() - compute_time * self.early_refresh_beta * math.log(random.random() or 1e-12) >= expires_at
+
+    def get_or_set(self, key: str, default_func: Callable, timeout: Optional[int] = None) -> Any:
+        """获取缓存值，如果不存在则设置默认值（带single-flight和stale-while-revalidate）"""
+        local = self.local_cache.get(key)
+        if local is not _MISSING:
+            # L1的存活时间不超过逻辑过期时间，命中即为新鲜值
+            self._count("l1_hits")
+            return local[0]
+        self._count("l1_misses")
 
-        # 生成默认值
         try:
-            value = default_func()
-            self.set(key, value, timeout)
-            return value
+            raw = cache.get(key)
         except Exception as e:
-            logger.error(f"Error generating default value for key {key}: {e}")
-            return None
+            logger.error(f"Error getting cache for key {key}: {e}")
+            raw = None
+
+        if raw is not None:
+            try:
+                value, expires_at, compute_time = self._unwrap(raw)
+            except Exception as e:
+                logger.error(f"Error decompressing cache data for key {key}: {e}")
+                value, expires_at, compute_time = None, None, 0.0
+
+            if value is not None:
+                self._count("l2_hits")
+                now = time.time()
+                if expires_at is None:
+                    return value
+                if expires_at <= now:
+                    # 已逻辑过期但仍在stale窗口内：先返回旧值，后台刷新
+                    self._count("stale_served")
+                    self._schedule_refresh(key, default_func, timeout)
+                    return value
+                if self._should_refresh_early(expires_at, compute_time):
+                    self._count("early_refreshes")
+                    self._schedule_refresh(key, default_func, timeout)
+                self._set_local(key, value, expires_at)
+                return value
+        self._count("l2_misses")
+
+        # 完全未命中：进程内single-flight
+        with self._get_key_lock(key):
+            local = self.local_cache.get(key)
+            if local is not _MISSING:
+                return local[0]
+
+            try:
+                return self._compute_with_lock(key, default_func, timeout)
+            except Exception as e:
+                logger.error(f"Error generating default value for key {key}: {e}")
+                return None
+
+    def _compute_with_lock(self, key: str, default_func: Callable, timeout: Optional[int]) -> Any:
+        """跨进程single-flight：拿到分布式锁的进程计算，其余进程等待结果"""
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                return self._recompute(key, default_func, timeout)
+            finally:
+                cache.delete(lock_key)
+
+        self._count("lock_waits")
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(0.05)
+            raw = cache.get(key)
+            if raw is not None:
+                value = self._unwrap(raw)[0]
+                if value is not None:
+                    return value
+            if cache.get(lock_key) is None:
+                break
+
+        # 持锁方失败或超时，自行计算
+        return self._recompute(key, default_func, timeout)
 
     def delete(self, key: str) -> bool:
         """删除缓存值"""
         try:
             cache.delete(key)
+            self._publish_invalidation(key)
             logger.debug(f"Cache deleted: {key}")
             return True
         except Exception as e:
@@ -108,8 +391,10 @@ class CacheService:
     def clear_pattern(self, pattern: str) -> int:
         """清除匹配模式的缓存键"""
         try:
-            # 这里需要根据具体的缓存后端实现
-            # 对于Redis，可以使用scan和delete
+            # L1中无法按模式匹配，直接通知所有进程清空
+            self._publish_invalidation("*")
+            if hasattr(cache, "delete_pattern"):
+                return cache.delete_pattern(pattern)
             # 对于内存缓存，只能等待过期
             logger.info(f"Clearing cache pattern: {pattern}")
             return 0
@@ -138,7 +423,7 @@ class CacheService:
     def get_many(self, keys: List[str]) -> Dict[str, Any]:
         """批量获取缓存值"""
         try:
-            result = cache.get_many(keys)
+            result = {key: self._unwrap(raw)[0] for key, raw in cache.get_many(keys).items()}
             logger.debug(f"Cache get_many: {len(result)}/{len(keys)} hits")
             return result
         except Exception as e:
@@ -151,15 +436,10 @@ class CacheService:
             if timeout is None:
                 timeout = self.default_timeout
 
-            # 压缩大对象
-            compressed_data = {}
-            for key, value in data.items():
-                if isinstance(value, (dict, list)) and len(str(value)) > 1000:
-                    compressed_data[key] = {"_compressed": True, "data": zlib.compress(pickle.dumps(value))}
-                else:
-                    compressed_data[key] = value
-
-            cache.set_many(compressed_data, timeout)
+            wrapped_data = {key: self._wrap(value, timeout) for key, value in data.items()}
+            cache.set_many(wrapped_data, timeout + self.stale_ttl)
+            for key in data:
+                self._publish_invalidation(key)
             logger.debug(f"Cache set_many: {len(data)} keys")
             return True
         except Exception as e:
@@ -183,14 +463,21 @@ class CacheService:
             return None
 
     def get_stats(self) -> Dict[str, Any]:
-        """获取缓存统计信息"""
+        """获取缓存统计信息（含各级命中/未命中计数）"""
         try:
-            # 这里需要根据具体的缓存后端实现
-            # 对于Redis，可以获取内存使用情况等
+            with self._stats_lock:
+                counters = dict(self._counters)
+            l1_total = counters["l1_hits"] + counters["l1_misses"]
+            l2_total = counters["l2_hits"] + counters["l2_misses"]
             return {
                 "backend": getattr(settings, "CACHE_BACKEND", "unknown"),
                 "prefix": self.cache_prefix,
                 "default_timeout": self.default_timeout,
+                "l1_entries": len(self.local_cache),
+                "l1_max_entries": self.local_cache.max_entries,
+                "l1_hit_rate": round(counters["l1_hits"] / l1_total, 4) if l1_total else 0,
+                "l2_hit_rate": round(counters["l2_hits"] / l2_total, 4) if l2_total else 0,
+                **counters,
             }
         except Exception as e:
             logger.error(f"Error getting cache stats: {e}")
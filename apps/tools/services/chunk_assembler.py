@@ -0,0 +1,231 @@
+"""
+分片上传流式组装
+
+最终文件在第一个分片到达前按总大小预分配，每个分片到达后直接写到自己的偏移位置（os.pwrite），
+不再先落盘成分片文件、最后再整体读一遍拼接。已写入的分片记录在持久化的位图中，
+进程重启或客户端断线后可以查询缺失分片继续上传。
+MD5在组装过程中按顺序增量计算：按序到达的分片直接用内存中的数据，提前到达的分片等前面补齐后
+再从文件中读回一次，内存占用与文件大小无关。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkAssemblyError(Exception):
+    """分片编号、大小或组装状态不合法"""
+
+
+def _pwrite_all(fd: int, data, offset: int):
+    """pwrite可能只写入一部分，循环直到写完"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class StreamingChunkAssembler:
+    """
+    单个文件的分片组装器
+
+    state_dir 下保存三个文件：{file_id}.part（预分配的目标文件）、{file_id}.bitmap（分片位图）、
+    {file_id}.json（文件名、大小、分片大小，用于恢复）。同一文件的分片可以并发写入。
+    """
+
+    def __init__(self, file_id: str, state_dir: Union[str, Path], total_size: int, chunk_size: int, filename: str = ""):
+        if total_size < 0 or chunk_size <= 0:
+            raise ChunkAssemblyError("文件大小或分片大小不合法")
+
+        self.file_id = file_id
+        self.state_dir = Path(state_dir)
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.filename = filename
+        self.total_chunks = max(1, (total_size + chunk_size - 1) // chunk_size)
+
+        self.part_path = self.state_dir / f"{file_id}.part"
+        self.bitmap_path = self.state_dir / f"{file_id}.bitmap"
+        self.meta_path = self.state_dir / f"{file_id}.json"
+
+        self._lock = threading.Lock()
+        self._md5 = hashlib.md5(usedforsecurity=False)
+        self._hashed_chunks = 0  # 已计入MD5的连续分片数
+        self.checksum = ""
+        self.is_complete = False
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        resuming = self.meta_path.exists() and self.part_path.exists() and self.bitmap_path.exists()
+        self._fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._bitmap_fd = os.open(self.bitmap_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        if resuming:
+            self._bitmap = bytearray(os.pread(self._bitmap_fd, (self.total_chunks + 7) // 8, 0))
+            self._bitmap.extend(b"\0" * ((self.total_chunks + 7) // 8 - len(self._bitmap)))
+            # hashlib对象无法持久化，恢复时把已连续到达的前缀重新计入MD5
+            self._advance_hash()
+        else:
+            self._bitmap = bytearray((self.total_chunks + 7) // 8)
+            self._preallocate()
+            os.pwrite(self._bitmap_fd, bytes(self._bitmap), 0)
+            self._write_meta()
+
+    @classmethod
+    def resume(cls, file_id: str, state_dir: Union[str, Path]) -> Optional["StreamingChunkAssembler"]:
+        """从持久化状态恢复未完成的上传，没有状态时返回None"""
+        meta_path = Path(state_dir) / f"{file_id}.json"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(file_id, state_dir, meta["total_size"], meta["chunk_size"], meta.get("filename", ""))
+
+    def _preallocate(self):
+        os.ftruncate(self._fd, self.total_size)
+        if self.total_size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self._fd, 0, self.total_size)
+            except OSError as e:
+                # 部分文件系统不支持，稀疏文件同样可以按偏移写入
+                logger.debug(f"预分配磁盘空间失败，使用稀疏文件: {e}")
+
+    def _write_meta(self):
+        meta = {
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "total_size": self.total_size,
+            "chunk_size": self.chunk_size,
+        }
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    def expected_size(self, chunk_number: int) -> int:
+        """分片应有的字节数，最后一片可能不足 chunk_size"""
+        if chunk_number == self.total_chunks - 1:
+            return self.total_size - chunk_number * self.chunk_size
+        return self.chunk_size
+
+    def has_chunk(self, chunk_number: int) -> bool:
+        return bool(self._bitmap[chunk_number >> 3] & (1 << (chunk_number & 7)))
+
+    @property
+    def received_chunks(self) -> List[int]:
+        return [n for n in range(self.total_chunks) if self.has_chunk(n)]
+
+    @property
+    def missing_chunks(self) -> List[int]:
+        return [n for n in range(self.total_chunks) if not self.has_chunk(n)]
+
+    @property
+    def received_count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self._bitmap)
+
+    def write_chunk(self, chunk_number: int, data) -> bool:
+        """
+        把分片写到最终文件中的偏移位置
+
+        返回是否为新分片；重复上传的分片直接忽略（幂等）。
+        """
+        if self.is_complete:
+            raise ChunkAssemblyError("文件已组装完成")
+        if not 0 <= chunk_number < self.total_chunks:
+            raise ChunkAssemblyError(f"分片编号超出范围: {chunk_number}/{self.total_chunks}")
+        if len(data) != self.expected_size(chunk_number):
+            raise ChunkAssemblyError(f"分片 {chunk_number} 大小不正确: {len(data)} != {self.expected_size(chunk_number)}")
+        if self.has_chunk(chunk_number):
+            return False
+
+        # 不同分片写入不重叠的区域，不需要加锁
+        _pwrite_all(self._fd, data, chunk_number * self.chunk_size)
+
+        with self._lock:
+            if self.has_chunk(chunk_number):
+                return False
+            # 数据写入后再更新位图，位图中的分片一定已经写入文件
+            index = chunk_number >> 3
+            self._bitmap[index] |= 1 << (chunk_number & 7)
+            os.pwrite(self._bitmap_fd, bytes((self._bitmap[index],)), index)
+            self._advance_hash(chunk_number, data)
+        return True
+
+    def _advance_hash(self, chunk_number: Optional[int] = None, data=None):
+        """把从 _hashed_chunks 开始连续到达的分片按顺序计入MD5"""
+        while self._hashed_chunks < self.total_chunks and self.has_chunk(self._hashed_chunks):
+            n = self._hashed_chunks
+            if n == chunk_number:
+                self._md5.update(data)
+            else:
+                self._hash_from_file(n)
+            self._hashed_chunks += 1
+
+    def _hash_from_file(self, chunk_number: int):
+        offset = chunk_number * self.chunk_size
+        remaining = self.expected_size(chunk_number)
+        while remaining > 0:
+            block = os.pread(self._fd, min(remaining, 1024 * 1024), offset)
+            if not block:
+                raise ChunkAssemblyError(f"读取分片 {chunk_number} 失败")
+            self._md5.update(block)
+            offset += len(block)
+            remaining -= len(block)
+
+    def finalize(self, final_path: Union[str, Path]) -> str:
+        """所有分片到齐后把文件移动到最终位置，清理状态文件，返回MD5"""
+        with self._lock:
+            if self.is_complete:
+                return self.checksum
+            if self._hashed_chunks != self.total_chunks:
+                raise ChunkAssemblyError(f"还有 {len(self.missing_chunks)} 个分片未上传")
+
+            os.fsync(self._fd)
+            self._close()
+
+            final_path = Path(final_path)
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(self.part_path, final_path)
+            except OSError:
+                # 临时目录与目标目录不在同一文件系统
+                shutil.move(str(self.part_path), str(final_path))
+
+            self.bitmap_path.unlink(missing_ok=True)
+            self.meta_path.unlink(missing_ok=True)
+            self.checksum = self._md5.hexdigest()
+            self.is_complete = True
+            return self.checksum
+
+    def _close(self):
+        for attr in ("_fd", "_bitmap_fd"):
+            fd = getattr(self, attr, None)
+            if fd is not None:
+                os.close(fd)
+                setattr(self, attr, None)
+
+    def abort(self):
+        """放弃上传，删除所有状态文件"""
+        with self._lock:
+            self._close()
+            for path in (self.part_path, self.bitmap_path, self.meta_path):
+                path.unlink(missing_ok=True)
+
+    def close(self):
+        """关闭文件句柄，保留状态以便之后恢复"""
+        with self._lock:
+            self._close()
+
+    def __del__(self):
+        try:
+            self._close()
+        except Exception:
+            pass
@@ -0,0 +1,189 @@
+"""
+文件转换结果缓存
+
+按输入内容寻址：SHA-256(输入字节) + 转换类型 + 参数 作为键，输出文件存放在本地磁盘，
+按最近使用时间淘汰，总大小不超过 PDF_CONVERSION_CACHE_MAX_BYTES。
+命中率和节省的字节数记录在Django缓存中，多进程共享。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# 转换实现发生不兼容变化时递增，使旧缓存自然失效
+CACHE_FORMAT_VERSION = 1
+
+STATS_KEY_PREFIX = "conversion_cache_stats"
+
+
+class ConversionCache:
+    """内容寻址的转换结果缓存"""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None, stats_prefix: str = STATS_KEY_PREFIX):
+        self._root = root
+        self._max_bytes = max_bytes
+        self.stats_prefix = stats_prefix
+        self._evict_lock = threading.Lock()
+
+    @property
+    def root(self) -> str:
+        if self._root:
+            return self._root
+        return getattr(settings, "PDF_CONVERSION_CACHE_DIR", None) or os.path.join(str(settings.BASE_DIR), "conversion_cache")
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, "PDF_CONVERSION_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+
+    @staticmethod
+    def make_key(file, conversion_type: str, **params) -> str:
+        """按文件内容、转换类型和参数生成缓存键，计算后文件指针复位"""
+        digest = hashlib.sha256()
+        if hasattr(file, "chunks"):
+            for chunk in file.chunks():
+                digest.update(chunk)
+        else:
+            file.seek(0)
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        file.seek(0)
+
+        params_part = json.dumps(params, sort_keys=True, default=str)
+        raw_key = f"v{CACHE_FORMAT_VERSION}|{digest.hexdigest()}|{conversion_type}|{params_part}"
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        directory = os.path.join(self.root, key[:2])
+        return directory, os.path.join(directory, f"{key}.bin"), os.path.join(directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存，命中时返回元数据（含输出文件路径 path 和大小 size）
+
+        命中会刷新文件修改时间，作为LRU淘汰依据。
+        """
+        _, data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            size = os.path.getsize(data_path)
+            os.utime(data_path)
+        except (OSError, ValueError):
+            self._incr_stat("misses")
+            return None
+
+        self._incr_stat("hits")
+        self._incr_stat("bytes_saved", size)
+        meta.update(path=data_path, size=size)
+        return meta
+
+    def contains(self, key: str) -> bool:
+        """是否存在完整的缓存条目，不计入命中统计"""
+        _, data_path, meta_path = self._paths(key)
+        return os.path.exists(meta_path) and os.path.exists(data_path)
+
+    def put(self, key: str, source, meta: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        写入缓存，source 为字节或可读的二进制文件对象
+
+        先写临时文件再原子替换，元数据文件最后写入，元数据存在即表示条目完整。
+        """
+        directory, data_path, meta_path = self._paths(key)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+                if isinstance(source, (bytes, bytearray)):
+                    tmp.write(source)
+                else:
+                    shutil.copyfileobj(source, tmp, 1024 * 1024)
+                tmp_path = tmp.name
+            os.replace(tmp_path, data_path)
+
+            with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, encoding="utf-8") as tmp:
+                json.dump(meta or {}, tmp, ensure_ascii=False)
+                tmp_meta_path = tmp.name
+            os.replace(tmp_meta_path, meta_path)
+        except OSError as e:
+            logger.warning(f"写入转换缓存失败: {e}")
+            return False
+
+        self._evict()
+        return True
+
+    def _iter_entries(self):
+        """遍历缓存条目，生成 (修改时间, 大小, 键)"""
+        if not os.path.isdir(self.root):
+            return
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry.name[:-4]
+
+    def _remove(self, key: str):
+        _, data_path, meta_path = self._paths(key)
+        for path in (meta_path, data_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """总大小超过上限时按最近使用时间从旧到新删除"""
+        with self._evict_lock:
+            entries = sorted(self._iter_entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(key)
+                total -= size
+                self._incr_stat("evictions")
+
+    def clear(self):
+        """清空缓存目录"""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _incr_stat(self, name: str, delta: int = 1):
+        key = f"{self.stats_prefix}:{name}"
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key, delta)
+        except Exception as e:
+            logger.debug(f"更新转换缓存统计失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中率、节省字节数和磁盘占用"""
+        names = ["hits", "misses", "bytes_saved", "evictions"]
+        values = cache.get_many([f"{self.stats_prefix}:{name}" for name in names])
+        stats = {name: values.get(f"{self.stats_prefix}:{name}", 0) for name in names}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+
+        entries = list(self._iter_entries())
+        stats["entries"] = len(entries)
+        stats["size_bytes"] = sum(size for _, size, _ in entries)
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+# 全局转换缓存实例
+conversion_cache = ConversionCache()
@@ -0,0 +1,212 @@
+"""
+目的地知识缓存
+
+旅游相关服务（TravelDataService、OverviewDataService，以及通过后者取概览数据的 MultiAPITravelService）
+对同一批热门目的地反复请求维基百科、OpenTripMap、国家、地理位置、汇率、时区和天气等外部接口。
+这里按“数据源 + 目的地”缓存每个数据源的结果：
+- 过期时间按数据源区分（国家、时区等几乎不变的数据按周缓存，天气只缓存十几分钟），可用 DESTINATION_KNOWLEDGE_TTLS 覆盖
+- 接口失败时返回备用数据，并只短暂缓存（FAILURE_TTL），接口恢复后很快会重新获取
+- 存储在Django缓存中，多进程共享
+- 定时任务按 TravelGuide 历史预热访问最多的目的地，refresh_destination_knowledge 命令可以批量刷新
+
+DeepSeek生成的目的地基本信息已由大模型响应缓存（llm_cache）按月缓存，不在这里重复缓存。
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .llm_cache import resolve_ttl
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "destination_knowledge:v1"
+
+# 默认过期时间：数据源 -> 档位名（见 llm_cache.TTL_TIERS）或秒数
+DEFAULT_SOURCE_TTLS = {
+    "country": 14 * 24 * 60 * 60,
+    "timezone": 14 * 24 * 60 * 60,
+    "geolocation": "monthly",
+    "wikipedia": "weekly",
+    "attractions": "weekly",
+    "search": "daily",
+    "currency": 6 * 60 * 60,
+    "weather": 15 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+# 接口失败时备用数据的缓存时间（秒）
+FAILURE_TTL = 5 * 60
+
+
+def parse_source_ttls(value: Union[str, Dict[str, Any], None]) -> Dict[str, int]:
+    """解析数据源过期时间，支持字典或 "weather=600,country=weekly" 格式的字符串，在默认值之上合并"""
+    ttls = {source: resolve_ttl(ttl) for source, ttl in DEFAULT_SOURCE_TTLS.items()}
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = [item.partition("=")[::2] for item in (value or "").split(",") if "=" in item]
+    for source, ttl in items:
+        if str(source).strip() and resolve_ttl(ttl) > 0:
+            ttls[str(source).strip()] = resolve_ttl(ttl)
+    return ttls
+
+
+class DestinationKnowledgeStore:
+    """按数据源和目的地缓存外部接口结果，进程内共享一个实例（destination_knowledge）"""
+
+    def __init__(self, ttls: Union[str, Dict[str, Any], None] = None, key_prefix: str = KEY_PREFIX):
+        self._ttls = ttls
+        self.key_prefix = key_prefix
+        self._local = threading.local()
+
+    @property
+    def ttls(self) -> Dict[str, int]:
+        value = self._ttls if self._ttls is not None else getattr(settings, "DESTINATION_KNOWLEDGE_TTLS", "")
+        return parse_source_ttls(value)
+
+    def ttl_for(self, source: str) -> int:
+        return self.ttls.get(source, DEFAULT_TTL)
+
+    def make_key(self, source: str, subject: str, variant: str = "") -> str:
+        digest = hashlib.sha256(subject.strip().encode("utf-8")).hexdigest()[:32]
+        return f"{self.key_prefix}:{source}:{variant}:{digest}"
+
+    @property
+    def is_refreshing(self) -> bool:
+        return getattr(self._local, "refreshing", False)
+
+    @contextmanager
+    def refreshing(self):
+        """块内（当前线程）的查询跳过缓存，重新请求接口并覆盖缓存"""
+        previous = self.is_refreshing
+        self._local.refreshing = True
+        try:
+            yield
+        finally:
+            self._local.refreshing = previous
+
+    def get(
+        self,
+        source: str,
+        subject: str,
+        fetch: Callable[[], Any],
+        fallback: Callable[[], Any],
+        variant: str = "",
+    ) -> Any:
+        """
+        返回缓存的数据源结果，没有或已过期时调用 fetch 获取并缓存
+
+        :param subject: 目的地；与目的地无关的数据可以用自然键（如货币代码、时区名）在目的地之间共享
+        :param fetch: 请求接口，返回None或抛出异常表示失败
+        :param fallback: 失败时的备用数据，只缓存 FAILURE_TTL 秒
+        :param variant: 同一数据源不同的结果格式（不同服务解析方式不同）
+        """
+        key = self.make_key(source, subject, variant)
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            logger.warning(f"目的地数据[{source}] {subject} 读取缓存失败: {e}")
+            entry = None
+        if entry is not None and not self.is_refreshing:
+            return entry["data"]
+
+        started = time.monotonic()
+        try:
+            data = fetch()
+        except Exception as e:
+            logger.warning(f"目的地数据[{source}] {subject} 获取失败: {e}")
+            data = None
+
+        if data is None:
+            # 强制刷新失败时保留原来的数据，不用备用数据覆盖
+            if entry is not None and not entry.get("fallback"):
+                return entry["data"]
+            data = fallback()
+            self._store(key, data, True, min(FAILURE_TTL, self.ttl_for(source)))
+            return data
+
+        self._store(key, data, False, self.ttl_for(source))
+        logger.debug(f"目的地数据[{source}] {subject} 已缓存，耗时{time.monotonic() - started:.2f}秒")
+        return data
+
+    def _store(self, key: str, data: Any, fallback: bool, ttl: int):
+        """写入缓存，缓存不可用时只记录日志"""
+        try:
+            cache.set(key, {"data": data, "fetched_at": time.time(), "fallback": fallback}, ttl)
+        except Exception as e:
+            logger.warning(f"目的地数据写入缓存失败: {e}")
+
+    def invalidate(self, subject: str, sources: Optional[Iterable[str]] = None, variants: Iterable[str] = ("",)):
+        """删除一个目的地（或自然键）的缓存"""
+        keys = [self.make_key(source, subject, variant) for source in (sources or self.ttls) for variant in variants]
+        cache.delete_many(keys)
+
+
+# 全局目的地知识缓存实例
+destination_knowledge = DestinationKnowledgeStore()
+
+
+def local_time_fields(timezone_name: str) -> Optional[Dict[str, Any]]:
+    """按时区名在本地计算当前时间、UTC偏移和夏令时（这些随时间变化，不随时区缓存），时区名无法识别时返回None"""
+    try:
+        now = datetime.now(ZoneInfo(timezone_name))
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+    offset = now.strftime("%z")
+    return {
+        "datetime": now.isoformat(),
+        "utc_offset": f"{offset[:3]}:{offset[3:]}",
+        "day_of_week": now.isoweekday() % 7,
+        "is_dst": bool(now.dst()),
+    }
+
+
+def top_destinations(limit: int) -> List[str]:
+    """按 TravelGuide 历史取生成攻略最多的目的地"""
+    from django.db.models import Count
+
+    from apps.tools.models import TravelGuide
+
+    rows = (
+        TravelGuide.objects.exclude(destination="")
+        .values("destination")
+        .annotate(guide_count=Count("id"))
+        .order_by("-guide_count")[:limit]
+    )
+    return [row["destination"] for row in rows]
+
+
+def prewarm_destinations(destinations: Iterable[str], refresh: bool = False, on_progress=None) -> Dict[str, float]:
+    """
+    预热目的地的全部数据源，返回每个目的地的耗时（秒）
+
+    默认只获取缺失或已过期的数据源；refresh=True 时全部重新获取。
+    概览数据中的目的地基本信息同时写入大模型响应缓存，但 refresh 不会绕过该缓存。
+    """
+    from .overview_data_service import OverviewDataService
+    from .travel_data_service import TravelDataService
+
+    overview_service = OverviewDataService()
+    travel_data_service = TravelDataService()
+    timings = {}
+    for destination in destinations:
+        started = time.monotonic()
+        try:
+            with destination_knowledge.refreshing() if refresh else nullcontext():
+                travel_data_service._数据抓取阶段(destination)
+                overview_service.get_overview_data(destination)
+        except Exception as e:
+            logger.warning(f"预热目的地 {destination} 失败: {e}")
+        timings[destination] = round(time.monotonic() - started, 2)
+        if on_progress:
+            on_progress(destination, timings[destination])
+    return timings
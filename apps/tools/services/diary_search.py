@@ -0,0 +1,245 @@
+"""
+生活日记全文检索
+
+中文没有空格分词，PostgreSQL自带的解析器也不支持中文，因此分词统一在Python中完成：
+连续的中文按单字和相邻二字切分（n-gram），其他文字按单词小写切分。
+- PostgreSQL：词项以 simple 配置写入 search_vector（标题A、正文B、其他C权重），GIN索引，SearchRank排序
+- 其他数据库（开发/测试的SQLite）：写入 LifeDiarySearchTerm 倒排索引表，按 (用户, 词项) 索引查询
+
+日记保存时通过 post_save 信号增量更新索引；已有日记在迁移 0072 中回填，之后可用 rebuild_diary_search_index 命令重建。
+"""
+
+import html
+import logging
+import re
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.signals import post_save
+
+logger = logging.getLogger(__name__)
+
+CJK_CHARS = "㐀-䶿一-鿿豈-﫿"
+CJK_RE = re.compile(rf"[{CJK_CHARS}]")
+TOKEN_RE = re.compile(rf"[{CJK_CHARS}]+|(?:(?![{CJK_CHARS}])[^\W_])+")
+
+# 与PostgreSQL默认的 {D, C, B, A} 权重一致
+FIELD_WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2}
+TAG_TERM_PREFIX = "#"
+MAX_TERM_LENGTH = 64
+# 影响检索结果的字段，保存时只更新了其他字段则不重建索引
+INDEXED_FIELDS = {"title", "content", "voice_text", "tags", "question_answer"}
+
+
+def tokenize(text: str) -> List[str]:
+    """索引分词：中文生成单字和二字词项，其他文字按单词"""
+    terms = []
+    for match in TOKEN_RE.finditer((text or "").lower()):
+        token = match.group()
+        if CJK_RE.match(token):
+            terms.extend(token)
+            terms.extend(token[i : i + 2] for i in range(len(token) - 1))
+        else:
+            terms.append(token[:MAX_TERM_LENGTH])
+    return terms
+
+
+def query_terms(query: str) -> List[str]:
+    """
+    查询分词：中文只取相邻二字（单个汉字取单字），全部词项都需命中
+
+    二字词项覆盖了查询的每个字及其顺序，效果接近子串匹配，同时可以走索引。
+    """
+    terms = []
+    for match in TOKEN_RE.finditer((query or "").lower()):
+        token = match.group()
+        if CJK_RE.match(token):
+            terms.extend([token] if len(token) == 1 else (token[i : i + 2] for i in range(len(token) - 1)))
+        else:
+            terms.append(token[:MAX_TERM_LENGTH])
+    return list(dict.fromkeys(terms))
+
+
+def tag_term(tag: str) -> str:
+    return f"{TAG_TERM_PREFIX}{str(tag).strip().lower()}"[:MAX_TERM_LENGTH]
+
+
+def document_fields(entry) -> Dict[str, str]:
+    """按权重分组的待索引文本"""
+    answers = entry.question_answer.values() if isinstance(entry.question_answer, dict) else []
+    extra = [entry.voice_text or ""] + [str(tag) for tag in entry.tags or []] + [str(a) for a in answers]
+    return {"A": entry.title or "", "B": entry.content or "", "C": " ".join(extra)}
+
+
+def document_terms(entry) -> Dict[str, float]:
+    """词项及其权重（各字段权重 × 出现次数），标签额外生成精确匹配的 #标签 词项"""
+    weights: Dict[str, float] = defaultdict(float)
+    for field_weight, text in document_fields(entry).items():
+        for term in tokenize(text):
+            weights[term] += FIELD_WEIGHTS[field_weight]
+    for tag in entry.tags or []:
+        weights.setdefault(tag_term(tag), 0.0)
+    return dict(weights)
+
+
+def highlight(text: str, query: str, max_length: int = 200, tag: str = "mark") -> str:
+    """
+    生成高亮摘要：HTML转义后用 <mark> 包裹命中的查询词，摘要窗口围绕第一个命中位置
+
+    高亮按查询中的原词匹配（不区分大小写），与分词方式无关。
+    """
+    text = text or ""
+    words = sorted({w for w in (query or "").split() if w}, key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE) if words else None
+    first = pattern.search(text) if pattern else None
+
+    start = 0
+    if first and len(text) > max_length:
+        start = max(0, min(first.start() - max_length // 4, len(text) - max_length))
+    snippet = text[start : start + max_length]
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(snippet) if pattern else ():
+        parts.append(html.escape(snippet[position : match.start()]))
+        parts.append(f"<{tag}>{html.escape(match.group())}</{tag}>")
+        position = match.end()
+    parts.append(html.escape(snippet[position:]))
+
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + max_length < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+class NgramDiarySearch:
+    """基于 LifeDiarySearchTerm 倒排索引表的检索"""
+
+    def index(self, entry):
+        from ..models import LifeDiarySearchTerm
+
+        terms = document_terms(entry)
+        with transaction.atomic():
+            LifeDiarySearchTerm.objects.filter(entry_id=entry.pk).delete()
+            LifeDiarySearchTerm.objects.bulk_create(
+                LifeDiarySearchTerm(entry_id=entry.pk, user_id=entry.user_id, term=term, weight=weight)
+                for term, weight in terms.items()
+            )
+
+    def match(self, queryset, user, terms: Sequence[str], tags: Sequence[str]) -> Tuple[object, Dict[int, float]]:
+        """返回 (过滤后的查询集, {日记ID: 相关度})，要求所有词项和标签都命中"""
+        from ..models import LifeDiarySearchTerm
+
+        required = list(dict.fromkeys(list(terms) + [tag_term(tag) for tag in tags]))
+        rows = (
+            LifeDiarySearchTerm.objects.filter(user=user, term__in=required)
+            .values("entry_id")
+            .annotate(matched=Count("id"), score=Sum("weight"))
+            .filter(matched=len(required))
+        )
+        ranks = {row["entry_id"]: row["score"] / max(len(terms), 1) for row in rows}
+        return queryset.filter(id__in=list(ranks)), ranks
+
+
+class PostgresDiarySearch:
+    """基于 search_vector 列和GIN索引的检索"""
+
+    def index(self, entry):
+        from django.contrib.postgres.search import SearchVector
+
+        from ..models import LifeDiaryEntry
+
+        vector = None
+        for field_weight, text in document_fields(entry).items():
+            part = SearchVector(Value(" ".join(tokenize(text))), config="simple", weight=field_weight)
+            vector = part if vector is None else vector + part
+        LifeDiaryEntry.objects.filter(pk=entry.pk).update(search_vector=vector)
+
+    def match(self, queryset, user, terms: Sequence[str], tags: Sequence[str]) -> Tuple[object, Dict[int, float]]:
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        if tags:
+            # jsonb @> 一次判断包含全部标签
+            queryset = queryset.filter(tags__contains=list(tags))
+        if not terms:
+            return queryset, {}
+
+        search_query = SearchQuery(" ".join(terms), config="simple", search_type="plain")
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F("search_vector"), search_query)
+        )
+        ranks = dict(queryset.values_list("id", "search_rank"))
+        return queryset, ranks
+
+
+def get_backend():
+    """按当前数据库选择检索实现"""
+    return PostgresDiarySearch() if connection.vendor == "postgresql" else NgramDiarySearch()
+
+
+def index_entry(entry):
+    """重建单篇日记的检索索引"""
+    try:
+        get_backend().index(entry)
+    except Exception as e:
+        # 索引失败不影响日记保存，rebuild_diary_search_index 可以补建
+        logger.warning(f"日记检索索引更新失败: {entry.pk}, {e}")
+
+
+def search_entries(
+    user,
+    query: str = "",
+    mood: str = "",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    tags: Iterable[str] = (),
+    limit: int = 50,
+) -> List[Tuple[object, float]]:
+    """
+    检索用户的日记，返回 [(日记, 相关度)]
+
+    有查询词时按相关度降序、日期降序排列；只有过滤条件时按日期降序，相关度为0。
+    """
+    from ..models import LifeDiaryEntry
+
+    queryset = LifeDiaryEntry.objects.filter(user=user)
+    if mood:
+        queryset = queryset.filter(mood=mood)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    terms = query_terms(query)
+    tags = [str(tag) for tag in tags if str(tag).strip()]
+    if query and not terms:
+        # 查询只包含标点等无法检索的字符
+        return []
+
+    ranks: Dict[int, float] = {}
+    if terms or tags:
+        queryset, ranks = get_backend().match(queryset, user, terms, tags)
+
+    if not terms:
+        return [(entry, 0.0) for entry in queryset.order_by("-date")[:limit]]
+
+    # 只取回排名靠前的日记
+    candidates = sorted(queryset.values_list("id", "date"), key=lambda row: (-ranks.get(row[0], 0.0), -row[1].toordinal()))
+    top_ids = [entry_id for entry_id, _ in candidates[:limit]]
+    entries = LifeDiaryEntry.objects.in_bulk(top_ids)
+    return [(entries[entry_id], ranks.get(entry_id, 0.0)) for entry_id in top_ids if entry_id in entries]
+
+
+def _index_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: index_entry(instance))
+
+
+def connect_signals():
+    """日记保存时增量更新检索索引（在 ToolsConfig.ready 中调用），删除时倒排索引随外键级联删除"""
+    from ..models import LifeDiaryEntry
+
+    post_save.connect(_index_on_save, sender=LifeDiaryEntry, dispatch_uid="diary_search_post_save")
@@ -6,6 +6,7 @@ import requests
 
 from ..models import DouyinVideo, DouyinVideoAnalysis
 from .douyin_crawler import DouyinCrawler
+from .llm_gateway import LLMGatewayError, LLMTimeoutError, llm_gateway
 
 
 class DouyinAnalyzer:
@@ -193,89 +194,26 @@ class DouyinAnalyzer:
         return prompt
 
     def _call_deepseek_api(self, prompt: str) -> str:
-        """调用DeepSeek API，带重试机制和更长超时"""
+        """调用DeepSeek API，重试和超时由 llm_gateway 统一处理，失败时返回错误说明"""
         import os
-        import time
-
-        import requests
 
         api_key = os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             return "DeepSeek API密钥未配置，无法生成产品预览"
 
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.8,
-            "max_tokens": 2000,
-        }
-
-        # 重试配置
-        max_retries = 3
-        retry_delays = [2, 5, 10]  # 递增重试延迟
-        timeout_values = [60, 90, 120]  # 递增超时时间
-
-        for attempt in range(max_retries):
-            try:
-                print(f"DeepSeek API调用尝试 {attempt + 1}/{max_retries}，超时设置: {timeout_values[attempt]}秒")
-
-                response = requests.post(  # nosec B113
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout_values[attempt],
-                    verify=True,  # nosec B501
-                )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    print("DeepSeek API调用成功")
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    error_msg = f"API调用失败: {response.status_code} - {response.text}"
-                    print(error_msg)
-
-                    # 如果是最后一次尝试，返回错误信息
-                    if attempt == max_retries - 1:
-                        return error_msg
-
-                    # 否则等待后重试
-                    time.sleep(retry_delays[attempt])
-                    continue
-
-            except requests.exceptions.Timeout:
-                error_msg = f"API调用超时 (尝试 {attempt + 1}/{max_retries}，超时时间: {timeout_values[attempt]}秒)"
-                print(error_msg)
-
-                if attempt == max_retries - 1:
-                    return f"API调用超时: 所有重试尝试都已超时，请稍后再试"
-
-                # 等待后重试
-                time.sleep(retry_delays[attempt])
-                continue
-
-            except requests.exceptions.ConnectionError:
-                error_msg = f"网络连接错误 (尝试 {attempt + 1}/{max_retries})"
-                print(error_msg)
-
-                if attempt == max_retries - 1:
-                    return f"网络连接错误: 无法连接到DeepSeek API服务器"
-
-                # 等待后重试
-                time.sleep(retry_delays[attempt])
-                continue
-
-            except Exception as e:
-                error_msg = f"API调用出错 (尝试 {attempt + 1}/{max_retries}): {str(e)}"
-                print(error_msg)
-
-                if attempt == max_retries - 1:
-                    return f"API调用出错: {str(e)}"
-
-                # 等待后重试
-                time.sleep(retry_delays[attempt])
-                continue
-
-        return "API调用失败: 所有重试尝试都已失败"
+        try:
+            # 最多尝试3次，总时间预算与原来逐次放宽的超时（60/90/120秒）相当
+            content = llm_gateway.complete(
+                prompt, feature="douyin", api_key=api_key, timeout=270, max_retries=2, temperature=0.8, max_tokens=2000
+            )
+            print("DeepSeek API调用成功")
+            return content
+        except LLMTimeoutError:
+            return "API调用超时: 所有重试尝试都已超时，请稍后再试"
+        except LLMGatewayError as e:
+            print(f"DeepSeek API调用失败: {e}")
+            if e.status_code is not None:
+                return f"API调用失败: {e.status_code} - {e.body}"
+            if e.retryable:
+                return "网络连接错误: 无法连接到DeepSeek API服务器"
+            return f"API调用出错: {str(e)}"
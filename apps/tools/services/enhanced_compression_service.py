@@ -14,7 +14,12 @@ import tarfile
 import tempfile
 import zipfile
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.http import StreamingHttpResponse
+
+from .archive_stream import CONTENT_TYPES as STREAM_CONTENT_TYPES
+from .archive_stream import make_entry, streaming_archive_response
 
 logger = logging.getLogger(__name__)
 
@@ -343,6 +348,45 @@ class EnhancedCompressionService:
             logger.error(f"压缩文件时发生错误: {str(e)}")
             return False, f"压缩失败: {str(e)}", None
 
+    def stream_files(
+        self,
+        file_paths: List[str],
+        output_name: str = None,
+        compression_method: str = "auto",
+        compression_level: int = 6,
+        include_paths: bool = True,
+        on_close: Optional[Callable[[], None]] = None,
+    ) -> Tuple[bool, str, Optional[StreamingHttpResponse]]:
+        """
+        边压缩边下载，不预先生成压缩文件
+
+        只支持多文件容器格式 zip 和 tar.gz；auto 直接使用 zip，不再预先分析文件选择算法。
+        媒体文件原样存储，其余文件并行压缩。on_close 在下载结束后调用，用于清理临时文件。
+
+        Returns:
+            (success, message, response)
+        """
+        if compression_method == "auto":
+            compression_method = "zip"
+        if compression_method not in STREAM_CONTENT_TYPES:
+            return False, f"压缩方法 {compression_method} 不支持流式下载", None
+
+        entries = []
+        for file_path in file_paths:
+            if os.path.exists(file_path) and os.path.isfile(file_path):
+                entries.append(make_entry(file_path, file_path.lstrip("/") if include_paths else None))
+        if not entries:
+            return False, "没有有效的文件", None
+
+        suffix = f".{compression_method}"
+        if not output_name:
+            output_name = f"compressed_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+        elif not output_name.endswith(suffix):
+            output_name += suffix
+
+        response = streaming_archive_response(entries, output_name, compression_method, compression_level, on_close)
+        return True, f"开始下载，包含 {len(entries)} 个文件", response
+
     def get_compression_info(self, file_path: str) -> Dict:
         """获取压缩文件信息"""
         try:
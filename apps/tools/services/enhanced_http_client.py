@@ -69,15 +69,19 @@ class EnhancedHTTPClient:
             }
         )
 
-    def _get_proxy(self) -> Optional[Dict]:
-        """获取代理配置"""
+    def _get_proxy(self, url: Optional[str] = None) -> Optional[Dict]:
+        """获取代理配置，url 用于按目标站点选择代理"""
         if not self.use_proxy:
             return None
 
-        # 检查是否需要轮换代理
-        if self.current_proxy is None or self.request_count % self.proxy_rotation_interval == 0:
+        # 检查是否需要轮换代理；当前代理对目标站点熔断时也立即轮换
+        if (
+            self.current_proxy is None
+            or self.request_count % self.proxy_rotation_interval == 0
+            or not proxy_pool.is_proxy_available(self.current_proxy["info"].proxy, url)
+        ):
 
-            new_proxy = proxy_pool.get_proxy_for_requests()
+            new_proxy = proxy_pool.get_proxy_for_requests(url)
             if new_proxy:
                 self.current_proxy = new_proxy
                 logger.info(f"🔄 切换代理: {new_proxy['info'].proxy}")
@@ -160,7 +164,7 @@ class EnhancedHTTPClient:
 
         # 首先尝试使用代理
         if self.use_proxy:
-            proxy_config = self._get_proxy()
+            proxy_config = self._get_proxy(url)
             if proxy_config:
                 kwargs_with_proxy = kwargs.copy()
                 kwargs_with_proxy["proxies"] = {"http": proxy_config["http"], "https": proxy_config["https"]}
@@ -176,38 +180,44 @@ class EnhancedHTTPClient:
         return self._try_direct_request(method, url, **kwargs)
 
     def _try_request_with_config(self, method: str, url: str, proxy_config: Dict, **kwargs) -> Optional[requests.Response]:
-        """使用指定配置尝试请求"""
+        """使用指定配置尝试请求，每次结果都上报给代理池用于评分和熔断"""
+        proxy = proxy_config["info"].proxy
         for attempt in range(2):  # 代理模式下减少重试次数
             try:
-                logger.debug(f"🔒 {method} {url} via proxy {proxy_config['info'].proxy} (尝试 {attempt + 1}/2)")
+                logger.debug(f"🔒 {method} {url} via proxy {proxy} (尝试 {attempt + 1}/2)")
 
+                start_time = time.monotonic()
                 if method.upper() == "GET":
                     response = self.session.get(url, **kwargs)
                 elif method.upper() == "POST":
                     response = self.session.post(url, **kwargs)
                 else:
                     response = self.session.request(method, url, **kwargs)
+                latency = time.monotonic() - start_time
 
                 # 检查响应状态
                 if response.status_code == 200:
                     logger.debug(f"✅ 代理请求成功: {url}")
+                    proxy_pool.report_result(proxy, True, latency, domain=url)
                     return response
                 elif response.status_code == 404:
                     logger.warning(f"❌ 页面不存在 ({response.status_code}): {url}")
+                    proxy_pool.report_result(proxy, True, latency, domain=url)
                     return response  # 404是有效响应，不重试
                 elif response.status_code == 403:
                     logger.warning(f"🚫 代理被拒绝 ({response.status_code}): {url}")
-                    # 标记代理失败
-                    proxy_pool.mark_proxy_failed(proxy_config["info"].proxy)
+                    # 只计入该站点的健康度，连续被拒后对该站点熔断
+                    proxy_pool.report_result(proxy, False, latency, domain=url, status_code=response.status_code)
                     self.current_proxy = None
                     break  # 跳出循环，尝试直连
                 else:
                     logger.warning(f"⚠️ 代理返回异常状态码 ({response.status_code}): {url}")
+                    proxy_pool.report_result(proxy, False, latency, domain=url, status_code=response.status_code)
 
             except (requests.exceptions.ProxyError, requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
                 logger.warning(f"🔌 代理连接问题: {e}")
-                # 标记代理失败
-                proxy_pool.mark_proxy_failed(proxy_config["info"].proxy)
+                # 连接层失败同时计入全局健康度
+                proxy_pool.report_result(proxy, False, domain=url)
                 self.current_proxy = None
                 break  # 跳出循环，尝试直连
 
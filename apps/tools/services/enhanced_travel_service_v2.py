@@ -3,17 +3,22 @@ import json
 import logging
 import time
 from datetime import timedelta
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from django.conf import settings
 from django.utils import timezone
 
 import requests
 
+from .llm_gateway import LLMGatewayError, llm_gateway
+from .markdown_sections import MarkdownSectionParser
 from .overview_data_service import OverviewDataService
 
 logger = logging.getLogger(__name__)
 
+# 流式生成时要求按二级标题分节，便于前端逐节渲染
+STREAM_SECTION_FORMAT = "\n\n请使用Markdown格式输出，每个部分以“## ”开头的二级标题单独成节，标题后直接写该部分的内容。"
+
 
 class MultiAPITravelService:
     """多API旅游服务 - 支持缓存和智能路由"""
@@ -613,20 +618,7 @@ class MultiAPITravelService:
             # 处理参数兼容性
             if interests is None:
                 interests = []
-
-            # 处理预算参数 - 如果没有budget_range，从其他预算参数生成
-            if budget_range is None:
-                if budget_amount is not None:
-                    budget_range = f"¥{budget_amount}"
-                elif budget_min is not None and budget_max is not None:
-                    budget_range = f"¥{budget_min}-{budget_max}"
-                elif budget_min is not None:
-                    budget_range = f"¥{budget_min}+"
-                elif budget_max is not None:
-                    budget_range = f"最高¥{budget_max}"
-                else:
-                    budget_range = "中等预算"
-
+            budget_range = self._resolve_budget_range(budget_range, budget_amount, budget_min, budget_max)
             if travel_duration is None:
                 travel_duration = "3-5天"
 
@@ -684,20 +676,7 @@ class MultiAPITravelService:
             # 处理参数兼容性
             if interests is None:
                 interests = []
-
-            # 处理预算参数 - 如果没有budget_range，从其他预算参数生成
-            if budget_range is None:
-                if budget_amount is not None:
-                    budget_range = f"¥{budget_amount}"
-                elif budget_min is not None and budget_max is not None:
-                    budget_range = f"¥{budget_min}-{budget_max}"
-                elif budget_min is not None:
-                    budget_range = f"¥{budget_min}+"
-                elif budget_max is not None:
-                    budget_range = f"最高¥{budget_max}"
-                else:
-                    budget_range = "中等预算"
-
+            budget_range = self._resolve_budget_range(budget_range, budget_amount, budget_min, budget_max)
             if travel_duration is None:
                 travel_duration = "3-5天"
 
@@ -743,40 +722,140 @@ class MultiAPITravelService:
 
             # 3. 如果DeepSeek成功，直接返回结果
             if guide_data:
-                # 使用新的overview数据服务获取overview数据
-                overview_data = self.overview_service.get_overview_data(destination)
-                if overview_data:
-                    guide_data.update(overview_data)
-
-                # 保存到缓存
-                self._save_to_cache(cache_key, guide_data, api_used, generation_time, fast_mode)
-                response = self._format_response(guide_data, api_used, generation_time, fast_mode)
-
+                response = self._finish_generated_guide(
+                    destination, cache_key, guide_data, api_used, generation_time, fast_mode
+                )
                 total_time = time.time() - start_time
                 logger.info(f"✅ DeepSeek旅游攻略生成完成！总耗时: {total_time:.2f}秒，使用API: {api_used}")
                 return response
 
             # 4. 如果DeepSeek失败，使用真实备用数据
-            logger.info("✅ 使用真实备用数据")
-            guide_data = self._get_real_fallback_data(destination, travel_style, budget_range, travel_duration, interests)
+            return self._get_real_fallback_response(
+                destination, travel_style, budget_range, travel_duration, interests, start_time, fast_mode
+            )
 
-            # 使用新的overview数据服务获取overview数据
-            overview_data = self.overview_service.get_overview_data(destination)
-            if overview_data:
-                guide_data.update(overview_data)
+        except Exception as e:
+            logger.error(f"❌ 旅游攻略生成失败: {e}")
+            return self._get_error_response(str(e))
 
-            api_used = "real_fallback"
-            generation_time = time.time() - start_time
+    def stream_travel_guide(
+        self,
+        destination: str,
+        travel_style: str,
+        budget_min: float = None,
+        budget_max: float = None,
+        budget_amount: float = None,
+        budget_range: str = None,
+        travel_duration: str = None,
+        interests: List[str] = None,
+        fast_mode: bool = False,
+    ) -> Iterator[Tuple[str, Dict]]:
+        """
+        流式生成旅游攻略，逐步产出 (事件名, 数据)：
+        - delta：新收到的文本片段 {"text"}
+        - section：一个完整的小节 {"index", "title", "content"}
+        - guide：最终攻略（格式同 get_travel_guide 的返回值），总是最后一个事件
+
+        命中攻略缓存时直接产出 guide；DeepSeek调用失败时使用真实备用数据。
+        """
+        start_time = time.time()
+        interests = interests or []
+        budget_range = self._resolve_budget_range(budget_range, budget_amount, budget_min, budget_max)
+        travel_duration = travel_duration or "3-5天"
+
+        cache_key = self._generate_cache_key(destination, travel_style, budget_range, travel_duration, interests)
+        cached_data = self._get_cached_guide(cache_key)
+        if cached_data and not cached_data.is_expired():
+            logger.info("✅ 从缓存获取攻略数据")
+            cached_data.increment_usage()
+            yield "guide", self._format_cached_response(cached_data)
+            return
+
+        config = self.api_configs["deepseek"]
+        prompt = self._build_travel_prompt(destination, travel_style, budget_range, travel_duration, interests)
+        parser = MarkdownSectionParser()
+        try:
+            for text in llm_gateway.stream_chat(
+                [{"role": "user", "content": prompt + STREAM_SECTION_FORMAT}],
+                feature="travel",
+                model=config["model"],
+                api_key=config["api_key"] or None,
+                timeout=getattr(settings, "TRAVEL_GUIDE_STREAM_TIMEOUT", 180),
+                max_tokens=config["max_tokens"],
+                temperature=0.7,
+            ):
+                yield "delta", {"text": text}
+                for section in parser.feed(text):
+                    yield "section", section
+            for section in parser.close():
+                yield "section", section
+        except LLMGatewayError as e:
+            logger.warning(f"⚠️ DeepSeek流式调用失败: {e}，使用真实备用数据")
+            yield "guide", self._get_real_fallback_response(
+                destination, travel_style, budget_range, travel_duration, interests, start_time, fast_mode
+            )
+            return
+
+        generation_time = time.time() - start_time
+        guide_data = self._parse_api_response(parser.text, destination)
+        logger.info(f"✅ DeepSeek流式攻略生成完成！耗时: {generation_time:.2f}秒，共{len(parser.sections)}节")
+        yield "guide", self._finish_generated_guide(destination, cache_key, guide_data, "deepseek", generation_time, fast_mode)
+
+    @staticmethod
+    def _resolve_budget_range(budget_range, budget_amount, budget_min, budget_max) -> str:
+        """没有budget_range时从其他预算参数生成"""
+        if budget_range is not None:
+            return budget_range
+        if budget_amount is not None:
+            return f"¥{budget_amount}"
+        if budget_min is not None and budget_max is not None:
+            return f"¥{budget_min}-{budget_max}"
+        if budget_min is not None:
+            return f"¥{budget_min}+"
+        if budget_max is not None:
+            return f"最高¥{budget_max}"
+        return "中等预算"
+
+    def _finish_generated_guide(
+        self, destination: str, cache_key: str, guide_data: Dict, api_used: str, generation_time: float, fast_mode: bool
+    ) -> Dict:
+        """补充overview数据并写入攻略缓存"""
+        # 使用新的overview数据服务获取overview数据
+        overview_data = self.overview_service.get_overview_data(destination)
+        if overview_data:
+            guide_data.update(overview_data)
 
-            response = self._format_response(guide_data, api_used, generation_time, fast_mode)
+        # 保存到缓存
+        self._save_to_cache(cache_key, guide_data, api_used, generation_time, fast_mode)
+        return self._format_response(guide_data, api_used, generation_time, fast_mode)
 
-            total_time = time.time() - start_time
-            logger.info(f"✅ 旅游攻略生成完成！总耗时: {total_time:.2f}秒，使用API: {api_used}")
-            return response
+    def _get_real_fallback_response(
+        self,
+        destination: str,
+        travel_style: str,
+        budget_range: str,
+        travel_duration: str,
+        interests: List[str],
+        start_time: float,
+        fast_mode: bool,
+    ) -> Dict:
+        """DeepSeek失败时使用真实备用数据生成攻略"""
+        logger.info("✅ 使用真实备用数据")
+        guide_data = self._get_real_fallback_data(destination, travel_style, budget_range, travel_duration, interests)
 
-        except Exception as e:
-            logger.error(f"❌ 旅游攻略生成失败: {e}")
-            return self._get_error_response(str(e))
+        # 使用新的overview数据服务获取overview数据
+        overview_data = self.overview_service.get_overview_data(destination)
+        if overview_data:
+            guide_data.update(overview_data)
+
+        api_used = "real_fallback"
+        generation_time = time.time() - start_time
+
+        response = self._format_response(guide_data, api_used, generation_time, fast_mode)
+
+        total_time = time.time() - start_time
+        logger.info(f"✅ 旅游攻略生成完成！总耗时: {total_time:.2f}秒，使用API: {api_used}")
+        return response
 
     def _generate_cache_key(
         self, destination: str, travel_style: str, budget_range: str, travel_duration: str, interests: List[str]
@@ -4,7 +4,7 @@
 
 import io
 import uuid
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 
 from django.conf import settings
 from django.core.files.base import ContentFile
@@ -113,19 +113,29 @@ class FileManager:
             print(f"保存文件失败: {e}")
             return None
 
-    def split_file_into_chunks(self, file_obj) -> List[bytes]:
-        """将文件分片"""
-        chunks = []
+    def split_file_into_chunks(self, file_obj) -> Iterator[bytes]:
+        """将文件分片，逐片生成，内存中同时只有一个分片"""
         while True:
             chunk = file_obj.read(self.chunk_size)
             if not chunk:
                 break
-            chunks.append(chunk)
-        return chunks
-
-    def merge_chunks(self, chunks: List[bytes]) -> bytes:
-        """合并文件分片"""
-        return b"".join(chunks)
+            yield chunk
+
+    def merge_chunks(self, chunks: Iterable[bytes], output=None) -> Union[bytes, int]:
+        """
+        合并文件分片
+
+        传入 output（可写的二进制文件对象）时逐片写入并返回写入的字节数，不在内存中拼接整个文件；
+        否则返回拼接后的字节。
+        """
+        if output is None:
+            return b"".join(chunks)
+
+        written = 0
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+        return written
 
     def get_file_url(self, file_path: str) -> str:
         """获取文件URL"""
@@ -0,0 +1,194 @@
+"""
+食物随机抽样服务
+
+按 (餐种, 菜系) 缓存活跃食物的轻量行（ID、受欢迎度、标签等），用别名表做 O(1) 加权抽样，
+最后只用 in_bulk 取回选中的行，避免 random.choice(queryset) 和 ORDER BY ? 扫描全表。
+FoodItem 保存或删除时递增版本号使缓存失效；queryset.update 不触发信号，由缓存过期时间兜底。
+"""
+
+import logging
+import random
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "food_sampler:version"
+CACHE_TIMEOUT = 60 * 60
+
+# 抽样和过滤需要的字段，避免为了过滤取回整行
+FoodRow = namedtuple("FoodRow", ["id", "cuisine", "meal_types", "difficulty", "tags", "popularity_score"])
+
+ALL = "all"
+
+
+def _normalize(value: Optional[str]) -> str:
+    """空值、all、mixed 都表示不过滤"""
+    return value if value and value not in (ALL, "mixed") else ALL
+
+
+class AliasTable:
+    """Vose别名表：构建 O(n)，每次加权抽样 O(1)"""
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        self.size = n
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        if n == 0:
+            return
+        if total <= 0:
+            # 全部权重为0时退化为均匀抽样
+            self.prob = [1.0] * n
+            return
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] = scaled[g] + scaled[s] - 1.0
+            (small if scaled[g] < 1.0 else large).append(g)
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw(self, rng=random) -> int:
+        i = rng.randrange(self.size)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class FoodSampler:
+    """食物随机抽样器"""
+
+    def __init__(self, cache_timeout: int = CACHE_TIMEOUT):
+        self.cache_timeout = cache_timeout
+        self._tables: Dict[tuple, AliasTable] = {}
+        self._lock = threading.Lock()
+
+    def get_version(self) -> int:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 1, None)
+            version = cache.get(VERSION_KEY, 1)
+        return version
+
+    def invalidate(self):
+        """递增版本号，所有进程的分组缓存随之失效"""
+        try:
+            cache.add(VERSION_KEY, 1, None)
+            cache.incr(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"食物抽样缓存失效失败: {e}")
+
+    def get_rows(self, meal_type: Optional[str] = None, cuisine: Optional[str] = None) -> List[FoodRow]:
+        """获取某个 (餐种, 菜系) 分组下活跃食物的轻量行，按版本缓存"""
+        from ..models.legacy_models import FoodItem
+
+        meal_type, cuisine = _normalize(meal_type), _normalize(cuisine)
+        key = f"food_sampler:v{self.get_version()}:{meal_type}:{cuisine}"
+        rows = cache.get(key)
+        if rows is None:
+            queryset = FoodItem.objects.filter(is_active=True)
+            if cuisine != ALL:
+                queryset = queryset.filter(cuisine=cuisine)
+            # meal_types 是JSON列表，SQLite不支持 contains 查询，在取回的轻量行上过滤
+            rows = [
+                FoodRow(*values)
+                for values in queryset.order_by("id").values_list(
+                    "id", "cuisine", "meal_types", "difficulty", "tags", "popularity_score"
+                )
+                if meal_type == ALL or meal_type in (values[2] or [])
+            ]
+            cache.set(key, rows, self.cache_timeout)
+        return rows
+
+    def _get_table(self, version: int, meal_type: str, cuisine: str, rows: List[FoodRow], weighted: bool):
+        """进程内按版本缓存别名表，版本变化时丢弃旧表"""
+        table_key = (version, meal_type, cuisine, weighted)
+        with self._lock:
+            table = self._tables.get(table_key)
+            if table is None or table.size != len(rows):
+                if any(key[0] != version for key in self._tables):
+                    self._tables = {key: value for key, value in self._tables.items() if key[0] == version}
+                table = _build_table(rows, weighted)
+                self._tables[table_key] = table
+            return table
+
+    def sample_ids(
+        self,
+        k: int = 1,
+        meal_type: Optional[str] = None,
+        cuisine: Optional[str] = None,
+        weighted: bool = False,
+        exclude: Iterable[int] = (),
+        predicate: Optional[Callable[[FoodRow], bool]] = None,
+    ) -> List[int]:
+        """
+        不放回地抽取最多 k 个食物ID
+
+        weighted=True 时按 popularity_score 加权；predicate 对轻量行做额外过滤（如标签、难度）。
+        """
+        version = self.get_version()
+        rows = self.get_rows(meal_type, cuisine)
+        if predicate is not None:
+            rows = [row for row in rows if predicate(row)]
+            table = _build_table(rows, weighted)
+        else:
+            table = self._get_table(version, _normalize(meal_type), _normalize(cuisine), rows, weighted)
+
+        excluded = set(exclude)
+        available = len(rows) - sum(1 for row in rows if row.id in excluded) if excluded else len(rows)
+        k = min(k, available)
+        chosen: List[int] = []
+        seen = set(excluded)
+
+        # 拒绝采样：k 远小于候选数时几乎不会重复，尝试次数用完后再从剩余候选中补齐
+        attempts = 0
+        while len(chosen) < k and attempts < k * 10:
+            attempts += 1
+            food_id = rows[table.draw()].id
+            if food_id not in seen:
+                seen.add(food_id)
+                chosen.append(food_id)
+        if len(chosen) < k:
+            remaining = [row.id for row in rows if row.id not in seen]
+            chosen.extend(random.sample(remaining, k - len(chosen)))
+        return chosen
+
+    def sample(self, k: int = 1, **kwargs) -> list:
+        """抽样并只取回选中的 FoodItem，按抽样顺序返回"""
+        from ..models.legacy_models import FoodItem
+
+        ids = self.sample_ids(k, **kwargs)
+        foods = FoodItem.objects.in_bulk(ids)
+        return [foods[food_id] for food_id in ids if food_id in foods]
+
+
+def _build_table(rows: List[FoodRow], weighted: bool) -> AliasTable:
+    if weighted:
+        # 加一个很小的底数，受欢迎度为0的食物也有机会被抽到
+        return AliasTable([max(row.popularity_score or 0.0, 0.0) + 0.01 for row in rows])
+    return AliasTable([1.0] * len(rows))
+
+
+# 全局抽样器实例
+food_sampler = FoodSampler()
+
+
+def _invalidate_food_sampler(sender, **kwargs):
+    food_sampler.invalidate()
+
+
+def connect_signals():
+    """FoodItem 变更时使抽样缓存失效（在 ToolsConfig.ready 中调用）"""
+    from ..models.legacy_models import FoodItem
+
+    post_save.connect(_invalidate_food_sampler, sender=FoodItem, dispatch_uid="food_sampler_post_save")
+    post_delete.connect(_invalidate_food_sampler, sender=FoodItem, dispatch_uid="food_sampler_post_delete")
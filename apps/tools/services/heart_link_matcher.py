@@ -2,25 +2,45 @@
 """
 心动链接智能匹配服务
 提供更智能的匹配算法，考虑用户在线时间、匹配历史等因素
+
+配对通过 heart_link_queue 中的原子队列完成，每次匹配只需常数次数据库往返；
+过期请求由后台线程定期清理，不再在请求处理中按概率触发。
 """
 
+import logging
 import random
+import threading
 from datetime import timedelta
+from statistics import median
+from typing import Optional
 
-from django.db import transaction
-from django.db.models import Q
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
 from django.utils import timezone
 
 from apps.tools.models import ChatRoom, HeartLinkRequest, UserOnlineStatus
 from apps.users.models import UserActivityLog
 
+from .heart_link_queue import BaseMatchQueue, create_match_queue, is_eligible
+
+logger = logging.getLogger(__name__)
+
+# 配对对象被抢走（已取消/过期）时最多重试的次数
+CLAIM_ATTEMPTS = 3
+
 
 class HeartLinkMatcher:
     """心动链接智能匹配器"""
 
-    def __init__(self):
+    def __init__(self, queue: Optional[BaseMatchQueue] = None, background_sweep: bool = True):
         self.max_wait_time = 10  # 最大等待时间（分钟）- 统一设置为10分钟
         self.min_online_time = 5  # 最小在线时间（分钟）
+        self.background_sweep = background_sweep
+        self._queue = queue
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
 
     def get_user_score(self, user):
         """计算用户匹配分数"""
@@ -51,47 +71,23 @@ class HeartLinkMatcher:
 
         return score
 
-    def find_best_match(self, current_user, current_request):
-        """找到最佳匹配对象"""
-        try:
-            # 查找可用的匹配对象，按等待时间排序
-            available_requests = (
-                HeartLinkRequest.objects.filter(
-                    status="pending",
-                    requester__is_staff=False,
-                    requester__is_superuser=False,
-                    requester__is_active=True,
-                )
-                .exclude(Q(requester=current_user))
-                .order_by("created_at")
-            )  # 优先匹配等待时间最长的
-
-            if not available_requests.exists():
-                return None
-
-            # 尝试匹配等待时间最长的用户
-            for available_request in available_requests:
-                try:
-                    # 使用乐观锁：尝试更新状态
-                    updated = HeartLinkRequest.objects.filter(id=available_request.id, status="pending").update(
-                        status="matching"
-                    )
-
-                    if updated > 0:
-                        # 更新成功，重新获取对象
-                        available_request.refresh_from_db()
-                        print(f"成功匹配用户: {available_request.requester.username}")
-                        return available_request
-
-                except Exception as e:
-                    print(f"匹配过程中出错: {str(e)}")
-                    continue
-
-            return None
+    @property
+    def queue(self) -> BaseMatchQueue:
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = create_match_queue()
+        return self._queue
 
-        except Exception as e:
-            print(f"查找匹配对象时出错: {str(e)}")
+    def find_best_match(self, current_user, current_request):
+        """在当前事务中原子地选出配对对象，返回对方的请求（已离开队列）"""
+        partner_id = self.queue.claim_partner(current_request)
+        if partner_id is None:
             return None
+        partner = HeartLinkRequest.objects.select_related("requester", "chat_room").filter(id=partner_id).first()
+        if partner is None:
+            raise _ClaimLost()
+        return partner
 
     def create_match(self, user1, user2):
         """创建匹配"""
@@ -103,107 +99,213 @@ class HeartLinkMatcher:
 
         return chat_room
 
-    def match_users(self, current_user, current_request):
-        """执行用户匹配"""
-        try:
-            # 使用更短的超时时间避免长时间锁定
-            with transaction.atomic():
-                # 找到最佳匹配
-                best_match_request = self.find_best_match(current_user, current_request)
-
-                if not best_match_request:
-                    print(f"用户 {current_user.username} 没有找到匹配对象")
-                    return None, None
+    def _complete_match(self, current_user, current_request, partner_request):
+        """用条件UPDATE确认双方仍在等待并写入匹配结果，任何一方已被处理则抛出 _ClaimLost"""
+        now = timezone.now()
+        partner_user = partner_request.requester
+
+        claimed = HeartLinkRequest.objects.filter(id=partner_request.id, status="pending").update(
+            status="matched", matched_with=current_user, matched_at=now
+        )
+        if not claimed:
+            raise _ClaimLost()
+        claimed = HeartLinkRequest.objects.filter(id=current_request.id, status="pending").update(
+            status="matched", matched_with=partner_user, matched_at=now
+        )
+        if not claimed:
+            raise _ClaimLost(own_lost=True)
+
+        # 优先使用对方的聊天室，如果没有则使用自己的，都没有则创建新的
+        if partner_request.chat_room:
+            chat_room = partner_request.chat_room
+            chat_room.user2 = current_user
+            chat_room.status = "active"
+            chat_room.save()
+        elif current_request.chat_room:
+            chat_room = current_request.chat_room
+            chat_room.user2 = partner_user
+            chat_room.status = "active"
+            chat_room.save()
+        else:
+            chat_room = self.create_match(current_user, partner_user)
+
+        HeartLinkRequest.objects.filter(id=current_request.id).update(chat_room=chat_room)
+        if not partner_request.chat_room:
+            HeartLinkRequest.objects.filter(id=partner_request.id).update(chat_room=chat_room)
+
+        for request, matched_with in ((current_request, partner_user), (partner_request, current_user)):
+            request.status = "matched"
+            request.matched_with = matched_with
+            request.matched_at = now
+        current_request.chat_room = chat_room
+        if not partner_request.chat_room:
+            partner_request.chat_room = chat_room
+        return chat_room
 
-                # 双重检查：确保对方请求状态为matching
-                best_match_request.refresh_from_db()
-                if best_match_request.status != "matching":
-                    print(f"用户 {best_match_request.requester.username} 的状态不是matching，可能是被其他用户匹配了")
-                    return None, None
+    def _requeue(self, *requests):
+        """把请求放回队列（按原创建时间排队），不能入队的请求跳过，队列出错时只记录日志"""
+        for request in requests:
+            if not is_eligible(request):
+                continue
+            try:
+                self.queue.requeue(request)
+            except Exception as e:
+                logger.error(f"请求 {request.id} 放回匹配队列失败: {e}")
 
-                # 优先使用对方的聊天室，如果没有则使用自己的，都没有则创建新的
-                chat_room = None
-                if best_match_request.chat_room:
-                    # 使用对方的聊天室
-                    chat_room = best_match_request.chat_room
-                    chat_room.user2 = current_user
-                    chat_room.status = "active"
-                    chat_room.save()
-                    print(f"使用对方聊天室: {chat_room.room_id}")
-                elif current_request.chat_room:
-                    # 使用自己的聊天室
-                    chat_room = current_request.chat_room
-                    chat_room.user2 = best_match_request.requester
-                    chat_room.status = "active"
-                    chat_room.save()
-                    print(f"使用自己聊天室: {chat_room.room_id}")
-                else:
-                    # 创建新的聊天室
-                    chat_room = self.create_match(current_user, best_match_request.requester)
-                    print(f"创建新聊天室: {chat_room.room_id}")
-
-                # 更新两个请求的状态
-                current_request.status = "matched"
-                current_request.matched_with = best_match_request.requester
-                current_request.matched_at = timezone.now()
-                current_request.chat_room = chat_room
-                current_request.save()
-
-                best_match_request.status = "matched"
-                best_match_request.matched_with = current_user
-                best_match_request.matched_at = timezone.now()
-                # 如果best_match_request没有聊天室，也使用同一个聊天室
-                if not best_match_request.chat_room:
-                    best_match_request.chat_room = chat_room
-                best_match_request.save()
-
-                print(f"匹配成功: {current_user.username} <-> {best_match_request.requester.username}")
-                return chat_room, best_match_request.requester
-
-        except Exception as e:
-            # 如果匹配失败，记录错误但不立即设为过期
-            print(f"匹配失败: {str(e)}")
-            # 保持pending状态，让用户有机会重试
-            # 只有在明确知道是致命错误时才设为过期
-            if "database is locked" in str(e).lower():
-                # 数据库锁定错误，保持pending状态，让用户重试
-                print("数据库锁定，保持pending状态")
-                return None, None
-            elif "duplicate key" in str(e).lower():
-                # 重复键错误，可能已经被匹配，设为过期
-                print("重复键错误，设为过期")
-                current_request.status = "expired"
-                current_request.save()
-                return None, None
-            else:
-                # 其他错误，保持pending状态，让用户重试
-                print("其他错误，保持pending状态")
+    def match_users(self, current_user, current_request):
+        """
+        执行用户匹配
+
+        配对对象由队列原子地选出，双方状态在同一事务中确认；对方已取消或过期时换下一个，
+        自己已被其他匹配者配对时直接返回（结果由状态查询接口获得）。
+        """
+        self.ensure_background_sweeper()
+
+        for _ in range(CLAIM_ATTEMPTS):
+            partner = None
+            try:
+                with transaction.atomic():
+                    partner = self.find_best_match(current_user, current_request)
+                    if partner is None:
+                        logger.debug(f"用户 {current_user.username} 进入等待队列")
+                        return None, None
+                    chat_room = self._complete_match(current_user, current_request, partner)
+            except _ClaimLost as e:
+                if e.own_lost:
+                    if partner is not None:
+                        self._requeue(partner)
+                    return None, None
+                continue
+            except Exception as e:
+                # 匹配失败时双方都保持pending；选出对方时双方都已离开队列，一起放回，让用户有机会重试
+                logger.warning(f"匹配失败: {e}")
+                if partner is not None:
+                    self._requeue(partner, current_request)
                 return None, None
 
-    def cleanup_expired_requests(self):
-        """清理过期的请求（10分钟）"""
-        expired_time = timezone.now() - timedelta(minutes=10)  # 统一设置为10分钟
-        expired_requests = HeartLinkRequest.objects.filter(status="pending", created_at__lt=expired_time)
+            logger.info(f"匹配成功: {current_user.username} <-> {partner.requester.username}")
+            return chat_room, partner.requester
+
+        return None, None
+
+    def pair_waiting(self, limit: int = 20) -> int:
+        """为仍在等待的请求两两配对（并发入队的请求可能互相错过），返回配对数"""
+        paired = 0
+        waiting = (
+            HeartLinkRequest.objects.filter(
+                status="pending",
+                created_at__gte=self._expire_cutoff(),
+                requester__is_staff=False,
+                requester__is_superuser=False,
+                requester__is_active=True,
+            )
+            .select_related("requester", "chat_room")
+            .order_by("created_at")[:limit]
+        )
+        for request in waiting:
+            if HeartLinkRequest.objects.filter(id=request.id, status="pending").exists():
+                chat_room, _ = self.match_users(request.requester, request)
+                if chat_room is None:
+                    break
+                paired += 1
+        return paired
+
+    def _expire_cutoff(self):
+        return timezone.now() - timedelta(minutes=self.max_wait_time)
+
+    def expire_stale_requests(self) -> int:
+        """过期等待超过 max_wait_time 的请求，返回过期数量"""
+        cutoff = self._expire_cutoff()
+        self.queue.discard_expired(cutoff)
+        # 一条UPDATE覆盖所有过期请求（包括未进入队列的），走 (status, created_at) 索引
+        return HeartLinkRequest.objects.filter(status="pending", created_at__lt=cutoff).update(status="expired")
 
-        for request in expired_requests:
-            request.status = "expired"
-            request.save()
+    def cleanup_expired_requests(self):
+        """清理过期的请求（10分钟），后台线程会定期执行"""
+        return self.expire_stale_requests()
+
+    def cancel_requests(self, request_ids):
+        """取消的请求移出队列"""
+        self.queue.remove(list(request_ids))
+
+    # ===== 后台清理 =====
+
+    def ensure_background_sweeper(self):
+        """确保后台清理线程在运行"""
+        if not self.background_sweep or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._stop_event.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="heart-link-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop_background_sweeper(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        sweeper = self._sweeper
+        if sweeper is not None:
+            sweeper.join(timeout)
+
+    def _sweep_loop(self):
+        interval = getattr(settings, "HEART_LINK_SWEEP_INTERVAL", 30)
+        while not self._stop_event.wait(interval):
+            try:
+                expired = self.expire_stale_requests()
+                paired = self.pair_waiting()
+                if expired or paired:
+                    logger.info(f"心动链接后台清理: 过期 {expired} 个请求，补充配对 {paired} 对")
+            except Exception as e:
+                logger.error(f"心动链接后台清理失败: {e}")
+            finally:
+                close_old_connections()
+
+    # ===== 统计 =====
+
+    def get_wait_metrics(self, window_minutes: int = 60, sample_size: int = 500):
+        """队列深度、最近匹配的等待时间中位数和当前最久的等待时间（秒）"""
+        now = timezone.now()
+        recent = HeartLinkRequest.objects.filter(
+            status="matched", matched_at__gte=now - timedelta(minutes=window_minutes)
+        ).order_by("-matched_at")[:sample_size]
+        waits = [(matched - created).total_seconds() for created, matched in recent.values_list("created_at", "matched_at")]
+
+        oldest = (
+            HeartLinkRequest.objects.filter(status="pending", created_at__gte=self._expire_cutoff())
+            .order_by("created_at")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        return {
+            "queue_depth": self.queue.depth(),
+            "median_wait_seconds": round(median(waits), 1) if waits else None,
+            "oldest_wait_seconds": round((now - oldest).total_seconds(), 1) if oldest else 0,
+            "sample_size": len(waits),
+        }
 
     def get_matching_stats(self):
         """获取匹配统计信息"""
-        total_requests = HeartLinkRequest.objects.count()
-        matched_requests = HeartLinkRequest.objects.filter(status="matched").count()
-        pending_requests = HeartLinkRequest.objects.filter(status="pending").count()
-        expired_requests = HeartLinkRequest.objects.filter(status="expired").count()
+        counts = dict(HeartLinkRequest.objects.values_list("status").annotate(total=Count("id")).order_by())
+        total_requests = sum(counts.values())
+        matched_requests = counts.get("matched", 0)
 
         return {
             "total": total_requests,
             "matched": matched_requests,
-            "pending": pending_requests,
-            "expired": expired_requests,
+            "pending": counts.get("pending", 0),
+            "expired": counts.get("expired", 0),
             "match_rate": (matched_requests / total_requests * 100) if total_requests > 0 else 0,
+            **self.get_wait_metrics(),
         }
 
 
+class _ClaimLost(Exception):
+    """配对对象或自己已不再等待，回滚本次配对"""
+
+    def __init__(self, own_lost: bool = False):
+        super().__init__()
+        self.own_lost = own_lost
+
+
 # 全局匹配器实例
 matcher = HeartLinkMatcher()
@@ -0,0 +1,195 @@
+"""
+心动链接匹配队列
+
+等待匹配的请求组成一个按入队时间排序的队列，配对在一个原子步骤中完成：
+- RedisMatchQueue：ZSET（分数为请求创建时间），Lua脚本一次完成"找到最早的其他用户并把双方移出队列"，
+  找不到时把自己加入队列；并发的匹配者不会拿到同一个等待者。
+- DatabaseMatchQueue：直接以 pending 状态的 HeartLinkRequest 行作为队列。支持 SKIP LOCKED 的数据库
+  （PostgreSQL/MySQL 8）先锁住自己的行，再锁最早的可用对象，被其他事务锁住的行直接跳过；
+  其他数据库（SQLite 写事务本身串行）只取最早的对象，由调用方的条件UPDATE保证不会重复匹配。
+
+队列只负责选出配对对象，请求状态仍以数据库为准；调用方在同一事务中用条件UPDATE确认双方仍为 pending。
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# 每次配对最多检查的队首成员数（正常情况下每个用户只有一个等待中的请求）
+SCAN_LIMIT = 32
+# 每轮最多清理的过期成员数
+EXPIRE_BATCH = 500
+
+# KEYS[1]=队列  ARGV: 自己的成员, 自己的用户ID, 入队分数, 扫描数量, 未配对时是否入队(1/0)
+POP_PAIR_SCRIPT = """
+local candidates = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[4]) - 1)
+for _, member in ipairs(candidates) do
+  if member ~= ARGV[1] then
+    local sep = string.find(member, ':', 1, true)
+    if sep and string.sub(member, sep + 1) ~= ARGV[2] then
+      redis.call('ZREM', KEYS[1], member, ARGV[1])
+      return member
+    end
+  end
+end
+if ARGV[5] == '1' then
+  redis.call('ZADD', KEYS[1], 'NX', ARGV[3], ARGV[1])
+end
+return false
+"""
+
+# KEYS[1]=队列  ARGV: 截止分数, 数量上限
+POP_EXPIRED_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #expired > 0 then
+  redis.call('ZREM', KEYS[1], unpack(expired))
+end
+return expired
+"""
+
+
+def is_eligible(request) -> bool:
+    """只有正常用户的请求可以被匹配（与原有的筛选条件一致）"""
+    user = request.requester
+    return user.is_active and not user.is_staff and not user.is_superuser
+
+
+def queue_member(request_id: int, user_id: int) -> str:
+    return f"{request_id}:{user_id}"
+
+
+def parse_member(member) -> int:
+    """成员格式为 请求ID:用户ID，返回请求ID"""
+    if isinstance(member, bytes):
+        member = member.decode()
+    return int(member.split(":", 1)[0])
+
+
+class BaseMatchQueue:
+    """匹配队列基类"""
+
+    def claim_partner(self, request) -> Optional[int]:
+        """
+        为 request 原子地选出一个配对对象（其他用户、等待最久），返回对方的请求ID
+
+        选中的对象和 request 自己都离开队列；没有可配对的对象时 request 留在队列中等待。
+        需要在调用方的事务中执行。
+        """
+        raise NotImplementedError
+
+    def requeue(self, request) -> None:
+        """配对未能完成时把对方放回队列（保持原来的排队位置）"""
+
+    def remove(self, request_ids: List[int]) -> None:
+        """取消的请求移出队列"""
+
+    def discard_expired(self, cutoff: datetime) -> List[int]:
+        """移出入队时间早于 cutoff 的成员，返回请求ID"""
+        return []
+
+    def depth(self) -> int:
+        raise NotImplementedError
+
+
+class DatabaseMatchQueue(BaseMatchQueue):
+    """以 pending 状态的请求行作为队列"""
+
+    def _waiting(self):
+        from ..models import HeartLinkRequest
+
+        return HeartLinkRequest.objects.filter(
+            status="pending",
+            requester__is_staff=False,
+            requester__is_superuser=False,
+            requester__is_active=True,
+        )
+
+    def claim_partner(self, request) -> Optional[int]:
+        from ..models import HeartLinkRequest
+
+        candidates = self._waiting().exclude(requester_id=request.requester_id).order_by("created_at")
+        if connection.features.has_select_for_update_skip_locked:
+            # 自己的行被锁住说明另一个匹配者正在和自己配对
+            own = HeartLinkRequest.objects.select_for_update(skip_locked=True).filter(id=request.id, status="pending")
+            if not own.exists():
+                return None
+            candidates = candidates.select_for_update(skip_locked=True, of=("self",))
+        return candidates.values_list("id", flat=True).first()
+
+    def depth(self) -> int:
+        return self._waiting().count()
+
+
+class RedisMatchQueue(BaseMatchQueue):
+    """基于Redis ZSET和Lua脚本的匹配队列"""
+
+    def __init__(self, client, key: str = "heart_link:queue"):
+        self.client = client
+        self.key = key
+        self._pop_pair = client.register_script(POP_PAIR_SCRIPT)
+        self._pop_expired = client.register_script(POP_EXPIRED_SCRIPT)
+
+    def claim_partner(self, request) -> Optional[int]:
+        member = self._pop_pair(
+            keys=[self.key],
+            args=[
+                queue_member(request.id, request.requester_id),
+                request.requester_id,
+                request.created_at.timestamp(),
+                SCAN_LIMIT,
+                1 if is_eligible(request) else 0,
+            ],
+        )
+        return parse_member(member) if member else None
+
+    def requeue(self, request) -> None:
+        self.client.zadd(self.key, {queue_member(request.id, request.requester_id): request.created_at.timestamp()})
+
+    def remove(self, request_ids: List[int]) -> None:
+        if not request_ids:
+            return
+        wanted = {str(request_id) for request_id in request_ids}
+        # 成员里带着用户ID，按请求ID前缀找到后删除
+        members = [m for m in self.client.zrange(self.key, 0, -1) if str(parse_member(m)) in wanted]
+        if members:
+            self.client.zrem(self.key, *members)
+
+    def discard_expired(self, cutoff: datetime) -> List[int]:
+        members = self._pop_expired(keys=[self.key], args=[cutoff.timestamp(), EXPIRE_BATCH])
+        return [parse_member(member) for member in members]
+
+    def depth(self) -> int:
+        return self.client.zcard(self.key)
+
+
+def create_match_queue() -> BaseMatchQueue:
+    """
+    根据配置创建匹配队列
+
+    HEART_LINK_QUEUE_BACKEND: auto(默认) / redis / database
+    auto模式下Redis可用时使用Redis，否则使用数据库
+    """
+    backend = getattr(settings, "HEART_LINK_QUEUE_BACKEND", "auto")
+    redis_url = getattr(settings, "HEART_LINK_REDIS_URL", None) or os.environ.get("REDIS_URL")
+
+    if backend in ("auto", "redis") and redis_url:
+        try:
+            import redis
+
+            client = redis.from_url(redis_url, socket_connect_timeout=2, socket_timeout=5)
+            client.ping()
+            logger.info("心动链接匹配队列使用Redis后端")
+            return RedisMatchQueue(client)
+        except Exception as e:
+            if backend == "redis":
+                raise
+            logger.warning(f"Redis不可用，心动链接匹配队列使用数据库: {e}")
+
+    logger.info("心动链接匹配队列使用数据库后端")
+    return DatabaseMatchQueue()
@@ -0,0 +1,248 @@
+"""
+大模型响应缓存
+
+很多AI功能的提示词高度重复（热门城市的旅游攻略、常见身材的饮食计划、目的地基本信息等），
+缓存放在 llm_gateway 前面，命中时不再请求DeepSeek：
+- 键：规范化后的消息（合并空白）+ 模型 + 调用参数的SHA-256，按功能分前缀
+- 过期时间按功能分档（TTL_TIERS），没有配置策略的功能（故事、对话等需要每次不同结果的）不缓存，
+  单次调用也可以用 cache=False 跳过
+- 存储：Redis可用时存Redis，否则存本地磁盘（复用 ConversionCache 的按最近使用淘汰）
+- 命中、未命中、跳过次数和节省的token数记录在Django缓存中，多进程共享
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from django.conf import settings
+from django.core.cache import cache
+
+from utils.redis_client import get_redis_client
+
+from .conversion_cache import ConversionCache
+
+logger = logging.getLogger(__name__)
+
+# 键的组成方式或响应格式发生不兼容变化时递增，使旧缓存自然失效
+CACHE_FORMAT_VERSION = 1
+
+KEY_PREFIX = "llm_cache"
+STATS_KEY_PREFIX = "llm_cache_stats"
+STAT_NAMES = ("hits", "misses", "bypasses", "stores", "tokens_saved")
+
+TTL_TIERS = {
+    "hourly": 60 * 60,
+    "daily": 24 * 60 * 60,
+    "weekly": 7 * 24 * 60 * 60,
+    "monthly": 30 * 24 * 60 * 60,
+}
+
+# 默认缓存策略：功能名 -> 过期档位或秒数
+DEFAULT_POLICIES = {
+    "tarot": "daily",
+    "travel": "weekly",
+    "content": "weekly",
+    "nutrition": "weekly",
+    "destination_info": "monthly",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """合并连续空白并去掉首尾空白，缩进和换行不同的相同提示词得到同一个键"""
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def resolve_ttl(value: Union[str, int, None]) -> int:
+    """把档位名或秒数转换为秒数，无法识别时返回0（不缓存）"""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return max(0, value)
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    return TTL_TIERS.get(value, 0)
+
+
+def parse_cache_policies(value: Union[str, Dict[str, Any], None]) -> Dict[str, int]:
+    """
+    解析缓存策略，支持字典或 "travel=weekly,tarot=3600,chat=off" 格式的字符串
+
+    配置在默认策略之上合并，值为0或 off 时关闭该功能的缓存。
+    """
+    policies = {feature: resolve_ttl(tier) for feature, tier in DEFAULT_POLICIES.items()}
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = [item.partition("=")[::2] for item in (value or "").split(",") if "=" in item]
+    for feature, tier in items:
+        if str(feature).strip():
+            policies[str(feature).strip()] = resolve_ttl(tier)
+    return {feature: ttl for feature, ttl in policies.items() if ttl > 0}
+
+
+class LLMResponseCache:
+    """大模型响应缓存，进程内共享一个实例（llm_cache）"""
+
+    def __init__(
+        self,
+        policies: Union[str, Dict[str, Any], None] = None,
+        redis_client=None,
+        disk: Optional[ConversionCache] = None,
+        stats_prefix: str = STATS_KEY_PREFIX,
+    ):
+        self._policies = policies
+        self._redis_client = redis_client
+        self._disk = disk
+        self.stats_prefix = stats_prefix
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, "LLM_CACHE_ENABLED", True)
+
+    @property
+    def policies(self) -> Dict[str, int]:
+        value = self._policies if self._policies is not None else getattr(settings, "LLM_CACHE_POLICIES", "")
+        return parse_cache_policies(value)
+
+    @property
+    def disk(self) -> ConversionCache:
+        if self._disk is None:
+            root = getattr(settings, "LLM_CACHE_DIR", None) or os.path.join(str(settings.BASE_DIR), "llm_cache")
+            max_bytes = getattr(settings, "LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+            self._disk = ConversionCache(root=root, max_bytes=max_bytes, stats_prefix=f"{self.stats_prefix}:disk")
+        return self._disk
+
+    def _redis(self):
+        return self._redis_client or get_redis_client()
+
+    def ttl_for(self, feature: str) -> int:
+        """功能的缓存时间（秒），0表示不缓存"""
+        if not self.enabled:
+            return 0
+        return self.policies.get(feature, 0)
+
+    @staticmethod
+    def make_key(feature: str, model: str, messages: List[dict], params: Dict[str, Any]) -> str:
+        """按规范化的消息、模型和参数生成缓存键"""
+        normalized = [[m.get("role", ""), normalize_text(str(m.get("content", "")))] for m in messages]
+        raw_key = json.dumps(
+            [CACHE_FORMAT_VERSION, model, normalized, params], sort_keys=True, ensure_ascii=False, default=str
+        )
+        return f"{KEY_PREFIX}:{feature}:{hashlib.sha256(raw_key.encode('utf-8')).hexdigest()}"
+
+    # ===== 读写 =====
+
+    def _load(self, key: str) -> Optional[dict]:
+        client = self._redis()
+        if client is not None:
+            try:
+                raw = client.get(key)
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"读取Redis响应缓存失败，改用磁盘缓存: {e}")
+
+        disk_key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        if not self.disk.contains(disk_key):
+            return None
+        meta = self.disk.get(disk_key)
+        if meta is None or meta.get("expires_at", 0) < time.time():
+            return None
+        try:
+            with open(meta["path"], "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key: str, response: dict, ttl: int) -> bool:
+        data = json.dumps(response, ensure_ascii=False)
+        client = self._redis()
+        if client is not None:
+            try:
+                client.set(key, data, ex=ttl)
+                return True
+            except Exception as e:
+                logger.warning(f"写入Redis响应缓存失败，改用磁盘缓存: {e}")
+
+        disk_key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.disk.put(disk_key, data.encode("utf-8"), meta={"expires_at": time.time() + ttl})
+
+    def get(self, feature: str, key: str) -> Optional[dict]:
+        """查询缓存，命中时返回缓存的响应JSON并计入节省的token"""
+        response = self._load(key)
+        if response is None:
+            self._incr_stat(feature, "misses")
+            return None
+        self._incr_stat(feature, "hits")
+        self._incr_stat(feature, "tokens_saved", int((response.get("usage") or {}).get("total_tokens") or 0))
+        return response
+
+    def set(self, feature: str, key: str, response: dict, ttl: int):
+        if self._save(key, response, ttl):
+            self._incr_stat(feature, "stores")
+
+    def record_bypass(self, feature: str):
+        """记录一次主动跳过缓存的调用"""
+        self._incr_stat(feature, "bypasses")
+
+    def clear(self, feature: Optional[str] = None) -> int:
+        """清除缓存（可只清除一个功能），返回删除的Redis键数量；磁盘缓存只能整体清除"""
+        deleted = 0
+        client = self._redis()
+        if client is not None:
+            try:
+                keys = list(client.scan_iter(match=f"{KEY_PREFIX}:{feature or '*'}:*", count=500))
+                if keys:
+                    deleted = client.delete(*keys)
+            except Exception as e:
+                logger.warning(f"清除Redis响应缓存失败: {e}")
+        if feature is None:
+            self.disk.clear()
+        return deleted
+
+    # ===== 统计 =====
+
+    def _incr_stat(self, feature: str, name: str, delta: int = 1):
+        if not delta:
+            return
+        for key in (f"{self.stats_prefix}:{name}", f"{self.stats_prefix}:{feature}:{name}"):
+            try:
+                cache.add(key, 0, None)
+                cache.incr(key, delta)
+            except Exception as e:
+                logger.debug(f"更新响应缓存统计失败: {e}")
+
+    @staticmethod
+    def _summarize(values: Dict[str, int]) -> Dict[str, Any]:
+        stats = {name: values.get(name, 0) for name in STAT_NAMES}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        """总的和按功能的命中率、跳过次数和节省的token数"""
+        policies = self.policies
+        scopes = [""] + [f"{feature}:" for feature in policies]
+        keys = [f"{self.stats_prefix}:{scope}{name}" for scope in scopes for name in STAT_NAMES]
+        values = cache.get_many(keys)
+
+        def scoped(scope):
+            return {name: values.get(f"{self.stats_prefix}:{scope}{name}", 0) for name in STAT_NAMES}
+
+        stats = self._summarize(scoped(""))
+        stats["enabled"] = self.enabled
+        stats["backend"] = "redis" if self._redis() is not None else "disk"
+        stats["features"] = {
+            feature: {**self._summarize(scoped(f"{feature}:")), "ttl": ttl} for feature, ttl in policies.items()
+        }
+        return stats
+
+
+# 全局响应缓存实例
+llm_cache = LLMResponseCache()
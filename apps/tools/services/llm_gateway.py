@@ -0,0 +1,612 @@
+"""
+大模型调用网关
+
+所有 DeepSeek chat/completions 调用统一经过这里：
+- 进程内共享一个带连接池的 requests.Session，复用TCP/TLS连接（keep-alive）
+- 全局并发上限 + 按功能（feature）的并发上限，避免某个功能占满所有连接
+- 令牌桶限速，Redis可用时多个进程共享同一个桶（Lua脚本原子扣减），否则使用进程内的桶
+- 统一的重试/退避：超时、连接错误、429和5xx重试，遵守 Retry-After，总耗时不超过截止时间
+- 截止时间可以通过 deadline_scope 向下传递，嵌套调用共享同一个时间预算
+- 按功能统计调用次数、错误、重试、token用量和延迟分布
+- 调用前先查响应缓存（llm_cache），按功能配置的过期时间缓存成功的响应
+- stream_chat 以 stream=true 调用，边接收边产出回复文本
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Union
+
+from django.conf import settings
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics_aggregator import histogram_percentile, latency_bucket
+from utils.redis_client import get_redis_client
+
+from .llm_cache import LLMResponseCache, llm_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+CONNECT_TIMEOUT = 5
+# 退避时间：BACKOFF_BASE * 2^n 秒（加随机抖动），单次不超过 BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 10.0
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+COUNTER_FIELDS = ("calls", "errors", "timeouts", "retries") + TOKEN_FIELDS
+
+# KEYS[1]=桶  ARGV: 每秒补充的令牌数, 桶容量
+# 取到令牌返回"0"，否则返回还需等待的秒数（用字符串返回，避免Lua数字被截断为整数）
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class LLMGatewayError(Exception):
+    """大模型调用失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = False, body: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.body = body
+
+
+class LLMTimeoutError(LLMGatewayError):
+    """在截止时间内未能完成调用（请求超时、等待并发额度或限速令牌超时）"""
+
+    def __init__(self, message: str):
+        super().__init__(message, retryable=True)
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """
+    在代码块内设置调用截止时间，块内所有网关调用（包括嵌套的服务方法）共享这段时间预算
+
+    已有更早的截止时间时保持不变。
+    """
+    deadline = time.monotonic() + seconds
+    outer = _current_deadline.get()
+    token = _current_deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    """当前上下文的截止时间（time.monotonic()），没有则为None"""
+    return _current_deadline.get()
+
+
+def parse_feature_limits(value: Union[str, Dict[str, int], None]) -> Dict[str, int]:
+    """解析按功能的并发上限，支持字典或 "travel=4,douyin=2" 格式的字符串"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {str(name): int(limit) for name, limit in value.items()}
+    limits = {}
+    for item in value.split(","):
+        name, sep, limit = item.partition("=")
+        if sep and name.strip() and limit.strip().isdigit():
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """解析 Retry-After 响应头（只支持秒数格式）"""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第 attempt 次重试前的等待时间：指数退避加随机抖动，服务端要求的等待时间优先"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.0)  # nosec B311
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_completion(response) -> dict:
+    """校验200响应包含回复文本，返回响应JSON"""
+    try:
+        result = response.json()
+        if isinstance(result["choices"][0]["message"]["content"], str):
+            return result
+    except (ValueError, KeyError, IndexError, TypeError):
+        pass
+    raise LLMGatewayError("API响应格式错误", status_code=response.status_code, body=response.text[:500])
+
+
+def iter_stream_chunks(response) -> Iterator[dict]:
+    """逐个解析 stream=true 响应（SSE）中的JSON数据块，遇到 [DONE] 结束"""
+    for line in response.iter_lines():
+        if not line or not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            logger.debug(f"忽略无法解析的流式数据块: {data[:200]!r}")
+
+
+def request_error(e: requests.exceptions.RequestException) -> LLMGatewayError:
+    """把 requests 异常转换为网关错误，超时和连接错误可重试"""
+    if isinstance(e, requests.exceptions.Timeout):
+        return LLMTimeoutError("请求超时")
+    if isinstance(e, requests.exceptions.ConnectionError):
+        return LLMGatewayError(f"网络连接错误: {e}", retryable=True)
+    return LLMGatewayError(f"网络请求失败: {e}")
+
+
+def status_error(response) -> LLMGatewayError:
+    """非200响应对应的网关错误，429和5xx可重试"""
+    return LLMGatewayError(
+        f"API调用失败: {response.status_code}",
+        status_code=response.status_code,
+        retryable=response.status_code in RETRYABLE_STATUS,
+        body=response.text[:500],
+    )
+
+
+class LocalTokenBucket:
+    """进程内令牌桶"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """取到令牌返回0，否则返回还需等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class RedisTokenBucket:
+    """多个进程共享的令牌桶，时间取Redis服务器时间，各进程时钟不一致也不影响"""
+
+    def __init__(self, client, key: str, rate_per_second: float, capacity: float):
+        self.key = key
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self) -> float:
+        wait = self._script(keys=[self.key], args=[self.rate, self.capacity])
+        return float(wait.decode() if isinstance(wait, bytes) else wait)
+
+
+def _new_feature_stats():
+    stats = {field: 0 for field in COUNTER_FIELDS}
+    stats["total_time"] = 0.0
+    stats["buckets"] = defaultdict(int)
+    return stats
+
+
+class LLMGateway:
+    """大模型调用网关，进程内共享一个实例（llm_gateway）"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        feature_concurrency: Union[str, Dict[str, int], None] = None,
+        rate_limit_per_minute: Optional[float] = None,
+        rate_limit_burst: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+        pool_size: Optional[int] = None,
+        redis_client=None,
+        response_cache: Optional[LLMResponseCache] = None,
+    ):
+        self.base_url = (base_url or getattr(settings, "LLM_API_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.max_concurrency = max_concurrency or getattr(settings, "LLM_MAX_CONCURRENCY", 8)
+        self.feature_limits = parse_feature_limits(
+            feature_concurrency if feature_concurrency is not None else getattr(settings, "LLM_FEATURE_CONCURRENCY", "")
+        )
+        self.rate_limit_per_minute = (
+            rate_limit_per_minute if rate_limit_per_minute is not None else getattr(settings, "LLM_RATE_LIMIT_PER_MINUTE", 120)
+        )
+        self.rate_limit_burst = rate_limit_burst or getattr(settings, "LLM_RATE_LIMIT_BURST", 10)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, "LLM_MAX_RETRIES", 2)
+        self.timeout = timeout or getattr(settings, "LLM_TIMEOUT", 60)
+        self.pool_size = pool_size or getattr(settings, "LLM_POOL_SIZE", self.max_concurrency)
+
+        self.response_cache = response_cache or llm_cache
+        self._redis_client = redis_client
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._global_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._feature_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._bucket = None
+        self._local_bucket = None
+        self._stats: Dict[str, dict] = defaultdict(_new_feature_stats)
+        self._stats_lock = threading.Lock()
+
+    # ===== 连接和限流资源 =====
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({"Content-Type": "application/json"})
+                    self._session = session
+        return self._session
+
+    def _feature_semaphore(self, feature: str) -> Optional[threading.BoundedSemaphore]:
+        limit = self.feature_limits.get(feature)
+        if not limit:
+            return None
+        with self._lock:
+            if feature not in self._feature_slots:
+                self._feature_slots[feature] = threading.BoundedSemaphore(limit)
+            return self._feature_slots[feature]
+
+    def _get_bucket(self):
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    rate = self.rate_limit_per_minute / 60.0
+                    self._local_bucket = LocalTokenBucket(rate, self.rate_limit_burst)
+                    client = self._redis_client or get_redis_client()
+                    if client is not None:
+                        try:
+                            self._bucket = RedisTokenBucket(client, "llm_gateway:bucket", rate, self.rate_limit_burst)
+                        except Exception as e:
+                            logger.warning(f"Redis令牌桶不可用，使用进程内限速: {e}")
+                    if self._bucket is None:
+                        self._bucket = self._local_bucket
+        return self._bucket
+
+    def _acquire_rate_token(self, deadline: float):
+        if not self.rate_limit_per_minute:
+            return
+        bucket = self._get_bucket()
+        while True:
+            try:
+                wait = bucket.try_acquire()
+            except Exception as e:
+                # Redis临时故障时退回进程内的桶，不让限速把调用挡住
+                logger.warning(f"Redis令牌桶调用失败，使用进程内限速: {e}")
+                bucket = self._local_bucket
+                wait = bucket.try_acquire()
+            if wait <= 0:
+                return
+            if time.monotonic() + wait >= deadline:
+                raise LLMTimeoutError("等待限速令牌超过截止时间")
+            time.sleep(wait)
+
+    @staticmethod
+    def _acquire_slot(semaphore, deadline: float, name: str):
+        if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMTimeoutError(f"等待{name}并发额度超过截止时间")
+
+    # ===== 调用 =====
+
+    def _resolve_deadline(self, timeout: Optional[float], deadline: Optional[float]) -> float:
+        candidates = [time.monotonic() + (timeout or self.timeout)]
+        if deadline is not None:
+            candidates.append(deadline)
+        if _current_deadline.get() is not None:
+            candidates.append(_current_deadline.get())
+        return min(candidates)
+
+    @contextmanager
+    def _slots(self, feature: str, deadline: float):
+        """占用全局和功能的并发额度，直到代码块结束"""
+        feature_slots = self._feature_semaphore(feature)
+        self._acquire_slot(self._global_slots, deadline, "全局")
+        try:
+            if feature_slots is not None:
+                self._acquire_slot(feature_slots, deadline, f"功能[{feature}]")
+            try:
+                yield
+            finally:
+                if feature_slots is not None:
+                    feature_slots.release()
+        finally:
+            self._global_slots.release()
+
+    def _post(self, payload: dict, api_key: str, deadline: float, stream: bool = False) -> requests.Response:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError("调用超过截止时间")
+        return self.session.post(
+            f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=payload,
+            timeout=(min(CONNECT_TIMEOUT, remaining), remaining),
+            stream=stream,
+        )
+
+    def _send(self, payload: dict, api_key: str, feature: str, deadline: float) -> requests.Response:
+        """在并发额度内发出一次请求"""
+        with self._slots(feature, deadline):
+            return self._post(payload, api_key, deadline)
+
+    @staticmethod
+    def _resolve_api_key(api_key: Optional[str]) -> str:
+        api_key = api_key or getattr(settings, "DEEPSEEK_API_KEY", None) or os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise LLMGatewayError("DeepSeek API密钥未配置")
+        return api_key
+
+    def _lookup_cache(self, feature: str, model: str, messages: List[dict], params: dict, cache: bool):
+        """返回 (缓存键, 过期时间, 缓存的响应)；不缓存的功能或跳过缓存时缓存键为None"""
+        cache_ttl = self.response_cache.ttl_for(feature)
+        if cache_ttl and not cache:
+            self.response_cache.record_bypass(feature)
+        elif cache_ttl:
+            cache_key = self.response_cache.make_key(feature, model, messages, params)
+            return cache_key, cache_ttl, self.response_cache.get(feature, cache_key)
+        return None, 0, None
+
+    def _store_cache(self, feature: str, cache_key: Optional[str], result: dict, cache_ttl: int):
+        # 被截断（finish_reason=length）或过滤的回复不缓存
+        if cache_key is not None and result["choices"][0].get("finish_reason") in (None, "stop"):
+            self.response_cache.set(feature, cache_key, result, cache_ttl)
+
+    def _retry_delay(self, feature: str, error: LLMGatewayError, attempt: int, max_retries: int, response, deadline: float):
+        """可以重试时返回退避时间（秒），否则返回None"""
+        if not error.retryable or attempt >= max_retries:
+            return None
+        delay = backoff_delay(attempt, retry_after_seconds(response))
+        if time.monotonic() + delay >= deadline:
+            return None
+        logger.info(f"LLM调用[{feature}]第{attempt + 1}次失败（{error}），{delay:.1f}秒后重试")
+        return delay
+
+    def chat(
+        self,
+        messages: List[dict],
+        feature: str = "default",
+        model: str = "deepseek-chat",
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        api_key: Optional[str] = None,
+        cache: bool = True,
+        **params,
+    ) -> dict:
+        """
+        调用 chat/completions，返回完整的响应JSON
+
+        :param feature: 功能名，用于按功能限制并发和统计
+        :param timeout: 本次调用（包括重试和排队）的总时间预算（秒），默认 LLM_TIMEOUT
+        :param deadline: 绝对截止时间（time.monotonic()），与 timeout、deadline_scope 取最早者
+        :param cache: 为False时跳过响应缓存（例如用户要求重新生成）
+        :param params: 透传给接口的其他参数（temperature、max_tokens等）
+        :raises LLMTimeoutError: 截止时间内未完成
+        :raises LLMGatewayError: 接口返回错误或响应格式不正确
+        """
+        api_key = self._resolve_api_key(api_key)
+        cache_key, cache_ttl, cached = self._lookup_cache(feature, model, messages, params, cache)
+        if cached is not None:
+            return cached
+
+        deadline = self._resolve_deadline(timeout, deadline)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        payload = {"model": model, "messages": messages, **params}
+
+        started = time.monotonic()
+        retries = 0
+        error: Optional[LLMGatewayError] = None
+        result = None
+        for attempt in range(max_retries + 1):
+            response = None
+            try:
+                self._acquire_rate_token(deadline)
+                response = self._send(payload, api_key, feature, deadline)
+            except LLMTimeoutError as e:
+                error = e
+                break
+            except requests.exceptions.RequestException as e:
+                error = request_error(e)
+            else:
+                if response.status_code == 200:
+                    try:
+                        result = parse_completion(response)
+                    except LLMGatewayError as e:
+                        error = e
+                    break
+                error = status_error(response)
+
+            delay = self._retry_delay(feature, error, attempt, max_retries, response, deadline)
+            if delay is None:
+                break
+            retries += 1
+            time.sleep(delay)
+
+        self._record(feature, time.monotonic() - started, retries, result, error if result is None else None)
+        if result is None:
+            logger.warning(f"LLM调用[{feature}]失败: {error}")
+            raise error
+        self._store_cache(feature, cache_key, result, cache_ttl)
+        return result
+
+    def stream_chat(
+        self,
+        messages: List[dict],
+        feature: str = "default",
+        model: str = "deepseek-chat",
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        api_key: Optional[str] = None,
+        cache: bool = True,
+        **params,
+    ) -> Iterator[str]:
+        """
+        以 stream=true 调用 chat/completions，边接收边产出回复文本片段
+
+        参数、限速、并发额度和截止时间与 chat 相同；并发额度一直占用到流结束（或调用方停止迭代）。
+        只在收到第一个片段之前重试，之后的失败直接抛出。完整回复按 chat 的响应格式写入响应缓存，
+        缓存命中时一次产出全部内容。
+        """
+        api_key = self._resolve_api_key(api_key)
+        cache_key, cache_ttl, cached = self._lookup_cache(feature, model, messages, params, cache)
+        if cached is not None:
+            yield cached["choices"][0]["message"]["content"]
+            return
+
+        deadline = self._resolve_deadline(timeout, deadline)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        payload = {"model": model, "messages": messages, **params, "stream": True, "stream_options": {"include_usage": True}}
+
+        started = time.monotonic()
+        retries = 0
+        error: Optional[LLMGatewayError] = None
+        parts: List[str] = []
+        usage: dict = {}
+        finish_reason = None
+        for attempt in range(max_retries + 1):
+            response = None
+            error = None
+            try:
+                self._acquire_rate_token(deadline)
+                with self._slots(feature, deadline):
+                    response = self._post(payload, api_key, deadline, stream=True)
+                    if response.status_code != 200:
+                        error = status_error(response)
+                    else:
+                        for chunk in iter_stream_chunks(response):
+                            if time.monotonic() >= deadline:
+                                raise LLMTimeoutError("流式响应超过截止时间")
+                            usage = chunk.get("usage") or usage
+                            for choice in chunk.get("choices") or []:
+                                finish_reason = choice.get("finish_reason") or finish_reason
+                                text = (choice.get("delta") or {}).get("content")
+                                if text:
+                                    parts.append(text)
+                                    yield text
+            except LLMTimeoutError as e:
+                error = e
+                break
+            except requests.exceptions.RequestException as e:
+                error = request_error(e)
+            finally:
+                if response is not None:
+                    response.close()
+
+            # 已经产出内容后不能重试，否则调用方会收到重复的文本
+            if error is None or parts:
+                break
+            delay = self._retry_delay(feature, error, attempt, max_retries, response, deadline)
+            if delay is None:
+                break
+            retries += 1
+            time.sleep(delay)
+
+        result = None
+        if error is None:
+            result = {
+                "choices": [{"message": {"role": "assistant", "content": "".join(parts)}, "finish_reason": finish_reason}],
+                "usage": usage,
+            }
+        self._record(feature, time.monotonic() - started, retries, result, error)
+        if error is not None:
+            logger.warning(f"LLM流式调用[{feature}]失败: {error}")
+            raise error
+        self._store_cache(feature, cache_key, result, cache_ttl)
+
+    def reply(self, messages: List[dict], **kwargs) -> str:
+        """调用 chat 并返回回复文本"""
+        return self.chat(messages, **kwargs)["choices"][0]["message"]["content"]
+
+    def complete(self, prompt: str, system: Optional[str] = None, **kwargs) -> str:
+        """单轮对话，返回回复文本；参数同 chat"""
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return self.reply(messages, **kwargs)
+
+    # ===== 统计 =====
+
+    def _record(self, feature: str, elapsed: float, retries: int, result: Optional[dict], error):
+        usage = (result or {}).get("usage") or {}
+        with self._stats_lock:
+            stats = self._stats[feature]
+            stats["calls"] += 1
+            stats["retries"] += retries
+            stats["total_time"] += elapsed
+            stats["buckets"][latency_bucket(elapsed * 1000)] += 1
+            if error is not None:
+                stats["errors"] += 1
+                if isinstance(error, LLMTimeoutError):
+                    stats["timeouts"] += 1
+            for field in TOKEN_FIELDS:
+                stats[field] += int(usage.get(field) or 0)
+        logger.info(
+            f"LLM调用[{feature}] 耗时{elapsed:.2f}s 重试{retries}次 "
+            f"tokens={usage.get('prompt_tokens', 0)}/{usage.get('completion_tokens', 0)} "
+            f"{'失败' if error is not None else '成功'}"
+        )
+
+    def get_metrics(self) -> Dict[str, dict]:
+        """按功能汇总的调用统计（时间单位：秒）"""
+        with self._stats_lock:
+            snapshot = {feature: {**stats, "buckets": dict(stats["buckets"])} for feature, stats in self._stats.items()}
+        metrics = {}
+        for feature, stats in snapshot.items():
+            calls = stats["calls"]
+            metrics[feature] = {
+                **{field: stats[field] for field in COUNTER_FIELDS},
+                "avg_time": stats["total_time"] / calls if calls else 0,
+                "p50": histogram_percentile(stats["buckets"], 50) / 1000,
+                "p95": histogram_percentile(stats["buckets"], 95) / 1000,
+            }
+        return metrics
+
+    def reset_metrics(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+
+# 全局网关实例
+llm_gateway = LLMGateway()
@@ -0,0 +1,62 @@
+"""
+流式Markdown分节
+
+大模型流式输出的Markdown按标题（# ~ ###）切分为小节：每收到一段文本调用 feed，
+出现下一个标题时上一节就完整了，立即返回，前端可以逐节渲染而不必等待全文。
+"""
+
+import re
+from typing import Dict, List, Optional
+
+HEADING_RE = re.compile(r"^#{1,3}\s+(.+?)[\s#]*$")
+
+
+class MarkdownSectionParser:
+    """增量解析Markdown小节，只按完整的行判断标题"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._pending = ""
+        self._title: Optional[str] = None
+        self._lines: List[str] = []
+        self.sections: List[Dict] = []
+
+    @property
+    def text(self) -> str:
+        """目前收到的全部文本"""
+        return "".join(self._parts)
+
+    def feed(self, text: str) -> List[Dict]:
+        """追加一段文本，返回因此变完整的小节"""
+        self._parts.append(text)
+        *lines, self._pending = (self._pending + text).split("\n")
+        completed = []
+        for line in lines:
+            completed.extend(self._add_line(line))
+        return completed
+
+    def close(self) -> List[Dict]:
+        """文本结束，返回最后一节（没有内容时为空列表）"""
+        completed = self._add_line(self._pending) if self._pending else []
+        self._pending = ""
+        completed.extend(self._take())
+        return completed
+
+    def _add_line(self, line: str) -> List[Dict]:
+        match = HEADING_RE.match(line.strip())
+        if not match:
+            self._lines.append(line)
+            return []
+        completed = self._take()
+        self._title = match.group(1)
+        return completed
+
+    def _take(self) -> List[Dict]:
+        content = "\n".join(self._lines).strip()
+        self._lines = []
+        # 只有标题没有内容的（如全文的大标题）不单独成节
+        if not content:
+            return []
+        section = {"index": len(self.sections), "title": self._title or "", "content": content}
+        self.sections.append(section)
+        return [section]
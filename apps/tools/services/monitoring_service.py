@@ -403,6 +403,16 @@ def collect_monitoring_data() -> Dict[str, Any]:
 
         data["cache"] = get_cache_stats()
 
+        # 文件转换缓存统计
+        from .conversion_cache import conversion_cache
+
+        data["conversion_cache"] = conversion_cache.get_stats()
+
+        # 大模型响应缓存统计
+        from .llm_cache import llm_cache
+
+        data["llm_cache"] = llm_cache.get_stats()
+
         # 日志统计
         from .log_rotation import get_log_stats
 
@@ -0,0 +1,202 @@
+"""
+NCM（网易云音乐加密格式）解码
+
+文件结构：魔数 CTENFDAM、AES加密的RC4密钥、AES加密的元数据JSON、专辑封面、用密钥流异或加密的音频。
+音频部分的密钥流只依赖密钥盒，周期为256字节，因此只生成一次，平铺成64KiB后用NumPy按块异或，
+不再逐字节循环；音频按块流式输出，可以直接写入文件或送入转码器的管道，不需要整首歌留在内存中。
+"""
+
+import base64
+import json
+import logging
+import os
+import struct
+from typing import BinaryIO, Iterator, Optional, Union
+
+import numpy as np
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CTENFDAM"
+CORE_KEY = b"hzHRAmso5kInbaxW"
+META_KEY = b"#14ljk_!\\]&0U<'("
+KEY_PREFIX = b"neteasecloudmusic"
+META_PREFIX = b"163 key(Don't modify):"
+META_JSON_PREFIX = b"music:"
+
+# 块大小必须是256的整数倍，每块都从密钥流周期的起点开始
+BLOCK_SIZE = 64 * 1024
+
+
+class NCMDecodeError(ValueError):
+    """不是有效的NCM文件或文件已损坏"""
+
+
+def _aes_ecb_decrypt(key: bytes, data: bytes) -> bytes:
+    if not data or len(data) % 16:
+        raise NCMDecodeError("AES数据长度不是16的倍数")
+    decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+    plain = decryptor.update(data) + decryptor.finalize()
+    padding = plain[-1]
+    return plain[:-padding] if 0 < padding <= 16 else plain
+
+
+def build_keybox(key: bytes) -> bytearray:
+    """RC4密钥调度，生成256字节的密钥盒"""
+    if not key:
+        raise NCMDecodeError("RC4密钥为空")
+    box = bytearray(range(256))
+    j = 0
+    for i in range(256):
+        j = (box[i] + j + key[i % len(key)]) & 0xFF
+        box[i], box[j] = box[j], box[i]
+    return box
+
+
+def build_keystream(box: bytearray) -> np.ndarray:
+    """由密钥盒生成一个周期（256字节）的密钥流，音频第 n 个字节与 keystream[n % 256] 异或"""
+    stream = np.empty(256, dtype=np.uint8)
+    for i in range(256):
+        j = (i + 1) & 0xFF
+        stream[i] = box[(box[j] + box[(box[j] + j) & 0xFF]) & 0xFF]
+    return stream
+
+
+def _parse_metadata(raw: bytes) -> dict:
+    """解密元数据JSON，失败时返回空字典（元数据缺失不影响音频解码）"""
+    if not raw:
+        return {}
+    try:
+        data = bytes(np.bitwise_xor(np.frombuffer(raw, dtype=np.uint8), 0x63))
+        if data.startswith(META_PREFIX):
+            data = data[len(META_PREFIX) :]
+        plain = _aes_ecb_decrypt(META_KEY, base64.b64decode(data))
+        if plain.startswith(META_JSON_PREFIX):
+            plain = plain[len(META_JSON_PREFIX) :]
+        meta = json.loads(plain.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.warning(f"NCM元数据解析失败: {e}")
+        return {}
+
+    artists = meta.get("artist") or []
+    return {
+        "title": meta.get("musicName", ""),
+        "artist": "/".join(str(a[0]) for a in artists if isinstance(a, list) and a),
+        "album": meta.get("album", ""),
+        "duration": (meta.get("duration") or 0) / 1000,
+        "format": meta.get("format", ""),
+        "bitrate": meta.get("bitrate", 0),
+    }
+
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise NCMDecodeError("NCM文件不完整")
+    return data
+
+
+def _read_u32(f: BinaryIO) -> int:
+    return struct.unpack("<I", _read_exact(f, 4))[0]
+
+
+class NCMDecoder:
+    """
+    NCM文件解码器
+
+    构造时只解析文件头（密钥、元数据、封面），音频在 iter_audio() 中按块解密。
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        self.file_size = os.path.getsize(self.path)
+
+        with open(self.path, "rb") as f:
+            if f.read(8) != MAGIC:
+                raise NCMDecodeError("不是有效的NCM文件")
+            f.seek(2, 1)
+
+            key_length = _read_u32(f)
+            if key_length <= 0 or key_length > self.file_size:
+                raise NCMDecodeError(f"密钥长度异常: {key_length}")
+            key_data = np.bitwise_xor(np.frombuffer(_read_exact(f, key_length), dtype=np.uint8), 0x64).tobytes()
+            key = _aes_ecb_decrypt(CORE_KEY, key_data)
+            if key.startswith(KEY_PREFIX):
+                key = key[len(KEY_PREFIX) :]
+            self.keystream = build_keystream(build_keybox(key))
+
+            meta_length = _read_u32(f)
+            if meta_length > self.file_size:
+                raise NCMDecodeError(f"元数据长度异常: {meta_length}")
+            self.metadata = _parse_metadata(_read_exact(f, meta_length))
+
+            # CRC32（4字节）和1字节保留位
+            f.seek(5, 1)
+            cover_frame_length = _read_u32(f)
+            image_size = _read_u32(f)
+            if image_size > cover_frame_length and cover_frame_length:
+                raise NCMDecodeError(f"封面长度异常: {image_size}")
+            image = _read_exact(f, image_size) if image_size else b""
+            f.seek(max(cover_frame_length - image_size, 0), 1)
+            self.audio_offset = f.tell()
+
+        self.audio_size = self.file_size - self.audio_offset
+        if self.audio_size <= 0:
+            raise NCMDecodeError("没有可解密的音频数据")
+        self.album_cover = (
+            {"data": image, "format": "png" if image.startswith(b"\x89PNG") else "jpeg", "size": len(image)} if image else None
+        )
+        self._tiled = np.tile(self.keystream, BLOCK_SIZE // 256)
+
+    @property
+    def audio_format(self) -> str:
+        """元数据中记录的音频格式（mp3/flac），缺失时为空"""
+        return self.metadata.get("format", "")
+
+    def iter_audio(self, block_size: int = BLOCK_SIZE) -> Iterator[memoryview]:
+        """按块解密音频，每块在下一次迭代前有效"""
+        if block_size % 256:
+            raise ValueError("block_size 必须是256的整数倍")
+        tiled = self._tiled if block_size == BLOCK_SIZE else np.tile(self.keystream, block_size // 256)
+
+        with open(self.path, "rb") as f:
+            f.seek(self.audio_offset)
+            while True:
+                buffer = bytearray(block_size)
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                block = np.frombuffer(buffer, dtype=np.uint8, count=n)
+                np.bitwise_xor(block, tiled[:n], out=block)
+                yield memoryview(buffer)[:n]
+
+    def read_audio(self) -> bytes:
+        """一次性解密全部音频（小文件或需要随机访问时使用）"""
+        return b"".join(self.iter_audio())
+
+    def decrypt_to(self, output: Union[str, os.PathLike, BinaryIO]) -> int:
+        """把解密后的音频写入文件路径或二进制文件对象，返回写入的字节数"""
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, "wb") as f:
+                return self.decrypt_to(f)
+        written = 0
+        for block in self.iter_audio():
+            output.write(block)
+            written += len(block)
+        return written
+
+
+def decode_ncm(path: Union[str, os.PathLike], output: Optional[Union[str, os.PathLike, BinaryIO]] = None) -> dict:
+    """
+    解码NCM文件，返回 {"metadata", "album_cover", "audio_format"}
+
+    指定 output 时音频流式写入其中，否则结果中附带 audio_data（整首歌的字节）。
+    """
+    decoder = NCMDecoder(path)
+    result = {"metadata": decoder.metadata, "album_cover": decoder.album_cover, "audio_format": decoder.audio_format}
+    if output is None:
+        result["audio_data"] = decoder.read_audio()
+    else:
+        decoder.decrypt_to(output)
+    return result
@@ -8,14 +8,13 @@ from typing import Dict, List
 
 from django.conf import settings
 
-import requests
+from .llm_gateway import llm_gateway
 
 
 class NutritionCoachService:
     """健身营养定制引擎服务"""
 
     def __init__(self):
-        self.deepseek_api_url = "https://api.deepseek.com/v1/chat/completions"
         self.deepseek_api_key = getattr(settings, "DEEPSEEK_API_KEY", "")
 
     def calculate_bmr(self, age: int, gender: str, weight: float, height: float) -> float:
@@ -148,23 +147,15 @@ class NutritionCoachService:
 
     def _call_deepseek_api(self, prompt: str) -> str:
         """调用DeepSeek API"""
-        headers = {"Authorization": f"Bearer {self.deepseek_api_key}", "Content-Type": "application/json"}
-
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": "你是一个专业的健身营养师，擅长为健身人群制定个性化饮食计划。"},
-                {"role": "user", "content": prompt},
-            ],
-            "temperature": 0.7,
-            "max_tokens": 4000,
-        }
-
-        response = requests.post(self.deepseek_api_url, headers=headers, json=data, timeout=30, verify=True)  # nosec B501
-        response.raise_for_status()
-
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+        return llm_gateway.complete(
+            prompt,
+            system="你是一个专业的健身营养师，擅长为健身人群制定个性化饮食计划。",
+            feature="nutrition",
+            api_key=self.deepseek_api_key,
+            timeout=30,
+            temperature=0.7,
+            max_tokens=4000,
+        )
 
     def _parse_deepseek_response(self, response: str) -> List[Dict]:
         """解析DeepSeek响应"""
@@ -8,6 +8,9 @@ from django.conf import settings
 
 import requests
 
+from .destination_knowledge import destination_knowledge, local_time_fields
+from .llm_gateway import LLMGatewayError, llm_gateway
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,9 +21,8 @@ class OverviewDataService:
         self.session = requests.Session()
         self.session.timeout = 30
 
-        # DeepSeek配置
+        # DeepSeek配置（请求经由 llm_gateway 发出）
         self.deepseek_config = {
-            "base_url": "https://api.deepseek.com/v1",
             "api_key": getattr(settings, "DEEPSEEK_API_KEY", ""),
             "model": "deepseek-chat",
             "max_tokens": 2000,
@@ -99,216 +101,231 @@ class OverviewDataService:
 3. 不要包含代码块标记
 4. 信息要准确真实"""
 
-            url = f"{self.deepseek_config['base_url']}/chat/completions"
-            headers = {"Authorization": f'Bearer {self.deepseek_config["api_key"]}', "Content-Type": "application/json"}
-
-            data = {
-                "model": self.deepseek_config["model"],
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": self.deepseek_config["max_tokens"],
-                "temperature": 0.3,
-            }
-
-            response = self.session.post(url, headers=headers, json=data, timeout=self.deepseek_config["timeout"])
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"].strip()
-
-                # 尝试解析JSON，处理可能的代码块标记
-                try:
-                    # 清理内容，移除可能的代码块标记
-                    clean_content = content.strip()
-                    if clean_content.startswith("```json"):
-                        clean_content = clean_content[7:]
-                    if clean_content.startswith("```"):
-                        clean_content = clean_content[3:]
-                    if clean_content.endswith("```"):
-                        clean_content = clean_content[:-3]
-                    clean_content = clean_content.strip()
-
-                    destination_data = json.loads(clean_content)
-                    logger.info(f"✅ DeepSeek成功获取{destination}基本信息")
-                    return destination_data
-                except json.JSONDecodeError as e:
-                    logger.warning(f"⚠️ DeepSeek返回数据非JSON格式: {e}")
-                    logger.warning(f"原始内容: {content[:200]}...")
-                    return self._get_fallback_destination_info(destination)
-            else:
-                logger.warning(f"⚠️ DeepSeek API返回错误: {response.status_code}")
+            # 目的地基本信息很少变化，同一目的地的结果由响应缓存按月复用
+            content = llm_gateway.complete(
+                prompt,
+                feature="destination_info",
+                model=self.deepseek_config["model"],
+                api_key=self.deepseek_config["api_key"],
+                timeout=self.deepseek_config["timeout"],
+                max_tokens=self.deepseek_config["max_tokens"],
+                temperature=0.3,
+            ).strip()
+
+            # 尝试解析JSON，处理可能的代码块标记
+            try:
+                # 清理内容，移除可能的代码块标记
+                clean_content = content.strip()
+                if clean_content.startswith("```json"):
+                    clean_content = clean_content[7:]
+                if clean_content.startswith("```"):
+                    clean_content = clean_content[3:]
+                if clean_content.endswith("```"):
+                    clean_content = clean_content[:-3]
+                clean_content = clean_content.strip()
+
+                destination_data = json.loads(clean_content)
+                logger.info(f"✅ DeepSeek成功获取{destination}基本信息")
+                return destination_data
+            except json.JSONDecodeError as e:
+                logger.warning(f"⚠️ DeepSeek返回数据非JSON格式: {e}")
+                logger.warning(f"原始内容: {content[:200]}...")
                 return self._get_fallback_destination_info(destination)
 
+        except LLMGatewayError as e:
+            logger.warning(f"⚠️ DeepSeek API返回错误: {e}")
+            return self._get_fallback_destination_info(destination)
+
         except Exception as e:
             logger.error(f"❌ DeepSeek API调用失败: {e}")
             return self._get_fallback_destination_info(destination)
 
     def _get_weather_info(self, destination: str) -> Dict:
-        """获取天气信息"""
-        try:
-            logger.info(f"🌤️ 获取{destination}天气信息...")
-
-            # 使用wttr.in API获取天气
-            url = f"{self.weather_api_url}/{destination}?format=j1"
-            response = self.session.get(url, timeout=10)
-
-            if response.status_code == 200:
-                data = response.json()
-                current = data.get("current_condition", [{}])[0]
-
-                return {
-                    "temperature": int(current.get("temp_C", 20)),
-                    "weather": current.get("weatherDesc", [{}])[0].get("value", "晴朗"),
-                    "humidity": int(current.get("humidity", 70)),
-                    "wind_speed": int(current.get("windspeedKmph", 10)),
-                    "feels_like": int(current.get("FeelsLikeC", 22)),
-                    "description": self._get_weather_description(destination),
-                }
-            else:
-                return self._get_fallback_weather_info()
-
-        except Exception as e:
-            logger.warning(f"⚠️ 天气信息获取失败: {e}")
-            return self._get_fallback_weather_info()
+        """获取天气信息，按目的地缓存"""
+        logger.info(f"🌤️ 获取{destination}天气信息...")
+        return destination_knowledge.get(
+            "weather",
+            destination,
+            lambda: self._fetch_weather_info(destination),
+            self._get_fallback_weather_info,
+            variant="overview",
+        )
 
-    def _get_currency_info(self, destination: str) -> Dict:
-        """获取汇率信息"""
-        try:
-            logger.info(f"💱 获取{destination}汇率信息...")
-
-            # 根据目的地确定货币
-            currency_mapping = {
-                "北京": "CNY",
-                "上海": "CNY",
-                "杭州": "CNY",
-                "西安": "CNY",
-                "成都": "CNY",
-                "东京": "JPY",
-                "首尔": "KRW",
-                "曼谷": "THB",
-                "新加坡": "SGD",
-                "巴黎": "EUR",
-                "伦敦": "GBP",
-                "纽约": "USD",
-                "洛杉矶": "USD",
+    def _fetch_weather_info(self, destination: str) -> Optional[Dict]:
+        # 使用wttr.in API获取天气
+        url = f"{self.weather_api_url}/{destination}?format=j1"
+        response = self.session.get(url, timeout=10)
+
+        if response.status_code == 200:
+            data = response.json()
+            current = data.get("current_condition", [{}])[0]
+
+            return {
+                "temperature": int(current.get("temp_C", 20)),
+                "weather": current.get("weatherDesc", [{}])[0].get("value", "晴朗"),
+                "humidity": int(current.get("humidity", 70)),
+                "wind_speed": int(current.get("windspeedKmph", 10)),
+                "feels_like": int(current.get("FeelsLikeC", 22)),
+                "description": self._get_weather_description(destination),
             }
+        return None
 
-            local_currency = currency_mapping.get(destination, "CNY")
+    def _get_currency_info(self, destination: str) -> Dict:
+        """获取汇率信息，按当地货币缓存"""
+        logger.info(f"💱 获取{destination}汇率信息...")
+
+        # 根据目的地确定货币
+        currency_mapping = {
+            "北京": "CNY",
+            "上海": "CNY",
+            "杭州": "CNY",
+            "西安": "CNY",
+            "成都": "CNY",
+            "东京": "JPY",
+            "首尔": "KRW",
+            "曼谷": "THB",
+            "新加坡": "SGD",
+            "巴黎": "EUR",
+            "伦敦": "GBP",
+            "纽约": "USD",
+            "洛杉矶": "USD",
+        }
 
-            # 如果是人民币，直接返回
-            if local_currency == "CNY":
-                return {
-                    "currency": "人民币 (CNY)",
-                    "rate": "1 USD = 7.2 CNY",
-                    "exchange_tips": "建议在银行或正规兑换点兑换",
-                    "local_currency": "CNY",
-                }
+        local_currency = currency_mapping.get(destination, "CNY")
 
-            # 获取汇率数据
-            response = self.session.get(self.currency_api_url, timeout=10)
+        # 如果是人民币，直接返回
+        if local_currency == "CNY":
+            return {
+                "currency": "人民币 (CNY)",
+                "rate": "1 USD = 7.2 CNY",
+                "exchange_tips": "建议在银行或正规兑换点兑换",
+                "local_currency": "CNY",
+            }
 
-            if response.status_code == 200:
-                data = response.json()
-                rates = data.get("rates", {})
+        return destination_knowledge.get(
+            "currency",
+            local_currency,
+            lambda: self._fetch_currency_info(local_currency),
+            self._get_fallback_currency_info,
+            variant="overview",
+        )
 
-                if local_currency in rates:
-                    rate = rates[local_currency]
-                    return {
-                        "currency": f"{self._get_currency_name(local_currency)} ({local_currency})",
-                        "rate": f"1 USD = {rate} {local_currency}",
-                        "exchange_tips": f"建议在银行或正规兑换点兑换{local_currency}",
-                        "local_currency": local_currency,
-                    }
+    def _fetch_currency_info(self, local_currency: str) -> Optional[Dict]:
+        # 获取汇率数据
+        response = self.session.get(self.currency_api_url, timeout=10)
 
-            return self._get_fallback_currency_info()
+        if response.status_code == 200:
+            data = response.json()
+            rates = data.get("rates", {})
 
-        except Exception as e:
-            logger.warning(f"⚠️ 汇率信息获取失败: {e}")
-            return self._get_fallback_currency_info()
+            if local_currency in rates:
+                rate = rates[local_currency]
+                return {
+                    "currency": f"{self._get_currency_name(local_currency)} ({local_currency})",
+                    "rate": f"1 USD = {rate} {local_currency}",
+                    "exchange_tips": f"建议在银行或正规兑换点兑换{local_currency}",
+                    "local_currency": local_currency,
+                }
+        return None
 
     def _get_timezone_info(self, destination: str) -> Dict:
-        """获取时区信息"""
-        try:
-            logger.info(f"🕐 获取{destination}时区信息...")
-
-            # 时区映射
-            timezone_mapping = {
-                "北京": "Asia/Shanghai",
-                "上海": "Asia/Shanghai",
-                "杭州": "Asia/Shanghai",
-                "西安": "Asia/Shanghai",
-                "成都": "Asia/Shanghai",
-                "东京": "Asia/Tokyo",
-                "首尔": "Asia/Seoul",
-                "曼谷": "Asia/Bangkok",
-                "新加坡": "Asia/Singapore",
-                "巴黎": "Europe/Paris",
-                "伦敦": "Europe/London",
-                "纽约": "America/New_York",
-                "洛杉矶": "America/Los_Angeles",
-            }
+        """获取时区信息，按时区缓存，当前时间、偏移和夏令时每次在本地计算"""
+        logger.info(f"🕐 获取{destination}时区信息...")
+
+        # 时区映射
+        timezone_mapping = {
+            "北京": "Asia/Shanghai",
+            "上海": "Asia/Shanghai",
+            "杭州": "Asia/Shanghai",
+            "西安": "Asia/Shanghai",
+            "成都": "Asia/Shanghai",
+            "东京": "Asia/Tokyo",
+            "首尔": "Asia/Seoul",
+            "曼谷": "Asia/Bangkok",
+            "新加坡": "Asia/Singapore",
+            "巴黎": "Europe/Paris",
+            "伦敦": "Europe/London",
+            "纽约": "America/New_York",
+            "洛杉矶": "America/Los_Angeles",
+        }
 
-            timezone = timezone_mapping.get(destination, "Asia/Shanghai")
-
-            # 尝试多个时区API，增加超时时间和重试机制
-            apis = [
-                f"{self.timezone_api_url}/timezone/{timezone}",
-                f"http://api.timezonedb.com/v2.1/get-time-zone?key=demo&format=json&by=zone&zone={timezone}",
-                f"https://timeapi.io/api/TimeZone/zone?timeZone={timezone}",
-            ]
-
-            for api_url in apis:
-                for retry in range(2):  # 每个API重试2次
-                    try:
-                        logger.info(f"🔄 尝试时区API: {api_url} (尝试 {retry + 1}/2)")
-                        response = self.session.get(api_url, timeout=15)  # 增加超时时间到15秒
-
-                        if response.status_code == 200:
-                            data = response.json()
-
-                            # 处理不同API的响应格式
-                            if "datetime" in data:  # worldtimeapi.org
-                                logger.info(f"✅ 成功从 {api_url} 获取时区信息")
-                                return {
-                                    "timezone": data.get("timezone", "UTC+8"),
-                                    "current_time": data.get("datetime", "2024-01-01T14:30:00")[11:16],
-                                    "daylight_saving": "是" if data.get("dst", False) else "无",
-                                    "utc_offset": data.get("utc_offset", "+08:00"),
-                                }
-                            elif "formatted" in data:  # timezonedb
-                                logger.info(f"✅ 成功从 {api_url} 获取时区信息")
-                                return {
-                                    "timezone": data.get("zoneName", "UTC+8"),
-                                    "current_time": data.get("formatted", "14:30:00")[11:16],
-                                    "daylight_saving": "是" if data.get("dst", 0) else "无",
-                                    "utc_offset": f"+{data.get('gmtOffset', 28800)//3600:02d}:00",
-                                }
-                            else:
-                                logger.warning(f"⚠️ API {api_url} 返回格式未知")
-                                continue
-
-                    except requests.exceptions.Timeout:
-                        logger.warning(f"⏰ 时区API {api_url} 超时 (尝试 {retry + 1}/2)")
-                        if retry < 1:  # 还有重试机会
-                            time.sleep(2)  # 等待2秒后重试
-                            continue
-                    except requests.exceptions.ConnectionError as e:
-                        logger.warning(f"🔌 时区API {api_url} 连接错误 (尝试 {retry + 1}/2): {e}")
-                        if retry < 1:  # 还有重试机会
-                            time.sleep(2)  # 等待2秒后重试
-                            continue
-                    except Exception as api_error:
-                        logger.warning(f"⚠️ 时区API {api_url} 失败 (尝试 {retry + 1}/2): {api_error}")
-                        if retry < 1:  # 还有重试机会
-                            time.sleep(2)  # 等待2秒后重试
-                            continue
+        timezone = timezone_mapping.get(destination, "Asia/Shanghai")
+        timezone_info = dict(
+            destination_knowledge.get(
+                "timezone",
+                timezone,
+                lambda: self._fetch_timezone_info(timezone),
+                self._get_fallback_timezone_info,
+                variant="overview",
+            )
+        )
 
-            # 所有API都失败，使用本地时间作为备用
-            logger.warning("⚠️ 所有时区API都失败，使用本地时间")
-            return self._get_fallback_timezone_info()
+        fields = local_time_fields(timezone_info["timezone"])
+        if fields:
+            timezone_info["current_time"] = fields["datetime"][11:16]
+            timezone_info["utc_offset"] = fields["utc_offset"]
+            timezone_info["daylight_saving"] = "是" if fields["is_dst"] else "无"
+        else:
+            timezone_info["current_time"] = datetime.now().strftime("%H:%M")
+        return timezone_info
+
+    def _fetch_timezone_info(self, timezone: str) -> Optional[Dict]:
+        # 尝试多个时区API，增加超时时间和重试机制
+        apis = [
+            f"{self.timezone_api_url}/timezone/{timezone}",
+            f"http://api.timezonedb.com/v2.1/get-time-zone?key=demo&format=json&by=zone&zone={timezone}",
+            f"https://timeapi.io/api/TimeZone/zone?timeZone={timezone}",
+        ]
+
+        for api_url in apis:
+            for retry in range(2):  # 每个API重试2次
+                try:
+                    logger.info(f"🔄 尝试时区API: {api_url} (尝试 {retry + 1}/2)")
+                    response = self.session.get(api_url, timeout=15)  # 增加超时时间到15秒
+
+                    if response.status_code == 200:
+                        data = response.json()
+
+                        # 处理不同API的响应格式
+                        if "datetime" in data:  # worldtimeapi.org
+                            logger.info(f"✅ 成功从 {api_url} 获取时区信息")
+                            return {
+                                "timezone": data.get("timezone", "UTC+8"),
+                                "current_time": data.get("datetime", "2024-01-01T14:30:00")[11:16],
+                                "daylight_saving": "是" if data.get("dst", False) else "无",
+                                "utc_offset": data.get("utc_offset", "+08:00"),
+                            }
+                        elif "formatted" in data:  # timezonedb
+                            logger.info(f"✅ 成功从 {api_url} 获取时区信息")
+                            return {
+                                "timezone": data.get("zoneName", "UTC+8"),
+                                "current_time": data.get("formatted", "14:30:00")[11:16],
+                                "daylight_saving": "是" if data.get("dst", 0) else "无",
+                                "utc_offset": f"+{data.get('gmtOffset', 28800)//3600:02d}:00",
+                            }
+                        else:
+                            logger.warning(f"⚠️ API {api_url} 返回格式未知")
+                            continue
 
-        except Exception as e:
-            logger.warning(f"⚠️ 时区信息获取失败: {e}")
-            return self._get_fallback_timezone_info()
+                except requests.exceptions.Timeout:
+                    logger.warning(f"⏰ 时区API {api_url} 超时 (尝试 {retry + 1}/2)")
+                    if retry < 1:  # 还有重试机会
+                        time.sleep(2)  # 等待2秒后重试
+                        continue
+                except requests.exceptions.ConnectionError as e:
+                    logger.warning(f"🔌 时区API {api_url} 连接错误 (尝试 {retry + 1}/2): {e}")
+                    if retry < 1:  # 还有重试机会
+                        time.sleep(2)  # 等待2秒后重试
+                        continue
+                except Exception as api_error:
+                    logger.warning(f"⚠️ 时区API {api_url} 失败 (尝试 {retry + 1}/2): {api_error}")
+                    if retry < 1:  # 还有重试机会
+                        time.sleep(2)  # 等待2秒后重试
+                        continue
+
+        # 所有API都失败，使用本地时间作为备用
+        logger.warning("⚠️ 所有时区API都失败，使用本地时间")
+        return None
 
     def _get_weather_description(self, destination: str) -> str:
         """获取天气描述"""
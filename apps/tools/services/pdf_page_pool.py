@@ -0,0 +1,147 @@
+"""
+PDF页面级并行处理
+
+在进程池中逐页渲染和OCR，结果按页码顺序重组。
+进程池使用spawn方式启动，避免在多线程的Django进程中fork；
+worker函数只依赖PyMuPDF/pytesseract，不访问Django。
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def ocr_page(pdf_path: str, page_index: int, dpi: int = 300, timeout: float = 0) -> str:
+    """
+    渲染并识别单页（在worker进程中运行）
+
+    timeout 交给 pytesseract，超时会终止tesseract子进程并抛出RuntimeError。
+    """
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    with fitz.open(pdf_path) as doc:
+        pix = doc.load_page(page_index).get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+        # 直接使用像素数据构造图片，省去PNG编码再解码
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        pix = None
+
+    try:
+        # 使用中文+英文OCR，移除字符白名单限制以支持更多中文字符
+        text = pytesseract.image_to_string(img, lang="chi_sim+eng", config="--oem 3 --psm 6", timeout=timeout)
+    except pytesseract.TesseractError as ocr_error:
+        # 未安装中文语言包等情况；超时（RuntimeError）直接抛出，由调用方记为失败页
+        logger.warning(f"第{page_index + 1}页中文OCR失败，回退到英文: {ocr_error}")
+        text = pytesseract.image_to_string(img, lang="eng", timeout=timeout)
+    return text.strip()
+
+
+class PDFPagePool:
+    """
+    PDF页面进程池
+
+    每页作为一个任务提交，按完成顺序回调进度，按页码顺序返回结果；
+    失败或超时的页面结果为 None，不影响其他页面。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or get_default_workers()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def map_pages(
+        self,
+        func: Callable,
+        pdf_path: str,
+        page_count: int,
+        args: tuple = (),
+        page_timeout: Optional[float] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ) -> List:
+        """
+        对每一页执行 func(pdf_path, page_index, *args)
+
+        page_timeout 秒内没有任何页面完成时视为卡住，剩余页面取消并记为 None；
+        单页自身的耗时上限由worker函数负责（如OCR的tesseract超时）。
+        """
+        if page_count <= 0:
+            return []
+
+        try:
+            executor = self._get_executor()
+            futures = {executor.submit(func, pdf_path, index, *args): index for index in range(page_count)}
+        except BrokenProcessPool:
+            # worker进程异常退出后进程池不可再用，重建一次
+            self._reset_executor()
+            executor = self._get_executor()
+            futures = {executor.submit(func, pdf_path, index, *args): index for index in range(page_count)}
+
+        results = [None] * page_count
+        finished = 0
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=page_timeout or None, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool as e:
+                    logger.error(f"PDF页面进程池异常: {e}")
+                    self._reset_executor()
+                except Exception as e:
+                    logger.warning(f"第{index + 1}页处理失败: {e}")
+                finished += 1
+                if progress_callback:
+                    progress_callback(finished, page_count)
+
+        for future in pending:
+            future.cancel()
+            logger.warning(f"第{futures[future] + 1}页处理超时，已跳过")
+        return results
+
+    def shutdown(self):
+        self._reset_executor()
+
+
+def get_default_workers() -> int:
+    """默认worker数：配置值，未配置时取CPU核数（最多4个）"""
+    configured = getattr(settings, "PDF_CONVERT_MAX_WORKERS", 0)
+    return configured or min(4, os.cpu_count() or 1)
+
+
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+
+def get_page_pool() -> PDFPagePool:
+    """获取进程内共享的页面进程池"""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = PDFPagePool()
+        return _page_pool
@@ -9,8 +9,11 @@
 - 代理池健康监控
 - 自适应轮换策略
 - 详细统计分析
+
+健康检查和补充代理由后台刷新线程完成；取代理时只读取不可变快照，不加锁、不发网络请求。
 """
 
+import heapq
 import json
 import logging
 import os
@@ -18,11 +21,14 @@ import random
 import re
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures import as_completed
 from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import Dict, List, Optional
+from urllib.parse import urlsplit
 
 import requests
 
@@ -63,6 +69,12 @@ class ProxyConfig:
     max_response_time: float = 30.0
     concurrent_checks: int = 10
     proxy_file: str = "proxy_pool.json"
+    min_refill_interval: int = 60  # 两次补充代理的最小间隔（秒）
+    ewma_alpha: float = 0.3  # EWMA平滑系数，越大越看重最近的结果
+    selection_candidates: int = 10  # 二选一抽样的候选范围（按评分排序的前N个）
+    breaker_failure_threshold: int = 3  # 连续失败多少次后熔断
+    breaker_cooldown: float = 60.0  # 熔断后多久放行一次试探请求（秒）
+    breaker_max_cooldown: float = 600.0  # 试探连续失败时冷却时间翻倍的上限（秒）
 
 
 @dataclass
@@ -79,6 +91,9 @@ class ProxyInfo:
     response_time: float = 0.0
     source: str = "manual"
     score: float = 0.0  # 代理质量评分
+    ewma_latency: float = 0.0  # 成功请求延迟的EWMA（秒）
+    ewma_success: float = 1.0  # 成功率的EWMA
+    ewma_samples: int = 0
 
     @property
     def success_rate(self) -> float:
@@ -86,16 +101,179 @@ class ProxyInfo:
         total = self.success_count + self.fail_count
         return self.success_count / total if total > 0 else 1.0
 
+    @property
+    def recent_success_rate(self) -> float:
+        """近期成功率：有EWMA样本时使用EWMA，否则使用累计成功率"""
+        return self.ewma_success if self.ewma_samples else self.success_rate
+
+    @property
+    def recent_latency(self) -> float:
+        """近期延迟：有EWMA样本时使用EWMA，否则使用最近一次响应时间"""
+        return self.ewma_latency or self.response_time
+
     @property
     def total_requests(self) -> int:
         """总请求次数"""
         return self.success_count + self.fail_count
 
 
+# 不区分目标站点的全局健康度桶
+GLOBAL_DOMAIN = "*"
+
+# 这些二级域名下的站点按三级域名分桶，如 sina.com.cn
+_SECOND_LEVEL_SUFFIXES = {"com", "net", "org", "gov", "edu"}
+
+
+def target_domain(url: Optional[str]) -> str:
+    """把URL或主机名归一化为健康度分桶用的站点域名，如 api.bilibili.com -> bilibili.com"""
+    if not url:
+        return GLOBAL_DOMAIN
+    host = (urlsplit(url).hostname if "://" in url else url.split(":")[0]) or ""
+    labels = host.lower().strip(".").split(".")
+    if len(labels) <= 2 or all(label.isdigit() for label in labels):
+        return host.lower() or GLOBAL_DOMAIN
+    if labels[-2] in _SECOND_LEVEL_SUFFIXES and len(labels[-1]) == 2:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class ProxyHealth:
+    """
+    代理在一个目标站点上的健康度
+
+    延迟和成功率用EWMA跟踪，最近的结果权重更高；连续失败达到阈值后熔断，
+    冷却结束后放行一次试探请求（半开），成功则恢复，失败则冷却时间翻倍。
+    """
+
+    __slots__ = ("latency", "success", "samples", "consecutive_failures", "state", "opened_at", "cooldown", "trial_started_at")
+
+    def __init__(self):
+        self.latency = 0.0
+        self.success = 1.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.trial_started_at = 0.0
+
+    def record(self, success: bool, latency: Optional[float], config: ProxyConfig, now: float):
+        alpha = config.ewma_alpha
+        outcome = 1.0 if success else 0.0
+        self.success = outcome if not self.samples else self.success + alpha * (outcome - self.success)
+        # 失败请求的耗时（如被拒绝）不代表代理速度，只计入成功率
+        if success and latency is not None:
+            self.latency = latency if not self.latency else self.latency + alpha * (latency - self.latency)
+        self.samples += 1
+
+        if success:
+            self.consecutive_failures = 0
+            self.state = CircuitState.CLOSED
+            self.cooldown = 0.0
+            return
+
+        self.consecutive_failures += 1
+        if self.state is CircuitState.HALF_OPEN:
+            self._open(now, min(self.cooldown * 2, config.breaker_max_cooldown))
+        elif self.state is CircuitState.CLOSED and self.consecutive_failures >= config.breaker_failure_threshold:
+            self._open(now, config.breaker_cooldown)
+
+    def _open(self, now: float, cooldown: float):
+        self.state = CircuitState.OPEN
+        self.opened_at = now
+        self.cooldown = cooldown
+
+    def allows(self, now: float) -> bool:
+        """熔断器是否放行请求（不改变状态）"""
+        if self.state is CircuitState.CLOSED:
+            return True
+        if self.state is CircuitState.OPEN:
+            return now - self.opened_at >= self.cooldown
+        # 半开状态只放行一个试探请求；试探结果迟迟没有上报时，冷却时间过后再放行一个
+        return now - self.trial_started_at >= self.cooldown
+
+    def claim_trial(self, now: float) -> bool:
+        """占用半开试探名额，调用方需持有健康度锁"""
+        if not self.allows(now):
+            return False
+        if self.state is not CircuitState.CLOSED:
+            self.state = CircuitState.HALF_OPEN
+            self.trial_started_at = now
+        return True
+
+    def cost(self, default_latency: float) -> float:
+        """期望的单次成功耗时，越小越好"""
+        return (self.latency or default_latency) / max(self.success, 0.05)
+
+
+def _selection_key(proxy_info: ProxyInfo) -> tuple:
+    """选择顺序：评分高、近期成功率高、失败次数少、近期延迟短优先"""
+    return (-proxy_info.score, -proxy_info.recent_success_rate, proxy_info.fail_count, proxy_info.recent_latency)
+
+
+class ProxySnapshot:
+    """
+    代理池的不可变快照
+
+    可用代理按选择顺序建成二叉堆（构建 O(n)），取前k个最优代理时沿堆向下展开，
+    只访问 O(k) 个节点，不需要每次全量排序。快照发布后不再修改，读取无需加锁。
+    """
+
+    __slots__ = ("heap", "degraded", "created_at", "by_proxy")
+
+    def __init__(self, proxies: List[ProxyInfo], config: ProxyConfig, failed_proxies: set):
+        self.by_proxy = {p.proxy: p for p in proxies}
+        available = [
+            p
+            for p in proxies
+            if p.proxy not in failed_proxies
+            and p.fail_count < config.max_retries
+            and p.recent_success_rate >= config.min_success_rate
+        ]
+        # 没有合格代理时退化为失败次数未超限的代理，给新代理一个机会
+        self.degraded = not available
+        if self.degraded:
+            available = [p for p in proxies if p.fail_count < config.max_retries]
+
+        # 序号保证堆元素可比较，不会比较到ProxyInfo本身
+        entries = [(_selection_key(p), index, p) for index, p in enumerate(available)]
+        heapq.heapify(entries)
+        self.heap = tuple(entries)
+        self.created_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def top(self, k: int, skip=()) -> List[ProxyInfo]:
+        """按选择顺序返回前k个不在 skip 中的代理"""
+        heap = self.heap
+        result = []
+        if not heap:
+            return result
+
+        frontier = [(heap[0], 0)]
+        while frontier and len(result) < k:
+            entry, index = heapq.heappop(frontier)
+            if entry[2].proxy not in skip:
+                result.append(entry[2])
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+
 class ProxyPool:
     """增强版虚拟IP池管理系统"""
 
-    def __init__(self, config: Optional[ProxyConfig] = None):
+    def __init__(self, config: Optional[ProxyConfig] = None, background_refresh: bool = True):
         self.config = config or ProxyConfig()
         self.proxies: List[ProxyInfo] = []  # 可用代理列表
         self.failed_proxies: set = set()  # 失败代理集合
@@ -103,6 +281,18 @@ class ProxyPool:
         self.last_check_time = None
         self._lock = threading.RLock()  # 线程安全锁
 
+        # 后台刷新线程，首次取代理时启动
+        self.background_refresh = background_refresh
+        self._refresher: Optional[threading.Thread] = None
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._last_fetch_time = 0.0
+        self._snapshot = ProxySnapshot([], self.config, set())
+
+        # (代理地址, 站点域名) -> 健康度，站点为 GLOBAL_DOMAIN 时表示不区分站点
+        self._health: Dict[tuple, ProxyHealth] = {}
+        self._health_lock = threading.Lock()
+
         # 代理源配置 - 优化并分类代理源
         self.proxy_sources = {
             # API类型源 - 稳定可靠
@@ -140,10 +330,9 @@ class ProxyPool:
             },
         }
 
-        # 初始化代理池
+        # 初始化代理池；本地没有代理时由后台刷新线程获取，不阻塞导入
         self._load_local_proxies()
-        if not self.proxies:
-            self._fetch_fresh_proxies()
+        self.refresh_snapshot()
 
     def _load_local_proxies(self):
         """加载本地保存的代理"""
@@ -204,6 +393,7 @@ class ProxyPool:
     def _fetch_fresh_proxies(self):
         """获取新的代理列表"""
         logger.info("🔄 获取新的代理列表...")
+        self._last_fetch_time = time.monotonic()
         new_proxies = []
 
         # 添加一些高质量免费代理源（定期更新）
@@ -299,6 +489,7 @@ class ProxyPool:
                 else:
                     logger.info("ℹ️ 未发现新的代理地址")
 
+                self.refresh_snapshot()
                 self._save_proxies()
         else:
             logger.warning("⚠️ 未获取到新代理，使用现有代理池")
@@ -432,6 +623,7 @@ class ProxyPool:
                 proxy_info.last_checked = datetime.now().isoformat()
                 proxy_info.success_count += 1
                 proxy_info.response_time = response_time
+                self.report_result(proxy, True, response_time)
 
                 # 计算代理质量评分 (0-100)
                 proxy_info.score = self._calculate_proxy_score(proxy_info)
@@ -456,6 +648,7 @@ class ProxyPool:
 
         except Exception as e:
             proxy_info.fail_count += 1
+            self.report_result(proxy, False)
             logger.debug(f"❌ 代理 {proxy} 测试失败: {e}")
 
             # 更新失败统计
@@ -475,17 +668,17 @@ class ProxyPool:
         """计算代理质量评分"""
         score = 0.0
 
-        # 成功率权重 (50%)
-        if proxy_info.total_requests > 0:
-            success_rate_score = proxy_info.success_rate * 50
+        # 成功率权重 (50%)，使用近期成功率，过去表现好但现在变差的代理会较快降分
+        if proxy_info.total_requests > 0 or proxy_info.ewma_samples:
+            success_rate_score = proxy_info.recent_success_rate * 50
             score += success_rate_score
         else:
             score += 25  # 新代理给予中等分数
 
         # 响应时间权重 (30%)
-        if proxy_info.response_time > 0:
+        if proxy_info.recent_latency > 0:
             # 响应时间越短分数越高，10秒以内满分
-            time_score = max(0, (10 - proxy_info.response_time) / 10 * 30)
+            time_score = max(0, (10 - proxy_info.recent_latency) / 10 * 30)
             score += time_score
         else:
             score += 15  # 未测试给予中等分数
@@ -496,76 +689,201 @@ class ProxyPool:
 
         return min(score, 100.0)
 
-    def get_working_proxy(self) -> Optional[ProxyInfo]:
-        """获取一个可用的代理"""
+    def refresh_snapshot(self):
+        """根据当前代理列表重建并发布选择快照"""
         with self._lock:
-            if not self.proxies:
-                logger.warning("⚠️ 代理池为空，尝试获取新代理...")
-                self._fetch_fresh_proxies()
-
-            # 检查是否需要更新代理池
-            if self.last_check_time is None or datetime.now() - self.last_check_time > timedelta(
-                seconds=self.config.check_interval
-            ):
-                self._check_proxy_health()
-
-            # 过滤可用代理
-            available_proxies = []
-            for proxy_info in self.proxies:
-                if (
-                    proxy_info.proxy not in self.failed_proxies
-                    and proxy_info.fail_count < self.config.max_retries
-                    and proxy_info.success_rate >= self.config.min_success_rate
-                ):
-                    available_proxies.append(proxy_info)
-
-            if not available_proxies:
-                logger.warning("⚠️ 没有可用代理，重新获取...")
-                self._fetch_fresh_proxies()
-                # 给新代理一个机会
-                available_proxies = [p for p in self.proxies if p.fail_count < self.config.max_retries]
-
-            if available_proxies:
-                # 智能排序：综合考虑评分、成功率、响应时间
-                available_proxies.sort(
-                    key=lambda x: (
-                        -x.score,  # 评分高优先
-                        -x.success_rate,  # 成功率高优先
-                        x.fail_count,  # 失败次数少优先
-                        x.response_time,  # 响应时间短优先
-                    )
-                )
+            self._snapshot = ProxySnapshot(self.proxies, self.config, self.failed_proxies)
+
+    def get_working_proxy(self, domain: Optional[str] = None) -> Optional[ProxyInfo]:
+        """
+        获取一个可用的代理（只读取快照，不加锁、不阻塞）
+
+        domain 为目标站点（URL或域名），在评分最高的若干代理中随机抽两个，
+        选该站点上期望耗时更低的一个（二选一），并跳过对该站点熔断中的代理。
+        """
+        self.ensure_background_refresh()
+        snapshot = self._snapshot
+        domain = target_domain(domain)
+
+        if snapshot.degraded:
+            logger.warning("⚠️ 没有可用代理，已通知后台刷新线程获取新代理")
+            self.request_refresh()
+            # 退化快照中的代理本身就是候选，不再按失败集合过滤
+            candidates = snapshot.top(self.config.selection_candidates)
+        else:
+            # 快照发布后被标记失败的代理直接跳过
+            candidates = snapshot.top(self.config.selection_candidates, skip=self.failed_proxies)
+
+        now = time.monotonic()
+        candidates = [p for p in candidates if self._breakers_allow(p.proxy, domain, now)]
 
-                # 从前5个最佳代理中随机选择，平衡负载
-                best_proxies = available_proxies[:5]
-                proxy_info = random.choice(best_proxies)
+        while candidates:
+            if len(candidates) >= 2:
+                first, second = random.sample(candidates, 2)
+                proxy_info = min(first, second, key=lambda p: self._proxy_cost(p, domain))
+            else:
+                proxy_info = candidates[0]
 
+            # 熔断冷却结束的代理只能有一个请求去试探，名额被占用时换一个
+            if self._claim_trials(proxy_info.proxy, domain, now):
                 logger.debug(
-                    f"🎯 选择代理: {proxy_info.proxy} "
+                    f"🎯 选择代理: {proxy_info.proxy} -> {domain} "
                     f"(评分: {proxy_info.score:.1f}, "
-                    f"成功率: {proxy_info.success_rate:.2f}, "
-                    f"响应时间: {proxy_info.response_time:.2f}s)"
+                    f"成功率: {proxy_info.recent_success_rate:.2f}, "
+                    f"响应时间: {proxy_info.recent_latency:.2f}s)"
                 )
-
                 return proxy_info
+            candidates.remove(proxy_info)
+
+        return None
+
+    def _health_buckets(self, proxy: str, domain: str) -> List[ProxyHealth]:
+        buckets = [self._health.get((proxy, GLOBAL_DOMAIN))]
+        if domain != GLOBAL_DOMAIN:
+            buckets.append(self._health.get((proxy, domain)))
+        return [bucket for bucket in buckets if bucket is not None]
+
+    def _breakers_allow(self, proxy: str, domain: str, now: float) -> bool:
+        return all(bucket.allows(now) for bucket in self._health_buckets(proxy, domain))
+
+    def _claim_trials(self, proxy: str, domain: str, now: float) -> bool:
+        buckets = self._health_buckets(proxy, domain)
+        if all(bucket.state is CircuitState.CLOSED for bucket in buckets):
+            return True
+        with self._health_lock:
+            if not all(bucket.allows(now) for bucket in buckets):
+                return False
+            for bucket in buckets:
+                bucket.claim_trial(now)
+            return True
+
+    def _proxy_cost(self, proxy_info: ProxyInfo, domain: str) -> float:
+        """代理访问某站点的期望耗时：有该站点的样本时用站点桶，否则用全局桶"""
+        default_latency = proxy_info.recent_latency or self.config.timeout / 2
+        for key in ((proxy_info.proxy, domain), (proxy_info.proxy, GLOBAL_DOMAIN)):
+            bucket = self._health.get(key)
+            if bucket is not None and bucket.samples:
+                return bucket.cost(default_latency)
+        return default_latency / max(proxy_info.recent_success_rate, 0.05)
+
+    def is_proxy_available(self, proxy: str, domain: Optional[str] = None) -> bool:
+        """代理当前是否可用于某站点（未被标记失败且熔断器放行）"""
+        return proxy not in self.failed_proxies and self._breakers_allow(proxy, target_domain(domain), time.monotonic())
+
+    def report_result(
+        self,
+        proxy: str,
+        success: bool,
+        latency: Optional[float] = None,
+        domain: Optional[str] = None,
+        status_code: Optional[int] = None,
+    ):
+        """
+        上报一次经由代理的请求结果
+
+        结果总是计入目标站点的健康度桶；成功或连接层失败（没有状态码）同时计入全局桶，
+        站点返回的拒绝类状态码只说明该站点不接受这个代理，不影响其他站点。
+        """
+        domain = target_domain(domain)
+        now = time.monotonic()
+        update_global = success or status_code is None or domain == GLOBAL_DOMAIN
+        with self._health_lock:
+            if domain != GLOBAL_DOMAIN:
+                self._health.setdefault((proxy, domain), ProxyHealth()).record(success, latency, self.config, now)
+            if update_global:
+                global_health = self._health.setdefault((proxy, GLOBAL_DOMAIN), ProxyHealth())
+                global_health.record(success, latency, self.config, now)
+
+        proxy_info = self._snapshot.by_proxy.get(proxy)
+        if proxy_info is not None and update_global:
+            proxy_info.ewma_success = global_health.success
+            proxy_info.ewma_latency = global_health.latency
+            proxy_info.ewma_samples = global_health.samples
+            proxy_info.score = self._calculate_proxy_score(proxy_info)
+
+    def get_health(self, proxy: str) -> Dict[str, Dict]:
+        """代理在各站点上的健康度"""
+        with self._health_lock:
+            return {
+                domain: {
+                    "latency": round(health.latency, 3),
+                    "success": round(health.success, 3),
+                    "samples": health.samples,
+                    "state": health.state.value,
+                }
+                for (address, domain), health in self._health.items()
+                if address == proxy
+            }
+
+    def ensure_background_refresh(self):
+        """确保后台刷新线程在运行"""
+        if not self.background_refresh or (self._refresher is not None and self._refresher.is_alive()):
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stop_event.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name="proxy-pool-refresher", daemon=True)
+            self._refresher.start()
+            logger.info("🚀 代理池后台刷新线程已启动")
+
+    def stop_background_refresh(self, timeout: Optional[float] = None):
+        """停止后台刷新线程"""
+        self._stop_event.set()
+        self._wake_event.set()
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join(timeout)
+
+    def request_refresh(self):
+        """通知后台刷新线程尽快刷新，立即返回"""
+        self._wake_event.set()
+
+    def _refresh_loop(self):
+        while not self._stop_event.is_set():
+            # 先清除再刷新：刷新期间到达的通知会让下一轮立即开始
+            self._wake_event.clear()
+            try:
+                self._refresh_once()
+            except Exception as e:
+                logger.error(f"❌ 代理池后台刷新失败: {e}")
+            self._wake_event.wait(self.config.check_interval)
+
+    def _refresh_once(self):
+        """一轮后台刷新：代理不足时补充，到期时做健康检查"""
+        if self._stop_event.is_set():
+            return
+
+        snapshot = self._snapshot
+        if (snapshot.degraded or not snapshot) and time.monotonic() - self._last_fetch_time >= self.config.min_refill_interval:
+            self._fetch_fresh_proxies()
 
-            return None
+        if self.last_check_time is None or datetime.now() - self.last_check_time > timedelta(
+            seconds=self.config.check_interval
+        ):
+            self._check_proxy_health()
 
     def _check_proxy_health(self):
-        """批量检查代理健康状态"""
+        """
+        批量检查代理健康状态
+
+        探测期间不持有锁，探测结束后在锁内清理失败代理并发布新快照。
+        """
         logger.info("🔍 检查代理池健康状态...")
         self.last_check_time = datetime.now()
 
         # 优先检查评分较低或长时间未检查的代理
-        proxies_to_check = sorted(self.proxies, key=lambda x: (x.score, x.last_checked or ""))[:30]
-
-        # 使用线程池并发测试
-        with ThreadPoolExecutor(max_workers=self.config.concurrent_checks) as executor:
-            future_to_proxy = {executor.submit(self._test_proxy, proxy): proxy for proxy in proxies_to_check}
+        with self._lock:
+            proxies_to_check = sorted(self.proxies, key=lambda x: (x.score, x.last_checked or ""))[:30]
 
-            failed_count = 0
-            success_count = 0
+        failed_count = 0
+        success_count = 0
+        newly_failed = set()
 
+        # 使用线程池并发测试
+        executor = ThreadPoolExecutor(max_workers=self.config.concurrent_checks)
+        future_to_proxy = {executor.submit(self._test_proxy, proxy): proxy for proxy in proxies_to_check}
+        try:
             for future in as_completed(future_to_proxy, timeout=60):
                 proxy = future_to_proxy[future]
                 try:
@@ -576,16 +894,23 @@ class ProxyPool:
                         failed_count += 1
                         # 标记连续失败多次的代理
                         if proxy.fail_count >= self.config.max_retries:
-                            self.failed_proxies.add(proxy.proxy)
+                            newly_failed.add(proxy.proxy)
                 except Exception as e:
                     logger.debug(f"代理 {proxy.proxy} 测试异常: {e}")
                     failed_count += 1
-                    self.failed_proxies.add(proxy.proxy)
+                    newly_failed.add(proxy.proxy)
+        except FuturesTimeoutError:
+            logger.warning("⚠️ 部分代理检查超时，本轮跳过")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
         # 清理失败代理
-        original_count = len(self.proxies)
-        self.proxies = [p for p in self.proxies if p.proxy not in self.failed_proxies]
-        removed_count = original_count - len(self.proxies)
+        with self._lock:
+            self.failed_proxies.update(newly_failed)
+            original_count = len(self.proxies)
+            self.proxies = [p for p in self.proxies if p.proxy not in self.failed_proxies]
+            removed_count = original_count - len(self.proxies)
+            self.refresh_snapshot()
 
         # 保存更新后的代理池
         self._save_proxies()
@@ -607,10 +932,11 @@ class ProxyPool:
 
             # 移除失败次数过多的代理
             self.proxies = [p for p in self.proxies if p.proxy != proxy or p.fail_count < self.config.max_retries * 2]
+            self.refresh_snapshot()
 
-    def get_proxy_for_requests(self) -> Optional[Dict]:
-        """获取用于requests的代理字典"""
-        proxy_info = self.get_working_proxy()
+    def get_proxy_for_requests(self, domain: Optional[str] = None) -> Optional[Dict]:
+        """获取用于requests的代理字典，domain 为目标站点（URL或域名）"""
+        proxy_info = self.get_working_proxy(domain)
         if proxy_info:
             proxy = proxy_info.proxy
 
@@ -636,6 +962,7 @@ class ProxyPool:
                 proxy_info = ProxyInfo(proxy=proxy, protocol=protocol, country=country, anonymity=anonymity, source="manual")
                 self.proxies.append(proxy_info)
                 logger.info(f"✅ 已添加自定义代理: {proxy}")
+                self.refresh_snapshot()
                 self._save_proxies()
                 return True
             else:
@@ -652,6 +979,7 @@ class ProxyPool:
                 self.failed_proxies.discard(proxy)
                 if proxy in self.proxy_stats:
                     del self.proxy_stats[proxy]
+                self.refresh_snapshot()
                 self._save_proxies()
                 logger.info(f"✅ 已移除代理: {proxy}")
                 return True
@@ -798,6 +1126,7 @@ class ProxyPool:
                 proxy.fail_count = 0
 
             logger.info(f"🔄 已重置 {old_count} 个失败代理，给予第二次机会")
+            self.refresh_snapshot()
             self._save_proxies()
 
     def force_refresh(self):
@@ -10,8 +10,13 @@ import time
 from datetime import datetime
 from typing import Dict, List
 
+from django.conf import settings
+
 import requests
 
+from .llm_gateway import LLMGatewayError, LLMTimeoutError, llm_gateway
+from .stage_fanout import Stage, run_stages
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -47,9 +52,11 @@ class RealDataTravelService:
             "timezone": "worldtimeapi.org",
         }
 
-        # 重试配置 - 优化版本
+        # 重试配置 - 优化版本（DeepSeek调用的总尝试次数）
         self.max_retries = 2  # 减少重试次数
-        self.retry_delay = 1  # 减少重试延迟
+        self.deepseek_timeout = 120  # 单次DeepSeek调用的总时间预算（秒，包括重试）
+        # 并行获取基础数据的总截止时间（秒），到期未完成的部分使用备用数据
+        self.fetch_deadline = getattr(settings, "TRAVEL_GUIDE_FETCH_DEADLINE", 90)
 
     def get_real_travel_guide(
         self, destination: str, travel_style: str, budget_range: str, travel_duration: str, interests: List[str]
@@ -59,36 +66,59 @@ class RealDataTravelService:
             logger.info(f"🔍 开始为{destination}生成真实旅游攻略...")
             start_time = time.time()
 
-            # 使用同步方式获取数据，避免线程池问题
-            logger.info("🚀 获取基础数据...")
-
-            # 获取景点数据
-            logger.info("🔍 获取attractions数据...")
-            attractions = self._get_data_with_fallback(
-                "attractions", self._get_real_attractions_with_deepseek, destination, travel_style, interests
-            )
-
-            # 获取美食数据
-            logger.info("🔍 获取foods数据...")
-            foods = self._get_data_with_fallback("foods", self._get_real_foods_with_deepseek, destination, interests)
-
-            # 获取住宿数据
-            logger.info("🔍 获取accommodations数据...")
-            accommodations = self._get_data_with_fallback(
-                "accommodations", self._get_real_accommodations_with_deepseek, destination, budget_range
+            # 互相独立的数据并行获取，共用一个截止时间，超时或失败的部分使用备用数据
+            logger.info("🚀 并行获取景点、美食、住宿、交通、天气和地理信息...")
+            data, stage_timings = run_stages(
+                [
+                    Stage(
+                        "attractions",
+                        lambda: self._get_data_with_fallback(
+                            "attractions", self._get_real_attractions_with_deepseek, destination, travel_style, interests
+                        ),
+                        lambda: self._get_fallback_attractions(destination, travel_style, interests),
+                    ),
+                    Stage(
+                        "foods",
+                        lambda: self._get_data_with_fallback(
+                            "foods", self._get_real_foods_with_deepseek, destination, interests
+                        ),
+                        lambda: self._get_fallback_foods(destination, interests),
+                    ),
+                    Stage(
+                        "accommodations",
+                        lambda: self._get_data_with_fallback(
+                            "accommodations", self._get_real_accommodations_with_deepseek, destination, budget_range
+                        ),
+                        lambda: self._get_fallback_accommodations(destination, budget_range),
+                    ),
+                    Stage(
+                        "transport",
+                        lambda: self._get_data_with_fallback("transport", self._get_real_transport_with_deepseek, destination),
+                        lambda: self._get_fallback_transport(destination),
+                    ),
+                    Stage(
+                        "weather",
+                        lambda: self._get_real_weather_data(destination),
+                        lambda: self._get_fallback_weather_data(destination),
+                    ),
+                    Stage(
+                        "geolocation",
+                        lambda: self._get_geolocation_info(destination),
+                        lambda: self._get_fallback_geo_data(destination),
+                    ),
+                ],
+                timeout=self.fetch_deadline,
             )
-
-            # 获取交通数据
-            logger.info("🔍 获取transport数据...")
-            transport = self._get_data_with_fallback("transport", self._get_real_transport_with_deepseek, destination)
-
-            # 获取天气和地理信息
-            logger.info("🌤️ 获取天气和地理信息...")
-            weather_info = self._get_real_weather_data(destination)
-            geo_info = self._get_geolocation_info(destination)
+            attractions = data["attractions"]
+            foods = data["foods"]
+            accommodations = data["accommodations"]
+            transport = data["transport"]
+            weather_info = data["weather"]
+            geo_info = data["geolocation"]
 
             # 生成完整攻略
             logger.info("📝 生成完整攻略...")
+            guide_started = time.monotonic()
             complete_guide = self._generate_complete_guide_with_deepseek(
                 destination,
                 travel_style,
@@ -102,6 +132,7 @@ class RealDataTravelService:
                 weather_info,
                 geo_info,
             )
+            stage_timings["complete_guide"] = {"status": "ok", "seconds": round(time.monotonic() - guide_started, 3)}
 
             # 合成最终攻略
             final_guide = self._synthesize_final_guide(
@@ -118,6 +149,11 @@ class RealDataTravelService:
                 accommodations,
                 complete_guide,
             )
+            final_guide["stage_timings"] = stage_timings
+            data_sources = final_guide.get("data_sources") or {}
+            for name, report in stage_timings.items():
+                if report["status"] != "ok" and name in data_sources:
+                    data_sources[name] = "备用数据"
 
             end_time = time.time()
             logger.info(f"✅ 真实旅游攻略生成完成！耗时: {end_time - start_time:.2f}秒")
@@ -212,62 +248,23 @@ class RealDataTravelService:
             return self._generate_fallback_guide(destination, travel_style, budget_range, travel_duration, interests)
 
     def _call_deepseek_api(self, prompt: str, max_tokens: int = 8000) -> str:  # 增加token数量到8000
-        """调用DeepSeek API，带重试机制"""
-        import time
-
-        for attempt in range(self.max_retries):
-            try:
-                url = f"{self.deepseek_base_url}/chat/completions"
-                headers = {"Authorization": f"Bearer {self.deepseek_api_key}", "Content-Type": "application/json"}
-
-                data = {
-                    "model": "deepseek-chat",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": max_tokens,
-                    "temperature": 0.7,
-                }
-
-                logger.info(f"🔄 DeepSeek API调用尝试 {attempt + 1}/{self.max_retries}")
-                response = self.session.post(url, headers=headers, json=data)
-
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.info("✅ DeepSeek API调用成功")
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    logger.warning(f"⚠️ DeepSeek API调用失败: {response.status_code} - {response.text}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(self.retry_delay * (attempt + 1))
-                        continue
-                    else:
-                        return ""
-
-            except requests.exceptions.Timeout:
-                logger.warning(f"⏰ DeepSeek API调用超时 (尝试 {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-                else:
-                    logger.error("❌ DeepSeek API调用最终超时")
-                    return ""
-
-            except requests.exceptions.ConnectionError as e:
-                logger.warning(f"🔌 DeepSeek API连接错误 (尝试 {attempt + 1}/{self.max_retries}): {e}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-                else:
-                    logger.error("❌ DeepSeek API连接最终失败")
-                    return ""
-
-            except Exception as e:
-                logger.error(f"❌ DeepSeek API调用异常: {e}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-                else:
-                    return ""
-
+        """调用DeepSeek API，重试和超时由 llm_gateway 统一处理，失败时返回空字符串"""
+        try:
+            content = llm_gateway.complete(
+                prompt,
+                feature="travel",
+                api_key=self.deepseek_api_key,
+                max_retries=self.max_retries - 1,
+                timeout=self.deepseek_timeout,
+                max_tokens=max_tokens,
+                temperature=0.7,
+            )
+            logger.info("✅ DeepSeek API调用成功")
+            return content
+        except LLMTimeoutError:
+            logger.error("❌ DeepSeek API调用最终超时")
+        except LLMGatewayError as e:
+            logger.error(f"❌ DeepSeek API调用失败: {e}")
         return ""
 
     def _get_real_attractions_with_deepseek(self, destination: str, travel_style: str, interests: List[str]) -> List[Dict]:
@@ -0,0 +1,319 @@
+"""
+MeetSomeone 关系图谱构建
+
+图谱只依赖四类轻量数据，每类一条查询（与人物数量无关）：
+人物档案、人物-标签关联、人物-共同好友关联、多人互动的参与者。
+标签按 RelationshipTag 的默认排序分组后取第一个作为主标签；人物之间的连线按无序对合并，
+共同好友和一起参与互动都会建立连线，一起参与的次数越多连线越强。
+
+序列化后的图谱按用户缓存，人物、互动、标签及其多对多关系变化时失效。失效时保留上一版图谱，
+重建后与之比较得到增量（新增/更新/删除的节点和连线），前端带上 since=<版本号> 即可只取增量。
+"""
+
+import hashlib
+import json
+import logging
+from collections import Counter, defaultdict, namedtuple
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "meetsomeone_graph"
+# 上一版图谱只用于计算增量，保留时间比当前图谱长
+SNAPSHOT_TIMEOUT = 7 * 24 * 60 * 60
+
+ProfileRow = namedtuple("ProfileRow", ["id", "name", "nickname", "importance_level", "interaction_count"])
+
+# (关键字, 类型)，按顺序匹配主标签
+NODE_TYPE_RULES = [
+    (("同事", "合作"), "colleague"),
+    (("家人", "亲"), "family"),
+    (("导师", "老师"), "mentor"),
+    (("朋友",), "friend"),
+]
+EDGE_TYPE_RULES = [(("同事",), "colleague"), (("家人",), "family"), (("导师",), "mentor")]
+
+ACQUAINTANCE_STRENGTH = 3.0
+MAX_STRENGTH = 10
+
+
+def _classify(tag_name: Optional[str], rules, default: str = "friend") -> str:
+    if tag_name:
+        for keywords, kind in rules:
+            if any(keyword in tag_name for keyword in keywords):
+                return kind
+    return default
+
+
+def _display_name(profile: ProfileRow) -> str:
+    return profile.nickname or profile.name
+
+
+def load_graph_rows(user_id: int):
+    """
+    读取构建图谱需要的数据，固定4条查询
+
+    返回 (人物列表, {人物ID: [标签名]}, 共同好友关系 [(人物ID, 好友ID)], 多人互动参与者 {互动ID: {人物ID}})
+    """
+    from ..models.relationship_models import Interaction, PersonProfile
+
+    profiles = [
+        ProfileRow(*row)
+        for row in PersonProfile.objects.filter(user_id=user_id).values_list(
+            "id", "name", "nickname", "importance_level", "interaction_count"
+        )
+    ]
+
+    tags: Dict[int, List[str]] = defaultdict(list)
+    tag_links = (
+        PersonProfile.relationship_tags.through.objects.filter(personprofile__user_id=user_id)
+        .order_by("personprofile_id", "-relationshiptag__usage_count", "relationshiptag__name")
+        .values_list("personprofile_id", "relationshiptag__name")
+    )
+    for profile_id, tag_name in tag_links:
+        tags[profile_id].append(tag_name)
+
+    mutual_pairs = list(
+        PersonProfile.mutual_friends.through.objects.filter(
+            from_personprofile__user_id=user_id, to_personprofile__user_id=user_id
+        ).values_list("from_personprofile_id", "to_personprofile_id")
+    )
+
+    participants: Dict[int, set] = defaultdict(set)
+    group_links = Interaction.other_participants.through.objects.filter(interaction__user_id=user_id).values_list(
+        "interaction_id", "interaction__person_id", "personprofile_id"
+    )
+    for interaction_id, person_id, participant_id in group_links:
+        participants[interaction_id].update((person_id, participant_id))
+
+    return profiles, dict(tags), mutual_pairs, dict(participants)
+
+
+def build_graph(
+    profiles: List[ProfileRow],
+    tags: Dict[int, List[str]],
+    mutual_pairs: Iterable[Tuple[int, int]],
+    participants: Dict[int, set],
+) -> dict:
+    """由读取的数据构建图谱（纯计算，不访问数据库）"""
+    profile_ids = {profile.id for profile in profiles}
+
+    nodes = [{"id": "self", "name": "我", "type": "self", "size": 25, "importance": 5}]
+    edges = []
+    for profile in profiles:
+        profile_tags = tags.get(profile.id, [])
+        main_tag = profile_tags[0] if profile_tags else None
+        nodes.append(
+            {
+                "id": profile.id,
+                "name": _display_name(profile),
+                "type": _classify(main_tag, NODE_TYPE_RULES),
+                "size": 10 + (profile.importance_level * 2) + min(profile.interaction_count // 5, 10),
+                "importance": profile.importance_level,
+                "interaction_count": profile.interaction_count,
+                "relationship_tags": profile_tags,
+            }
+        )
+        edges.append(
+            {
+                "id": f"self-{profile.id}",
+                "source": "self",
+                "target": profile.id,
+                "strength": min(profile.importance_level * 2 + profile.interaction_count / 10, MAX_STRENGTH),
+                "type": _classify(main_tag, EDGE_TYPE_RULES),
+                "interaction_count": profile.interaction_count,
+            }
+        )
+
+    # 人物之间的连线按无序对合并：共同好友（双向登记只算一条）和一起参与互动的次数
+    pair_sources: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    for source, target in mutual_pairs:
+        if source != target and source in profile_ids and target in profile_ids:
+            pair_sources.setdefault((min(source, target), max(source, target)), (source, target))
+
+    shared = Counter()
+    for members in participants.values():
+        members = sorted(member for member in members if member in profile_ids)
+        shared.update(combinations(members, 2))
+
+    for pair in sorted(set(pair_sources) | set(shared)):
+        source, target = pair_sources.get(pair, pair)
+        count = shared.get(pair, 0)
+        edges.append(
+            {
+                "id": f"{pair[0]}-{pair[1]}",
+                "source": source,
+                "target": target,
+                "strength": min(ACQUAINTANCE_STRENGTH + count, MAX_STRENGTH),
+                "type": "acquaintance",
+                "interaction_count": count,
+            }
+        )
+
+    total = len(profiles)
+    strongest = max(profiles, key=lambda p: p.importance_level * 2 + p.interaction_count) if profiles else None
+    most_connected = max(profiles, key=lambda p: p.interaction_count) if profiles else None
+    return {
+        "nodes": nodes,
+        "edges": edges,
+        "statistics": {
+            "total_connections": total,
+            "average_importance": round(sum(p.importance_level for p in profiles) / total, 1) if total else 0,
+            "strongest_connection": _display_name(strongest) if strongest else "无",
+            "most_connected": _display_name(most_connected) if most_connected else "无",
+        },
+    }
+
+
+def graph_version(graph: dict) -> str:
+    """图谱内容的版本号，内容不变则版本号不变"""
+    payload = json.dumps(graph, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _diff_items(old: List[dict], new: List[dict]) -> Tuple[List[dict], List[dict], list]:
+    old_by_id = {item["id"]: item for item in old}
+    new_ids = set()
+    added, updated = [], []
+    for item in new:
+        new_ids.add(item["id"])
+        previous = old_by_id.get(item["id"])
+        if previous is None:
+            added.append(item)
+        elif previous != item:
+            updated.append(item)
+    removed = [item_id for item_id in old_by_id if item_id not in new_ids]
+    return added, updated, removed
+
+
+def diff_graph(old: dict, new: dict) -> dict:
+    """计算两版图谱之间的增量"""
+    added_nodes, updated_nodes, removed_nodes = _diff_items(old["nodes"], new["nodes"])
+    added_edges, updated_edges, removed_edges = _diff_items(old["edges"], new["edges"])
+    return {
+        "nodes": {"added": added_nodes, "updated": updated_nodes, "removed": removed_nodes},
+        "edges": {"added": added_edges, "updated": updated_edges, "removed": removed_edges},
+        "statistics": new["statistics"],
+    }
+
+
+class RelationshipGraphService:
+    """按用户缓存关系图谱，支持增量返回"""
+
+    def __init__(self, cache_timeout: Optional[int] = None):
+        self.cache_timeout = cache_timeout
+
+    def _timeout(self) -> int:
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, "MEETSOMEONE_GRAPH_CACHE_TIMEOUT", 60 * 60)
+
+    @staticmethod
+    def _current_key(user_id: int) -> str:
+        return f"{CACHE_PREFIX}:{user_id}:current"
+
+    @staticmethod
+    def _snapshot_key(user_id: int) -> str:
+        return f"{CACHE_PREFIX}:{user_id}:snapshot"
+
+    def _build(self, user_id: int) -> dict:
+        graph = build_graph(*load_graph_rows(user_id))
+        version = graph_version(graph)
+        entry = {"version": version, "graph": graph, "delta": None}
+
+        # 与失效前的上一版比较，记录一步增量
+        snapshot = cache.get(self._snapshot_key(user_id))
+        if snapshot and snapshot["version"] != version:
+            entry["delta"] = {"base_version": snapshot["version"], **diff_graph(snapshot["graph"], graph)}
+
+        cache.set(self._current_key(user_id), entry, self._timeout())
+        cache.set(self._snapshot_key(user_id), {"version": version, "graph": graph}, SNAPSHOT_TIMEOUT)
+        return entry
+
+    def get_graph(self, user_id: int, since: Optional[str] = None) -> dict:
+        """
+        获取用户的关系图谱
+
+        返回 {"version", "mode", ...}：
+        - mode=unchanged：since 已是最新版本
+        - mode=delta：附带从 since 到当前版本的增量 delta
+        - mode=full：附带完整图谱 graph
+        """
+        entry = cache.get(self._current_key(user_id)) or self._build(user_id)
+        version = entry["version"]
+        if since and since == version:
+            return {"version": version, "mode": "unchanged"}
+        delta = entry.get("delta")
+        if since and delta and delta["base_version"] == since:
+            return {"version": version, "mode": "delta", "delta": delta}
+        return {"version": version, "mode": "full", "graph": entry["graph"]}
+
+    def invalidate(self, user_id: int):
+        """使当前图谱失效，保留上一版用于计算增量；缓存不可用时只记录日志，不影响触发失效的保存操作"""
+        try:
+            cache.delete(self._current_key(user_id))
+        except Exception as e:
+            logger.warning(f"关系图谱缓存失效失败: {user_id}, {e}")
+
+    def invalidate_users(self, user_ids: Iterable[int]):
+        for user_id in set(user_ids):
+            self.invalidate(user_id)
+
+
+# 全局图谱服务实例
+relationship_graph = RelationshipGraphService()
+
+
+def _invalidate_owner(sender, instance, **kwargs):
+    relationship_graph.invalidate(instance.user_id)
+
+
+def _invalidate_tag_users(sender, instance, **kwargs):
+    """标签改名或使用次数变化会影响主标签"""
+    from ..models.relationship_models import PersonProfile
+
+    relationship_graph.invalidate_users(
+        PersonProfile.objects.filter(relationship_tags=instance).values_list("user_id", flat=True).distinct()
+    )
+
+
+def _invalidate_m2m(sender, instance, action, pk_set=None, model=None, **kwargs):
+    from ..models.relationship_models import PersonProfile, RelationshipTag
+
+    if action == "pre_clear" and isinstance(instance, RelationshipTag):
+        # 从标签一侧清空关联，清空后就查不到受影响的人物了
+        _invalidate_tag_users(sender, instance)
+    if not action.startswith("post_"):
+        return
+
+    if hasattr(instance, "user_id"):
+        relationship_graph.invalidate(instance.user_id)
+    if model is PersonProfile and pk_set:
+        # 反向修改（如从标签一侧修改关联的人物）时，受影响的是这些人物的所有者
+        relationship_graph.invalidate_users(PersonProfile.objects.filter(pk__in=pk_set).values_list("user_id", flat=True))
+
+
+def connect_signals():
+    """人物、互动、标签及其关联变化时使图谱缓存失效（在 ToolsConfig.ready 中调用）"""
+    from ..models.relationship_models import Interaction, PersonProfile, RelationshipTag
+
+    for model in (PersonProfile, Interaction):
+        name = model.__name__.lower()
+        post_save.connect(_invalidate_owner, sender=model, dispatch_uid=f"relationship_graph_{name}_post_save")
+        post_delete.connect(_invalidate_owner, sender=model, dispatch_uid=f"relationship_graph_{name}_post_delete")
+
+    post_save.connect(_invalidate_tag_users, sender=RelationshipTag, dispatch_uid="relationship_graph_tag_post_save")
+    # 删除前关联还在，才能找到受影响的用户
+    pre_delete.connect(_invalidate_tag_users, sender=RelationshipTag, dispatch_uid="relationship_graph_tag_pre_delete")
+
+    for through in (
+        PersonProfile.relationship_tags.through,
+        PersonProfile.mutual_friends.through,
+        Interaction.other_participants.through,
+    ):
+        m2m_changed.connect(_invalidate_m2m, sender=through, dispatch_uid=f"relationship_graph_{through.__name__}")
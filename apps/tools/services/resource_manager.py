@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import io
 import logging
@@ -13,6 +14,8 @@ from django.conf import settings
 import aiofiles
 from PIL import Image
 
+from .chunk_assembler import ChunkAssemblyError, StreamingChunkAssembler
+
 logger = logging.getLogger(__name__)
 
 
@@ -89,7 +92,12 @@ class ThumbnailGenerator:
 
 
 class ChunkedFileManager:
-    """分片文件管理器"""
+    """
+    分片文件管理器
+
+    分片到达后直接写入预分配的目标文件（见 StreamingChunkAssembler），边写边算MD5；
+    上传状态持久化在临时目录中，可通过 resume_file 恢复未完成的上传。
+    """
 
     def __init__(self, chunk_size: int = 1024 * 1024):  # 1MB分片
         self.chunk_size = chunk_size
@@ -98,16 +106,15 @@ class ChunkedFileManager:
 
         # 文件信息缓存
         self.file_info_cache: Dict[str, FileInfo] = {}
+        self.assemblers: Dict[str, StreamingChunkAssembler] = {}
 
     def create_file_info(self, filename: str, total_size: int, mime_type: str = None) -> FileInfo:
-        """创建文件信息"""
+        """创建文件信息，同时预分配目标文件"""
         file_id = self._generate_file_id(filename, total_size)
 
         if mime_type is None:
             mime_type, _ = mimetypes.guess_type(filename)
 
-        (total_size + self.chunk_size - 1) // self.chunk_size
-
         file_info = FileInfo(
             file_id=file_id,
             filename=filename,
@@ -118,9 +125,40 @@ class ChunkedFileManager:
             uploaded_chunks=set(),
         )
 
+        self.assemblers[file_id] = StreamingChunkAssembler(file_id, self.temp_dir, total_size, self.chunk_size, filename)
+        self.file_info_cache[file_id] = file_info
+        return file_info
+
+    def resume_file(self, file_id: str) -> Optional[FileInfo]:
+        """恢复未完成的上传（如进程重启后），返回的 uploaded_chunks 为已写入的分片"""
+        if file_id in self.file_info_cache:
+            return self.file_info_cache[file_id]
+
+        assembler = StreamingChunkAssembler.resume(file_id, self.temp_dir)
+        if assembler is None:
+            return None
+
+        mime_type, _ = mimetypes.guess_type(assembler.filename)
+        file_info = FileInfo(
+            file_id=file_id,
+            filename=assembler.filename,
+            size=assembler.total_size,
+            mime_type=mime_type or "application/octet-stream",
+            checksum="",
+            chunks=[],
+            uploaded_chunks=set(assembler.received_chunks),
+        )
+        self.assemblers[file_id] = assembler
         self.file_info_cache[file_id] = file_info
         return file_info
 
+    def get_missing_chunks(self, file_id: str) -> Optional[List[int]]:
+        """断点续传：返回还需要上传的分片编号"""
+        if self.resume_file(file_id) is None:
+            return None
+        assembler = self.assemblers.get(file_id)
+        return assembler.missing_chunks if assembler else []
+
     async def save_chunk(self, chunk: FileChunk) -> bool:
         """保存文件分片"""
         try:
@@ -128,52 +166,42 @@ class ChunkedFileManager:
             if not self._verify_chunk_data(chunk):
                 return False
 
-            # 保存分片到临时文件
-            chunk_path = self.temp_dir / f"{chunk.file_id}_{chunk.chunk_number}"
-
-            async with aiofiles.open(chunk_path, "wb") as f:
-                await f.write(chunk.data)
+            file_info = self.resume_file(chunk.file_id)
+            assembler = self.assemblers.get(chunk.file_id)
+            if file_info is None or assembler is None:
+                logger.error(f"未知的上传文件: {chunk.file_id}")
+                return False
 
-            # 更新文件信息
-            if chunk.file_id in self.file_info_cache:
-                file_info = self.file_info_cache[chunk.file_id]
-                file_info.uploaded_chunks.add(chunk.chunk_number)
+            # 直接写入目标文件中该分片的偏移位置，磁盘IO放到线程中执行
+            await asyncio.to_thread(assembler.write_chunk, chunk.chunk_number, chunk.data)
+            file_info.uploaded_chunks.add(chunk.chunk_number)
 
-                # 检查是否所有分片都已上传
-                if len(file_info.uploaded_chunks) == chunk.total_chunks:
-                    await self._assemble_file(chunk.file_id)
+            # 检查是否所有分片都已上传
+            if assembler.received_count == assembler.total_chunks:
+                return await self._assemble_file(chunk.file_id)
 
             return True
 
+        except ChunkAssemblyError as e:
+            logger.error(f"保存分片失败: {e}")
+            return False
         except Exception as e:
             logger.error(f"保存分片失败: {e}")
             return False
 
     async def _assemble_file(self, file_id: str) -> bool:
-        """组装文件"""
+        """完成组装：分片已在写入时就位，这里只需落盘并移动到最终位置"""
         try:
             file_info = self.file_info_cache[file_id]
+            assembler = self.assemblers[file_id]
 
             # 创建最终文件路径
             final_path = Path(settings.MEDIA_ROOT) / "uploads" / file_info.filename
-            final_path.parent.mkdir(parents=True, exist_ok=True)
 
-            # 按顺序读取并写入分片
-            async with aiofiles.open(final_path, "wb") as final_file:
-                for chunk_num in range(len(file_info.uploaded_chunks)):
-                    chunk_path = self.temp_dir / f"{file_id}_{chunk_num}"
-
-                    if chunk_path.exists():
-                        async with aiofiles.open(chunk_path, "rb") as chunk_file:
-                            chunk_data = await chunk_file.read()
-                            await final_file.write(chunk_data)
-
-                    # 删除分片文件
-                    chunk_path.unlink(missing_ok=True)
-
-            # 计算最终文件校验和
-            file_info.checksum = await self._calculate_file_checksum(final_path)
+            # 校验和在写入分片时已增量计算
+            file_info.checksum = await asyncio.to_thread(assembler.finalize, final_path)
             file_info.is_complete = True
+            del self.assemblers[file_id]
 
             logger.info(f"文件组装完成: {file_info.filename}")
             return True
@@ -188,16 +216,6 @@ class ChunkedFileManager:
         calculated_checksum = hashlib.md5(chunk.data, usedforsecurity=False).hexdigest()
         return calculated_checksum == chunk.checksum
 
-    async def _calculate_file_checksum(self, file_path: Path) -> str:
-        """计算文件校验和"""
-        hash_md5 = hashlib.md5(usedforsecurity=False)
-
-        async with aiofiles.open(file_path, "rb") as f:
-            while chunk := await f.read(8192):
-                hash_md5.update(chunk)
-
-        return hash_md5.hexdigest()
-
     def _generate_file_id(self, filename: str, size: int) -> str:
         """生成文件ID"""
         content = f"{filename}_{size}_{time.time()}"
@@ -208,15 +226,21 @@ class ChunkedFileManager:
         return self.file_info_cache.get(file_id)
 
     def cleanup_temp_files(self, file_id: str = None):
-        """清理临时文件"""
+        """清理临时文件（未完成的上传状态会一并删除）"""
         if file_id:
-            # 清理特定文件的临时分片
-            for chunk_file in self.temp_dir.glob(f"{file_id}_*"):
-                chunk_file.unlink(missing_ok=True)
+            assembler = self.assemblers.pop(file_id, None)
+            if assembler:
+                assembler.abort()
+            # 清理特定文件的临时状态
+            for temp_file in self.temp_dir.glob(f"{file_id}[._]*"):
+                temp_file.unlink(missing_ok=True)
         else:
+            for assembler in self.assemblers.values():
+                assembler.abort()
+            self.assemblers.clear()
             # 清理所有临时文件
-            for chunk_file in self.temp_dir.glob("*"):
-                chunk_file.unlink(missing_ok=True)
+            for temp_file in self.temp_dir.glob("*"):
+                temp_file.unlink(missing_ok=True)
 
 
 class ResourceManager:
@@ -0,0 +1,104 @@
+"""
+并行执行互相独立的数据获取阶段
+
+各阶段提交到共享线程池同时运行，共用一个总截止时间：
+- 阶段内的大模型调用通过 deadline_scope 继承总截止时间，到期后网关直接放弃，不会继续占用线程
+- 截止时间到达时仍未完成的阶段被取消（还没开始的不再执行），结果改用该阶段的备用数据
+- 返回每个阶段的状态（ok / error / timeout）和耗时，便于定位拖慢整体的阶段
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .llm_gateway import deadline_scope
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """一个数据获取阶段：func 获取真实数据，fallback 在失败或超时时提供备用数据"""
+
+    name: str
+    func: Callable[[], Any]
+    fallback: Callable[[], Any]
+
+
+def _run_stage(stage: Stage, deadline: float) -> Tuple[Any, Optional[Exception], float]:
+    """在worker线程中执行阶段，返回 (结果, 异常, 耗时)"""
+    started = time.monotonic()
+    try:
+        with deadline_scope(max(0.0, deadline - started)):
+            return stage.func(), None, time.monotonic() - started
+    except Exception as e:
+        return None, e, time.monotonic() - started
+
+
+def _fallback(stage: Stage) -> Any:
+    try:
+        return stage.fallback()
+    except Exception as e:
+        logger.error(f"阶段[{stage.name}]备用数据获取失败: {e}")
+        return None
+
+
+def run_stages(
+    stages: List[Stage], timeout: float, executor: Optional[ThreadPoolExecutor] = None
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    并行执行所有阶段，最多等待 timeout 秒
+
+    返回 (按阶段名的结果, 按阶段名的 {"status", "seconds"})；失败或超时的阶段结果为其备用数据。
+    调用方的上下文（包括外层 deadline_scope）会复制到每个worker线程。
+    """
+    executor = executor or get_fanout_executor()
+    started = time.monotonic()
+    deadline = started + timeout
+    futures = [(executor.submit(contextvars.copy_context().run, _run_stage, stage, deadline), stage) for stage in stages]
+    done, _ = wait([future for future, _ in futures], timeout=max(0.0, deadline - time.monotonic()))
+
+    results = {}
+    report = {}
+    for future, stage in futures:
+        if future in done:
+            value, error, elapsed = future.result()
+            if error is None:
+                results[stage.name] = value
+                report[stage.name] = {"status": "ok", "seconds": round(elapsed, 3)}
+                continue
+            logger.warning(f"阶段[{stage.name}]失败: {error}，使用备用数据")
+            status = "error"
+        else:
+            future.cancel()
+            elapsed = time.monotonic() - started
+            logger.warning(f"阶段[{stage.name}]超过截止时间（{timeout}秒），使用备用数据")
+            status = "timeout"
+        results[stage.name] = _fallback(stage)
+        report[stage.name] = {"status": status, "seconds": round(elapsed, 3)}
+
+    summary = ", ".join(f"{name}={item['seconds']}s({item['status']})" for name, item in report.items())
+    logger.info(f"并行阶段完成，总耗时{time.monotonic() - started:.2f}秒: {summary}")
+    return results, report
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_fanout_executor() -> ThreadPoolExecutor:
+    """获取全局共享的阶段线程池（首次使用时创建）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "STAGE_FANOUT_MAX_WORKERS", 12), thread_name_prefix="stage-fanout"
+                )
+    return _executor
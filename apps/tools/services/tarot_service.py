@@ -11,9 +11,8 @@ from django.conf import settings
 from django.core.cache import cache
 from django.db import models
 
-import requests
-
 from ..models.tarot_models import TarotCard, TarotEnergyCalendar, TarotReading, TarotSpread
+from .llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -162,22 +161,7 @@ class TarotService:
             if not api_key:
                 return None
 
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 2000,
-                "temperature": 0.7,
-            }
-
-            response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-
-            return None
+            return llm_gateway.complete(prompt, feature="tarot", api_key=api_key, timeout=30, max_tokens=2000, temperature=0.7)
 
         except Exception as e:
             logger.error(f"调用AI API失败: {str(e)}")
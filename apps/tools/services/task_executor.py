@@ -0,0 +1,167 @@
+"""
+有界任务执行器
+固定数量的工作线程 + 优先级队列 + 按用户公平调度，队列满时拒绝新任务而不是无限创建线程
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskQueueFullError(Exception):
+    """任务队列已满"""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BoundedTaskExecutor:
+    """
+    有界任务执行器
+
+    调度顺序为 (priority, user_rank, seq)：priority越小越优先；
+    user_rank是该用户提交时已排队的任务数，使不同用户的任务交替执行，
+    避免单个用户的批量任务占满所有工作线程。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue_size: int = 50,
+        max_pending_per_user: int = 5,
+        default_duration: float = 30.0,
+        name: str = "task-executor",
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max_queue_size
+        self.max_pending_per_user = max_pending_per_user
+        self.name = name
+
+        self._heap: List[tuple] = []
+        self._entries: Dict[str, tuple] = {}
+        self._pending_per_user: Dict[str, int] = defaultdict(int)
+        self._running: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        # 任务耗时的指数滑动平均，用于估算ETA
+        self._avg_duration = default_duration
+        self._ewma_alpha = 0.2
+
+        self._workers: List[threading.Thread] = []
+        self._started = False
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"{self.name}-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._started = True
+
+    def submit(self, task_id: str, func: Callable, *args, priority: int = 0, user_id: Optional[str] = None, **kwargs):
+        """提交任务，队列已满或用户排队任务过多时抛出TaskQueueFullError"""
+        user_key = user_id or "anonymous"
+        with self._cond:
+            self._ensure_started()
+
+            if len(self._heap) >= self.max_queue_size:
+                raise TaskQueueFullError("任务队列已满，请稍后再试", retry_after=self._retry_after())
+            if self.max_pending_per_user and self._pending_per_user[user_key] >= self.max_pending_per_user:
+                raise TaskQueueFullError(
+                    f"您已有{self.max_pending_per_user}个任务在排队，请等待完成后再提交", retry_after=self._retry_after()
+                )
+
+            user_rank = self._pending_per_user[user_key]
+            entry = (priority, user_rank, next(self._seq), task_id, user_key, func, args, kwargs)
+            heapq.heappush(self._heap, entry)
+            self._entries[task_id] = entry
+            self._pending_per_user[user_key] += 1
+            self._cond.notify()
+
+    def cancel(self, task_id: str) -> bool:
+        """从队列中移除尚未开始的任务"""
+        with self._cond:
+            entry = self._entries.pop(task_id, None)
+            if entry is None:
+                return False
+            self._heap.remove(entry)
+            heapq.heapify(self._heap)
+            self._pending_per_user[entry[4]] -= 1
+            return True
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                entry = heapq.heappop(self._heap)
+                task_id, user_key, func, args, kwargs = entry[3:]
+                self._entries.pop(task_id, None)
+                self._pending_per_user[user_key] -= 1
+                self._running[task_id] = time.time()
+
+            started = time.time()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"执行器任务异常: {task_id}, {e}")
+            finally:
+                duration = time.time() - started
+                with self._cond:
+                    self._running.pop(task_id, None)
+                    self._avg_duration = self._ewma_alpha * duration + (1 - self._ewma_alpha) * self._avg_duration
+
+    def _retry_after(self) -> int:
+        waves = math.ceil((len(self._heap) + 1) / self.max_workers)
+        return max(1, int(waves * self._avg_duration))
+
+    def queue_positions(self) -> Dict[str, Dict[str, Any]]:
+        """返回所有排队任务的位置（从0开始）和预计完成所需秒数"""
+        with self._cond:
+            ordered = sorted(self._heap)
+            running_remaining = sorted(
+                max(0.0, self._avg_duration - (time.time() - started)) for started in self._running.values()
+            )
+            avg = self._avg_duration
+
+        positions = {}
+        for position, entry in enumerate(ordered):
+            # 前 max_workers - len(running) 个任务可以立即开始，其余按"波次"估算
+            free_slots = self.max_workers - len(running_remaining)
+            if position < free_slots:
+                wait = 0.0
+            else:
+                slot = position - free_slots
+                wave, index = divmod(slot, self.max_workers)
+                base = running_remaining[index] if index < len(running_remaining) else 0.0
+                wait = base + wave * avg
+            positions[entry[3]] = {"queue_position": position, "eta_seconds": int(wait + avg)}
+        return positions
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "queued": len(self._heap),
+                "running": len(self._running),
+                "avg_duration": round(self._avg_duration, 2),
+            }
+
+    def estimate_remaining(self, task_id: str) -> Optional[int]:
+        """估算运行中任务的剩余秒数"""
+        with self._cond:
+            started = self._running.get(task_id)
+            if started is None:
+                return None
+            return int(max(0.0, self._avg_duration - (time.time() - started)))
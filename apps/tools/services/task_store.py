@@ -0,0 +1,245 @@
+"""
+异步任务存储后端
+为AsyncTaskManager提供可插拔的持久化存储，多个worker进程共享同一份任务视图
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BaseTaskStore:
+    """任务存储基类，所有更新都以单个任务为粒度原子执行"""
+
+    def create(self, task: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, task_id: str, **fields) -> bool:
+        """原子更新任务字段，任务不存在时返回False"""
+        raise NotImplementedError
+
+    def delete(self, task_id: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, statuses: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        return len(self.list())
+
+    def delete_many(self, task_ids: Iterable[str]) -> int:
+        return sum(1 for task_id in task_ids if self.delete(task_id))
+
+
+class SQLiteTaskStore(BaseTaskStore):
+    """基于SQLite WAL模式的本地任务存储，同一台机器上的多个gunicorn worker共享"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None 由我们显式控制事务
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._get_connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS async_tasks (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_async_tasks_status ON async_tasks (status)")
+
+    def create(self, task: Dict[str, Any]) -> None:
+        conn = self._get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO async_tasks (id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (task["id"], task.get("status", "pending"), task.get("created_at", ""), json.dumps(task, ensure_ascii=False)),
+        )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._get_connection().execute("SELECT data FROM async_tasks WHERE id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, task_id: str, **fields) -> bool:
+        conn = self._get_connection()
+        # BEGIN IMMEDIATE 获取写锁，保证读-改-写在多进程间是原子的
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM async_tasks WHERE id = ?", (task_id,)).fetchone()
+            if not row:
+                conn.execute("ROLLBACK")
+                return False
+            task = json.loads(row[0])
+            task.update(fields)
+            conn.execute(
+                "UPDATE async_tasks SET status = ?, data = ? WHERE id = ?",
+                (task.get("status", "pending"), json.dumps(task, ensure_ascii=False), task_id),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, task_id: str) -> bool:
+        cursor = self._get_connection().execute("DELETE FROM async_tasks WHERE id = ?", (task_id,))
+        return cursor.rowcount > 0
+
+    def list(self, statuses: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        conn = self._get_connection()
+        if statuses:
+            statuses = list(statuses)
+            placeholders = ",".join("?" for _ in statuses)
+            rows = conn.execute(
+                f"SELECT data FROM async_tasks WHERE status IN ({placeholders}) ORDER BY created_at", statuses
+            ).fetchall()
+        else:
+            rows = conn.execute("SELECT data FROM async_tasks ORDER BY created_at").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self) -> int:
+        return self._get_connection().execute("SELECT COUNT(*) FROM async_tasks").fetchone()[0]
+
+
+class RedisTaskStore(BaseTaskStore):
+    """基于Redis的任务存储，每个任务一个hash，跨机器共享"""
+
+    # 仅在任务存在时写入字段，避免已删除的任务被进度更新"复活"
+    UPDATE_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('HSET', KEYS[1], unpack(ARGV))
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, client, prefix: str = "async_task"):
+        self.client = client
+        self.prefix = prefix
+        self.index_key = f"{prefix}:index"
+        self._update_script = client.register_script(self.UPDATE_SCRIPT)
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.prefix}:{task_id}"
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {key: json.dumps(value, ensure_ascii=False) for key, value in fields.items()}
+
+    @staticmethod
+    def _decode(raw: Dict[Any, Any]) -> Dict[str, Any]:
+        task = {}
+        for key, value in raw.items():
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            task[key] = json.loads(value)
+        return task
+
+    def create(self, task: Dict[str, Any]) -> None:
+        pipe = self.client.pipeline()
+        pipe.hset(self._task_key(task["id"]), mapping=self._encode(task))
+        pipe.zadd(self.index_key, {task["id"]: time.time()})
+        pipe.execute()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._task_key(task_id))
+        return self._decode(raw) if raw else None
+
+    def update(self, task_id: str, **fields) -> bool:
+        if not fields:
+            # 没有字段时 HSET 会报错，只判断任务是否存在
+            return bool(self.client.exists(self._task_key(task_id)))
+        args = []
+        for key, value in self._encode(fields).items():
+            args.extend([key, value])
+        return bool(self._update_script(keys=[self._task_key(task_id)], args=args))
+
+    def delete(self, task_id: str) -> bool:
+        pipe = self.client.pipeline()
+        pipe.delete(self._task_key(task_id))
+        pipe.zrem(self.index_key, task_id)
+        deleted, _ = pipe.execute()
+        return bool(deleted)
+
+    def list(self, statuses: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        task_ids = [
+            tid.decode("utf-8") if isinstance(tid, bytes) else tid for tid in self.client.zrange(self.index_key, 0, -1)
+        ]
+        if not task_ids:
+            return []
+
+        pipe = self.client.pipeline()
+        for task_id in task_ids:
+            pipe.hgetall(self._task_key(task_id))
+        raw_tasks = pipe.execute()
+
+        wanted = set(statuses) if statuses else None
+        tasks = []
+        stale_ids = []
+        for task_id, raw in zip(task_ids, raw_tasks):
+            if not raw:
+                stale_ids.append(task_id)
+                continue
+            task = self._decode(raw)
+            if wanted is None or task.get("status") in wanted:
+                tasks.append(task)
+
+        if stale_ids:
+            self.client.zrem(self.index_key, *stale_ids)
+        return tasks
+
+    def count(self) -> int:
+        return self.client.zcard(self.index_key)
+
+
+def create_task_store(storage_dir: str) -> BaseTaskStore:
+    """
+    根据配置创建任务存储
+
+    ASYNC_TASK_STORE_BACKEND: auto(默认) / redis / sqlite
+    auto模式下Redis可用时使用Redis，否则回退到本地SQLite WAL
+    """
+    backend = getattr(settings, "ASYNC_TASK_STORE_BACKEND", "auto")
+    redis_url = getattr(settings, "ASYNC_TASK_REDIS_URL", None) or os.environ.get("REDIS_URL")
+
+    if backend in ("auto", "redis") and redis_url:
+        try:
+            import redis
+
+            client = redis.from_url(redis_url, socket_connect_timeout=2, socket_timeout=5)
+            client.ping()
+            logger.info("异步任务存储使用Redis后端")
+            return RedisTaskStore(client)
+        except Exception as e:
+            if backend == "redis":
+                raise
+            logger.warning(f"Redis不可用，异步任务存储回退到SQLite: {e}")
+
+    db_path = os.path.join(storage_dir, "tasks.sqlite3")
+    logger.info(f"异步任务存储使用SQLite后端: {db_path}")
+    return SQLiteTaskStore(db_path)
@@ -1,9 +1,11 @@
 import re
 import urllib.parse
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import requests
 
+from .destination_knowledge import destination_knowledge, local_time_fields
+
 
 class TravelDataService:
     """智能旅游攻略生成引擎 - 使用免费API实现"""
@@ -162,251 +164,291 @@ class TravelDataService:
         return raw_data
 
     def _search_travel_info(self, destination: str) -> Dict:
-        """使用免费搜索API获取旅游信息"""
-        try:
-            # 使用DuckDuckGo Instant Answer API (免费)
-            query = f"{destination} 旅游攻略 景点 美食"
-            urllib.parse.quote(query)
-
-            url = f"https://api.duckduckgo.com/"
-            params = {"q": query, "format": "json", "no_html": "1", "skip_disambig": "1"}
+        """使用免费搜索API获取旅游信息，按目的地缓存"""
+        return destination_knowledge.get(
+            "search",
+            destination,
+            lambda: self._fetch_search_travel_info(destination),
+            lambda: self._get_fallback_travel_data(destination),
+        )
 
-            response = self.session.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return self._parse_duckduckgo_results(data, destination)
+    def _fetch_search_travel_info(self, destination: str) -> Optional[Dict]:
+        # 使用DuckDuckGo Instant Answer API (免费)
+        query = f"{destination} 旅游攻略 景点 美食"
 
-        except Exception as e:
-            print(f"DuckDuckGo搜索失败: {e}")
+        url = f"https://api.duckduckgo.com/"
+        params = {"q": query, "format": "json", "no_html": "1", "skip_disambig": "1"}
 
-        # 如果搜索失败，返回基础数据
-        return self._get_fallback_travel_data(destination)
+        response = self.session.get(url, params=params, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            return self._parse_duckduckgo_results(data, destination)
+        return None
 
     def _get_weather_data(self, destination: str) -> Dict:
-        """获取天气数据（免费wttr.in API）"""
-        try:
-            # 使用免费的wttr.in API
-            url = f"https://wttr.in/{destination}?format=j1"
-
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                current_condition = data["current_condition"][0]
-
-                return {
-                    "temperature": float(current_condition["temp_C"]),
-                    "weather": (
-                        current_condition["lang_zh"][0]["value"]
-                        if "lang_zh" in current_condition
-                        else current_condition["weatherDesc"][0]["value"]
-                    ),
-                    "humidity": int(current_condition["humidity"]),
-                    "wind_speed": float(current_condition["windspeedKmph"]),
-                    "feels_like": float(current_condition["FeelsLikeC"]),
-                }
-
-        except Exception as e:
-            print(f"天气数据获取失败: {e}")
+        """获取天气数据（免费wttr.in API），按目的地缓存"""
+        return destination_knowledge.get(
+            "weather",
+            destination,
+            lambda: self._fetch_weather_data(destination),
+            lambda: self._get_fallback_weather_data(destination),
+        )
 
-        # 如果免费API失败，返回模拟数据
-        return self._get_fallback_weather_data(destination)
+    def _fetch_weather_data(self, destination: str) -> Optional[Dict]:
+        # 使用免费的wttr.in API
+        url = f"https://wttr.in/{destination}?format=j1"
+
+        response = self.session.get(url, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            current_condition = data["current_condition"][0]
+
+            return {
+                "temperature": float(current_condition["temp_C"]),
+                "weather": (
+                    current_condition["lang_zh"][0]["value"]
+                    if "lang_zh" in current_condition
+                    else current_condition["weatherDesc"][0]["value"]
+                ),
+                "humidity": int(current_condition["humidity"]),
+                "wind_speed": float(current_condition["windspeedKmph"]),
+                "feels_like": float(current_condition["FeelsLikeC"]),
+            }
+        return None
 
     def _get_wikipedia_data(self, destination: str) -> Dict:
-        """获取维基百科数据（免费API）"""
-        try:
-            # 使用维基百科API
-            url = "https://zh.wikipedia.org/api/rest_v1/page/summary/"
-            encoded_destination = urllib.parse.quote(destination)
-
-            response = self.session.get(f"{url}{encoded_destination}", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "title": data.get("title", destination),
-                    "extract": data.get("extract", f"{destination}是一个美丽的旅游目的地"),
-                    "content_url": data.get("content_urls", {}).get("desktop", {}).get("page", ""),
-                }
-
-        except Exception as e:
-            print(f"维基百科数据获取失败: {e}")
+        """获取维基百科数据（免费API），按目的地缓存"""
+        return destination_knowledge.get(
+            "wikipedia",
+            destination,
+            lambda: self._fetch_wikipedia_data(destination),
+            lambda: {
+                "title": destination,
+                "extract": f"{destination}是一个充满魅力的旅游目的地，拥有丰富的文化遗产和自然风光。",
+                "content_url": "",
+            },
+        )
 
-        return {
-            "title": destination,
-            "extract": f"{destination}是一个充满魅力的旅游目的地，拥有丰富的文化遗产和自然风光。",
-            "content_url": "",
-        }
+    def _fetch_wikipedia_data(self, destination: str) -> Optional[Dict]:
+        # 使用维基百科API
+        url = "https://zh.wikipedia.org/api/rest_v1/page/summary/"
+        encoded_destination = urllib.parse.quote(destination)
+
+        response = self.session.get(f"{url}{encoded_destination}", timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                "title": data.get("title", destination),
+                "extract": data.get("extract", f"{destination}是一个美丽的旅游目的地"),
+                "content_url": data.get("content_urls", {}).get("desktop", {}).get("page", ""),
+            }
+        return None
 
     def _get_opentripmap_data(self, destination: str) -> Dict:
-        """获取OpenTripMap景点数据（免费API）"""
-        try:
-            # 使用OpenTripMap API (免费，无需密钥)
-            # 首先获取地理坐标
-            geocode_url = f"https://api.opentripmap.com/0.1/zh/places/geocode"
-            params = {"name": destination, "limit": 1, "format": "json"}
-
-            response = self.session.get(geocode_url, params=params, timeout=10)
-            if response.status_code == 200:
-                geocode_data = response.json()
-                if geocode_data:
-                    location = geocode_data[0]
-                    lat = location.get("lat")
-                    lon = location.get("lon")
-
-                    # 获取景点信息
-                    places_url = f"https://api.opentripmap.com/0.1/zh/places/radius"
-                    places_params = {
-                        "radius": 5000,  # 5公里半径
-                        "lon": lon,
-                        "lat": lat,
-                        "kinds": "cultural,historic,architecture,interesting_places",
-                        "limit": 10,
-                        "format": "json",
-                    }
-
-                    places_response = self.session.get(places_url, params=places_params, timeout=10)
-                    if places_response.status_code == 200:
-                        places_data = places_response.json()
-                        attractions = []
-                        for place in places_data.get("features", []):
-                            props = place.get("properties", {})
-                            attractions.append(
-                                {
-                                    "name": props.get("name", ""),
-                                    "type": props.get("kinds", ""),
-                                    "description": props.get("wikipedia_extracts", {}).get("text", ""),
-                                }
-                            )
-
-                        return {
-                            "location": {"lat": lat, "lon": lon},
-                            "attractions": attractions,
-                            "total_count": len(attractions),
-                        }
+        """获取OpenTripMap景点数据（免费API），按目的地缓存"""
+        return destination_knowledge.get(
+            "attractions",
+            destination,
+            lambda: self._fetch_opentripmap_data(destination),
+            lambda: {"location": {"lat": 0, "lon": 0}, "attractions": [], "total_count": 0},
+        )
 
-        except Exception as e:
-            print(f"OpenTripMap数据获取失败: {e}")
+    def _fetch_opentripmap_data(self, destination: str) -> Optional[Dict]:
+        # 使用OpenTripMap API (免费，无需密钥)
+        # 首先获取地理坐标
+        geocode_url = f"https://api.opentripmap.com/0.1/zh/places/geocode"
+        params = {"name": destination, "limit": 1, "format": "json"}
+
+        response = self.session.get(geocode_url, params=params, timeout=10)
+        if response.status_code == 200:
+            geocode_data = response.json()
+            if geocode_data:
+                location = geocode_data[0]
+                lat = location.get("lat")
+                lon = location.get("lon")
+
+                # 获取景点信息
+                places_url = f"https://api.opentripmap.com/0.1/zh/places/radius"
+                places_params = {
+                    "radius": 5000,  # 5公里半径
+                    "lon": lon,
+                    "lat": lat,
+                    "kinds": "cultural,historic,architecture,interesting_places",
+                    "limit": 10,
+                    "format": "json",
+                }
 
-        return {"location": {"lat": 0, "lon": 0}, "attractions": [], "total_count": 0}
+                places_response = self.session.get(places_url, params=places_params, timeout=10)
+                if places_response.status_code == 200:
+                    places_data = places_response.json()
+                    attractions = []
+                    for place in places_data.get("features", []):
+                        props = place.get("properties", {})
+                        attractions.append(
+                            {
+                                "name": props.get("name", ""),
+                                "type": props.get("kinds", ""),
+                                "description": props.get("wikipedia_extracts", {}).get("text", ""),
+                            }
+                        )
 
-    def _get_country_data(self, destination: str) -> Dict:
-        """获取国家信息数据（免费RestCountries API）"""
-        try:
-            # 使用RestCountries API
-            url = f"https://restcountries.com/v3.1/name/{destination}"
-
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    country = data[0]
                     return {
-                        "name": country.get("name", {}).get("common", destination),
-                        "capital": country.get("capital", [""])[0] if country.get("capital") else "",
-                        "region": country.get("region", ""),
-                        "population": country.get("population", 0),
-                        "currencies": list(country.get("currencies", {}).keys()),
-                        "languages": list(country.get("languages", {}).values()),
-                        "flag": country.get("flags", {}).get("png", ""),
-                        "timezones": country.get("timezones", []),
+                        "location": {"lat": lat, "lon": lon},
+                        "attractions": attractions,
+                        "total_count": len(attractions),
                     }
+        return None
 
-        except Exception as e:
-            print(f"RestCountries数据获取失败: {e}")
+    def _get_country_data(self, destination: str) -> Dict:
+        """获取国家信息数据（免费RestCountries API），按目的地缓存"""
+        return destination_knowledge.get(
+            "country",
+            destination,
+            lambda: self._fetch_country_data(destination),
+            lambda: {
+                "name": destination,
+                "capital": "",
+                "region": "",
+                "population": 0,
+                "currencies": ["CNY"],
+                "languages": ["中文"],
+                "flag": "",
+                "timezones": ["UTC+8"],
+            },
+        )
 
-        return {
-            "name": destination,
-            "capital": "",
-            "region": "",
-            "population": 0,
-            "currencies": ["CNY"],
-            "languages": ["中文"],
-            "flag": "",
-            "timezones": ["UTC+8"],
-        }
+    def _fetch_country_data(self, destination: str) -> Optional[Dict]:
+        # 使用RestCountries API
+        url = f"https://restcountries.com/v3.1/name/{destination}"
 
-    def _get_geolocation_data(self, destination: str) -> Dict:
-        """获取地理位置数据（免费IP Geolocation API）"""
-        try:
-            # 使用免费的地理位置API
-            url = f"http://ip-api.com/json/{destination}"
+        response = self.session.get(url, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            if data:
+                country = data[0]
+                return {
+                    "name": country.get("name", {}).get("common", destination),
+                    "capital": country.get("capital", [""])[0] if country.get("capital") else "",
+                    "region": country.get("region", ""),
+                    "population": country.get("population", 0),
+                    "currencies": list(country.get("currencies", {}).keys()),
+                    "languages": list(country.get("languages", {}).values()),
+                    "flag": country.get("flags", {}).get("png", ""),
+                    "timezones": country.get("timezones", []),
+                }
+        return None
 
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "success":
-                    return {
-                        "country": data.get("country", ""),
-                        "region": data.get("regionName", ""),
-                        "city": data.get("city", ""),
-                        "lat": data.get("lat", 0),
-                        "lon": data.get("lon", 0),
-                        "timezone": data.get("timezone", ""),
-                        "isp": data.get("isp", ""),
-                    }
+    def _get_geolocation_data(self, destination: str) -> Dict:
+        """获取地理位置数据（免费IP Geolocation API），按目的地缓存"""
+        return destination_knowledge.get(
+            "geolocation",
+            destination,
+            lambda: self._fetch_geolocation_data(destination),
+            lambda: {
+                "country": "China",
+                "region": "",
+                "city": destination,
+                "lat": 0,
+                "lon": 0,
+                "timezone": "Asia/Shanghai",
+                "isp": "",
+            },
+        )
 
-        except Exception as e:
-            print(f"IP Geolocation数据获取失败: {e}")
+    def _fetch_geolocation_data(self, destination: str) -> Optional[Dict]:
+        # 使用免费的地理位置API
+        url = f"http://ip-api.com/json/{destination}"
 
-        return {
-            "country": "China",
-            "region": "",
-            "city": destination,
-            "lat": 0,
-            "lon": 0,
-            "timezone": "Asia/Shanghai",
-            "isp": "",
-        }
+        response = self.session.get(url, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("status") == "success":
+                return {
+                    "country": data.get("country", ""),
+                    "region": data.get("regionName", ""),
+                    "city": data.get("city", ""),
+                    "lat": data.get("lat", 0),
+                    "lon": data.get("lon", 0),
+                    "timezone": data.get("timezone", ""),
+                    "isp": data.get("isp", ""),
+                }
+        return None
 
     def _get_currency_data(self, destination: str) -> Dict:
-        """获取汇率数据（免费Currency API）"""
-        try:
-            # 使用免费的汇率API
-            url = "https://api.exchangerate-api.com/v4/latest/CNY"
-
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                rates = data.get("rates", {})
+        """获取汇率数据（免费Currency API），以人民币为基准，各目的地共用一份缓存"""
+        return destination_knowledge.get(
+            "currency",
+            "CNY",
+            self._fetch_currency_data,
+            lambda: {
+                "base_currency": "CNY",
+                "rates": {
+                    "USD": 0.14,
+                    "EUR": 0.13,
+                    "JPY": 20.5,
+                    "GBP": 0.11,
+                    "KRW": 180.0,
+                    "THB": 5.0,
+                    "SGD": 0.19,
+                    "MYR": 0.65,
+                },
+                "last_updated": "2024-01-01",
+            },
+        )
 
-                # 获取主要货币汇率
-                major_currencies = ["USD", "EUR", "JPY", "GBP", "KRW", "THB", "SGD", "MYR"]
-                currency_rates = {}
-                for currency in major_currencies:
-                    if currency in rates:
-                        currency_rates[currency] = rates[currency]
+    def _fetch_currency_data(self) -> Optional[Dict]:
+        # 使用免费的汇率API
+        url = "https://api.exchangerate-api.com/v4/latest/CNY"
 
-                return {"base_currency": "CNY", "rates": currency_rates, "last_updated": data.get("date", "")}
+        response = self.session.get(url, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            rates = data.get("rates", {})
 
-        except Exception as e:
-            print(f"Currency数据获取失败: {e}")
+            # 获取主要货币汇率
+            major_currencies = ["USD", "EUR", "JPY", "GBP", "KRW", "THB", "SGD", "MYR"]
+            currency_rates = {}
+            for currency in major_currencies:
+                if currency in rates:
+                    currency_rates[currency] = rates[currency]
 
-        return {
-            "base_currency": "CNY",
-            "rates": {"USD": 0.14, "EUR": 0.13, "JPY": 20.5, "GBP": 0.11, "KRW": 180.0, "THB": 5.0, "SGD": 0.19, "MYR": 0.65},
-            "last_updated": "2024-01-01",
-        }
+            return {"base_currency": "CNY", "rates": currency_rates, "last_updated": data.get("date", "")}
+        return None
 
     def _get_timezone_data(self, destination: str) -> Dict:
-        """获取时区数据（免费Time API）"""
-        try:
-            # 使用免费的时区API
-            url = f"http://worldtimeapi.org/api/timezone/Asia/Shanghai"
-
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "timezone": data.get("timezone", "Asia/Shanghai"),
-                    "datetime": data.get("datetime", ""),
-                    "utc_offset": data.get("utc_offset", "+08:00"),
-                    "day_of_week": data.get("day_of_week", 1),
-                    "is_dst": data.get("dst", False),
-                }
-
-        except Exception as e:
-            print(f"Timezone数据获取失败: {e}")
-
-        return {"timezone": "Asia/Shanghai", "datetime": "", "utc_offset": "+08:00", "day_of_week": 1, "is_dst": False}
+        """获取时区数据（免费Time API），只缓存时区名，当前时间、偏移和夏令时每次按时区在本地计算"""
+        timezone_data = dict(
+            destination_knowledge.get(
+                "timezone",
+                "Asia/Shanghai",
+                self._fetch_timezone_data,
+                lambda: {
+                    "timezone": "Asia/Shanghai",
+                    "datetime": "",
+                    "utc_offset": "+08:00",
+                    "day_of_week": 1,
+                    "is_dst": False,
+                },
+            )
+        )
+        timezone_data.update(local_time_fields(timezone_data["timezone"]) or {})
+        return timezone_data
+
+    def _fetch_timezone_data(self) -> Optional[Dict]:
+        # 使用免费的时区API
+        url = f"http://worldtimeapi.org/api/timezone/Asia/Shanghai"
+
+        response = self.session.get(url, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                "timezone": data.get("timezone", "Asia/Shanghai"),
+                "datetime": data.get("datetime", ""),
+                "utc_offset": data.get("utc_offset", "+08:00"),
+                "day_of_week": data.get("day_of_week", 1),
+                "is_dst": data.get("dst", False),
+            }
+        return None
 
     def _信息结构化(self, raw_data: Dict, destination: str = "目的地") -> Dict:
         """信息结构化"""
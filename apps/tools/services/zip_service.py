@@ -12,6 +12,10 @@ import zipfile
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+from django.http import StreamingHttpResponse
+
+from .archive_stream import CONTENT_TYPES, make_entry, streaming_archive_response
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,6 +31,113 @@ class ZipService:
             "gz": "application/gzip",
         }
 
+    def _resolve_file_paths(self, file_paths: List[str]) -> List[str]:
+        """把请求中的文件路径（支持媒体相对路径和URL编码）解析为存在的本地文件"""
+        valid_files = []
+        for file_path in file_paths:
+            # URL解码文件路径
+            decoded_path = urllib.parse.unquote(str(file_path))
+
+            # 检查是否是媒体文件路径
+            if (
+                decoded_path.startswith("audio_files/")
+                or decoded_path.startswith("media/")
+                or decoded_path.startswith("temp_audio/")
+            ):
+                # 构建完整的媒体文件路径
+                from django.conf import settings
+
+                media_path = os.path.join(settings.MEDIA_ROOT, decoded_path)
+                if os.path.exists(media_path) and os.path.isfile(media_path):
+                    valid_files.append(media_path)
+                else:
+                    logger.warning(f"媒体文件不存在: {media_path}")
+                    # 尝试查找相似的文件名
+                    try:
+                        dir_path = os.path.dirname(media_path)
+                        if os.path.exists(dir_path):
+                            files_in_dir = os.listdir(dir_path)
+                            for file_in_dir in files_in_dir:
+                                if urllib.parse.unquote(file_in_dir) == os.path.basename(decoded_path):
+                                    found_path = os.path.join(dir_path, file_in_dir)
+                                    valid_files.append(found_path)
+                                    logger.info(f"找到匹配文件: {found_path}")
+                                    break
+                    except Exception as e:
+                        logger.warning(f"查找相似文件失败: {e}")
+            elif os.path.exists(decoded_path) and os.path.isfile(decoded_path):
+                valid_files.append(decoded_path)
+            else:
+                logger.warning(f"文件不存在或不是文件: {decoded_path}")
+        return valid_files
+
+    def _get_arcname(self, file_path: str, valid_files: List[str], include_paths: bool) -> str:
+        """文件在压缩包中的名称"""
+        if include_paths:
+            # 包含相对路径
+            arcname = os.path.relpath(file_path, os.path.commonpath([os.path.dirname(f) for f in valid_files]))
+        else:
+            # 只包含文件名
+            arcname = os.path.basename(file_path)
+
+        # 如果是媒体文件，使用原始文件名
+        from django.conf import settings
+
+        if str(file_path).startswith(str(settings.MEDIA_ROOT)):
+            # 从媒体路径中提取原始文件名
+            relative_path = os.path.relpath(file_path, settings.MEDIA_ROOT)
+            if not include_paths:
+                arcname = os.path.basename(relative_path)
+            else:
+                arcname = relative_path
+        return arcname
+
+    def stream_files(
+        self,
+        file_paths: List[str],
+        archive_name: str = None,
+        compression_level: int = 6,
+        include_paths: bool = True,
+        archive_format: str = "zip",
+    ) -> Tuple[bool, str, Optional[StreamingHttpResponse]]:
+        """
+        边打包边下载多个文件，不在临时目录中生成压缩包
+
+        Args:
+            file_paths: 文件路径列表（与 create_zip_from_files 相同）
+            archive_name: 压缩包文件名（可选）
+            compression_level: 压缩级别 (0-9)，媒体文件始终原样存储
+            include_paths: 是否包含文件路径结构
+            archive_format: zip 或 tar.gz
+
+        Returns:
+            (success, message, response)
+        """
+        if archive_format not in CONTENT_TYPES:
+            return False, f"不支持的流式打包格式: {archive_format}", None
+        if not file_paths:
+            return False, "没有提供文件路径", None
+
+        valid_files = self._resolve_file_paths(file_paths)
+        if not valid_files:
+            return False, "没有有效的文件可以打包", None
+
+        entries = []
+        for file_path in valid_files:
+            try:
+                entries.append(make_entry(file_path, self._get_arcname(file_path, valid_files, include_paths)))
+            except OSError as e:
+                logger.error(f"读取文件信息失败: {file_path}, 错误: {str(e)}")
+
+        suffix = f".{archive_format}"
+        if not archive_name:
+            archive_name = f"files_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+        elif not archive_name.endswith(suffix):
+            archive_name += suffix
+
+        response = streaming_archive_response(entries, archive_name, archive_format, compression_level)
+        return True, f"开始下载，包含 {len(entries)} 个文件", response
+
     def create_zip_from_files(
         self, file_paths: List[str], zip_name: str = None, compression_level: int = 6, include_paths: bool = True
     ) -> Tuple[bool, str, Optional[str]]:
@@ -47,42 +158,7 @@ class ZipService:
                 return False, "没有提供文件路径", None
 
             # 验证文件是否存在
-            valid_files = []
-            for file_path in file_paths:
-                # URL解码文件路径
-                decoded_path = urllib.parse.unquote(str(file_path))
-
-                # 检查是否是媒体文件路径
-                if (
-                    decoded_path.startswith("audio_files/")
-                    or decoded_path.startswith("media/")
-                    or decoded_path.startswith("temp_audio/")
-                ):
-                    # 构建完整的媒体文件路径
-                    from django.conf import settings
-
-                    media_path = os.path.join(settings.MEDIA_ROOT, decoded_path)
-                    if os.path.exists(media_path) and os.path.isfile(media_path):
-                        valid_files.append(media_path)
-                    else:
-                        logger.warning(f"媒体文件不存在: {media_path}")
-                        # 尝试查找相似的文件名
-                        try:
-                            dir_path = os.path.dirname(media_path)
-                            if os.path.exists(dir_path):
-                                files_in_dir = os.listdir(dir_path)
-                                for file_in_dir in files_in_dir:
-                                    if urllib.parse.unquote(file_in_dir) == os.path.basename(decoded_path):
-                                        found_path = os.path.join(dir_path, file_in_dir)
-                                        valid_files.append(found_path)
-                                        logger.info(f"找到匹配文件: {found_path}")
-                                        break
-                        except Exception as e:
-                            logger.warning(f"查找相似文件失败: {e}")
-                elif os.path.exists(decoded_path) and os.path.isfile(decoded_path):
-                    valid_files.append(decoded_path)
-                else:
-                    logger.warning(f"文件不存在或不是文件: {decoded_path}")
+            valid_files = self._resolve_file_paths(file_paths)
 
             if not valid_files:
                 return False, "没有有效的文件可以打包", None
@@ -102,24 +178,7 @@ class ZipService:
             with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zipf:
                 for file_path in valid_files:
                     try:
-                        if include_paths:
-                            # 包含相对路径
-                            arcname = os.path.relpath(file_path, os.path.commonpath([os.path.dirname(f) for f in valid_files]))
-                        else:
-                            # 只包含文件名
-                            arcname = os.path.basename(file_path)
-
-                        # 如果是媒体文件，使用原始文件名
-                        from django.conf import settings
-
-                        if str(file_path).startswith(str(settings.MEDIA_ROOT)):
-                            # 从媒体路径中提取原始文件名
-                            relative_path = os.path.relpath(file_path, settings.MEDIA_ROOT)
-                            if not include_paths:
-                                arcname = os.path.basename(relative_path)
-                            else:
-                                arcname = relative_path
-
+                        arcname = self._get_arcname(file_path, valid_files, include_paths)
                         zipf.write(file_path, arcname)
                         logger.info(f"已添加文件到ZIP: {file_path} -> {arcname}")
 
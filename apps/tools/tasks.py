@@ -40,6 +40,24 @@ def cleanup_expired_heart_links():
         return False
 
 
+@shared_task
+def prewarm_destination_knowledge():
+    """预热热门目的地数据任务 - 按攻略生成次数取前N个目的地，补齐已过期的数据源"""
+    try:
+        from django.conf import settings
+        from django.core.management import call_command
+
+        top = getattr(settings, "DESTINATION_KNOWLEDGE_PREWARM_TOP", 20)
+        if top <= 0:
+            return True
+        call_command("refresh_destination_knowledge", top=top, missing_only=True)
+        logger.info(f"热门目的地数据预热完成：前{top}个目的地")
+        return True
+    except Exception as e:
+        logger.error(f"热门目的地数据预热失败: {e}")
+        return False
+
+
 @shared_task
 def update_user_online_status():
     """更新用户在线状态任务"""
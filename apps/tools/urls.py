@@ -170,6 +170,8 @@ from .monitoring_views import (
     clear_cache,
     get_alerts,
     get_cache_stats,
+    get_conversion_cache_stats,
+    get_llm_cache_stats,
     get_monitoring_data,
     get_system_metrics,
     monitoring_dashboard,
@@ -450,6 +452,7 @@ from .views.travel_views import (
     toggle_favorite_guide_api,
     travel_guide,
     travel_guide_api,
+    travel_guide_stream_api,
 )
 from .views.vanity_views import (
     add_sin_points_api,
@@ -753,6 +756,7 @@ urlpatterns = [
     path("api/ai-analysis/", ai_analysis_api, name="ai_analysis_api"),
     # 旅游攻略API
     path("api/travel_guide/", travel_guide_api, name="travel_guide_api"),
+    path("api/travel_guide/stream/", travel_guide_stream_api, name="travel_guide_stream_api"),
     path("travel_guide_api/", travel_guide_api, name="travel_guide_api_alt"),  # 添加备用路径
     path("api/travel_guide/list/", get_travel_guides_api, name="travel_guide_list_api"),
     path("api/travel_guide/check-local-data/", check_local_travel_data_api, name="travel_guide_check_local_api"),
@@ -1063,6 +1067,8 @@ urlpatterns = [
     path("monitoring/system/", get_system_metrics, name="get_system_metrics"),
     path("monitoring/alerts/", get_alerts, name="get_alerts"),
     path("monitoring/cache/", get_cache_stats, name="get_cache_stats"),
+    path("monitoring/conversion-cache/", get_conversion_cache_stats, name="get_conversion_cache_stats"),
+    path("monitoring/llm-cache/", get_llm_cache_stats, name="get_llm_cache_stats"),
     path("monitoring/clear-cache/", clear_cache, name="clear_cache"),
     path("monitoring/warm-cache/", warm_up_cache, name="warm_up_cache"),
     path("monitoring/api/<str:type>/", MonitoringAPIView.as_view(), name="monitoring_api"),
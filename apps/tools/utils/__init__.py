@@ -1,14 +1,14 @@
 import json  # Added for json.dumps
 import os
 
-import requests
 from django_ratelimit.decorators import ratelimit
 
 # 从环境变量获取配置
 # 确保在模块导入时加载环境变量
 from dotenv import load_dotenv
 from ratelimit import limits, sleep_and_retry
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from ..services.llm_gateway import LLMGatewayError, llm_gateway
 
 # 尝试加载 .env 文件
 env_paths = [
@@ -37,7 +37,8 @@ except (ValueError, KeyError):
 
 
 class DeepSeekClient:
-    API_BASE_URL = "https://api.deepseek.com/v1/chat/completions"
+    """DeepSeek内容生成客户端，请求经由 llm_gateway 发出（连接池、并发、限速、重试由网关统一处理）"""
+
     TIMEOUT = 120  # 减少超时时间到2分钟，提高响应速度
     MAX_RETRY_ATTEMPTS = 1  # 减少重试次数到1次，提高速度
 
@@ -65,13 +66,12 @@ API_RATE_LIMIT=10/minute
             """.strip()
             )
 
+    def _call_options(self) -> dict:
+        """每次调用的时间预算（包括重试）和重试次数"""
+        return {"timeout": self.TIMEOUT * (self.MAX_RETRY_ATTEMPTS + 1), "max_retries": self.MAX_RETRY_ATTEMPTS}
+
     @sleep_and_retry
     @limits(calls=int(RATE_LIMIT_CALLS), period=int(RATE_LIMIT_PERIOD))
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((requests.exceptions.Timeout, requests.exceptions.ConnectionError)),
-    )
     def generate_test_cases(
         self, requirement: str, user_prompt: str, is_batch: bool = False, batch_id: int = 0, total_batches: int = 1
     ) -> str:
@@ -141,9 +141,7 @@ API_RATE_LIMIT=10/minute
                 raise ValueError("消息内容不能为空")
 
         # 优化模型参数，使用deepseek-reasoner模型，确保完整性和成功率
-        payload = {
-            "model": "deepseek-reasoner",  # 使用deepseek-reasoner模型
-            "messages": messages,
+        params = {
             "temperature": 0.05,  # 降低温度，提高一致性和完整性
             "max_tokens": 8192,  # 使用最大允许值，确保不超出API限制
             "top_p": 0.9,  # 提高多样性，确保内容完整
@@ -152,27 +150,22 @@ API_RATE_LIMIT=10/minute
             "stream": False,
         }
 
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
-
         # 添加调试日志
-        print(f"测试用例生成API请求URL: {self.API_BASE_URL}")
+        print(f"测试用例生成API请求URL: {llm_gateway.base_url}")
         print(f"测试用例生成API密钥: {self.api_key[:10]}...")
-        print(f"测试用例生成请求体: {json.dumps(payload, ensure_ascii=False, indent=2)}")
+        print(f"测试用例生成请求参数: {json.dumps(params, ensure_ascii=False, indent=2)}")
 
         try:
-            response = requests.post(self.API_BASE_URL, headers=headers, json=payload, timeout=self.TIMEOUT)
-
-            print(f"测试用例生成响应状态码: {response.status_code}")
-            print(f"测试用例生成响应头: {dict(response.headers)}")
-
-            response.raise_for_status()
-
-            result = response.json()
+            result = llm_gateway.chat(
+                messages,
+                feature="test_cases",
+                model="deepseek-reasoner",  # 使用deepseek-reasoner模型
+                api_key=self.api_key,
+                **self._call_options(),
+                **params,
+            )
             print(f"测试用例生成响应内容: {json.dumps(result, ensure_ascii=False, indent=2)}")
 
-            if "choices" not in result or not result["choices"]:
-                raise Exception("API响应格式错误：缺少choices字段")
-
             content = result["choices"][0]["message"]["content"]
 
             # 多次接续生成，确保用例数量充足
@@ -197,20 +190,20 @@ API_RATE_LIMIT=10/minute
 
             return content
 
-        except requests.exceptions.HTTPError as e:
+        except LLMGatewayError as e:
+            if e.status_code is None:
+                raise Exception(f"API请求失败: {str(e)}")
             # 详细错误信息
-            error_detail = f"HTTP {e.response.status_code}"
+            error_detail = f"HTTP {e.status_code}"
             try:
-                error_response = e.response.json()
+                error_response = json.loads(e.body)
                 if "error" in error_response:
                     error_detail += f": {error_response['error'].get('message', '未知错误')}"
                 elif "message" in error_response:
                     error_detail += f": {error_response['message']}"
             except Exception:
-                error_detail += f": {e.response.text[:200]}"
+                error_detail += f": {e.body[:200]}"
             raise Exception(f"API请求失败: {error_detail}")
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"API请求失败: {str(e)}")
         except KeyError as e:
             raise Exception(f"API响应格式错误: {str(e)}")
         except Exception as e:
@@ -231,29 +224,26 @@ API_RATE_LIMIT=10/minute
                 # 根据重试次数调整参数
                 temperature = 0.05 + (attempt * 0.02)  # 逐渐增加温度
 
-                payload = {
-                    "model": "deepseek-reasoner",  # 使用deepseek-reasoner模型
-                    "messages": [
-                        {"role": "system", "content": "继续生成测试用例，确保内容完整。"},
-                        {"role": "user", "content": continuation_prompt},
-                    ],
-                    "temperature": temperature,  # 根据重试次数调整
-                    "max_tokens": 8192,  # 使用最大允许值
-                    "top_p": 0.9,
-                    "frequency_penalty": 0.1,  # 轻微惩罚重复
-                    "presence_penalty": 0.1,  # 轻微惩罚重复主题
-                    "stream": False,
-                }
-
-                headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+                messages = [
+                    {"role": "system", "content": "继续生成测试用例，确保内容完整。"},
+                    {"role": "user", "content": continuation_prompt},
+                ]
 
                 print(f"第{attempt + 1}次尝试继续生成...")
 
-                response = requests.post(self.API_BASE_URL, headers=headers, json=payload, timeout=self.TIMEOUT)
-                response.raise_for_status()
-
-                result = response.json()
-                continuation = result["choices"][0]["message"]["content"]
+                continuation = llm_gateway.reply(
+                    messages,
+                    feature="test_cases",
+                    model="deepseek-reasoner",  # 使用deepseek-reasoner模型
+                    api_key=self.api_key,
+                    temperature=temperature,  # 根据重试次数调整
+                    max_tokens=8192,  # 使用最大允许值
+                    top_p=0.9,
+                    frequency_penalty=0.1,  # 轻微惩罚重复
+                    presence_penalty=0.1,  # 轻微惩罚重复主题
+                    stream=False,
+                    **self._call_options(),
+                )
 
                 # 检查继续生成的内容是否有效
                 if not continuation or len(continuation.strip()) < 100:
@@ -476,29 +466,19 @@ API_RATE_LIMIT=10/minute
             {"role": "user", "content": prompt},
         ]
 
-        # 构建请求载荷
-        payload = {
-            "model": "deepseek-chat",
-            "messages": messages,
-            "temperature": 0.8,
-            "max_tokens": 4000,
-            "top_p": 0.9,
-            "frequency_penalty": 0.1,
-            "presence_penalty": 0.1,
-            "stream": False,
-        }
-
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
-
         try:
-            response = requests.post(self.API_BASE_URL, headers=headers, json=payload, timeout=self.TIMEOUT)
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                return content
-            else:
-                raise Exception(f"API调用失败: {response.status_code} - {response.text}")
+            return llm_gateway.reply(
+                messages,
+                feature="redbook",
+                api_key=self.api_key,
+                temperature=0.8,
+                max_tokens=4000,
+                top_p=0.9,
+                frequency_penalty=0.1,
+                presence_penalty=0.1,
+                stream=False,
+                **self._call_options(),
+            )
 
         except Exception as e:
             print(f"生成小红书内容失败: {e}")
@@ -524,29 +504,19 @@ API_RATE_LIMIT=10/minute
             {"role": "user", "content": prompt},
         ]
 
-        # 构建请求载荷
-        payload = {
-            "model": "deepseek-chat",
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 6000,
-            "top_p": 0.9,
-            "frequency_penalty": 0.1,
-            "presence_penalty": 0.1,
-            "stream": False,
-        }
-
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
-
         try:
-            response = requests.post(self.API_BASE_URL, headers=headers, json=payload, timeout=self.TIMEOUT)
-
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                return content
-            else:
-                raise Exception(f"API调用失败: {response.status_code} - {response.text}")
+            return llm_gateway.reply(
+                messages,
+                feature="content",
+                api_key=self.api_key,
+                temperature=0.7,
+                max_tokens=6000,
+                top_p=0.9,
+                frequency_penalty=0.1,
+                presence_penalty=0.1,
+                stream=False,
+                **self._call_options(),
+            )
 
         except Exception as e:
             print(f"生成内容失败: {e}")
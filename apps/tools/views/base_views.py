@@ -13,7 +13,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-import requests
+from ..services.llm_gateway import LLMGatewayError, LLMTimeoutError, llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -37,28 +37,23 @@ def deepseek_api(request):
         if not api_key:
             return JsonResponse({"success": False, "error": "DeepSeek API密钥未配置"}, status=500)
 
-        # 构建请求
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {"model": model, "messages": [{"role": "user", "content": message}], "max_tokens": 1000, "temperature": 0.7}
-
         # 发送请求到DeepSeek API
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            ai_response = result["choices"][0]["message"]["content"]
+        messages = [{"role": "user", "content": message}]
+        result = llm_gateway.chat(
+            messages, feature="chat", model=model, api_key=api_key, timeout=30, max_tokens=1000, temperature=0.7
+        )
+        ai_response = result["choices"][0]["message"]["content"]
 
-            return JsonResponse({"success": True, "response": ai_response, "model": model, "usage": result.get("usage", {})})
-        else:
-            logger.error(f"DeepSeek API请求失败: {response.status_code} - {response.text}")
-            return JsonResponse({"success": False, "error": f"AI服务暂时不可用 (状态码: {response.status_code})"}, status=500)
+        return JsonResponse({"success": True, "response": ai_response, "model": model, "usage": result.get("usage", {})})
 
     except json.JSONDecodeError:
         return JsonResponse({"success": False, "error": "无效的JSON数据"}, status=400)
-    except requests.exceptions.Timeout:
+    except LLMTimeoutError:
         return JsonResponse({"success": False, "error": "请求超时，请稍后重试"}, status=408)
-    except requests.exceptions.RequestException as e:
+    except LLMGatewayError as e:
+        if e.status_code is not None:
+            logger.error(f"DeepSeek API请求失败: {e.status_code} - {e.body}")
+            return JsonResponse({"success": False, "error": f"AI服务暂时不可用 (状态码: {e.status_code})"}, status=500)
         logger.error(f"DeepSeek API请求异常: {str(e)}")
         return JsonResponse({"success": False, "error": f"网络请求失败: {str(e)}"}, status=500)
     except Exception as e:
@@ -14,9 +14,8 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-import requests
-
 from ..services.ip_location_service import IPLocationService
+from ..services.llm_gateway import LLMGatewayError, llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -137,25 +136,15 @@ def self_analysis_api(request):
             if not api_key:
                 return JsonResponse({"success": False, "error": "分析服务暂时不可用"})
 
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-            payload = {
-                "messages": [{"role": "user", "content": prompt}],
-                "model": "deepseek-chat",
-                "max_tokens": 1000,
-                "temperature": 0.7,
-            }
-
-            response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-            if response.status_code == 200:
-                result = response.json()
-                analysis = result["choices"][0]["message"]["content"]
-
-                return JsonResponse({"success": True, "analysis": analysis, "timestamp": timezone.now().isoformat()})
-            else:
+            try:
+                analysis = llm_gateway.complete(
+                    prompt, feature="self_analysis", api_key=api_key, timeout=30, max_tokens=1000, temperature=0.7
+                )
+            except LLMGatewayError:
                 return JsonResponse({"success": False, "error": "分析服务暂时不可用，请稍后重试"})
 
+            return JsonResponse({"success": True, "analysis": analysis, "timestamp": timezone.now().isoformat()})
+
         except Exception as e:
             return JsonResponse({"success": False, "error": f"分析失败: {str(e)}"})
 
@@ -200,18 +189,13 @@ def storyboard_api(request):
         ]
 
         # 调用DeepSeek API
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {"model": "deepseek-chat", "messages": messages, "temperature": 0.8, "max_tokens": 1000}
-
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            story = result["choices"][0]["message"]["content"]
-
-            return JsonResponse({"success": True, "story": story}, content_type="application/json")
-        elif response.status_code == 402:
+        try:
+            story = llm_gateway.reply(
+                messages, feature="storyboard", api_key=api_key, timeout=30, temperature=0.8, max_tokens=1000
+            )
+        except LLMGatewayError as e:
+            if e.status_code != 402:
+                return JsonResponse({"error": str(e)}, status=500, content_type="application/json")
             # API余额不足时返回示例故事
             fallback_stories = [
                 f"基于您的描述「{prompt}」，让我为您创作一个治愈的故事：\n\n在一个安静的午后，小雨轻敲着窗台。李明坐在咖啡店的角落，手中捧着一杯温热的拿铁，思考着生活的意义。\n\n突然，一只小猫从雨中跑进了咖啡店，浑身湿漉漉的。店员想要赶走它，但李明轻声说道：「让它留下来吧，或许它也需要一个温暖的地方。」\n\n小猫似乎听懂了什么，安静地卧在李明脚边。此刻，李明意识到，生活中最美好的时光，往往来自于这些不期而遇的温柔瞬间。\n\n有时候，我们不需要寻找答案，只需要学会在当下找到属于自己的宁静与温暖。",
@@ -227,8 +211,8 @@ def storyboard_api(request):
                 {"success": True, "story": story, "fallback": True, "message": "AI服务暂时不可用，为您提供了精选的治愈故事"},
                 content_type="application/json",
             )
-        else:
-            return JsonResponse({"error": f"API调用失败: {response.status_code}"}, status=500, content_type="application/json")
+
+        return JsonResponse({"success": True, "story": story}, content_type="application/json")
 
     except Exception as e:
         return JsonResponse({"error": f"处理请求时出错: {str(e)}"}, status=500)
@@ -300,36 +284,22 @@ def call_deepseek_api(prompt):
     try:
         # DeepSeek API配置
         api_key = os.getenv("DEEPSEEK_API_KEY", "")
-        api_url = "https://api.deepseek.com/v1/chat/completions"
 
         if not api_key:
             raise Exception("DeepSeek API密钥未配置")
 
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "你是一位资深的中国传统命理学专家，精通八字命理和姻缘分析。请提供专业、详细且实用的分析建议。",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            "max_tokens": 2000,
-            "temperature": 0.7,
-        }
-
-        response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            ai_content = result["choices"][0]["message"]["content"]
-
-            # 解析AI回复并结构化
-            return parse_ai_response(ai_content)
-        else:
-            raise Exception(f"DeepSeek API调用失败: {response.status_code}")
+        ai_content = llm_gateway.complete(
+            prompt,
+            system="你是一位资深的中国传统命理学专家，精通八字命理和姻缘分析。请提供专业、详细且实用的分析建议。",
+            feature="marriage_analysis",
+            api_key=api_key,
+            timeout=30,
+            max_tokens=2000,
+            temperature=0.7,
+        )
+
+        # 解析AI回复并结构化
+        return parse_ai_response(ai_content)
 
     except Exception as e:
         logger.error(f"DeepSeek API调用错误: {str(e)}")
@@ -16,6 +16,7 @@ from django.views.decorators.http import require_http_methods
 
 from apps.tools.models import FoodRandomizationLog
 from apps.tools.models.legacy_models import FoodHistory, FoodItem, FoodPhotoBinding, FoodRandomizationSession
+from apps.tools.services.food_sampler import food_sampler
 
 logger = logging.getLogger(__name__)
 
@@ -31,40 +32,36 @@ def food_randomizer_pure_random_api(request):
         meal_type = data.get("meal_type", "all")
         exclude_recent = data.get("exclude_recent", True)
 
-        # 从数据库获取活跃的食物数据 - 使用FoodItem模型
-        queryset = FoodItem.objects.all()
-
-        # 处理cuisine_type过滤
-        if cuisine_type != "all" and cuisine_type != "mixed":
-            queryset = queryset.filter(cuisine=cuisine_type)
-        # 如果是'mixed'，则不过滤cuisine类型，显示所有菜系
+        # 处理cuisine_type过滤（'mixed'不过滤菜系，显示所有菜系）
+        sample_cuisine = cuisine_type
 
         # 处理meal_type过滤
+        sample_meal_type = "all"
         if meal_type != "all":
             # 将'lunch'映射到'main'，因为午餐通常是主食
             if meal_type == "lunch":
                 meal_type = "main"
             # FoodItem模型使用meal_types JSON字段，需要特殊处理
             if meal_type in ["breakfast", "lunch", "dinner", "snack"]:
-                queryset = queryset.filter(meal_types__contains=[meal_type])
+                sample_meal_type = meal_type
 
         # 排除最近食用的食物（如果需要的话）
+        recent_food_ids = []
         if exclude_recent and request.user.is_authenticated:
             # 获取用户最近3天内食用过的食物
             recent_cutoff = datetime.now() - timedelta(days=3)
             recent_food_ids = FoodRandomizationLog.objects.filter(
                 user=request.user, created_at__gte=recent_cutoff, selected=True
             ).values_list("food_id", flat=True)
-            queryset = queryset.exclude(id__in=recent_food_ids)
 
-        # 转换为列表
-        available_foods = list(queryset)
+        # 从抽样器缓存的活跃食物ID中抽取选中项和3个备选，只取回这几行
+        sampled_foods = food_sampler.sample(k=4, meal_type=sample_meal_type, cuisine=sample_cuisine, exclude=recent_food_ids)
 
-        if not available_foods:
+        if not sampled_foods:
             return JsonResponse({"success": False, "error": "没有找到符合条件的食物"}, status=404)
 
         # 随机选择食物
-        selected_food = random.choice(available_foods)
+        selected_food, alternatives = sampled_foods[0], sampled_foods[1:]
 
         # 生成推荐理由
         reasons = [
@@ -79,10 +76,6 @@ def food_randomizer_pure_random_api(request):
             "维生素丰富，增强免疫力",
         ]
 
-        # 获取备选食物（除了选中的食物）
-        alternative_foods = [f for f in available_foods if f.id != selected_food.id]
-        alternatives = random.sample(alternative_foods, min(3, len(alternative_foods)))
-
         # 将选中的食物转换为字典格式 - 适配FoodItem模型
         def food_to_dict(food):
             # 获取绑定的图片
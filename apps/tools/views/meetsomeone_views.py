@@ -15,6 +15,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
 from apps.tools.models.relationship_models import ImportantMoment, Interaction, PersonProfile, RelationshipTag
+from apps.tools.services.relationship_graph import relationship_graph
 
 logger = logging.getLogger(__name__)
 
@@ -547,117 +548,24 @@ def get_timeline_data_api(request):
 @require_http_methods(["GET"])
 @login_required
 def get_graph_data_api(request):
-    """获取图表数据API - 使用真实数据"""
+    """
+    获取图表数据API - 使用真实数据
+
+    带上 since=<版本号> 时，图谱未变化返回 mode=unchanged，能计算增量时返回 mode=delta。
+    """
     try:
-        user = request.user
+        result = relationship_graph.get_graph(request.user.id, since=request.GET.get("since"))
 
-        # 获取用户的所有人物档案
-        profiles = PersonProfile.objects.filter(user=user).prefetch_related("relationship_tags")
-
-        # 构建节点数据
-        nodes = []
-        # 添加自己作为中心节点
-        nodes.append({"id": "self", "name": "我", "type": "self", "size": 25, "importance": 5})
-
-        # 添加其他人物节点
-        for profile in profiles:
-            # 计算节点大小（基于重要程度和互动次数）
-            size = 10 + (profile.importance_level * 2) + min(profile.interaction_count // 5, 10)
-
-            # 确定节点类型（基于主要关系标签）
-            node_type = "friend"  # 默认类型
-            if profile.relationship_tags.exists():
-                main_tag = profile.relationship_tags.first().name
-                if "同事" in main_tag or "合作" in main_tag:
-                    node_type = "colleague"
-                elif "家人" in main_tag or "亲" in main_tag:
-                    node_type = "family"
-                elif "导师" in main_tag or "老师" in main_tag:
-                    node_type = "mentor"
-                elif "朋友" in main_tag:
-                    node_type = "friend"
-
-            nodes.append(
-                {
-                    "id": profile.id,
-                    "name": profile.nickname or profile.name,
-                    "type": node_type,
-                    "size": size,
-                    "importance": profile.importance_level,
-                    "interaction_count": profile.interaction_count,
-                    "relationship_tags": [tag.name for tag in profile.relationship_tags.all()],
-                }
+        if result["mode"] == "full":
+            graph_data = result["graph"]
+            logger.info(
+                f"获取图表数据: 用户 {request.user.id}, 返回 {len(graph_data['nodes'])} 个节点，{len(graph_data['edges'])} 条边"
             )
+            return JsonResponse({"status": "success", "mode": "full", "version": result["version"], "data": graph_data})
 
-        # 构建边数据（连接关系）
-        edges = []
-        for profile in profiles:
-            # 每个人都与自己连接
-            connection_strength = min(profile.importance_level * 2 + profile.interaction_count / 10, 10)
-
-            # 确定关系类型
-            edge_type = "friend"
-            if profile.relationship_tags.exists():
-                main_tag = profile.relationship_tags.first().name
-                if "同事" in main_tag:
-                    edge_type = "colleague"
-                elif "家人" in main_tag:
-                    edge_type = "family"
-                elif "导师" in main_tag:
-                    edge_type = "mentor"
-
-            edges.append(
-                {
-                    "source": "self",
-                    "target": profile.id,
-                    "strength": connection_strength,
-                    "type": edge_type,
-                    "interaction_count": profile.interaction_count,
-                }
-            )
-
-        # 添加人物之间的关系（基于共同好友）
-        for profile in profiles:
-            for mutual_friend in profile.mutual_friends.all():
-                if mutual_friend.user == user and mutual_friend != profile:
-                    # 添加互相认识的关系
-                    edges.append(
-                        {
-                            "source": profile.id,
-                            "target": mutual_friend.id,
-                            "strength": 3.0,  # 较弱的连接
-                            "type": "acquaintance",
-                            "interaction_count": 0,
-                        }
-                    )
-
-        # 计算统计信息
-        total_connections = len(profiles)
-        if total_connections > 0:
-            avg_importance = sum(p.importance_level for p in profiles) / total_connections
-            strongest_profile = max(profiles, key=lambda p: p.importance_level * 2 + p.interaction_count) if profiles else None
-            most_connected_profile = max(profiles, key=lambda p: p.interaction_count) if profiles else None
-        else:
-            avg_importance = 0
-            strongest_profile = None
-            most_connected_profile = None
-
-        graph_data = {
-            "nodes": nodes,
-            "edges": edges,
-            "statistics": {
-                "total_connections": total_connections,
-                "average_importance": round(avg_importance, 1),
-                "strongest_connection": (strongest_profile.nickname or strongest_profile.name) if strongest_profile else "无",
-                "most_connected": (
-                    (most_connected_profile.nickname or most_connected_profile.name) if most_connected_profile else "无"
-                ),
-            },
-        }
-
-        logger.info(f"获取图表数据: 用户 {request.user.id}, 返回 {len(nodes)} 个节点，{len(edges)} 条边")
-
-        return JsonResponse({"status": "success", "data": graph_data})
+        return JsonResponse(
+            {"status": "success", "mode": result["mode"], "version": result["version"], "delta": result.get("delta")}
+        )
 
     except Exception as e:
         logger.error(f"获取图表数据失败: {str(e)}")
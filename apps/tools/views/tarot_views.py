@@ -16,9 +16,8 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-import requests
-
 from ..models.tarot_models import TarotCard, TarotEnergyCalendar, TarotReading, TarotSpread
+from ..services.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -678,20 +677,7 @@ def generate_ai_interpretation(spread, drawn_cards, question, reading_type):
         # 调用AI API（这里使用DeepSeek作为示例）
         api_key = getattr(settings, "DEEPSEEK_API_KEY", None)
         if api_key:
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 2000,
-                "temperature": 0.7,
-            }
-
-            response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=payload, timeout=30)
-
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
+            return llm_gateway.complete(prompt, feature="tarot", api_key=api_key, timeout=30, max_tokens=2000, temperature=0.7)
 
         # 如果AI API不可用，返回默认解读
         return generate_default_interpretation(spread, drawn_cards, question, reading_type)
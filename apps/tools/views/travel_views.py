@@ -7,7 +7,7 @@ import json
 from datetime import datetime
 
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -59,6 +59,85 @@ def check_local_travel_data_api(request):
         return JsonResponse({"has_local_data": False, "message": f"检测失败: {str(e)}"})
 
 
+# TravelGuide模型中存在的攻略字段，其他字段保存前过滤掉
+GUIDE_FIELDS = (
+    "must_visit_attractions",
+    "food_recommendations",
+    "transportation_guide",
+    "hidden_gems",
+    "weather_info",
+    "destination_info",
+    "currency_info",
+    "timezone_info",
+    "best_time_to_visit",
+    "budget_estimate",
+    "travel_tips",
+    "detailed_guide",
+    "daily_schedule",
+    "activity_timeline",
+    "cost_breakdown",
+)
+
+
+def _parse_guide_request(data):
+    """从请求数据中读取攻略参数"""
+    return {
+        "destination": data.get("destination", "").strip(),
+        "travel_style": data.get("travel_style", "general"),
+        "budget_min": data.get("budget_min", 3000),  # 预算最小值
+        "budget_max": data.get("budget_max", 8000),  # 预算最大值
+        "budget_amount": data.get("budget_amount", 5000),  # 新增具体预算金额（平均值）
+        "budget_range": data.get("budget_range", "medium"),  # 保留分类，用于兼容
+        "travel_duration": data.get("travel_duration", "3-5天"),
+        "interests": data.get("interests", []),
+        "fast_mode": data.get("fast_mode", False),  # 新增快速模式选项
+    }
+
+
+def _save_travel_guide(user, params, guide_content, has_local_data):
+    """保存生成的攻略，返回接口响应中的攻略数据"""
+    filtered_content = {k: v for k, v in guide_content.items() if k in GUIDE_FIELDS}
+
+    # 保存到数据库
+    travel_guide = TravelGuide.objects.create(
+        user=user,
+        destination=params["destination"],
+        travel_style=params["travel_style"],
+        budget_min=params["budget_min"],
+        budget_max=params["budget_max"],
+        budget_amount=params["budget_amount"],
+        budget_range=params["budget_range"],
+        travel_duration=params["travel_duration"],
+        interests=params["interests"],
+        **filtered_content,
+    )
+
+    # 构建响应数据
+    response_data = {
+        "id": travel_guide.id,
+        "destination": travel_guide.destination,
+        **{field: getattr(travel_guide, field) for field in GUIDE_FIELDS},
+        "created_at": travel_guide.created_at.strftime("%Y-%m-%d %H:%M"),
+    }
+
+    # 添加缓存和API信息
+    if hasattr(guide_content, "get"):
+        response_data.update(
+            {
+                "is_cached": guide_content.get("is_cached", False),
+                "api_used": guide_content.get("api_used", "unknown"),
+                "generation_time": guide_content.get("generation_time", 0),
+                "generation_mode": guide_content.get("generation_mode", "standard"),
+                "data_quality_score": guide_content.get("data_quality_score", 0.0),
+                "usage_count": guide_content.get("usage_count", 0),
+                "cached_at": guide_content.get("cached_at"),
+                "expires_at": guide_content.get("expires_at"),
+                "data_source": "local" if has_local_data else "deepseek",
+            }
+        )
+    return response_data
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def travel_guide_api(request):
@@ -68,19 +147,11 @@ def travel_guide_api(request):
         if not request.user.is_authenticated:
             return JsonResponse({"success": False, "error": "请先登录后再使用此功能"}, status=401)
 
-        data = json.loads(request.body)
-        destination = data.get("destination", "").strip()
-        travel_style = data.get("travel_style", "general")
-        budget_min = data.get("budget_min", 3000)  # 预算最小值
-        budget_max = data.get("budget_max", 8000)  # 预算最大值
-        budget_amount = data.get("budget_amount", 5000)  # 新增具体预算金额（平均值）
-        budget_range = data.get("budget_range", "medium")  # 保留分类，用于兼容
-        travel_duration = data.get("travel_duration", "3-5天")
-        interests = data.get("interests", [])
-        fast_mode = data.get("fast_mode", False)  # 新增快速模式选项
+        params = _parse_guide_request(json.loads(request.body))
+        destination = params["destination"]
 
         # 后端预算范围校验
-        validation_error = validate_budget_range(budget_min, budget_max)
+        validation_error = validate_budget_range(params["budget_min"], params["budget_max"])
         if validation_error:
             return JsonResponse({"error": validation_error}, status=400)
 
@@ -94,6 +165,7 @@ def travel_guide_api(request):
 
             # 只在需要时创建服务实例
             service = None
+            has_local_data = False
             try:
                 service = MultiAPITravelService()
 
@@ -103,30 +175,10 @@ def travel_guide_api(request):
                 # 如果有本地数据，优先使用本地数据
                 if has_local_data:
                     print(f"✅ {destination}有本地数据，使用本地数据生成攻略")
-                    guide_content = service.get_travel_guide_with_local_data(
-                        destination=destination,
-                        travel_style=travel_style,
-                        budget_min=budget_min,
-                        budget_max=budget_max,
-                        budget_amount=budget_amount,
-                        budget_range=budget_range,
-                        travel_duration=travel_duration,
-                        interests=interests,
-                        fast_mode=fast_mode,
-                    )
+                    guide_content = service.get_travel_guide_with_local_data(**params)
                 else:
                     print(f"❌ {destination}没有本地数据，使用DeepSeek功能")
-                    guide_content = service.get_travel_guide(
-                        destination=destination,
-                        travel_style=travel_style,
-                        budget_min=budget_min,
-                        budget_max=budget_max,
-                        budget_amount=budget_amount,
-                        budget_range=budget_range,
-                        travel_duration=travel_duration,
-                        interests=interests,
-                        fast_mode=fast_mode,
-                    )
+                    guide_content = service.get_travel_guide(**params)
 
             except Exception as service_error:
                 # 如果服务创建失败，使用备用方案
@@ -146,79 +198,8 @@ def travel_guide_api(request):
                     "cost_breakdown": {},
                 }
 
-            # 过滤掉TravelGuide模型中不存在的字段
-            valid_fields = {
-                "must_visit_attractions",
-                "food_recommendations",
-                "transportation_guide",
-                "hidden_gems",
-                "weather_info",
-                "destination_info",
-                "currency_info",
-                "timezone_info",
-                "best_time_to_visit",
-                "budget_estimate",
-                "travel_tips",
-                "detailed_guide",
-                "daily_schedule",
-                "activity_timeline",
-                "cost_breakdown",
-            }
-            filtered_content = {k: v for k, v in guide_content.items() if k in valid_fields}
-
-            # 保存到数据库
-            travel_guide = TravelGuide.objects.create(
-                user=request.user,
-                destination=destination,
-                travel_style=travel_style,
-                budget_min=budget_min,
-                budget_max=budget_max,
-                budget_amount=budget_amount,
-                budget_range=budget_range,
-                travel_duration=travel_duration,
-                interests=interests,
-                **filtered_content,
-            )
-
-            # 构建响应数据
-            response_data = {
-                "id": travel_guide.id,
-                "destination": travel_guide.destination,
-                "must_visit_attractions": travel_guide.must_visit_attractions,
-                "food_recommendations": travel_guide.food_recommendations,
-                "transportation_guide": travel_guide.transportation_guide,
-                "hidden_gems": travel_guide.hidden_gems,
-                "weather_info": travel_guide.weather_info,
-                "destination_info": travel_guide.destination_info,
-                "currency_info": travel_guide.currency_info,
-                "timezone_info": travel_guide.timezone_info,
-                "best_time_to_visit": travel_guide.best_time_to_visit,
-                "budget_estimate": travel_guide.budget_estimate,
-                "travel_tips": travel_guide.travel_tips,
-                "detailed_guide": travel_guide.detailed_guide,
-                "daily_schedule": travel_guide.daily_schedule,
-                "activity_timeline": travel_guide.activity_timeline,
-                "cost_breakdown": travel_guide.cost_breakdown,
-                "created_at": travel_guide.created_at.strftime("%Y-%m-%d %H:%M"),
-            }
-
-            # 添加缓存和API信息
-            if hasattr(guide_content, "get"):
-                response_data.update(
-                    {
-                        "is_cached": guide_content.get("is_cached", False),
-                        "api_used": guide_content.get("api_used", "unknown"),
-                        "generation_time": guide_content.get("generation_time", 0),
-                        "generation_mode": guide_content.get("generation_mode", "standard"),
-                        "data_quality_score": guide_content.get("data_quality_score", 0.0),
-                        "usage_count": guide_content.get("usage_count", 0),
-                        "cached_at": guide_content.get("cached_at"),
-                        "expires_at": guide_content.get("expires_at"),
-                        "data_source": "local" if has_local_data else "deepseek",
-                    }
-                )
-
-            return JsonResponse({"success": True, "guide_id": travel_guide.id, "guide": response_data})
+            response_data = _save_travel_guide(request.user, params, guide_content, has_local_data)
+            return JsonResponse({"success": True, "guide_id": response_data["id"], "guide": response_data})
         except Exception as e:
             error_message = str(e)
             if "无法获取有效的旅游数据" in error_message or "API" in error_message:
@@ -235,6 +216,69 @@ def travel_guide_api(request):
         return JsonResponse({"error": f"生成攻略失败: {str(e)}"}, status=500)
 
 
+def _sse_event(event, data):
+    """编码一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def travel_guide_stream_api(request):
+    """
+    旅游攻略流式API - 参数同 travel_guide_api，以Server-Sent Events返回：
+    start（开始生成）、delta（新文本）、section（完整的小节）、done（保存后的攻略）、error（失败）
+
+    本地数据和已缓存的攻略没有生成过程，直接返回 done。
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"success": False, "error": "请先登录后再使用此功能"}, status=401)
+
+    try:
+        params = _parse_guide_request(json.loads(request.body))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "无效的JSON数据"}, status=400)
+
+    validation_error = validate_budget_range(params["budget_min"], params["budget_max"])
+    if validation_error:
+        return JsonResponse({"error": validation_error}, status=400)
+    if not params["destination"]:
+        return JsonResponse({"error": "请输入目的地"}, status=400)
+
+    user = request.user
+
+    def events():
+        try:
+            from ..services.enhanced_travel_service_v2 import MultiAPITravelService
+
+            service = MultiAPITravelService()
+            has_local_data = params["destination"] in service.real_travel_data
+            yield _sse_event(
+                "start", {"destination": params["destination"], "data_source": "local" if has_local_data else "deepseek"}
+            )
+
+            if has_local_data:
+                guide_content = service.get_travel_guide_with_local_data(**params)
+            else:
+                guide_content = {}
+                for event, payload in service.stream_travel_guide(**params):
+                    if event == "guide":
+                        guide_content = payload
+                    else:
+                        yield _sse_event(event, payload)
+
+            response_data = _save_travel_guide(user, params, guide_content, has_local_data)
+            yield _sse_event("done", {"success": True, "guide_id": response_data["id"], "guide": response_data})
+        except Exception as e:
+            print(f"流式生成旅游攻略失败: {str(e)}")
+            yield _sse_event("error", {"error": f"生成攻略失败: {str(e)}"})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # 关闭nginx的响应缓冲，保证每个事件立即发送到浏览器
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 @login_required
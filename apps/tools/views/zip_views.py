@@ -54,6 +54,7 @@ def create_zip_from_uploaded_files_api(request):
         compression_level = int(request.POST.get("compression_level", 6))
         include_paths = request.POST.get("include_paths", "true").lower() == "true"
         compression_method = request.POST.get("compression_method", "auto")
+        stream = request.POST.get("stream", "false").lower() == "true"
 
         # 验证压缩级别
         if not (0 <= compression_level <= 9):
@@ -72,6 +73,21 @@ def create_zip_from_uploaded_files_api(request):
                         destination.write(chunk)
                 temp_file_paths.append(temp_file_path)
 
+            if stream:
+                # 边压缩边下载，下载结束后再清理上传的临时文件
+                success, message, response = enhanced_compression_service.stream_files(
+                    file_paths=temp_file_paths,
+                    output_name=zip_name,
+                    compression_method=compression_method,
+                    compression_level=compression_level,
+                    include_paths=False,
+                    on_close=lambda: shutil.rmtree(temp_dir, ignore_errors=True),
+                )
+                if success:
+                    return response
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return JsonResponse({"success": False, "message": message})
+
             # 使用增强压缩服务
             success, message, compressed_path = enhanced_compression_service.compress_files(
                 file_paths=temp_file_paths,
@@ -233,6 +249,8 @@ def create_zip_from_files_api(request):
         zip_name = data.get("zip_name", "")
         compression_level = data.get("compression_level", 6)
         include_paths = data.get("include_paths", True)
+        stream = data.get("stream", False)
+        archive_format = data.get("format", "zip")
 
         # 验证参数
         if not file_paths:
@@ -242,6 +260,17 @@ def create_zip_from_files_api(request):
         if not (0 <= compression_level <= 9):
             compression_level = 6
 
+        if stream:
+            # 直接把压缩包流式返回给浏览器，不在服务器上生成ZIP文件
+            success, message, response = zip_service.stream_files(
+                file_paths=file_paths,
+                archive_name=zip_name,
+                compression_level=compression_level,
+                include_paths=include_paths,
+                archive_format=archive_format,
+            )
+            return response if success else JsonResponse({"success": False, "message": message})
+
         # 创建ZIP文件
         success, message, zip_path = zip_service.create_zip_from_files(
             file_paths=file_paths, zip_name=zip_name, compression_level=compression_level, include_paths=include_paths
@@ -1,3 +1,4 @@
+import functools
 import html
 import logging
 import re
@@ -14,69 +15,95 @@ from django.utils.html import strip_tags
 logger = logging.getLogger(__name__)
 
 
+# XSS签名中的危险标签（匹配 <tag...> 形式，前缀匹配，如 a 同时覆盖 abbr、applet）
+XSS_TAGS = (
+    "script iframe object embed link meta form input textarea select button a img video audio canvas svg "
+    "math applet base bgsound command details dialog fieldset figure figcaption footer header hgroup "
+    "keygen legend map menu menuitem meter nav noscript optgroup option output param progress ruby rt rp "
+    "samp section source summary time track wbr "
+).split()
+
+# 所有签名合并为一个正则，每个字段只扫描一遍；命名分组用于记录命中的签名类别。
+# SQL注入原有的九条规则中，带 -- # /* 后缀的规则被不带后缀的规则完全覆盖，合并为三条。
+MALICIOUS_SIGNATURES = {
+    "xss_tag": r"<(?:%s)[^>]*>" % "|".join(XSS_TAGS),
+    "xss_protocol": r"javascript:",
+    "xss_event": r"on\w+\s*=",
+    "sql_keyword": r"\b(?:SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|EXEC|UNION)\b",
+    "sql_tautology_number": r"\b(?:OR|AND)\b\s+\d+\s*=\s*\d+",
+    "sql_tautology_string": r"\b(?:OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'",
+}
+
+MALICIOUS_PATTERN_RE = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in MALICIOUS_SIGNATURES.items()), re.IGNORECASE
+)
+SQL_INJECTION_RE = re.compile(
+    "|".join(MALICIOUS_SIGNATURES[name] for name in MALICIOUS_SIGNATURES if name.startswith("sql_")), re.IGNORECASE
+)
+PRIVATE_IP_RE = re.compile(r"^(?:10\.|172\.(?:1[6-9]|2[0-9]|3[0-1])\.|192\.168\.|127\.|169\.254\.|::1$|fe80:)")
+
+
+class MaliciousPatternScanner:
+    """
+    恶意模式扫描引擎
+
+    签名在模块加载时合并编译，每个字段一次扫描；服务器填写的META键（wsgi.*、SERVER_*、REMOTE_ADDR等）直接跳过，
+    其余（请求头、CONTENT_TYPE、QUERY_STRING等客户端可控的值）都扫描；单个字段最多扫描 max_field_length 个字符；
+    请求头的值大量重复（User-Agent、Accept等），短值的判定结果用LRU缓存。
+    """
+
+    # 由服务器填写、客户端无法控制的META键，跳过扫描
+    SKIPPED_META_PREFIXES = ("wsgi.", "SERVER_", "gunicorn.", "uwsgi.")
+    SKIPPED_META_KEYS = frozenset(["REMOTE_ADDR", "REMOTE_PORT", "REQUEST_METHOD", "SCRIPT_NAME"])
+
+    def __init__(self, max_field_length=None, verdict_cache_size=4096, cacheable_length=512):
+        if max_field_length is None:
+            max_field_length = getattr(settings, "SECURITY_SCAN_MAX_FIELD_LENGTH", 8192)
+        self.max_field_length = max_field_length
+        self.cacheable_length = cacheable_length
+        self._cached_match = functools.lru_cache(maxsize=verdict_cache_size)(self.match)
+
+    def match(self, content):
+        """返回命中的签名类别，未命中返回None"""
+        found = MALICIOUS_PATTERN_RE.search(content, 0, self.max_field_length)
+        return found.lastgroup if found else None
+
+    def match_header(self, content):
+        """请求头扫描，短值走判定缓存"""
+        if len(content) <= self.cacheable_length:
+            return self._cached_match(content)
+        return self.match(content)
+
+    def iter_request_fields(self, request):
+        """生成需要扫描的 (来源, 键, 值)"""
+        if request.method == "POST":
+            for key, value in request.POST.items():
+                if isinstance(value, str):
+                    yield "POST", key, value
+        for key, value in request.GET.items():
+            if isinstance(value, str):
+                yield "GET", key, value
+        for key, value in request.META.items():
+            if not isinstance(value, str) or key in self.SKIPPED_META_KEYS or key.startswith(self.SKIPPED_META_PREFIXES):
+                continue
+            yield "META", key, value
+
+    def scan_request(self, request):
+        """扫描请求，命中时返回 (来源, 键, 签名类别)，否则返回None"""
+        for source, key, value in self.iter_request_fields(request):
+            signature = self.match_header(value) if source == "META" else self.match(value)
+            if signature:
+                return source, key, signature
+        return None
+
+
 class SecurityMiddleware(MiddlewareMixin):
     """安全中间件，提供多种安全防护"""
 
     def __init__(self, get_response=None):
         super().__init__(get_response)
         self.ip_attack_counts = defaultdict(list)
-        self.suspicious_patterns = [
-            r"<script[^>]*>",
-            r"javascript:",
-            r"on\w+\s*=",
-            r"<iframe[^>]*>",
-            r"<object[^>]*>",
-            r"<embed[^>]*>",
-            r"<link[^>]*>",
-            r"<meta[^>]*>",
-            r"<form[^>]*>",
-            r"<input[^>]*>",
-            r"<textarea[^>]*>",
-            r"<select[^>]*>",
-            r"<button[^>]*>",
-            r"<a[^>]*>",
-            r"<img[^>]*>",
-            r"<video[^>]*>",
-            r"<audio[^>]*>",
-            r"<canvas[^>]*>",
-            r"<svg[^>]*>",
-            r"<math[^>]*>",
-            r"<applet[^>]*>",
-            r"<base[^>]*>",
-            r"<bgsound[^>]*>",
-            r"<command[^>]*>",
-            r"<details[^>]*>",
-            r"<dialog[^>]*>",
-            r"<fieldset[^>]*>",
-            r"<figure[^>]*>",
-            r"<figcaption[^>]*>",
-            r"<footer[^>]*>",
-            r"<header[^>]*>",
-            r"<hgroup[^>]*>",
-            r"<keygen[^>]*>",
-            r"<legend[^>]*>",
-            r"<map[^>]*>",
-            r"<menu[^>]*>",
-            r"<menuitem[^>]*>",
-            r"<meter[^>]*>",
-            r"<nav[^>]*>",
-            r"<noscript[^>]*>",
-            r"<optgroup[^>]*>",
-            r"<option[^>]*>",
-            r"<output[^>]*>",
-            r"<param[^>]*>",
-            r"<progress[^>]*>",
-            r"<ruby[^>]*>",
-            r"<rt[^>]*>",
-            r"<rp[^>]*>",
-            r"<samp[^>]*>",
-            r"<section[^>]*>",
-            r"<source[^>]*>",
-            r"<summary[^>]*>",
-            r"<time[^>]*>",
-            r"<track[^>]*>",
-            r"<wbr[^>]*>",
-        ]
+        self.scanner = MaliciousPatternScanner()
 
     def process_request(self, request):
         """处理请求前的安全检查"""
@@ -189,72 +216,20 @@ class SecurityMiddleware(MiddlewareMixin):
             return False
 
         # 检查是否为私有IP
-        private_ip_patterns = [
-            r"^10\.",
-            r"^172\.(1[6-9]|2[0-9]|3[0-1])\.",
-            r"^192\.168\.",
-            r"^127\.",
-            r"^169\.254\.",
-            r"^::1$",
-            r"^fe80:",
-        ]
-
-        for pattern in private_ip_patterns:
-            if re.match(pattern, ip):
-                return True
-
-        return False
+        return bool(PRIVATE_IP_RE.match(ip))
 
     def _has_malicious_content(self, request):
-        """检查是否包含恶意内容"""
-        # 检查POST数据
-        if request.method == "POST":
-            for key, value in request.POST.items():
-                if isinstance(value, str):
-                    if self._contains_malicious_pattern(value):
-                        return True
-
-        # 检查GET参数
-        for key, value in request.GET.items():
-            if isinstance(value, str):
-                if self._contains_malicious_pattern(value):
-                    return True
-
-        # 检查请求头
-        for key, value in request.META.items():
-            if isinstance(value, str):
-                if self._contains_malicious_pattern(value):
-                    return True
-
+        """检查是否包含恶意内容（POST数据、GET参数和请求头）"""
+        hit = self.scanner.scan_request(request)
+        if hit:
+            source, key, signature = hit
+            logger.info(f"恶意模式命中: {source}[{key}] 签名={signature}")
+            return True
         return False
 
     def _contains_malicious_pattern(self, content):
         """检查是否包含恶意模式"""
-        content_lower = content.lower()
-
-        # 检查XSS模式
-        for pattern in self.suspicious_patterns:
-            if re.search(pattern, content_lower, re.IGNORECASE):
-                return True
-
-        # 检查SQL注入模式
-        sql_patterns = [
-            r"(\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|EXEC|UNION)\b)",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\')",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*--)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'--)",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*#)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'#)",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*/\*)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'/\*)",
-        ]
-
-        for pattern in sql_patterns:
-            if re.search(pattern, content, re.IGNORECASE):
-                return True
-
-        return False
+        return self.scanner.match(content) is not None
 
 
 class InputValidator:
@@ -397,24 +372,8 @@ class SQLInjectionProtector:
         if not input_string:
             return False
 
-        # SQL注入关键词模式
-        sql_patterns = [
-            r"(\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|EXEC|UNION)\b)",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\')",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*--)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'--)",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*#)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'#)",
-            r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*/\*)",
-            r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'/\*)",
-        ]
-
-        for pattern in sql_patterns:
-            if re.search(pattern, input_string, re.IGNORECASE):
-                return True
-
-        return False
+        # SQL注入关键词模式（预编译）
+        return bool(SQL_INJECTION_RE.search(input_string))
 
     @staticmethod
     def sanitize_sql_input(input_string):
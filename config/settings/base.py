@@ -264,6 +264,23 @@ REST_FRAMEWORK = {
 
 # 第三方API配置
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+# 大模型调用网关：接口地址、全局并发上限、按功能的并发上限（如 "travel=4,douyin=2"）、连接池大小
+LLM_API_BASE_URL = os.environ.get("LLM_API_BASE_URL", "https://api.deepseek.com/v1")
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+LLM_FEATURE_CONCURRENCY = os.environ.get("LLM_FEATURE_CONCURRENCY", "")
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", 8))
+# 令牌桶限速（每分钟请求数，0表示不限速，Redis可用时多进程共享）和突发容量
+LLM_RATE_LIMIT_PER_MINUTE = float(os.environ.get("LLM_RATE_LIMIT_PER_MINUTE", 120))
+LLM_RATE_LIMIT_BURST = int(os.environ.get("LLM_RATE_LIMIT_BURST", 10))
+# 默认重试次数和单次调用的总时间预算（秒，包括排队和重试）
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_TIMEOUT = int(os.environ.get("LLM_TIMEOUT", 60))
+# 大模型响应缓存：总开关、按功能的过期策略（如 "travel=weekly,tarot=3600,chat=off"，在默认策略上合并）
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_POLICIES = os.environ.get("LLM_CACHE_POLICIES", "")
+# Redis不可用时的磁盘缓存目录和容量上限（字节）
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", str(BASE_DIR / "llm_cache"))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
 
 # 站点配置（用于captcha）
 SITE_ID = 1
@@ -278,6 +295,49 @@ CELERY_TIMEZONE = "Asia/Shanghai"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+# 异步任务存储（auto: Redis可用时使用Redis，否则使用本地SQLite WAL）
+ASYNC_TASK_STORE_BACKEND = os.environ.get("ASYNC_TASK_STORE_BACKEND", "auto")
+# 每个进程的异步任务并发数和排队上限，超出时接口返回429
+ASYNC_TASK_MAX_WORKERS = int(os.environ.get("ASYNC_TASK_MAX_WORKERS", 4))
+ASYNC_TASK_MAX_QUEUE_SIZE = int(os.environ.get("ASYNC_TASK_MAX_QUEUE_SIZE", 50))
+ASYNC_TASK_MAX_PENDING_PER_USER = int(os.environ.get("ASYNC_TASK_MAX_PENDING_PER_USER", 5))
+# 并行数据获取阶段（如旅游攻略的景点、美食、天气等）的共享线程数，以及旅游攻略并行获取的总截止时间（秒）
+STAGE_FANOUT_MAX_WORKERS = int(os.environ.get("STAGE_FANOUT_MAX_WORKERS", 12))
+TRAVEL_GUIDE_FETCH_DEADLINE = int(os.environ.get("TRAVEL_GUIDE_FETCH_DEADLINE", 90))
+# 流式生成旅游攻略时DeepSeek调用的总时间预算（秒），长攻略逐段输出，比一次性生成需要更长的时间
+TRAVEL_GUIDE_STREAM_TIMEOUT = int(os.environ.get("TRAVEL_GUIDE_STREAM_TIMEOUT", 180))
+# 目的地知识缓存：按数据源覆盖默认过期时间，如 "weather=600,country=weekly"；定时预热的热门目的地数量（0为不预热）
+DESTINATION_KNOWLEDGE_TTLS = os.environ.get("DESTINATION_KNOWLEDGE_TTLS", "")
+DESTINATION_KNOWLEDGE_PREWARM_TOP = int(os.environ.get("DESTINATION_KNOWLEDGE_PREWARM_TOP", 20))
+
+# 请求性能指标在进程内聚合后定期批量刷新到Redis（秒）
+PERFORMANCE_METRICS_FLUSH_INTERVAL = int(os.environ.get("PERFORMANCE_METRICS_FLUSH_INTERVAL", 10))
+# 记录完整查询画像（重复查询指纹、最慢语句）的请求比例，其余请求只计数和计时
+QUERY_PROFILE_SAMPLE_RATE = float(os.environ.get("QUERY_PROFILE_SAMPLE_RATE", 0.1))
+
+# PDF页面并行处理进程数（0表示按CPU核数，最多4个）和单页OCR超时（秒）
+PDF_CONVERT_MAX_WORKERS = int(os.environ.get("PDF_CONVERT_MAX_WORKERS", 0))
+PDF_OCR_PAGE_TIMEOUT = int(os.environ.get("PDF_OCR_PAGE_TIMEOUT", 60))
+# 文件转换结果缓存目录和总大小上限（字节），超出后按最近使用时间淘汰
+PDF_CONVERSION_CACHE_DIR = os.environ.get("PDF_CONVERSION_CACHE_DIR", str(BASE_DIR / "conversion_cache"))
+PDF_CONVERSION_CACHE_MAX_BYTES = int(os.environ.get("PDF_CONVERSION_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# 音频转码并发数（0表示按CPU核数）、排队上限和单个文件的转码超时（秒）
+AUDIO_TRANSCODE_MAX_WORKERS = int(os.environ.get("AUDIO_TRANSCODE_MAX_WORKERS", 0))
+AUDIO_TRANSCODE_MAX_QUEUE_SIZE = int(os.environ.get("AUDIO_TRANSCODE_MAX_QUEUE_SIZE", 50))
+AUDIO_TRANSCODE_TIMEOUT = int(os.environ.get("AUDIO_TRANSCODE_TIMEOUT", 300))
+AUDIO_FFMPEG_BINARY = os.environ.get("AUDIO_FFMPEG_BINARY", "ffmpeg")
+# 音频转码结果缓存目录和总大小上限（字节）
+AUDIO_TRANSCODE_CACHE_DIR = os.environ.get("AUDIO_TRANSCODE_CACHE_DIR", str(BASE_DIR / "audio_cache"))
+AUDIO_TRANSCODE_CACHE_MAX_BYTES = int(os.environ.get("AUDIO_TRANSCODE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# MeetSomeone 关系图谱缓存时间（秒），人物或互动变化时会主动失效
+MEETSOMEONE_GRAPH_CACHE_TIMEOUT = int(os.environ.get("MEETSOMEONE_GRAPH_CACHE_TIMEOUT", 60 * 60))
+
+# 心动链接匹配队列（auto: Redis可用时使用Redis ZSET，否则使用数据库行锁），后台清理过期请求的间隔（秒）
+HEART_LINK_QUEUE_BACKEND = os.environ.get("HEART_LINK_QUEUE_BACKEND", "auto")
+HEART_LINK_SWEEP_INTERVAL = int(os.environ.get("HEART_LINK_SWEEP_INTERVAL", 30))
+
 # 缓存配置
 CACHEOPS_REDIS = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/4")
 CACHEOPS_DEFAULTS = {"timeout": 60 * 15}
@@ -323,6 +383,9 @@ BLACKLISTED_IPS = [
     "183.94.33.160",  # 攻击IP
 ]
 
+# 恶意模式扫描时单个请求字段最多扫描的字符数
+SECURITY_SCAN_MAX_FIELD_LENGTH = int(os.environ.get("SECURITY_SCAN_MAX_FIELD_LENGTH", 8192))
+
 # 允许的引用域名
 ALLOWED_REFERER_DOMAINS = [
     "shenyiqing.xin",
@@ -3,10 +3,10 @@ import time
 
 from django.conf import settings
 from django.core.cache import cache
-from django.db import connection
 from django.http import JsonResponse
 
-from utils.database_optimizer import db_monitor
+from utils.metrics_aggregator import request_metrics
+from utils.query_profiler import profile_queries
 
 logger = logging.getLogger(__name__)
 
@@ -23,16 +23,16 @@ class PerformanceMonitoringMiddleware:
         if not self.enable_monitoring:
             return self.get_response(request)
 
-        # 记录请求开始
+        # 记录请求开始（查询数通过execute_wrapper统计，不依赖DEBUG下的connection.queries）
         start_time = time.time()
-        start_queries = len(connection.queries)
 
         # 处理请求
-        response = self.get_response(request)
+        with profile_queries(request) as query_profile:
+            response = self.get_response(request)
 
         # 计算性能指标
         execution_time = time.time() - start_time
-        query_count = len(connection.queries) - start_queries
+        query_count = query_profile.count
 
         # 记录性能指标
         self._log_performance(request, response, execution_time, query_count)
@@ -57,42 +57,31 @@ class PerformanceMonitoringMiddleware:
                 f"Slow request: {method} {path} - {execution_time:.3f}s, " f"{query_count} queries, status: {status_code}"
             )
 
-        # 记录性能指标到缓存（用于统计）
-        self._store_performance_metrics(path, method, execution_time, query_count, status_code)
+        # 按路由模式聚合，避免 /api/task/<uuid>/ 这类路径产生无限多的统计项
+        route = self._get_route(request)
+
+        # 记录性能指标（用于统计）
+        self._store_performance_metrics(route, method, execution_time, query_count, status_code)
+
+    @staticmethod
+    def _get_route(request):
+        """获取请求匹配的URL模式，未匹配时使用原始路径"""
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match is not None and resolver_match.route:
+            return "/" + resolver_match.route.lstrip("^")
+        return request.path
 
     def _store_performance_metrics(self, path, method, execution_time, query_count, status_code):
-        """存储性能指标"""
+        """存储性能指标（进程内累加，由聚合器定期批量刷新到Redis）"""
         try:
-            # 按路径聚合性能指标
-            cache_key = f"perf_metrics:{path}:{method}"
-            metrics = cache.get(
-                cache_key,
-                {
-                    "count": 0,
-                    "total_time": 0,
-                    "total_queries": 0,
-                    "avg_time": 0,
-                    "avg_queries": 0,
-                    "slow_count": 0,
-                    "error_count": 0,
-                },
+            request_metrics.record(
+                method,
+                path,
+                execution_time,
+                query_count,
+                is_slow=execution_time > self.slow_request_threshold,
+                is_error=status_code >= 400,
             )
-
-            metrics["count"] += 1
-            metrics["total_time"] += execution_time
-            metrics["total_queries"] += query_count
-            metrics["avg_time"] = metrics["total_time"] / metrics["count"]
-            metrics["avg_queries"] = metrics["total_queries"] / metrics["count"]
-
-            if execution_time > self.slow_request_threshold:
-                metrics["slow_count"] += 1
-
-            if status_code >= 400:
-                metrics["error_count"] += 1
-
-            # 缓存1小时
-            cache.set(cache_key, metrics, 3600)
-
         except Exception as e:
             logger.error(f"Failed to store performance metrics: {e}")
 
@@ -103,51 +92,68 @@ class DatabaseQueryMonitoringMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
         self.enable_monitoring = getattr(settings, "ENABLE_DB_MONITORING", True)
+        self.duplicate_query_threshold = getattr(settings, "DUPLICATE_QUERY_THRESHOLD", 5)
+        self.max_tracked_paths = 200
+        self._known_paths = set()
 
     def __call__(self, request):
         if not self.enable_monitoring:
             return self.get_response(request)
 
-        # 清理查询日志
-        connection.queries = []
-
         # 处理请求
-        response = self.get_response(request)
+        with profile_queries(request) as query_profile:
+            response = self.get_response(request)
 
         # 分析查询
-        self._analyze_queries(request, response)
+        self._analyze_queries(request, response, query_profile)
 
         return response
 
-    def _analyze_queries(self, request, response):
+    def _analyze_queries(self, request, response, query_profile):
         """分析数据库查询"""
-        if not connection.queries:
+        if not query_profile.count:
             return
 
         # 获取查询统计
-        stats = db_monitor.optimizer.analyze_queries()
+        stats = query_profile.as_stats()
 
         # 记录慢查询
-        slow_queries = db_monitor.optimizer.get_slow_queries()
-        if slow_queries:
+        if stats["slow_queries"]:
             logger.warning(
                 f"Slow queries detected in {request.path}: "
-                f"{len(slow_queries)} slow queries, "
+                f"{stats['slow_queries']} slow queries, "
                 f"total time: {stats['total_time']:.3f}s"
             )
 
             # 记录最慢的查询
-            for query in slow_queries[:3]:  # 只记录前3个最慢的
+            for query in stats.get("slowest_queries", [])[:3]:  # 只记录前3个最慢的
                 logger.warning(f"Slow query: {query['sql'][:100]}... " f"Time: {query['time']}s")
 
-        # 存储查询统计
-        self._store_query_stats(request.path, stats)
+        # 记录疑似N+1的重复查询
+        for duplicate in stats.get("duplicate_queries", [])[:3]:
+            if duplicate["count"] >= self.duplicate_query_threshold:
+                logger.warning(
+                    f"Duplicate query in {request.path} executed {duplicate['count']} times: "
+                    f"{duplicate['fingerprint'][:100]}..."
+                )
+
+        # 只有采样的请求才有完整画像，未采样的请求不覆盖已有统计
+        if stats["sampled"]:
+            self._store_query_stats(request.path, stats)
 
     def _store_query_stats(self, path, stats):
         """存储查询统计"""
         try:
             cache_key = f"db_stats:{path}"
             cache.set(cache_key, stats, 3600)  # 缓存1小时
+
+            # 记录路径索引，每个进程对同一路径只写一次
+            if path not in self._known_paths:
+                paths = cache.get("db_stats:paths", [])
+                if path not in paths:
+                    paths = (paths + [path])[-self.max_tracked_paths :]
+                    cache.set("db_stats:paths", paths, 3600)
+                self._known_paths.add(path)
         except Exception as e:
             logger.error(f"Failed to store query stats: {e}")
 
@@ -192,16 +198,13 @@ class CacheMonitoringMiddleware:
             logger.error(f"Failed to update cache stats: {e}")
 
 
-def get_performance_metrics(path=None):
-    """获取性能指标"""
+def get_performance_metrics(path=None, method="GET"):
+    """获取性能指标（含p50/p95/p99，单位秒）"""
     if path:
-        cache_key = f"perf_metrics:{path}:GET"
-        return cache.get(cache_key, {})
+        return request_metrics.get_route_metrics(method, path)
     else:
-        # 获取所有性能指标
-        metrics = {}
-        # 这里可以实现更复杂的聚合逻辑
-        return metrics
+        # 获取所有路由的性能指标，键为 "METHOD /route"
+        return request_metrics.get_all_metrics()
 
 
 def get_database_stats(path=None):
@@ -211,6 +214,6 @@ def get_database_stats(path=None):
         return cache.get(cache_key, {})
     else:
         # 获取所有数据库统计
-        stats = {}
-        # 这里可以实现更复杂的聚合逻辑
-        return stats
+        paths = cache.get("db_stats:paths", [])
+        stats = cache.get_many([f"db_stats:{p}" for p in paths])
+        return {key[len("db_stats:") :]: value for key, value in stats.items()}
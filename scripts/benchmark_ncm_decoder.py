@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+NCM解码基准测试
+生成合成的NCM文件，对比原逐字节异或实现和NumPy分块解码器的吞吐量（MB/s）
+
+用法:
+    python scripts/benchmark_ncm_decoder.py --size-mb 8 --rounds 3
+    python scripts/benchmark_ncm_decoder.py --size-mb 50 --skip-legacy   # 大文件只测新实现
+"""
+
+import argparse
+import base64
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes  # noqa: E402
+
+from apps.tools.services.ncm_decoder import (  # noqa: E402
+    CORE_KEY,
+    KEY_PREFIX,
+    MAGIC,
+    META_JSON_PREFIX,
+    META_KEY,
+    META_PREFIX,
+    NCMDecoder,
+    build_keybox,
+    build_keystream,
+)
+
+RC4_KEY = b"1176953296838E7fT49x7dof9OKCgLxPjU4aGHJ4JKrC1HOhbN8kqDDeR"
+
+
+def aes_encrypt(key, data):
+    padding = 16 - len(data) % 16
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+    return encryptor.update(data + bytes([padding]) * padding) + encryptor.finalize()
+
+
+def build_sample_ncm(path, size):
+    """生成带元数据的合成NCM文件，音频部分为随机数据"""
+    audio = b"ID3\x03\x00\x00\x00\x00\x00\x00" + os.urandom(size - 10)
+    key_data = np.bitwise_xor(np.frombuffer(aes_encrypt(CORE_KEY, KEY_PREFIX + RC4_KEY), dtype=np.uint8), 0x64)
+    meta = json.dumps({"musicName": "benchmark", "artist": [["QAToolBox", 1]], "format": "mp3"}).encode("utf-8")
+    meta_data = META_PREFIX + base64.b64encode(aes_encrypt(META_KEY, META_JSON_PREFIX + meta))
+    meta_data = np.bitwise_xor(np.frombuffer(meta_data, dtype=np.uint8), 0x63)
+    keystream = build_keystream(build_keybox(RC4_KEY))
+    body = np.frombuffer(audio, dtype=np.uint8) ^ np.resize(keystream, len(audio))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + b"\x01\x70")
+        f.write(struct.pack("<I", len(key_data)) + key_data.tobytes())
+        f.write(struct.pack("<I", len(meta_data)) + meta_data.tobytes())
+        f.write(b"\x00" * 5 + struct.pack("<II", 0, 0))
+        f.write(body.tobytes())
+    return audio
+
+
+def legacy_decrypt(path, audio_offset, key):
+    """旧实现的音频解密部分：整文件读入内存，生成完整长度的密钥流后逐字节异或"""
+    box = build_keybox(key)
+    with open(path, "rb") as f:
+        f.seek(audio_offset)
+        data = f.read()
+    stream = [box[(box[i] + box[(i + box[i]) & 0xFF]) & 0xFF] for i in range(256)]
+    stream = bytes(bytearray(stream * (len(data) // 256 + 1))[1 : 1 + len(data)])
+    return bytes(a ^ b for a, b in zip(data, stream))
+
+
+def measure(func, size, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return size / best / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NCM解码基准测试")
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过旧实现（大文件时很慢）")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "sample.ncm")
+        audio = build_sample_ncm(path, size)
+        decoder = NCMDecoder(path)
+        assert decoder.read_audio() == audio
+
+        def new_impl():
+            with open(os.devnull, "wb") as sink:
+                NCMDecoder(path).decrypt_to(sink)
+
+        new_mbps = measure(new_impl, size, args.rounds)
+        print(f"合成NCM: {args.size_mb:g} MB, 取 {args.rounds} 轮最好成绩")
+        print(f"{'实现':<16} {'MB/s':>10}")
+        if not args.skip_legacy:
+            assert legacy_decrypt(path, decoder.audio_offset, RC4_KEY) == audio
+            legacy_mbps = measure(lambda: legacy_decrypt(path, decoder.audio_offset, RC4_KEY), size, args.rounds)
+            print(f"{'逐字节异或':<16} {legacy_mbps:>10.1f}")
+        print(f"{'NumPy分块解码':<16} {new_mbps:>10.1f}")
+        if not args.skip_legacy:
+            print(f"加速比: {new_mbps / legacy_mbps:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
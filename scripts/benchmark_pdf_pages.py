@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+PDF页面并行处理基准测试
+生成样例PDF，测量不同worker数下的页/秒
+
+用法:
+    python scripts/benchmark_pdf_pages.py --pages 40 --workers 1 2 4
+    python scripts/benchmark_pdf_pages.py --mode render   # 未安装tesseract时只测渲染
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.test_minimal")
+
+import fitz  # noqa: E402
+
+from apps.tools.services.pdf_page_pool import PDFPagePool, ocr_page  # noqa: E402
+
+SAMPLE_TEXT = (
+    "QAToolBox PDF benchmark page {page}. The quick brown fox jumps over the lazy dog. "
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt."
+)
+
+
+def render_page(pdf_path, page_index, dpi=300):
+    """只渲染不识别，用于没有tesseract的环境"""
+    with fitz.open(pdf_path) as doc:
+        pix = doc.load_page(page_index).get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+        return len(pix.samples)
+
+
+def build_sample_pdf(path, pages, scanned):
+    """生成样例PDF；scanned=True时每页是渲染后的图片，模拟扫描件"""
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        for line in range(30):
+            page.insert_text((50, 60 + line * 24), SAMPLE_TEXT.format(page=page_number)[:90], fontsize=11)
+    if scanned:
+        scanned_doc = fitz.open()
+        for page in doc:
+            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+            new_page = scanned_doc.new_page(width=page.rect.width, height=page.rect.height)
+            new_page.insert_image(new_page.rect, pixmap=pix)
+        doc.close()
+        doc = scanned_doc
+    doc.save(path)
+    doc.close()
+
+
+def run(pdf_path, pages, workers, func, args):
+    pool = PDFPagePool(max_workers=workers)
+    try:
+        # 预热：进程池按需启动，启动时间不计入
+        pool.map_pages(func, pdf_path, min(workers, pages), args=args)
+        start = time.perf_counter()
+        results = pool.map_pages(func, pdf_path, pages, args=args)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+    failed = sum(1 for result in results if result is None)
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF页面并行处理基准测试")
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mode", choices=["ocr", "render"], default=None, help="默认：有tesseract时为ocr，否则render")
+    parser.add_argument("--dpi", type=int, default=300)
+    args = parser.parse_args()
+
+    mode = args.mode or ("ocr" if shutil.which("tesseract") else "render")
+    func, func_args = (ocr_page, (args.dpi, 60)) if mode == "ocr" else (render_page, (args.dpi,))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "sample.pdf")
+        build_sample_pdf(pdf_path, args.pages, scanned=mode == "ocr")
+        print(f"模式: {mode}, 页数: {args.pages}, DPI: {args.dpi}, CPU: {os.cpu_count()}")
+        print(f"{'workers':>8} {'耗时(s)':>10} {'页/秒':>10} {'加速比':>8} {'失败页':>6}")
+
+        baseline = None
+        for workers in args.workers:
+            elapsed, failed = run(pdf_path, args.pages, workers, func, func_args)
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.2f} {args.pages / elapsed:>10.2f} {baseline / elapsed:>8.2f} {failed:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+恶意模式扫描基准测试
+用接近真实流量的请求语料，对比逐条 re.search 的旧实现和合并编译的扫描引擎（请求/秒）
+
+用法:
+    python scripts/benchmark_security_scanner.py --requests 2000 --rounds 3
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.test_minimal")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+
+from apps.users.security import XSS_TAGS, MaliciousPatternScanner  # noqa: E402
+
+LEGACY_XSS_PATTERNS = [r"<script[^>]*>", r"javascript:", r"on\w+\s*="] + [rf"<{tag}[^>]*>" for tag in XSS_TAGS[1:]]
+LEGACY_SQL_PATTERNS = [
+    r"(\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|EXEC|UNION)\b)",
+    r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+)",
+    r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\')",
+    r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*--)",
+    r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'--)",
+    r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*#)",
+    r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'#)",
+    r"(\b(OR|AND)\b\s+\d+\s*=\s*\d+\s*/\*)",
+    r"(\b(OR|AND)\b\s+\'[^\']*\'\s*=\s*\'[^\']*\'/\*)",
+]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari",
+]
+TEXTS = [
+    "今天天气不错，适合出去走走",
+    "Remember to bring the documents to the meeting tomorrow at 10am",
+    "测试用例：登录页面输入正确的用户名和密码后跳转到首页",
+    "Great trip to Chengdu, the hotpot was amazing and the pandas were cute",
+    "a" * 2000,
+]
+ATTACKS = ["<script>alert(1)</script>", "' OR '1'='1", "1 OR 1=1 --", "<img src=x onerror=alert(1)>"]
+
+
+def legacy_contains_malicious_pattern(content):
+    """旧实现：每个字段逐条 re.search"""
+    content_lower = content.lower()
+    for pattern in LEGACY_XSS_PATTERNS:
+        if re.search(pattern, content_lower, re.IGNORECASE):
+            return True
+    for pattern in LEGACY_SQL_PATTERNS:
+        if re.search(pattern, content, re.IGNORECASE):
+            return True
+    return False
+
+
+def legacy_has_malicious_content(request):
+    if request.method == "POST":
+        for value in request.POST.values():
+            if isinstance(value, str) and legacy_contains_malicious_pattern(value):
+                return True
+    for value in request.GET.values():
+        if isinstance(value, str) and legacy_contains_malicious_pattern(value):
+            return True
+    for value in request.META.values():
+        if isinstance(value, str) and legacy_contains_malicious_pattern(value):
+            return True
+    return False
+
+
+def build_corpus(count, attack_ratio, seed=7):
+    """生成请求语料：GET列表页、POST表单，带真实的浏览器请求头，少量携带攻击载荷"""
+    rng = random.Random(seed)
+    factory = RequestFactory()
+    corpus = []
+    for i in range(count):
+        headers = {
+            "HTTP_USER_AGENT": rng.choice(USER_AGENTS),
+            "HTTP_ACCEPT": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "HTTP_ACCEPT_LANGUAGE": "zh-CN,zh;q=0.9,en;q=0.8",
+            "HTTP_ACCEPT_ENCODING": "gzip, deflate, br",
+            "HTTP_COOKIE": f"csrftoken={rng.getrandbits(64):x}; theme=dark",
+        }
+        payload = rng.choice(ATTACKS) if rng.random() < attack_ratio else rng.choice(TEXTS)
+        if i % 3 == 0:
+            request = factory.post("/tools/api/diary/", {"title": f"日记 {i}", "content": payload}, **headers)
+        else:
+            request = factory.get("/tools/api/search/", {"q": payload[:100], "page": i % 10}, **headers)
+        # 触发一次解析，避免把表单解析时间算进扫描
+        request.POST, request.GET
+        corpus.append(request)
+    return corpus
+
+
+def measure(func, corpus, rounds):
+    best = float("inf")
+    hits = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hits = sum(1 for request in corpus if func(request))
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="恶意模式扫描基准测试")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--attack-ratio", type=float, default=0.02)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.requests, args.attack_ratio)
+    scanner = MaliciousPatternScanner()
+
+    legacy_rps, legacy_hits = measure(legacy_has_malicious_content, corpus, args.rounds)
+    new_rps, new_hits = measure(lambda request: scanner.scan_request(request) is not None, corpus, args.rounds)
+
+    print(f"语料: {len(corpus)} 个请求, 攻击比例 {args.attack_ratio:.0%}")
+    print(f"{'实现':<12} {'请求/秒':>12} {'命中':>6}")
+    print(f"{'逐条re.search':<12} {legacy_rps:>12.0f} {legacy_hits:>6}")
+    print(f"{'合并扫描引擎':<12} {new_rps:>12.0f} {new_hits:>6}")
+    print(f"加速比: {new_rps / legacy_rps:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
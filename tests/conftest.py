@@ -9,6 +9,7 @@ from unittest.mock import Mock, patch
 import django
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.management import call_command
 from django.test import Client
 
@@ -40,6 +41,15 @@ def client():
     return Client()
 
 
+@pytest.fixture
+def locmem_cache(settings):
+    """测试全局使用DummyCache，需要真实缓存（命中、计数、统计）的测试用这个夹具换成进程内存缓存"""
+    settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests"}}
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
 @pytest.fixture
 def user():
     """创建测试用户"""
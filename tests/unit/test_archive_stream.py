@@ -0,0 +1,129 @@
+"""
+流式打包下载测试
+"""
+
+import io
+import random
+import tarfile
+import threading
+import time
+import zipfile
+
+import pytest
+
+from apps.tools.services.archive_stream import ArchiveEntry, iter_tar_gz, iter_zip, make_entry, should_store
+from apps.tools.services.zip_service import ZipService
+
+
+@pytest.fixture
+def sample_files(tmp_path):
+    """文本文件、媒体文件、空文件和中文文件名"""
+    rng = random.Random(5)
+    contents = {
+        "notes.txt": b"hello archive " * 20000,
+        "song.mp3": rng.randbytes(300000),
+        "empty.log": b"",
+        "中文说明.txt": "流式打包".encode("utf-8") * 1000,
+        "cover.png": rng.randbytes(5000),
+    }
+    paths = []
+    for name, data in contents.items():
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths, contents
+
+
+class TestStreamingZip:
+    """ZIP流测试"""
+
+    @pytest.mark.parametrize("force_zip64", [False, True])
+    def test_round_trip(self, sample_files, force_zip64):
+        """测试生成的ZIP可被标准库完整读取，媒体文件原样存储"""
+        paths, contents = sample_files
+        blob = b"".join(iter_zip([make_entry(p) for p in paths], force_zip64=force_zip64))
+
+        with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+            assert zf.testzip() is None
+            assert zf.namelist() == list(contents)
+            for name, data in contents.items():
+                assert zf.read(name) == data
+            assert zf.getinfo("song.mp3").compress_type == zipfile.ZIP_STORED
+            assert zf.getinfo("cover.png").compress_type == zipfile.ZIP_STORED
+            assert zf.getinfo("notes.txt").compress_type == zipfile.ZIP_DEFLATED
+            assert zf.getinfo("notes.txt").compress_size < len(contents["notes.txt"]) // 10
+
+    def test_unreadable_file_skipped(self, sample_files, tmp_path):
+        """测试无法读取的文件被跳过，不影响其他文件"""
+        paths, contents = sample_files
+        entries = [ArchiveEntry(str(tmp_path / "missing.txt"), "missing.txt", 10, 0)] + [make_entry(p) for p in paths]
+        with zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(entries)))) as zf:
+            assert zf.namelist() == list(contents)
+
+    def test_many_files_keep_order(self, tmp_path):
+        """测试并行压缩时成员仍按原顺序输出"""
+        entries = []
+        for i in range(30):
+            path = tmp_path / f"{i:02d}.txt"
+            path.write_bytes(f"file {i} ".encode() * (i * 500 + 1))
+            entries.append(make_entry(str(path)))
+        with zipfile.ZipFile(io.BytesIO(b"".join(iter_zip(entries, max_workers=4)))) as zf:
+            assert zf.namelist() == [f"{i:02d}.txt" for i in range(30)]
+            assert zf.read("17.txt") == b"file 17 " * (17 * 500 + 1)
+
+    def test_close_stops_workers(self, tmp_path):
+        """测试客户端中断下载后后台压缩线程退出"""
+        entries = []
+        for i in range(8):
+            path = tmp_path / f"big{i}.txt"
+            path.write_bytes(random.Random(i).randbytes(4 * 1024 * 1024))
+            entries.append(make_entry(str(path)))
+
+        stream = iter_zip(entries, max_workers=4)
+        next(stream)
+        stream.close()
+
+        deadline = time.monotonic() + 5
+        while any(t.name.startswith("archive-stream") for t in threading.enumerate()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not any(t.name.startswith("archive-stream") for t in threading.enumerate())
+
+
+class TestStreamingTarGz:
+    """tar.gz流测试"""
+
+    def test_round_trip(self, sample_files):
+        """测试多个gzip成员拼接的tar.gz可被标准库读取"""
+        paths, contents = sample_files
+        blob = b"".join(iter_tar_gz([make_entry(p) for p in paths]))
+        with tarfile.open(fileobj=io.BytesIO(blob), mode="r:gz") as tf:
+            assert tf.getnames() == list(contents)
+            for name, data in contents.items():
+                assert tf.extractfile(name).read() == data
+
+
+class TestZipServiceStreaming:
+    """ZipService流式下载测试"""
+
+    def test_stream_files_response(self, sample_files):
+        """测试返回流式响应，内容为完整ZIP"""
+        paths, contents = sample_files
+        success, message, response = ZipService().stream_files(paths, archive_name="下载", include_paths=False)
+        assert success
+        assert response.streaming
+        assert response["Content-Type"] == "application/zip"
+        assert "filename*=UTF-8''%E4%B8%8B%E8%BD%BD.zip" in response["Content-Disposition"]
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as zf:
+            assert sorted(zf.namelist()) == sorted(contents)
+
+    def test_stream_files_rejects_unknown_format(self, sample_files):
+        """测试不支持的格式返回失败"""
+        success, message, response = ZipService().stream_files(sample_files[0], archive_format="rar")
+        assert not success
+        assert response is None
+
+    def test_should_store(self):
+        """测试按扩展名判断是否原样存储"""
+        assert should_store("a/B.MP3")
+        assert not should_store("readme.md")
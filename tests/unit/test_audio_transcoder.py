@@ -0,0 +1,226 @@
+"""
+音频转码服务测试
+"""
+
+import shutil
+import threading
+import time
+import wave
+
+import pytest
+
+from apps.tools.async_task_manager import AsyncTaskManager
+from apps.tools.services.audio_transcoder import (
+    AudioTranscoder,
+    TranscodeError,
+    detect_audio_format,
+    ffmpeg_command,
+    find_audio_start,
+    run_ffmpeg,
+)
+from apps.tools.services.conversion_cache import ConversionCache
+from apps.tools.services.task_executor import BoundedTaskExecutor
+from apps.tools.services.task_store import SQLiteTaskStore
+from tests.unit.test_ncm_decoder import encode_ncm
+
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="未安装ffmpeg")
+
+
+pytestmark = pytest.mark.usefixtures("locmem_cache")
+
+
+@pytest.fixture
+def transcoder(tmp_path):
+    return AudioTranscoder(max_workers=1, cache=ConversionCache(root=str(tmp_path / "cache")), timeout=30)
+
+
+class TestFormatDetection:
+    """格式识别测试"""
+
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            (b"CTENFDAM\x01\x70", "ncm"),
+            (b"ID3\x04\x00\x00\x00\x00\x00\x00", "mp3"),
+            (MP3_FRAME[:16], "mp3"),
+            (b"RIFF\x24\x08\x00\x00WAVEfmt ", "wav"),
+            (b"fLaC\x00\x00\x00\x22", "flac"),
+            (b"\x00\x00\x00\x20ftypM4A ", "m4a"),
+            (b"\x00" * 16, None),
+        ],
+    )
+    def test_detect_audio_format(self, header, expected):
+        """测试根据文件头识别格式"""
+        assert detect_audio_format(header) == expected
+
+    def test_find_audio_start_skips_garbage(self):
+        """测试跳过解密数据前面的垃圾字节"""
+        garbage = bytes(range(1, 200))
+        assert find_audio_start(garbage + MP3_FRAME) == (len(garbage), "mp3")
+        assert find_audio_start(b"\x00" * 37 + b"fLaC" + b"\x00" * 64) == (37, "flac")
+        assert find_audio_start(b"\x00" * 64) == (0, None)
+
+    def test_reserved_frame_header_rejected(self):
+        """测试版本位为保留值的伪同步头不被当作MP3帧"""
+        assert find_audio_start(b"\x01\xff\xe8\x90\x00" + b"\x00" * 64) == (0, None)
+
+
+class TestFfmpegCommand:
+    """ffmpeg命令测试"""
+
+    def test_pipe_input(self):
+        """测试管道输入和目标格式参数"""
+        command = ffmpeg_command("mp3", "/tmp/out.mp3")
+        assert command[command.index("-i") + 1] == "pipe:0"
+        assert "libmp3lame" in command
+        assert command[-1] == "/tmp/out.mp3"
+        assert "-nostdin" not in command
+
+    def test_path_input_and_unknown_format(self):
+        """测试路径输入不读取stdin，未知格式抛出异常"""
+        assert "-nostdin" in ffmpeg_command("m4a", "/tmp/out.m4a", "/tmp/in.m4a")
+        with pytest.raises(TranscodeError):
+            ffmpeg_command("ogg", "/tmp/out.ogg")
+
+    def test_missing_binary(self, settings, tmp_path):
+        """测试找不到ffmpeg时抛出TranscodeError"""
+        settings.AUDIO_FFMPEG_BINARY = str(tmp_path / "no-ffmpeg")
+        with pytest.raises(TranscodeError):
+            run_ffmpeg(iter([b"data"]), str(tmp_path / "out.mp3"), "mp3")
+
+
+class TestAudioTranscoder:
+    """转码器测试"""
+
+    def test_cache_hit_skips_ffmpeg(self, transcoder, tmp_path, settings):
+        """测试已缓存的结果直接复制，不启动ffmpeg"""
+        settings.AUDIO_FFMPEG_BINARY = str(tmp_path / "no-ffmpeg")
+        source = tmp_path / "song.mp3"
+        source.write_bytes(MP3_FRAME * 10)
+        key = transcoder.cache_key(str(source), "wav")
+        transcoder.cache.put(key, b"converted", {"metadata": {"title": "歌"}, "has_cover": False})
+
+        output = tmp_path / "out.wav"
+        result = transcoder.transcode(str(source), str(output), "wav")
+        assert result == {"cached": True, "metadata": {"title": "歌"}, "album_cover": None}
+        assert output.read_bytes() == b"converted"
+        assert transcoder.cache.get_stats()["hits"] == 1
+
+    def test_key_depends_on_target_format(self, transcoder, tmp_path):
+        """测试同一文件不同目标格式使用不同缓存键"""
+        source = tmp_path / "song.mp3"
+        source.write_bytes(MP3_FRAME)
+        assert transcoder.cache_key(str(source), "wav") != transcoder.cache_key(str(source), "flac")
+
+    def test_invalid_ncm_raises(self, transcoder, tmp_path):
+        """测试损坏的NCM文件报告转码失败"""
+        source = tmp_path / "broken.ncm"
+        source.write_bytes(b"CTENFDAM" + b"\x00" * 16)
+        with pytest.raises(TranscodeError):
+            transcoder.transcode(str(source), str(tmp_path / "out.mp3"), "mp3", use_cache=False)
+
+    def test_ncm_streams_decrypted_audio(self, transcoder, tmp_path):
+        """测试NCM解密后的音频跳过垃圾前缀后直接作为管道输入"""
+        source = tmp_path / "song.ncm"
+        source.write_bytes(encode_ncm(b"\x00" * 100 + MP3_FRAME * 500, {"musicName": "歌", "format": "mp3"}))
+
+        chunks, size, extras = transcoder._open_source(str(source))
+        assert b"".join(bytes(chunk) for chunk in chunks) == MP3_FRAME * 500
+        assert size == 100 + len(MP3_FRAME) * 500
+        assert extras["metadata"]["title"] == "歌"
+
+    @requires_ffmpeg
+    def test_wav_to_flac_round_trip(self, transcoder, tmp_path):
+        """测试通过管道转码并写入缓存，第二次转换命中缓存"""
+        source = tmp_path / "tone.wav"
+        with wave.open(str(source), "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(44100)
+            w.writeframes(b"\x10\x00\xf0\xff" * 44100)
+
+        progress = []
+        output = tmp_path / "tone.flac"
+        result = transcoder.transcode(str(source), str(output), "flac", progress_callback=lambda p, s: progress.append(p))
+        assert not result["cached"]
+        assert output.read_bytes()[:4] == b"fLaC"
+        assert progress and progress[-1] > 10
+
+        assert transcoder.transcode(str(source), str(tmp_path / "again.flac"), "flac")["cached"]
+
+
+class TestDedicatedExecutor:
+    """专用执行器测试"""
+
+    def test_job_runs_on_given_executor(self, tmp_path):
+        """测试转码任务在专用执行器上运行，不占用默认执行器"""
+        default_executor = BoundedTaskExecutor(max_workers=1, max_queue_size=5, max_pending_per_user=5)
+        transcode_executor = BoundedTaskExecutor(max_workers=2, max_queue_size=5, max_pending_per_user=5, name="audio-test")
+        manager = AsyncTaskManager(store=SQLiteTaskStore(str(tmp_path / "tasks.sqlite3")), executor=default_executor)
+
+        thread_names = []
+
+        def job(report_progress):
+            thread_names.append(threading.current_thread().name)
+            report_progress(50, "正在转码")
+            return {"filename": "out.mp3"}
+
+        task_id = manager.create_job("audio_transcode", job, executor=transcode_executor)
+        deadline = time.time() + 5
+        while manager.get_task_status(task_id)["status"] != "completed" and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert manager.get_task_status(task_id)["result"] == {"filename": "out.mp3"}
+        assert thread_names[0].startswith("audio-test")
+        assert default_executor.get_stats()["running"] == 0
+
+
+class TestConverterView:
+    """转换接口缓存命中测试"""
+
+    @pytest.fixture
+    def post(self, transcoder, tmp_path, settings, monkeypatch):
+        from django.contrib.auth.models import AnonymousUser
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import RequestFactory
+
+        from apps.tools import legacy_views
+
+        settings.MEDIA_ROOT = str(tmp_path / "media")
+        settings.AUDIO_FFMPEG_BINARY = str(tmp_path / "no-ffmpeg")
+        monkeypatch.setattr(legacy_views, "audio_transcoder", transcoder)
+
+        def post():
+            upload = SimpleUploadedFile("song.mp3", MP3_FRAME * 10, content_type="audio/mpeg")
+            request = RequestFactory().post("/tools/api/audio_converter/", {"audio_file": upload, "target_format": "wav"})
+            request.user = AnonymousUser()
+            return legacy_views.audio_converter_api(request)
+
+        return post
+
+    def inputs(self, tmp_path):
+        return list((tmp_path / "media" / "temp_audio").glob("input_*"))
+
+    def test_hit_returns_synchronously(self, post, transcoder, tmp_path):
+        """测试缓存命中时同步返回结果并删除输入文件"""
+        source = tmp_path / "song.mp3"
+        source.write_bytes(MP3_FRAME * 10)
+        transcoder.cache.put(transcoder.cache_key(str(source), "wav"), b"converted", {"metadata": {}, "has_cover": False})
+
+        response = post()
+        assert response.status_code == 200
+        assert b'"cached": true' in response.content
+        assert self.inputs(tmp_path) == []
+
+    def test_evicted_entry_falls_back_to_task(self, post, transcoder, tmp_path, monkeypatch):
+        """测试检查后条目被淘汰时不在请求中转码，输入文件保留给后台任务"""
+        submitted = []
+        monkeypatch.setattr(transcoder.cache, "contains", lambda key: True)
+        monkeypatch.setattr(transcoder, "submit", lambda func, **kwargs: submitted.append(self.inputs(tmp_path)) or "task-1")
+
+        response = post()
+        assert response.status_code == 202
+        assert len(submitted) == 1 and len(submitted[0]) == 1
+        assert submitted[0][0].exists()
@@ -0,0 +1,112 @@
+"""
+缓存服务批量操作与命名空间版本测试
+"""
+
+import time
+
+import pytest
+
+from apps.tools.services.cache_service import CacheManager, CacheService, ChatCacheService, StatsCacheService, UserCacheService
+
+
+@pytest.fixture(autouse=True)
+def namespace_versions(locmem_cache):
+    CacheService._namespace_versions.clear()
+    yield
+    CacheService._namespace_versions.clear()
+
+
+class TestCacheServiceBatch:
+    """批量操作测试"""
+
+    def test_set_many_get_many(self):
+        """测试同一前缀下的批量读写"""
+        assert UserCacheService.set_many("user", {1: {"name": "a"}, 2: {"name": "b"}})
+        assert UserCacheService.get_user_profiles([1, 2, 3]) == {1: {"name": "a"}, 2: {"name": "b"}}
+
+    def test_batch_across_prefixes(self):
+        """测试跨前缀批量读取"""
+        StatsCacheService.cache_global_stats({"total_users": 10})
+        StatsCacheService.cache_user_stats(7, {"total_capsules": 2})
+        StatsCacheService.cache_daily_stats("2025-01-01", {"visits": 3})
+
+        stats = StatsCacheService.get_dashboard_stats(7, dates=["2025-01-01", "2025-01-02"])
+        assert stats["global"] == {"total_users": 10}
+        assert stats["user"] == {"total_capsules": 2}
+        assert stats["daily"] == {"2025-01-01": {"visits": 3}, "2025-01-02": None}
+
+    def test_delete_batch(self):
+        """测试批量删除"""
+        ChatCacheService.cache_chat_room("r1", {"id": "r1"})
+        ChatCacheService.cache_chat_messages("r1", [{"content": "hi"}])
+        assert ChatCacheService.clear_chat_cache("r1")
+        assert ChatCacheService.get_chat_room("r1") is None
+        assert ChatCacheService.get_chat_messages("r1") is None
+
+
+class TestNamespaceVersion:
+    """命名空间版本测试"""
+
+    def test_clear_prefix_invalidates_only_that_prefix(self):
+        """测试前缀清除只影响对应命名空间"""
+        UserCacheService.cache_user_profile(1, {"name": "a"})
+        StatsCacheService.cache_global_stats({"total_users": 10})
+
+        version = CacheService._get_namespace_versions(["user"])["user"]
+        assert CacheService.clear_prefix("user") == version + 1
+        assert UserCacheService.get_user_profile(1) is None
+        assert StatsCacheService.get_global_stats() == {"total_users": 10}
+
+    def test_clear_all_reports_status(self):
+        """测试全部清除返回每个前缀是否成功，而不是版本号"""
+        StatsCacheService.cache_global_stats({"total_users": 10})
+        results = CacheManager.clear_all_cache()
+        assert results and all(value is True for value in results.values())
+        assert StatsCacheService.get_global_stats() is None
+
+    def test_other_process_sees_new_version(self):
+        """测试本地版本缓存过期后能看到其他进程的前缀清除"""
+        UserCacheService.cache_user_profile(1, {"name": "a"})
+        CacheService.clear_prefix("user")
+        UserCacheService.cache_user_profile(1, {"name": "b"})
+
+        # 模拟另一个进程：没有本地版本缓存
+        CacheService._namespace_versions.clear()
+        assert UserCacheService.get_user_profile(1) == {"name": "b"}
+
+    def test_evicted_version_does_not_revive_old_entries(self, locmem_cache):
+        """测试版本号键被淘汰后重新创建的版本号不会与旧版本重合"""
+        UserCacheService.cache_user_profile(1, {"name": "a"})
+        CacheService.clear_prefix("user")
+        time.sleep(0.01)
+
+        locmem_cache.delete(CacheService._version_key("user"))
+        CacheService._namespace_versions.clear()
+        assert UserCacheService.get_user_profile(1) is None
+
+
+class TestCacheOutage:
+    """缓存不可用测试"""
+
+    @pytest.fixture
+    def broken_cache(self, monkeypatch):
+        from apps.tools.services import cache_service
+
+        def fail(*args, **kwargs):
+            raise ConnectionError("redis down")
+
+        for name in ("get", "set", "add", "delete", "touch", "get_many", "set_many", "delete_many", "incr"):
+            monkeypatch.setattr(cache_service.cache, name, fail)
+
+    def test_errors_swallowed(self, broken_cache):
+        """测试缓存不可用时各操作返回默认值而不抛出异常，也不在进程内缓存猜测的版本号"""
+        assert CacheService.get("user", 1) is None
+        assert CacheService.set("user", 1, {"a": 1}) is False
+        assert CacheService.delete("user", 1) is False
+        assert CacheService.exists("user", 1) is False
+        assert CacheService.expire("user", 1, 60) is False
+        assert CacheService.get_many("user", [1, 2]) == {}
+        assert CacheService.set_many("user", {1: "a"}) is False
+        assert CacheService.delete_many("user", [1]) is False
+        assert CacheService.clear_prefix("user") == 0
+        assert CacheService._namespace_versions == {}
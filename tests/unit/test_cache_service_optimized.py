@@ -0,0 +1,126 @@
+"""
+两级缓存（进程内LRU + Redis）测试
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+
+import pytest
+
+from apps.tools.services.cache_service_optimized import CacheService, LocalLRUCache
+
+
+@pytest.fixture
+def service(locmem_cache):
+    return CacheService(default_timeout=60)
+
+
+class TestLocalLRUCache:
+    """进程内LRU测试"""
+
+    def test_evicts_least_recently_used(self):
+        """测试超出容量时淘汰最久未使用的键"""
+        lru = LocalLRUCache(max_entries=2)
+        lru.set("a", 1, 60)
+        lru.set("b", 2, 60)
+        lru.get("a")
+        lru.set("c", 3, 60)
+        assert lru.get("a") == 1
+        assert lru.get("c") == 3
+        assert len(lru) == 2
+
+    def test_entries_expire(self):
+        """测试TTL过期"""
+        lru = LocalLRUCache()
+        lru.set("a", 1, 0.01)
+        time.sleep(0.02)
+        lru.get("a")
+        assert len(lru) == 0
+
+
+class TestTwoTierCache:
+    """两级缓存测试"""
+
+    def test_l1_serves_repeat_reads(self, service):
+        """测试重复读取由L1命中"""
+        assert service.get_or_set("k", lambda: {"v": 1}) == {"v": 1}
+        assert service.get_or_set("k", lambda: {"v": 2}) == {"v": 1}
+        stats = service.get_stats()
+        assert stats["l1_hits"] == 1
+        assert stats["recomputes"] == 1
+
+    def test_single_flight_on_miss(self, service):
+        """测试并发未命中时只计算一次"""
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.get_or_set("hot", slow_compute))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["value"] * 8
+        assert len(calls) == 1
+
+    def test_stale_value_served_while_revalidating(self, service):
+        """测试逻辑过期后先返回旧值，后台刷新"""
+        service.set("stats", "old", timeout=1)
+        # 模拟逻辑过期：L2中的值过期时间设为过去，并清空L1
+        raw = cache.get("stats")
+        raw["expires_at"] = time.time() - 1
+        cache.set("stats", raw, 60)
+        service.local_cache.clear()
+
+        refreshed = threading.Event()
+
+        def compute():
+            refreshed.set()
+            return "new"
+
+        assert service.get_or_set("stats", compute) == "old"
+        assert refreshed.wait(2)
+        deadline = time.time() + 2
+        while service.get("stats") != "new" and time.time() < deadline:
+            time.sleep(0.01)
+        assert service.get("stats") == "new"
+        assert service.get_stats()["stale_served"] == 1
+
+    def test_stale_value_served_when_refresh_cannot_start(self, service, monkeypatch):
+        """测试刷新锁或线程池出错时仍返回旧值，之后可以再次刷新"""
+        service.set("stats", "old", timeout=1)
+        raw = cache.get("stats")
+        raw["expires_at"] = time.time() - 1
+        cache.set("stats", raw, 60)
+        service.local_cache.clear()
+
+        def broken(*args, **kwargs):
+            raise RuntimeError("executor shut down")
+
+        monkeypatch.setattr(service._refresh_executor, "submit", broken)
+        assert service.get_or_set("stats", lambda: "new") == "old"
+        assert "stats" not in service._refreshing
+        cache.delete("stats:refresh_lock")
+
+        monkeypatch.setattr(cache, "add", broken)
+        assert service.get_or_set("stats", lambda: "new") == "old"
+        assert "stats" not in service._refreshing
+
+    def test_delete_clears_both_tiers(self, service):
+        """测试删除同时清除L1和L2"""
+        service.set("k", [1, 2, 3])
+        assert service.get("k") == [1, 2, 3]
+        service.delete("k")
+        assert service.get("k") is None
+
+    def test_legacy_values_still_readable(self, service):
+        """测试直接写入缓存的旧格式值仍可读取"""
+        cache.set("legacy", {"a": 1}, 60)
+        assert service.get("legacy") == {"a": 1}
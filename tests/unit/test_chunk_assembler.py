@@ -0,0 +1,115 @@
+"""
+分片上传流式组装测试
+"""
+
+import hashlib
+import io
+import random
+import threading
+
+import pytest
+
+from apps.tools.services.chunk_assembler import ChunkAssemblyError, StreamingChunkAssembler
+from apps.tools.services.file_manager import FileManager
+
+CHUNK_SIZE = 1024
+
+
+@pytest.fixture
+def payload():
+    return random.Random(3).randbytes(CHUNK_SIZE * 7 + 300)
+
+
+def chunks_of(payload):
+    return [payload[i : i + CHUNK_SIZE] for i in range(0, len(payload), CHUNK_SIZE)]
+
+
+class TestStreamingChunkAssembler:
+    """组装器测试"""
+
+    def test_out_of_order_assembly(self, tmp_path, payload):
+        """测试乱序到达的分片写到正确位置，MD5与整体计算一致"""
+        assembler = StreamingChunkAssembler("f1", tmp_path / "state", len(payload), CHUNK_SIZE, "a.bin")
+        assert assembler.total_chunks == 8
+        order = list(range(8))
+        random.Random(1).shuffle(order)
+        for n in order:
+            assert assembler.write_chunk(n, chunks_of(payload)[n])
+
+        final_path = tmp_path / "uploads" / "a.bin"
+        checksum = assembler.finalize(final_path)
+        assert final_path.read_bytes() == payload
+        assert checksum == hashlib.md5(payload).hexdigest()
+        assert list((tmp_path / "state").iterdir()) == []
+
+    def test_duplicate_chunk_ignored(self, tmp_path, payload):
+        """测试重复上传的分片幂等"""
+        assembler = StreamingChunkAssembler("f2", tmp_path, len(payload), CHUNK_SIZE)
+        assert assembler.write_chunk(0, chunks_of(payload)[0])
+        assert not assembler.write_chunk(0, chunks_of(payload)[0])
+        assert assembler.received_count == 1
+
+    @pytest.mark.parametrize("chunk_number,size", [(8, CHUNK_SIZE), (-1, CHUNK_SIZE), (0, 10), (7, CHUNK_SIZE)])
+    def test_rejects_invalid_chunks(self, tmp_path, payload, chunk_number, size):
+        """测试分片编号越界或大小不符时拒绝"""
+        assembler = StreamingChunkAssembler("f3", tmp_path, len(payload), CHUNK_SIZE)
+        with pytest.raises(ChunkAssemblyError):
+            assembler.write_chunk(chunk_number, b"x" * size)
+
+    def test_finalize_requires_all_chunks(self, tmp_path, payload):
+        """测试分片未到齐时不能完成组装"""
+        assembler = StreamingChunkAssembler("f4", tmp_path, len(payload), CHUNK_SIZE)
+        assembler.write_chunk(0, chunks_of(payload)[0])
+        with pytest.raises(ChunkAssemblyError):
+            assembler.finalize(tmp_path / "out.bin")
+
+    def test_resume_from_persisted_bitmap(self, tmp_path, payload):
+        """测试进程重启后从位图恢复，只需上传缺失分片"""
+        chunks = chunks_of(payload)
+        assembler = StreamingChunkAssembler("f5", tmp_path / "state", len(payload), CHUNK_SIZE, "b.bin")
+        for n in (0, 1, 2, 5):
+            assembler.write_chunk(n, chunks[n])
+        assembler.close()
+
+        resumed = StreamingChunkAssembler.resume("f5", tmp_path / "state")
+        assert resumed.filename == "b.bin"
+        assert resumed.missing_chunks == [3, 4, 6, 7]
+        for n in resumed.missing_chunks:
+            resumed.write_chunk(n, chunks[n])
+        assert resumed.finalize(tmp_path / "b.bin") == hashlib.md5(payload).hexdigest()
+        assert (tmp_path / "b.bin").read_bytes() == payload
+
+    def test_resume_unknown_file(self, tmp_path):
+        """测试没有状态时恢复返回None"""
+        assert StreamingChunkAssembler.resume("missing", tmp_path) is None
+
+    def test_concurrent_writes(self, tmp_path, payload):
+        """测试多个线程并发写入同一文件的不同分片"""
+        chunks = chunks_of(payload)
+        assembler = StreamingChunkAssembler("f6", tmp_path, len(payload), CHUNK_SIZE)
+        threads = [threading.Thread(target=assembler.write_chunk, args=(n, chunks[n])) for n in range(len(chunks))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert assembler.finalize(tmp_path / "c.bin") == hashlib.md5(payload).hexdigest()
+
+    def test_empty_file(self, tmp_path):
+        """测试空文件只有一个空分片"""
+        assembler = StreamingChunkAssembler("f7", tmp_path, 0, CHUNK_SIZE)
+        assembler.write_chunk(0, b"")
+        assert assembler.finalize(tmp_path / "empty") == hashlib.md5(b"").hexdigest()
+
+
+class TestFileManagerChunks:
+    """FileManager分片测试"""
+
+    def test_split_and_merge_streaming(self, payload):
+        """测试逐片切分并流式合并到文件对象"""
+        manager = FileManager()
+        manager.chunk_size = CHUNK_SIZE
+        output = io.BytesIO()
+        written = manager.merge_chunks(manager.split_file_into_chunks(io.BytesIO(payload)), output)
+        assert written == len(payload)
+        assert output.getvalue() == payload
+        assert manager.merge_chunks(manager.split_file_into_chunks(io.BytesIO(payload))) == payload
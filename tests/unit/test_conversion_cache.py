@@ -0,0 +1,105 @@
+"""
+文件转换结果缓存测试
+"""
+
+import io
+import json
+import os
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import pytest
+
+from apps.tools.pdf_converter_api import PDFConverter, pdf_converter_api
+from apps.tools.services.conversion_cache import ConversionCache
+
+pytestmark = pytest.mark.usefixtures("locmem_cache")
+
+
+class TestConversionCache:
+    """转换缓存测试"""
+
+    def test_key_depends_on_content_type_and_params(self):
+        """测试缓存键由内容、转换类型和参数共同决定"""
+        a = ConversionCache.make_key(io.BytesIO(b"same"), "pdf-to-image", dpi=150)
+        assert a == ConversionCache.make_key(io.BytesIO(b"same"), "pdf-to-image", dpi=150)
+        assert a != ConversionCache.make_key(io.BytesIO(b"same"), "pdf-to-image", dpi=300)
+        assert a != ConversionCache.make_key(io.BytesIO(b"same"), "pdf-to-text")
+        assert a != ConversionCache.make_key(io.BytesIO(b"other"), "pdf-to-image", dpi=150)
+
+    def test_hit_records_bytes_saved(self, tmp_path):
+        """测试命中返回输出文件并统计节省字节数"""
+        store = ConversionCache(root=str(tmp_path), max_bytes=1024)
+        assert store.get("k" * 64) is None
+        store.put("k" * 64, b"x" * 100, {"name": "pdf_to_text.txt"})
+
+        cached = store.get("k" * 64)
+        assert cached["name"] == "pdf_to_text.txt"
+        with open(cached["path"], "rb") as f:
+            assert f.read() == b"x" * 100
+
+        stats = store.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["bytes_saved"] == 100
+
+    def test_lru_eviction_keeps_recently_used(self, tmp_path):
+        """测试超过大小上限时淘汰最久未使用的条目"""
+        store = ConversionCache(root=str(tmp_path), max_bytes=250)
+        store.put("a" * 64, b"a" * 100)
+        store.put("b" * 64, b"b" * 100)
+        # 让a比b更新
+        past = time.time() - 60
+        os.utime(store._paths("b" * 64)[1], (past, past))
+        os.utime(store._paths("a" * 64)[1], (past - 60, past - 60))
+        assert store.get("a" * 64) is not None
+
+        store.put("c" * 64, b"c" * 100)
+        assert store.get("b" * 64) is None
+        assert store.get("a" * 64) is not None
+        assert store.get_stats()["size_bytes"] <= 250
+
+
+def make_pdf():
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for i in range(2):
+        doc.new_page().insert_text((72, 72), f"Cached conversion page {i + 1} content")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class TestConverterAPICache:
+    """转换API缓存命中测试"""
+
+    def test_repeat_conversion_served_from_cache(self, rf, settings, tmp_path, monkeypatch):
+        """测试相同文件第二次转换不再调用转换器"""
+        settings.MEDIA_ROOT = str(tmp_path / "media")
+        settings.PDF_CONVERSION_CACHE_DIR = str(tmp_path / "cache")
+        pdf_bytes = make_pdf()
+
+        def convert():
+            request = rf.post(
+                "/tools/api/pdf-converter/",
+                {"type": "pdf-to-text", "file": SimpleUploadedFile("a.pdf", pdf_bytes, content_type="application/pdf")},
+            )
+            request.user = AnonymousUser()
+            response = pdf_converter_api(request)
+            assert response.status_code == 200
+            return json.loads(response.content)
+
+        first = convert()
+        assert "cached" not in first
+
+        def fail(*args, **kwargs):
+            raise AssertionError("不应重新转换")
+
+        monkeypatch.setattr(PDFConverter, "pdf_to_text_file", fail)
+        second = convert()
+        assert second["cached"] is True
+        assert second["filename"].endswith("_pdf_to_text.txt")
+        saved = tmp_path / "media" / "converted"
+        assert (saved / second["filename"]).read_bytes() == (saved / first["filename"]).read_bytes()
@@ -0,0 +1,204 @@
+"""
+目的地知识缓存测试
+"""
+
+import json
+
+import pytest
+import requests
+
+from apps.tools.services import destination_knowledge as knowledge_module
+from apps.tools.services.destination_knowledge import (
+    FAILURE_TTL,
+    DestinationKnowledgeStore,
+    destination_knowledge,
+    local_time_fields,
+    parse_source_ttls,
+)
+from apps.tools.services.overview_data_service import OverviewDataService
+from apps.tools.services.travel_data_service import TravelDataService
+
+
+@pytest.fixture(autouse=True)
+def default_ttls(locmem_cache, settings):
+    settings.DESTINATION_KNOWLEDGE_TTLS = ""
+
+
+@pytest.fixture
+def stored_ttls(monkeypatch):
+    """记录写入缓存时使用的过期时间"""
+    ttls = []
+    original_set = knowledge_module.cache.set
+
+    def record(key, value, ttl):
+        ttls.append(ttl)
+        original_set(key, value, ttl)
+
+    monkeypatch.setattr(knowledge_module.cache, "set", record)
+    return ttls
+
+
+class FakeSession:
+    """按URL片段返回固定JSON并记录请求的会话"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        for fragment, body in self.routes.items():
+            if fragment in url:
+                response.status_code = 200
+                response._content = json.dumps(body).encode()
+                return response
+        response.status_code = 503
+        response._content = b""
+        return response
+
+
+class Counter:
+    """记录调用次数的数据获取函数"""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class TestStore:
+    """缓存读写测试"""
+
+    def test_parse_ttls(self):
+        """测试档位名和秒数在默认过期时间上合并，无效项忽略"""
+        ttls = parse_source_ttls("weather=60, country=daily, bad, search=off")
+        assert ttls["weather"] == 60
+        assert ttls["country"] == 24 * 3600
+        assert ttls["search"] == 24 * 3600
+        assert ttls["geolocation"] == 30 * 24 * 3600
+        assert parse_source_ttls({"wikipedia": 10})["wikipedia"] == 10
+
+    def test_hit_skips_fetch(self, stored_ttls):
+        """测试第二次查询命中缓存，写入时按数据源设置过期时间"""
+        store = DestinationKnowledgeStore(ttls="weather=120")
+        fetch = Counter({"temperature": 20})
+
+        assert store.get("weather", "杭州", fetch, lambda: {}) == {"temperature": 20}
+        assert store.get("weather", " 杭州 ", fetch, lambda: {}) == {"temperature": 20}
+        assert fetch.calls == 1
+        assert stored_ttls == [120]
+        assert store.get("weather", "杭州", Counter({"x": 1}), lambda: {}, variant="overview") == {"x": 1}
+
+    def test_failure_cached_briefly(self, stored_ttls):
+        """测试获取失败时返回备用数据，只短暂缓存"""
+        store = DestinationKnowledgeStore()
+
+        assert store.get("country", "杭州", Counter(RuntimeError("down")), lambda: {"name": "备用"}) == {"name": "备用"}
+        assert store.get("country", "上海", Counter(None), lambda: {"name": "备用"}) == {"name": "备用"}
+        assert stored_ttls == [FAILURE_TTL, FAILURE_TTL]
+
+    def test_refresh_keeps_good_data_on_failure(self):
+        """测试强制刷新重新获取；刷新失败时保留原来的数据"""
+        store = DestinationKnowledgeStore()
+        store.get("wikipedia", "杭州", Counter({"extract": "旧"}), lambda: {})
+
+        with store.refreshing():
+            assert store.get("wikipedia", "杭州", Counter(RuntimeError("down")), lambda: {"extract": "备用"}) == {
+                "extract": "旧"
+            }
+            assert store.get("wikipedia", "杭州", Counter({"extract": "新"}), lambda: {}) == {"extract": "新"}
+        assert not store.is_refreshing
+        assert store.get("wikipedia", "杭州", Counter({"extract": "x"}), lambda: {}) == {"extract": "新"}
+
+        store.invalidate("杭州", sources=["wikipedia"])
+        assert store.get("wikipedia", "杭州", Counter({"extract": "x"}), lambda: {}) == {"extract": "x"}
+
+    def test_cache_errors_fall_through(self, monkeypatch):
+        """测试缓存读写出错时按未命中处理，仍然获取数据并返回"""
+
+        def broken(*args, **kwargs):
+            raise ConnectionError("cache down")
+
+        monkeypatch.setattr(knowledge_module.cache, "get", broken)
+        monkeypatch.setattr(knowledge_module.cache, "set", broken)
+        store = DestinationKnowledgeStore()
+        fetch = Counter({"temperature": 20})
+
+        assert store.get("weather", "杭州", fetch, lambda: {}) == {"temperature": 20}
+        assert store.get("weather", "杭州", fetch, lambda: {}) == {"temperature": 20}
+        assert fetch.calls == 2
+        assert store.get("weather", "上海", Counter(None), lambda: {"name": "备用"}) == {"name": "备用"}
+
+    def test_local_time_fields(self):
+        """测试按时区名计算偏移，无法识别的时区返回None"""
+        fields = local_time_fields("Asia/Shanghai")
+        assert fields["utc_offset"] == "+08:00"
+        assert fields["is_dst"] is False
+        assert local_time_fields("UTC+8 (北京时间)") is None
+
+
+class TestServices:
+    """旅游数据服务衔接测试"""
+
+    def test_travel_data_reuses_sources(self):
+        """测试同一目的地第二次抓取不再请求外部接口，失败的数据源使用备用数据"""
+        service = TravelDataService()
+        service.session = FakeSession(
+            {
+                "wikipedia.org": {"title": "杭州", "extract": "浙江省会"},
+                "restcountries.com": [{"name": {"common": "China"}, "capital": ["北京"]}],
+                "exchangerate-api.com": {"rates": {"USD": 0.14}, "date": "2026-10-18"},
+            }
+        )
+
+        raw_data = service._数据抓取阶段("杭州")
+        requested = len(service.session.urls)
+        assert raw_data["wiki_data"]["extract"] == "浙江省会"
+        assert raw_data["country"]["capital"] == "北京"
+        assert raw_data["opentripmap"]["total_count"] == 0
+        assert raw_data["timezone"]["utc_offset"] == "+08:00"
+
+        again = service._数据抓取阶段("杭州")
+        assert len(service.session.urls) == requested
+        assert again["wiki_data"] == raw_data["wiki_data"]
+
+        service._数据抓取阶段("上海")
+        urls = service.session.urls[requested:]
+        assert not any("exchangerate-api.com" in url or "worldtimeapi.org" in url for url in urls)
+
+    def test_overview_timezone_time_not_cached(self, monkeypatch):
+        """测试概览时区信息只缓存时区，当前时间每次重新计算"""
+        service = OverviewDataService()
+        service.session = FakeSession(
+            {"worldtimeapi.org": {"timezone": "Asia/Tokyo", "datetime": "2024-01-01T14:30:00", "utc_offset": "+09:00"}}
+        )
+
+        fields = {"datetime": "2026-10-18T21:05:00+09:00", "utc_offset": "+09:00", "day_of_week": 0, "is_dst": False}
+        monkeypatch.setattr("apps.tools.services.overview_data_service.local_time_fields", lambda name: fields)
+
+        first = service._get_timezone_info("东京")
+        assert first["timezone"] == "Asia/Tokyo"
+        assert first["current_time"] == "21:05"
+
+        fields["datetime"] = "2026-10-18T21:30:00+09:00"
+        assert service._get_timezone_info("东京")["current_time"] == "21:30"
+        assert len(service.session.urls) == 1
+
+    def test_prewarm(self, monkeypatch):
+        """测试预热逐个目的地获取，refresh=True 时跳过缓存"""
+        calls = []
+        monkeypatch.setattr(
+            TravelDataService, "_数据抓取阶段", lambda self, d: calls.append((d, destination_knowledge.is_refreshing))
+        )
+        monkeypatch.setattr(OverviewDataService, "get_overview_data", lambda self, d: None)
+
+        timings = knowledge_module.prewarm_destinations(["杭州", "东京"], refresh=True)
+        assert list(timings) == ["杭州", "东京"]
+        assert calls == [("杭州", True), ("东京", True)]
+        assert not destination_knowledge.is_refreshing
@@ -0,0 +1,89 @@
+"""
+生活日记全文检索测试
+"""
+
+from apps.tools.models import LifeDiaryEntry
+from apps.tools.services.diary_search import FIELD_WEIGHTS, _index_on_save, document_terms, highlight, query_terms, tokenize
+
+
+def make_entry(**fields):
+    defaults = {"title": "", "content": "", "voice_text": "", "tags": [], "question_answer": {}}
+    defaults.update(fields)
+    return LifeDiaryEntry(**defaults)
+
+
+class TestTokenize:
+    """分词测试"""
+
+    def test_chinese_unigrams_and_bigrams(self):
+        """测试中文生成单字和相邻二字词项"""
+        assert tokenize("今天晴") == ["今", "天", "晴", "今天", "天晴"]
+
+    def test_mixed_text(self):
+        """测试中英文混排时英文按单词小写，标点被忽略"""
+        assert tokenize("跑步5KM, Happy!") == ["跑", "步", "跑步", "5km", "happy"]
+
+    def test_query_uses_bigrams(self):
+        """测试查询只使用二字词项，单个汉字使用单字，重复词项去重"""
+        assert query_terms("天气很好") == ["天气", "气很", "很好"]
+        assert query_terms("雨") == ["雨"]
+        assert query_terms("好好 好好") == ["好好"]
+        assert query_terms("！？") == []
+
+
+class TestDocumentTerms:
+    """文档词项测试"""
+
+    def test_field_weights(self):
+        """测试标题权重高于正文，同一词项的权重累加"""
+        terms = document_terms(make_entry(title="散步", content="公园散步"))
+        assert terms["散步"] == FIELD_WEIGHTS["A"] + FIELD_WEIGHTS["B"]
+        assert terms["公园"] == FIELD_WEIGHTS["B"]
+
+    def test_tags_and_answers_indexed(self):
+        """测试标签、语音文字和问题回答都参与检索，标签额外生成精确匹配词项"""
+        terms = document_terms(make_entry(voice_text="录音", tags=["Travel"], question_answer={"q1": "开心"}))
+        assert terms["录音"] == FIELD_WEIGHTS["C"]
+        assert terms["开心"] == FIELD_WEIGHTS["C"]
+        assert terms["travel"] == FIELD_WEIGHTS["C"]
+        assert "#travel" in terms
+
+
+class TestHighlight:
+    """高亮摘要测试"""
+
+    def test_marks_matches_and_escapes(self):
+        """测试命中词被包裹且HTML被转义"""
+        assert highlight("<b>今天</b>天气不错", "天气") == "&lt;b&gt;今天&lt;/b&gt;<mark>天气</mark>不错"
+
+    def test_case_insensitive(self):
+        """测试英文不区分大小写并保留原文大小写"""
+        assert highlight("Went Hiking", "hiking") == "Went <mark>Hiking</mark>"
+
+    def test_window_around_first_match(self):
+        """测试长文本的摘要窗口围绕第一个命中位置"""
+        text = "无关" * 200 + "关键词" + "结尾" * 200
+        snippet = highlight(text, "关键词", max_length=40)
+        assert snippet.startswith("...") and snippet.endswith("...")
+        assert "<mark>关键词</mark>" in snippet
+
+    def test_no_match_truncates(self):
+        """测试没有命中时返回开头的摘要"""
+        assert highlight("a" * 10, "b", max_length=4) == "aaaa..."
+
+
+class TestIndexSignal:
+    """保存信号测试"""
+
+    def test_skips_unrelated_update_fields(self, monkeypatch):
+        """测试只更新与检索无关的字段时不重建索引"""
+        scheduled = []
+        monkeypatch.setattr("apps.tools.services.diary_search.transaction.on_commit", scheduled.append)
+        entry = make_entry(title="标题")
+
+        _index_on_save(LifeDiaryEntry, entry, update_fields={"mood"})
+        assert scheduled == []
+
+        _index_on_save(LifeDiaryEntry, entry, update_fields={"content"})
+        _index_on_save(LifeDiaryEntry, entry)
+        assert len(scheduled) == 2
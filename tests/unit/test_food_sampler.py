@@ -0,0 +1,72 @@
+"""
+食物随机抽样服务测试
+"""
+
+import random
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models.signals import post_save
+
+import pytest
+
+from apps.tools.models.legacy_models import FoodItem
+from apps.tools.services.food_sampler import AliasTable, FoodRow, FoodSampler, food_sampler
+
+
+@pytest.fixture
+def sampler(locmem_cache):
+    """预置分组缓存的抽样服务"""
+    sampler = FoodSampler()
+    rows = [
+        FoodRow(1, "chinese", ["lunch", "dinner"], "easy", ["spicy"], 9.0),
+        FoodRow(2, "chinese", ["breakfast"], "medium", [], 1.0),
+        FoodRow(3, "japanese", ["lunch"], "easy", ["seafood"], 0.0),
+    ]
+    cache.set(f"food_sampler:v{sampler.get_version()}:all:all", rows)
+    return sampler
+
+
+class TestAliasTable:
+    """别名表测试"""
+
+    def test_weighted_distribution(self):
+        """测试抽样频率与权重成比例"""
+        table = AliasTable([1, 3, 6])
+        rng = random.Random(42)
+        counts = Counter(table.draw(rng) for _ in range(20000))
+        assert 0.08 < counts[0] / 20000 < 0.12
+        assert 0.27 < counts[1] / 20000 < 0.33
+        assert 0.57 < counts[2] / 20000 < 0.63
+
+    def test_zero_weights_fall_back_to_uniform(self):
+        """测试权重全为0时均匀抽样"""
+        table = AliasTable([0, 0])
+        assert {table.draw() for _ in range(100)} == {0, 1}
+
+
+class TestFoodSampler:
+    """食物抽样器测试"""
+
+    def test_sample_distinct_and_exclude(self, sampler):
+        """测试不放回抽样和排除指定ID"""
+        assert sorted(sampler.sample_ids(k=10)) == [1, 2, 3]
+        assert 1 not in sampler.sample_ids(k=3, exclude=[1])
+        assert sampler.sample_ids(k=3, exclude=[1, 2, 3]) == []
+
+    def test_predicate_filters_cached_rows(self, sampler):
+        """测试在缓存的轻量行上做额外过滤"""
+        ids = sampler.sample_ids(k=3, predicate=lambda row: row.difficulty == "easy" and "spicy" not in row.tags)
+        assert ids == [3]
+
+    def test_weighted_prefers_popular(self, sampler):
+        """测试加权抽样偏向受欢迎的食物"""
+        counts = Counter(sampler.sample_ids(k=1, weighted=True)[0] for _ in range(2000))
+        assert counts[1] > counts[2] > counts[3]
+
+    def test_food_item_save_bumps_version(self, sampler):
+        """测试FoodItem保存信号使抽样缓存失效"""
+        version = food_sampler.get_version()
+        post_save.send(sender=FoodItem, instance=FoodItem(name="披萨"), created=True)
+        assert food_sampler.get_version() == version + 1
+        assert cache.get(f"food_sampler:v{version + 1}:all:all") is None
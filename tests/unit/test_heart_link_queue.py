@@ -0,0 +1,170 @@
+"""
+心动链接匹配队列测试
+"""
+
+import importlib.util
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from apps.tools.services.heart_link_matcher import HeartLinkMatcher
+from apps.tools.services.heart_link_queue import (
+    DatabaseMatchQueue,
+    RedisMatchQueue,
+    create_match_queue,
+    is_eligible,
+    parse_member,
+    queue_member,
+)
+
+requires_lua = pytest.mark.skipif(importlib.util.find_spec("lupa") is None, reason="fakeredis未安装Lua支持(lupa)")
+
+BASE_TIME = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def make_request(request_id, user_id, minutes=0):
+    user = SimpleNamespace(is_active=True, is_staff=False, is_superuser=False)
+    return SimpleNamespace(
+        id=request_id, requester_id=user_id, requester=user, created_at=BASE_TIME + timedelta(minutes=minutes)
+    )
+
+
+@pytest.fixture
+def redis_queue():
+    return RedisMatchQueue(fakeredis.FakeRedis(), key="test:heart_link:queue")
+
+
+class TestQueueMembers:
+    """队列成员测试"""
+
+    def test_member_round_trip(self):
+        """测试成员编码包含请求ID和用户ID"""
+        assert queue_member(12, 34) == "12:34"
+        assert parse_member(b"12:34") == 12
+        assert parse_member("7:1") == 7
+
+    def test_eligibility(self):
+        """测试管理员和停用用户不参与匹配"""
+        assert is_eligible(make_request(1, 1))
+        request = make_request(1, 1)
+        request.requester.is_staff = True
+        assert not is_eligible(request)
+        request = make_request(1, 1)
+        request.requester.is_superuser = True
+        assert not is_eligible(request)
+        request = make_request(1, 1)
+        request.requester.is_active = False
+        assert not is_eligible(request)
+
+
+class TestQueueFactory:
+    """后端选择测试"""
+
+    def test_database_backend(self, settings):
+        """测试显式使用数据库队列"""
+        settings.HEART_LINK_QUEUE_BACKEND = "database"
+        assert isinstance(create_match_queue(), DatabaseMatchQueue)
+
+    def test_auto_falls_back_without_redis(self, settings):
+        """测试Redis不可用时自动回退到数据库队列"""
+        settings.HEART_LINK_QUEUE_BACKEND = "auto"
+        settings.HEART_LINK_REDIS_URL = "redis://127.0.0.1:1/0"
+        assert isinstance(create_match_queue(), DatabaseMatchQueue)
+
+    def test_redis_backend_required(self, settings):
+        """测试强制使用Redis但不可用时报错"""
+        settings.HEART_LINK_QUEUE_BACKEND = "redis"
+        settings.HEART_LINK_REDIS_URL = "redis://127.0.0.1:1/0"
+        with pytest.raises(Exception):
+            create_match_queue()
+
+
+class TestRedisMatchQueue:
+    """Redis队列测试"""
+
+    def test_requeue_keeps_position(self, redis_queue):
+        """测试放回队列时按原创建时间排序"""
+        redis_queue.requeue(make_request(2, 20, minutes=5))
+        redis_queue.requeue(make_request(1, 10, minutes=1))
+        members = redis_queue.client.zrange(redis_queue.key, 0, -1)
+        assert [parse_member(m) for m in members] == [1, 2]
+        assert redis_queue.depth() == 2
+
+    def test_remove(self, redis_queue):
+        """测试取消的请求移出队列"""
+        for i in range(1, 4):
+            redis_queue.requeue(make_request(i, i * 10, minutes=i))
+        redis_queue.remove([2, 99])
+        assert [parse_member(m) for m in redis_queue.client.zrange(redis_queue.key, 0, -1)] == [1, 3]
+        redis_queue.remove([])
+        assert redis_queue.depth() == 2
+
+    @requires_lua
+    def test_pop_pair(self, redis_queue):
+        """测试配对跳过同一用户，双方都离开队列，没有对象时自己入队"""
+        assert redis_queue.claim_partner(make_request(1, 10)) is None
+        assert redis_queue.claim_partner(make_request(2, 10, minutes=1)) is None
+        assert redis_queue.depth() == 2
+
+        assert redis_queue.claim_partner(make_request(3, 30, minutes=2)) == 1
+        assert [parse_member(m) for m in redis_queue.client.zrange(redis_queue.key, 0, -1)] == [2]
+
+    @requires_lua
+    def test_ineligible_not_enqueued(self, redis_queue):
+        """测试管理员的请求可以配对但不会进入队列"""
+        staff = make_request(1, 10)
+        staff.requester.is_staff = True
+        assert redis_queue.claim_partner(staff) is None
+        assert redis_queue.depth() == 0
+
+    @requires_lua
+    def test_discard_expired(self, redis_queue):
+        """测试移出过期成员"""
+        redis_queue.requeue(make_request(1, 10))
+        redis_queue.requeue(make_request(2, 20, minutes=30))
+        assert redis_queue.discard_expired(BASE_TIME + timedelta(minutes=10)) == [1]
+        assert redis_queue.depth() == 1
+
+
+class TestMatcherQueue:
+    """匹配器与队列的衔接测试"""
+
+    def test_queue_created_lazily(self, settings):
+        """测试首次使用时才创建队列"""
+        settings.HEART_LINK_QUEUE_BACKEND = "database"
+        matcher = HeartLinkMatcher(background_sweep=False)
+        assert matcher._queue is None
+        assert isinstance(matcher.queue, DatabaseMatchQueue)
+        assert matcher.queue is matcher.queue
+
+    def test_cancel_removes_from_queue(self, redis_queue):
+        """测试取消请求时移出队列"""
+        matcher = HeartLinkMatcher(queue=redis_queue, background_sweep=False)
+        redis_queue.requeue(make_request(1, 10))
+        matcher.cancel_requests([1])
+        assert redis_queue.depth() == 0
+
+    @requires_lua
+    def test_failed_match_requeues_both(self, redis_queue, monkeypatch):
+        """测试配对后写入失败时双方都按原排队位置回到队列"""
+        matcher = HeartLinkMatcher(queue=redis_queue, background_sweep=False)
+        waiting = make_request(1, 10)
+        current = make_request(2, 20, minutes=1)
+        redis_queue.requeue(waiting)
+
+        def complete_match(current_user, current_request, partner):
+            raise RuntimeError("database down")
+
+        monkeypatch.setattr("apps.tools.services.heart_link_matcher.transaction.atomic", nullcontext)
+        monkeypatch.setattr(matcher, "find_best_match", lambda user, request: redis_queue.claim_partner(request) and waiting)
+        monkeypatch.setattr(matcher, "_complete_match", complete_match)
+
+        assert matcher.match_users(current.requester, current) == (None, None)
+        members = redis_queue.client.zrange(redis_queue.key, 0, -1, withscores=True)
+        assert members == [
+            (queue_member(1, 10).encode(), waiting.created_at.timestamp()),
+            (queue_member(2, 20).encode(), current.created_at.timestamp()),
+        ]
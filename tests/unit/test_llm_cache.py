@@ -0,0 +1,171 @@
+"""
+大模型响应缓存测试
+"""
+
+import json
+
+import fakeredis
+import pytest
+import requests
+
+from apps.tools.services.conversion_cache import ConversionCache
+from apps.tools.services.llm_cache import LLMResponseCache, normalize_text, parse_cache_policies
+from apps.tools.services.llm_gateway import LLMGateway
+
+MESSAGES = [{"role": "user", "content": "推荐 杭州\n  三日游"}]
+
+
+def completion(content="西湖一日游", finish_reason="stop", total_tokens=30):
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": total_tokens - 10, "total_tokens": total_tokens},
+    }
+
+
+class FakeSession:
+    """记录请求次数并返回固定响应的会话"""
+
+    def __init__(self, body):
+        self.body = body
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body.encode() if isinstance(self.body, str) else json.dumps(self.body).encode()
+        response._content_consumed = True
+        return response
+
+
+@pytest.fixture(autouse=True)
+def cache_enabled(locmem_cache, settings):
+    settings.LLM_CACHE_ENABLED = True
+
+
+@pytest.fixture
+def disk_cache(tmp_path):
+    disk = ConversionCache(root=str(tmp_path / "llm"), max_bytes=1024 * 1024, stats_prefix="test_llm_cache:disk")
+    return LLMResponseCache(policies="", disk=disk, stats_prefix="test_llm_cache")
+
+
+def make_gateway(response_cache, body=None):
+    gateway = LLMGateway(base_url="http://llm.invalid/v1", rate_limit_per_minute=0, response_cache=response_cache)
+    gateway._session = FakeSession(completion() if body is None else body)
+    return gateway
+
+
+class TestKeysAndPolicies:
+    """缓存键和策略测试"""
+
+    def test_whitespace_normalized(self):
+        """测试只有空白不同的提示词得到同一个键"""
+        assert normalize_text("  a\n\n b\tc ") == "a b c"
+        key = LLMResponseCache.make_key("travel", "deepseek-chat", MESSAGES, {})
+        same = LLMResponseCache.make_key("travel", "deepseek-chat", [{"role": "user", "content": "推荐 杭州 三日游"}], {})
+        assert key == same
+        assert key.startswith("llm_cache:travel:")
+
+    def test_params_change_key(self):
+        """测试模型、参数或功能不同时键不同"""
+        key = LLMResponseCache.make_key("travel", "deepseek-chat", MESSAGES, {"temperature": 0.3})
+        assert key != LLMResponseCache.make_key("travel", "deepseek-chat", MESSAGES, {"temperature": 0.7})
+        assert key != LLMResponseCache.make_key("travel", "deepseek-reasoner", MESSAGES, {"temperature": 0.3})
+        assert key != LLMResponseCache.make_key("tarot", "deepseek-chat", MESSAGES, {"temperature": 0.3})
+
+    def test_parse_policies(self):
+        """测试档位名、秒数和关闭在默认策略上合并"""
+        policies = parse_cache_policies("travel=hourly, story=120, tarot=off, bad")
+        assert policies["travel"] == 3600
+        assert policies["story"] == 120
+        assert "tarot" not in policies
+        assert policies["destination_info"] == 30 * 24 * 3600
+        assert parse_cache_policies({"chat": "daily"})["chat"] == 24 * 3600
+
+    def test_disabled(self, settings, disk_cache):
+        """测试总开关关闭时所有功能都不缓存"""
+        settings.LLM_CACHE_ENABLED = False
+        assert disk_cache.ttl_for("travel") == 0
+
+
+class TestStorage:
+    """存储测试"""
+
+    def test_disk_round_trip_and_expiry(self, disk_cache, monkeypatch):
+        """测试Redis不可用时存磁盘，过期后不再命中"""
+        key = disk_cache.make_key("travel", "deepseek-chat", MESSAGES, {})
+        assert disk_cache.get("travel", key) is None
+        disk_cache.set("travel", key, completion(), ttl=60)
+        assert disk_cache.get("travel", key) == completion()
+
+        monkeypatch.setattr("apps.tools.services.llm_cache.time.time", lambda: 10**12)
+        assert disk_cache.get("travel", key) is None
+
+    def test_redis_round_trip(self, tmp_path):
+        """测试Redis可用时存Redis并设置过期时间，按功能清除"""
+        client = fakeredis.FakeRedis()
+        response_cache = LLMResponseCache(redis_client=client, disk=ConversionCache(root=str(tmp_path)))
+        key = response_cache.make_key("travel", "deepseek-chat", MESSAGES, {})
+        response_cache.set("travel", key, completion(), ttl=60)
+        assert 0 < client.ttl(key) <= 60
+        assert response_cache.get("travel", key) == completion()
+        assert response_cache.clear("travel") == 1
+        assert response_cache.get("travel", key) is None
+        assert list((tmp_path).iterdir()) == []
+
+
+class TestGatewayCache:
+    """网关缓存衔接测试"""
+
+    def test_hit_skips_request(self, disk_cache):
+        """测试相同提示词第二次调用不发请求，统计命中和节省的token"""
+        gateway = make_gateway(disk_cache)
+        assert gateway.complete("推荐杭州  三日游", feature="travel", api_key="sk-test") == "西湖一日游"
+        assert gateway.complete("推荐杭州 三日游", feature="travel", api_key="sk-test") == "西湖一日游"
+        assert gateway.session.calls == 1
+
+        stats = disk_cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["tokens_saved"] == 30
+        assert stats["hit_rate"] == 0.5
+        assert stats["features"]["travel"]["stores"] == 1
+
+    def test_bypass(self, disk_cache):
+        """测试 cache=False 时既不读也不写缓存"""
+        gateway = make_gateway(disk_cache)
+        gateway.complete("问题", feature="travel", api_key="sk-test", cache=False)
+        gateway.complete("问题", feature="travel", api_key="sk-test")
+        assert gateway.session.calls == 2
+        assert disk_cache.get_stats()["features"]["travel"]["bypasses"] == 1
+
+    def test_truncated_not_cached(self, disk_cache):
+        """测试被截断的回复不缓存"""
+        gateway = make_gateway(disk_cache, completion(finish_reason="length"))
+        for _ in range(2):
+            gateway.complete("问题", feature="travel", api_key="sk-test")
+        assert gateway.session.calls == 2
+        assert disk_cache.get_stats()["stores"] == 0
+
+    def test_feature_without_policy_not_cached(self, disk_cache):
+        """测试没有缓存策略的功能每次都请求"""
+        gateway = make_gateway(disk_cache)
+        for _ in range(2):
+            gateway.complete("问题", feature="storyboard", api_key="sk-test")
+        assert gateway.session.calls == 2
+        assert disk_cache.get_stats()["misses"] == 0
+
+    def test_stream_cached(self, disk_cache):
+        """测试流式调用的完整回复写入缓存，之后的流式和普通调用直接命中"""
+        chunks = [
+            {"choices": [{"delta": {"content": "西湖"}, "finish_reason": None}]},
+            {"choices": [{"delta": {"content": "一日游"}, "finish_reason": "stop"}], "usage": {"total_tokens": 30}},
+        ]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        gateway = make_gateway(disk_cache, body)
+        messages = [{"role": "user", "content": "问题"}]
+        assert list(gateway.stream_chat(messages, feature="travel", api_key="sk-test")) == ["西湖", "一日游"]
+        assert list(gateway.stream_chat(messages, feature="travel", api_key="sk-test")) == ["西湖一日游"]
+        assert gateway.reply(messages, feature="travel", api_key="sk-test") == "西湖一日游"
+        assert gateway.session.calls == 1
+        assert disk_cache.get_stats()["tokens_saved"] == 60
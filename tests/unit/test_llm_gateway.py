@@ -0,0 +1,355 @@
+"""
+大模型调用网关测试（使用本地桩服务器）
+"""
+
+import importlib.util
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fakeredis
+import pytest
+
+from apps.tools.services import llm_gateway as gateway_module
+from apps.tools.services.llm_cache import DEFAULT_POLICIES, LLMResponseCache
+from apps.tools.services.llm_gateway import (
+    LLMGateway,
+    LLMGatewayError,
+    LLMTimeoutError,
+    LocalTokenBucket,
+    RedisTokenBucket,
+    deadline_scope,
+    parse_feature_limits,
+)
+
+requires_lua = pytest.mark.skipif(importlib.util.find_spec("lupa") is None, reason="fakeredis未安装Lua支持(lupa)")
+
+
+def stream_body(*texts, usage=None):
+    """stream=true 时的SSE响应体"""
+    chunks = [{"choices": [{"delta": {"content": text}, "finish_reason": None}]} for text in texts]
+    chunks.append({"choices": [{"delta": {}, "finish_reason": "stop"}], "usage": usage})
+    return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+
+def completion(content="你好", prompt_tokens=10, completion_tokens=5):
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class StubServer:
+    """按顺序返回预设响应的 chat/completions 桩服务"""
+
+    def __init__(self):
+        self.responses = []
+        self.default = (200, completion(), {}, 0)
+        self.requests = []
+        self.client_ports = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def add(self, status=200, body=None, headers=None, delay=0):
+        self.responses.append((status, completion() if body is None else body, headers or {}, delay))
+
+    def next_response(self):
+        with self.lock:
+            return self.responses.pop(0) if self.responses else self.default
+
+
+@pytest.fixture
+def stub():
+    state = StubServer()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with state.lock:
+                state.requests.append({"path": self.path, "auth": self.headers.get("Authorization"), "body": body})
+                state.client_ports.add(self.client_address[1])
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            status, payload, headers, delay = state.next_response()
+            time.sleep(delay)
+            with state.lock:
+                state.in_flight -= 1
+            # 字符串响应体按SSE流发送
+            is_stream = isinstance(payload, str)
+            data = payload.encode() if is_stream else json.dumps(payload).encode()
+            try:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "text/event-stream" if is_stream else "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(gateway_module, "BACKOFF_BASE", 0.01)
+
+
+def make_gateway(stub, **kwargs):
+    # 关闭所有默认的响应缓存策略，保证每次调用都请求桩服务
+    no_cache = LLMResponseCache(policies={feature: "off" for feature in DEFAULT_POLICIES})
+    options = {"rate_limit_per_minute": 0, "max_retries": 2, "timeout": 10, "response_cache": no_cache}
+    options.update(kwargs)
+    return LLMGateway(base_url=stub.url, **options)
+
+
+class TestGatewayCalls:
+    """调用和重试测试"""
+
+    def test_complete_sends_request_and_records_usage(self, stub):
+        """测试请求格式、回复文本和token统计"""
+        gateway = make_gateway(stub)
+        assert gateway.complete("问题", system="系统", feature="tarot", api_key="sk-test", max_tokens=50) == "你好"
+
+        request = stub.requests[0]
+        assert request["path"] == "/v1/chat/completions"
+        assert request["auth"] == "Bearer sk-test"
+        assert request["body"]["model"] == "deepseek-chat"
+        assert request["body"]["max_tokens"] == 50
+        assert [m["role"] for m in request["body"]["messages"]] == ["system", "user"]
+
+        metrics = gateway.get_metrics()["tarot"]
+        assert metrics["calls"] == 1
+        assert metrics["errors"] == 0
+        assert metrics["total_tokens"] == 15
+        assert metrics["p50"] > 0
+
+    def test_connections_reused(self, stub):
+        """测试多次调用复用同一个keep-alive连接"""
+        gateway = make_gateway(stub)
+        for _ in range(3):
+            gateway.complete("问题", api_key="sk-test")
+        assert len(stub.requests) == 3
+        assert len(stub.client_ports) == 1
+
+    def test_retries_server_errors(self, stub):
+        """测试5xx后重试成功"""
+        stub.add(503, {"error": "busy"})
+        gateway = make_gateway(stub)
+        assert gateway.complete("问题", feature="retry", api_key="sk-test") == "你好"
+        assert len(stub.requests) == 2
+        assert gateway.get_metrics()["retry"]["retries"] == 1
+
+    def test_honours_retry_after(self, stub):
+        """测试429时按Retry-After等待后重试"""
+        stub.add(429, {"error": "rate limited"}, headers={"Retry-After": "0.3"})
+        gateway = make_gateway(stub)
+        started = time.monotonic()
+        gateway.complete("问题", api_key="sk-test")
+        assert time.monotonic() - started >= 0.3
+        assert len(stub.requests) == 2
+
+    def test_client_errors_not_retried(self, stub):
+        """测试4xx不重试，错误中带状态码和响应内容"""
+        stub.add(402, {"error": {"message": "余额不足"}})
+        gateway = make_gateway(stub)
+        with pytest.raises(LLMGatewayError) as exc_info:
+            gateway.complete("问题", feature="story", api_key="sk-test")
+        assert exc_info.value.status_code == 402
+        assert json.loads(exc_info.value.body)["error"]["message"] == "余额不足"
+        assert str(exc_info.value) == "API调用失败: 402"
+        assert len(stub.requests) == 1
+        assert gateway.get_metrics()["story"]["errors"] == 1
+
+    def test_gives_up_after_max_retries(self, stub):
+        """测试超过重试次数后抛出最后的错误"""
+        for _ in range(3):
+            stub.add(500, {"error": "boom"})
+        gateway = make_gateway(stub)
+        with pytest.raises(LLMGatewayError) as exc_info:
+            gateway.complete("问题", api_key="sk-test", max_retries=1)
+        assert exc_info.value.status_code == 500
+        assert len(stub.requests) == 2
+
+    def test_malformed_response(self, stub):
+        """测试200但缺少回复内容时报错"""
+        stub.add(200, {"choices": []})
+        with pytest.raises(LLMGatewayError, match="响应格式错误"):
+            make_gateway(stub).complete("问题", api_key="sk-test")
+
+    def test_missing_api_key(self, stub, settings, monkeypatch):
+        """测试未配置密钥时不发请求"""
+        settings.DEEPSEEK_API_KEY = None
+        monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+        with pytest.raises(LLMGatewayError, match="密钥"):
+            make_gateway(stub).complete("问题")
+        assert stub.requests == []
+
+
+class TestStreaming:
+    """流式调用测试"""
+
+    def test_stream_yields_chunks(self, stub):
+        """测试按顺序产出文本片段，请求带 stream 参数，统计token"""
+        stub.add(200, stream_body("第一段", "第二段", usage={"prompt_tokens": 8, "completion_tokens": 4, "total_tokens": 12}))
+        gateway = make_gateway(stub)
+        chunks = list(gateway.stream_chat([{"role": "user", "content": "问题"}], feature="guide", api_key="sk-test"))
+        assert chunks == ["第一段", "第二段"]
+        assert stub.requests[0]["body"]["stream"] is True
+
+        metrics = gateway.get_metrics()["guide"]
+        assert metrics["calls"] == 1
+        assert metrics["total_tokens"] == 12
+
+    def test_stream_retries_before_first_chunk(self, stub):
+        """测试收到内容之前失败时重试"""
+        stub.add(503, {"error": "busy"})
+        stub.add(200, stream_body("好的"))
+        gateway = make_gateway(stub)
+        assert list(gateway.stream_chat([{"role": "user", "content": "问题"}], api_key="sk-test")) == ["好的"]
+        assert len(stub.requests) == 2
+
+    def test_stream_error_status(self, stub):
+        """测试4xx直接抛出"""
+        stub.add(401, {"error": "unauthorized"})
+        with pytest.raises(LLMGatewayError) as exc_info:
+            list(make_gateway(stub).stream_chat([{"role": "user", "content": "问题"}], api_key="sk-test"))
+        assert exc_info.value.status_code == 401
+
+    def test_slots_released_when_consumer_stops(self, stub):
+        """测试调用方提前停止迭代时释放并发额度"""
+        stub.add(200, stream_body("一", "二", "三"))
+        gateway = make_gateway(stub, max_concurrency=1)
+        stream = gateway.stream_chat([{"role": "user", "content": "问题"}], api_key="sk-test")
+        assert next(stream) == "一"
+        stream.close()
+        assert gateway.complete("问题", api_key="sk-test", timeout=1) == "你好"
+
+
+class TestDeadlines:
+    """截止时间测试"""
+
+    def test_timeout_bounds_total_time(self, stub):
+        """测试慢响应在时间预算内放弃，不再重试"""
+        stub.default = (200, completion(), {}, 2)
+        gateway = make_gateway(stub)
+        started = time.monotonic()
+        with pytest.raises(LLMTimeoutError):
+            gateway.complete("问题", feature="slow", api_key="sk-test", timeout=0.3)
+        assert time.monotonic() - started < 1.5
+        assert gateway.get_metrics()["slow"]["timeouts"] == 1
+
+    def test_deadline_scope_propagates(self, stub):
+        """测试外层设置的截止时间约束内部调用"""
+        stub.default = (200, completion(), {}, 2)
+        gateway = make_gateway(stub)
+        started = time.monotonic()
+        with deadline_scope(0.3):
+            with pytest.raises(LLMTimeoutError):
+                gateway.complete("问题", api_key="sk-test", timeout=30)
+        assert time.monotonic() - started < 1.5
+
+    def test_backoff_respects_deadline(self, stub):
+        """测试服务端要求的等待超过截止时间时直接失败"""
+        stub.add(429, {"error": "rate limited"}, headers={"Retry-After": "5"})
+        gateway = make_gateway(stub)
+        started = time.monotonic()
+        with pytest.raises(LLMGatewayError) as exc_info:
+            gateway.complete("问题", api_key="sk-test", timeout=1)
+        assert exc_info.value.status_code == 429
+        assert time.monotonic() - started < 1
+
+
+class TestConcurrencyAndRateLimit:
+    """并发和限速测试"""
+
+    def run_parallel(self, gateway, count, **kwargs):
+        errors = []
+
+        def call():
+            try:
+                gateway.complete("问题", api_key="sk-test", **kwargs)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_feature_concurrency_limit(self, stub):
+        """测试按功能的并发上限"""
+        stub.default = (200, completion(), {}, 0.2)
+        gateway = make_gateway(stub, feature_concurrency="story=1")
+        assert self.run_parallel(gateway, 3, feature="story") == []
+        assert stub.max_in_flight == 1
+
+    def test_global_concurrency_limit(self, stub):
+        """测试全局并发上限对所有功能生效"""
+        stub.default = (200, completion(), {}, 0.2)
+        gateway = make_gateway(stub, max_concurrency=2)
+        assert self.run_parallel(gateway, 4, feature="a") == []
+        assert stub.max_in_flight == 2
+
+    def test_waiting_for_slot_respects_deadline(self, stub):
+        """测试等待并发额度超过截止时间时报超时"""
+        stub.default = (200, completion(), {}, 1)
+        gateway = make_gateway(stub, max_concurrency=1)
+        errors = self.run_parallel(gateway, 2, timeout=0.5)
+        assert any(isinstance(e, LLMTimeoutError) for e in errors)
+
+    def test_rate_limit_blocks_until_deadline(self, stub):
+        """测试令牌用完且等待超过截止时间时不发请求"""
+        gateway = make_gateway(stub, rate_limit_per_minute=1, rate_limit_burst=1)
+        gateway.complete("问题", api_key="sk-test")
+        with pytest.raises(LLMTimeoutError, match="限速"):
+            gateway.complete("问题", api_key="sk-test", timeout=0.5)
+        assert len(stub.requests) == 1
+
+
+class TestTokenBuckets:
+    """令牌桶测试"""
+
+    def test_local_bucket(self):
+        """测试突发容量用完后返回等待时间"""
+        bucket = LocalTokenBucket(rate_per_second=1, capacity=2)
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 0
+        assert 0.9 < bucket.try_acquire() <= 1
+
+    @requires_lua
+    def test_redis_bucket_shared(self):
+        """测试多个进程（实例）共享Redis中的同一个桶"""
+        client = fakeredis.FakeRedis()
+        first = RedisTokenBucket(client, "test:llm:bucket", rate_per_second=1, capacity=2)
+        second = RedisTokenBucket(client, "test:llm:bucket", rate_per_second=1, capacity=2)
+        assert first.try_acquire() == 0
+        assert second.try_acquire() == 0
+        assert 0.9 < first.try_acquire() <= 1
+
+    def test_parse_feature_limits(self):
+        """测试按功能并发上限的配置格式"""
+        assert parse_feature_limits("travel=4, douyin=2,bad,x=") == {"travel": 4, "douyin": 2}
+        assert parse_feature_limits({"tarot": "3"}) == {"tarot": 3}
+        assert parse_feature_limits("") == {}
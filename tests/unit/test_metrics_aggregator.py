@@ -0,0 +1,84 @@
+"""
+请求指标聚合器测试
+"""
+
+import threading
+
+from utils.metrics_aggregator import RequestMetricsAggregator, bucket_upper_bound, histogram_percentile, latency_bucket
+
+
+class TestLatencyHistogram:
+    """延迟分桶测试"""
+
+    def test_bucket_bounds_contain_value(self):
+        """测试延迟落在所属桶的上界之内，且误差不超过一个桶宽"""
+        for ms in (1.5, 12, 250, 3000, 45000):
+            index = latency_bucket(ms)
+            assert bucket_upper_bound(index) >= ms
+            assert bucket_upper_bound(index) <= ms * 1.2 + 1e-9
+
+    def test_percentiles(self):
+        """测试百分位估算"""
+        buckets = {}
+        for ms in [10] * 90 + [1000] * 9 + [5000]:
+            index = latency_bucket(ms)
+            buckets[index] = buckets.get(index, 0) + 1
+        assert histogram_percentile(buckets, 50) < 12
+        assert 1000 <= histogram_percentile(buckets, 95) < 1200
+        assert histogram_percentile(buckets, 99.5) >= 5000
+        assert histogram_percentile({}, 50) == 0.0
+
+
+class TestRequestMetricsAggregator:
+    """请求指标聚合器测试（无Redis时使用进程内汇总）"""
+
+    def test_record_and_summarize(self):
+        """测试记录后可以读取聚合结果和百分位"""
+        aggregator = RequestMetricsAggregator()
+        for i in range(100):
+            aggregator.record("GET", "/tools/", 0.01 if i < 95 else 2.5, 3, is_slow=i >= 95, is_error=i == 0)
+
+        metrics = aggregator.get_route_metrics("GET", "/tools/")
+        assert metrics["count"] == 100
+        assert metrics["total_queries"] == 300
+        assert metrics["slow_count"] == 5
+        assert metrics["error_count"] == 1
+        assert metrics["p50"] < 0.012
+        assert metrics["p99"] >= 2.5
+        assert "GET /tools/" in aggregator.get_all_metrics()
+
+    def test_concurrent_records_not_lost(self):
+        """测试并发记录不会丢失增量"""
+        aggregator = RequestMetricsAggregator()
+
+        def worker():
+            for _ in range(500):
+                aggregator.record("POST", "/api/", 0.005, 1, is_slow=False, is_error=False)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert aggregator.get_route_metrics("POST", "/api/")["count"] == 4000
+
+    def test_threads_spread_across_shards(self):
+        """测试不同线程分到不同分片，同一线程始终使用同一分片"""
+        aggregator = RequestMetricsAggregator(shard_count=4)
+        shards = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            shard = aggregator._shard()
+            assert aggregator._shard() is shard
+            shards.append(id(shard))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(shards)) == 4
@@ -0,0 +1,143 @@
+"""
+NCM解码测试
+"""
+
+import base64
+import io
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from apps.tools.services.ncm_decoder import (
+    CORE_KEY,
+    KEY_PREFIX,
+    MAGIC,
+    META_JSON_PREFIX,
+    META_KEY,
+    META_PREFIX,
+    NCMDecodeError,
+    NCMDecoder,
+    build_keybox,
+    build_keystream,
+    decode_ncm,
+)
+
+RC4_KEY = b"1176953296838E7fT49x7dof9OKCgLxPjU4aGHJ4JKrC1HOhbN8kqDDeR"
+
+
+def _aes_encrypt(key, data):
+    padding = 16 - len(data) % 16
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+    return encryptor.update(data + bytes([padding]) * padding) + encryptor.finalize()
+
+
+def _xor(data, value):
+    return bytes(b ^ value for b in data)
+
+
+def encode_ncm(audio, metadata=None, cover=b"", rc4_key=RC4_KEY):
+    """按NCM格式加密音频，生成测试用的NCM文件内容"""
+    key_data = _xor(_aes_encrypt(CORE_KEY, KEY_PREFIX + rc4_key), 0x64)
+    meta_data = b""
+    if metadata is not None:
+        encrypted = _aes_encrypt(META_KEY, META_JSON_PREFIX + json.dumps(metadata).encode("utf-8"))
+        meta_data = _xor(META_PREFIX + base64.b64encode(encrypted), 0x63)
+    keystream = build_keystream(build_keybox(rc4_key))
+    body = np.frombuffer(audio, dtype=np.uint8) ^ np.resize(keystream, len(audio))
+    return b"".join(
+        [
+            MAGIC,
+            b"\x01\x70",
+            struct.pack("<I", len(key_data)),
+            key_data,
+            struct.pack("<I", len(meta_data)),
+            meta_data,
+            b"\x00" * 5,
+            struct.pack("<I", len(cover) + 16),
+            struct.pack("<I", len(cover)),
+            cover,
+            b"\x00" * 16,
+            body.tobytes(),
+        ]
+    )
+
+
+@pytest.fixture
+def audio():
+    return b"ID3\x03\x00\x00\x00\x00\x00\x00" + os.urandom(300 * 1024 + 77)
+
+
+@pytest.fixture
+def ncm_file(tmp_path, audio):
+    metadata = {
+        "musicName": "晴天",
+        "artist": [["周杰伦", 6452]],
+        "album": "叶惠美",
+        "duration": 269000,
+        "format": "mp3",
+        "bitrate": 320000,
+    }
+    path = tmp_path / "song.ncm"
+    path.write_bytes(encode_ncm(audio, metadata, cover=b"\xff\xd8\xff\xe0" + b"\x01" * 100))
+    return path
+
+
+class TestNCMDecoder:
+    """NCM解码器测试"""
+
+    def test_keystream_matches_legacy_rc4(self):
+        """测试向量化密钥流与原逐字节实现一致"""
+        box = build_keybox(RC4_KEY)
+        legacy = bytes(bytearray([box[(box[i] + box[(i + box[i]) & 0xFF]) & 0xFF] for i in range(256)] * 3)[1:513])
+        assert np.tile(build_keystream(box), 2).tobytes() == legacy
+
+    def test_decode_audio_metadata_and_cover(self, ncm_file, audio):
+        """测试解出音频、元数据和原样的封面图片"""
+        decoder = NCMDecoder(ncm_file)
+        assert decoder.read_audio() == audio
+        assert decoder.audio_size == len(audio)
+        assert decoder.metadata["title"] == "晴天"
+        assert decoder.metadata["artist"] == "周杰伦"
+        assert decoder.metadata["duration"] == 269
+        assert decoder.audio_format == "mp3"
+        assert decoder.album_cover["format"] == "jpeg"
+        assert decoder.album_cover["data"].startswith(b"\xff\xd8")
+
+    @pytest.mark.parametrize("block_size", [256, 4096, 64 * 1024])
+    def test_streaming_blocks(self, ncm_file, audio, block_size):
+        """测试任意256倍数的块大小结果一致，块大小不是256倍数时拒绝"""
+        decoder = NCMDecoder(ncm_file)
+        assert b"".join(bytes(block) for block in decoder.iter_audio(block_size)) == audio
+        with pytest.raises(ValueError):
+            next(decoder.iter_audio(1000))
+
+    def test_decrypt_to_file_object_and_path(self, ncm_file, audio, tmp_path):
+        """测试流式写入文件对象和路径"""
+        buffer = io.BytesIO()
+        assert NCMDecoder(ncm_file).decrypt_to(buffer) == len(audio)
+        assert buffer.getvalue() == audio
+
+        result = decode_ncm(ncm_file, tmp_path / "out.mp3")
+        assert (tmp_path / "out.mp3").read_bytes() == audio
+        assert "audio_data" not in result
+
+    def test_missing_metadata_and_cover(self, tmp_path, audio):
+        """测试没有元数据和封面的文件仍可解码"""
+        path = tmp_path / "bare.ncm"
+        path.write_bytes(encode_ncm(audio))
+        result = decode_ncm(path)
+        assert result["audio_data"] == audio
+        assert result["metadata"] == {}
+        assert result["album_cover"] is None
+
+    @pytest.mark.parametrize("content", [b"not an ncm file at all", MAGIC + b"\x01\x70" + b"\xff" * 8, MAGIC])
+    def test_invalid_files(self, tmp_path, content):
+        """测试非NCM文件和截断的文件抛出NCMDecodeError"""
+        path = tmp_path / "bad.ncm"
+        path.write_bytes(content)
+        with pytest.raises(NCMDecodeError):
+            NCMDecoder(path)
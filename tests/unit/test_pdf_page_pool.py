@@ -0,0 +1,101 @@
+"""
+PDF页面进程池与后台转换任务测试
+"""
+
+import threading
+import time
+
+import pytest
+
+from apps.tools.async_task_manager import AsyncTaskManager
+from apps.tools.services.pdf_page_pool import PDFPagePool
+from apps.tools.services.task_executor import BoundedTaskExecutor
+from apps.tools.services.task_store import SQLiteTaskStore
+
+
+def reversed_delay_page(pdf_path, page_index, page_count):
+    """越靠前的页面完成得越晚，用于验证按页码重组"""
+    time.sleep((page_count - page_index) * 0.05)
+    return f"{pdf_path}:{page_index}"
+
+
+def flaky_page(pdf_path, page_index, slow_page, fail_page):
+    if page_index == fail_page:
+        raise ValueError("broken page")
+    if page_index == slow_page:
+        time.sleep(2)
+    return page_index
+
+
+@pytest.fixture
+def page_pool():
+    pool = PDFPagePool(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+
+class TestPDFPagePool:
+    """页面进程池测试"""
+
+    def test_results_reassembled_in_page_order(self, page_pool):
+        """测试结果按页码顺序返回，并逐页汇报进度"""
+        progress = []
+        results = page_pool.map_pages(
+            reversed_delay_page, "doc.pdf", 4, args=(4,), progress_callback=lambda done, total: progress.append(done)
+        )
+        assert results == [f"doc.pdf:{i}" for i in range(4)]
+        assert progress == [1, 2, 3, 4]
+
+    def test_failed_and_timed_out_pages_are_none(self, page_pool):
+        """测试失败和卡住的页面记为None，其他页面正常返回"""
+        # 先让两个worker进程都启动，避免把进程启动时间算进超时
+        page_pool.map_pages(reversed_delay_page, "warmup.pdf", 2, args=(2,))
+        start = time.monotonic()
+        results = page_pool.map_pages(flaky_page, "doc.pdf", 4, args=(1, 2), page_timeout=0.3)
+        assert time.monotonic() - start < 2
+        assert results[0] == 0 and results[3] == 3
+        assert results[1] is None and results[2] is None
+
+
+class TestAsyncJob:
+    """通用后台任务测试"""
+
+    def test_job_reports_progress_and_result(self, tmp_path):
+        """测试后台任务汇报进度并保存结果"""
+        manager = AsyncTaskManager(
+            store=SQLiteTaskStore(str(tmp_path / "tasks.sqlite3")),
+            executor=BoundedTaskExecutor(max_workers=1, max_queue_size=5, max_pending_per_user=5),
+        )
+        reported = threading.Event()
+
+        def job(report_progress):
+            report_progress(40, "OCR识别 2/5 页")
+            reported.set()
+            return {"filename": "out.docx"}
+
+        task_id = manager.create_job("pdf_to_word", job, description="PDF转Word: a.pdf")
+        assert reported.wait(5)
+        deadline = time.time() + 5
+        while manager.get_task_status(task_id)["status"] != "completed" and time.time() < deadline:
+            time.sleep(0.01)
+
+        task = manager.get_task_status(task_id)
+        assert task["status"] == "completed"
+        assert task["result"] == {"filename": "out.docx"}
+        assert task["job_type"] == "pdf_to_word"
+
+    def test_failed_job_records_error(self, tmp_path):
+        """测试任务异常时记录失败原因"""
+        manager = AsyncTaskManager(
+            store=SQLiteTaskStore(str(tmp_path / "tasks.sqlite3")),
+            executor=BoundedTaskExecutor(max_workers=1, max_queue_size=5, max_pending_per_user=5),
+        )
+
+        def job(report_progress):
+            raise RuntimeError("转换失败")
+
+        task_id = manager.create_job("pdf_to_word", job)
+        deadline = time.time() + 5
+        while manager.get_task_status(task_id)["status"] != "failed" and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.get_task_status(task_id)["error"] == "转换失败"
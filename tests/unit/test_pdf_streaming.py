@@ -0,0 +1,92 @@
+"""
+PDF逐页流式转换测试
+"""
+
+import io
+import json
+import zipfile
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+import pytest
+
+from apps.tools.pdf_converter_api import PDFConverter, pdf_converter_api
+
+fitz = pytest.importorskip("fitz")
+
+
+def make_pdf(pages=3):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Streaming page {i + 1} content")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def pdf_upload():
+    return SimpleUploadedFile("sample.pdf", make_pdf(), content_type="application/pdf")
+
+
+class TestPDFConverterStreaming:
+    """转换器逐页输出测试"""
+
+    def test_images_written_page_by_page_into_zip(self, pdf_upload):
+        """测试图片逐页写入ZIP"""
+        output = io.BytesIO()
+        success, result, file_type = PDFConverter().pdf_to_images_zip(pdf_upload, output, dpi=50)
+        assert success and file_type == "pdf_to_images"
+        assert result["total_pages"] == 3
+        assert result["file_size"] == len(output.getvalue())
+        assert zipfile.ZipFile(output).namelist() == ["page_1.png", "page_2.png", "page_3.png"]
+
+    def test_zip_stream_is_valid_archive(self, tmp_path):
+        """测试流式ZIP按页产出且拼接后是合法的压缩包"""
+        pdf_path = tmp_path / "sample.pdf"
+        pdf_path.write_bytes(make_pdf())
+        chunks = list(PDFConverter().iter_images_zip(str(pdf_path), dpi=50))
+        assert len([chunk for chunk in chunks if chunk]) >= 3
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        assert archive.testzip() is None
+        assert len(archive.namelist()) == 3
+
+    def test_text_written_incrementally(self, pdf_upload):
+        """测试文本逐页写入输出文件"""
+        output = io.BytesIO()
+        success, result, _ = PDFConverter().pdf_to_text_file(pdf_upload, output)
+        assert success
+        text = output.getvalue().decode("utf-8")
+        assert "Streaming page 1" in text and "Streaming page 3" in text
+        assert result["total_pages"] == 3
+
+
+class TestPDFConverterAPIStreaming:
+    """转换API测试"""
+
+    def test_stream_mode_returns_zip(self, rf, pdf_upload):
+        """测试stream=1时直接返回流式ZIP"""
+        request = rf.post("/tools/api/pdf-converter/", {"type": "pdf-to-image", "stream": "1", "file": pdf_upload})
+        request.user = AnonymousUser()
+        response = pdf_converter_api(request)
+        assert response.streaming
+        assert response["Content-Type"] == "application/zip"
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        assert len(archive.namelist()) == 3
+
+    def test_download_handle_mode_saves_to_storage(self, rf, settings, tmp_path, pdf_upload):
+        """测试默认模式保存ZIP并返回下载链接"""
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.PDF_CONVERSION_CACHE_DIR = str(tmp_path / "conversion_cache")
+        request = rf.post("/tools/api/pdf-converter/", {"type": "pdf-to-image", "file": pdf_upload})
+        request.user = AnonymousUser()
+        response = pdf_converter_api(request)
+        assert response.status_code == 200
+
+        data = json.loads(response.content)
+        assert data["total_pages"] == 3
+        saved = tmp_path / "converted" / data["filename"]
+        assert saved.stat().st_size == data["file_size"]
@@ -0,0 +1,242 @@
+"""
+代理池快照选择与后台刷新测试
+"""
+
+import threading
+import time
+
+import pytest
+
+from apps.tools.services.proxy_pool import (
+    GLOBAL_DOMAIN,
+    CircuitState,
+    ProxyConfig,
+    ProxyHealth,
+    ProxyInfo,
+    ProxyPool,
+    ProxySnapshot,
+    target_domain,
+)
+
+
+def make_proxy(index, score, **kwargs):
+    return ProxyInfo(proxy=f"10.0.0.{index}:8080", score=score, success_count=kwargs.pop("success_count", 1), **kwargs)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ProxyPool(ProxyConfig(proxy_file=str(tmp_path / "proxy_pool.json")), background_refresh=False)
+    pool.proxies = [make_proxy(i, score=i * 10) for i in range(1, 9)]
+    pool.refresh_snapshot()
+    return pool
+
+
+class TestProxySnapshot:
+    """快照测试"""
+
+    def test_top_in_selection_order(self):
+        """测试按评分从高到低取前k个"""
+        proxies = [make_proxy(i, score=s) for i, s in enumerate([30, 90, 10, 70, 50, 80])]
+        snapshot = ProxySnapshot(proxies, ProxyConfig(), set())
+        assert [p.score for p in snapshot.top(4)] == [90, 80, 70, 50]
+
+    def test_top_skips_failed(self):
+        """测试跳过快照发布后被标记失败的代理"""
+        proxies = [make_proxy(i, score=s) for i, s in enumerate([30, 90, 10, 70])]
+        snapshot = ProxySnapshot(proxies, ProxyConfig(), set())
+        skip = {proxies[1].proxy, proxies[3].proxy}
+        assert [p.score for p in snapshot.top(5, skip=skip)] == [30, 10]
+
+    def test_degraded_when_nothing_qualifies(self):
+        """测试没有合格代理时退化为失败次数未超限的代理"""
+        proxies = [make_proxy(1, score=50, success_count=0, fail_count=1)]
+        snapshot = ProxySnapshot(proxies, ProxyConfig(min_success_rate=0.5), set())
+        assert snapshot.degraded
+        assert snapshot.top(5) == proxies
+
+
+class TestProxyPoolSelection:
+    """代理选择测试"""
+
+    def test_two_choices_avoid_slowest(self, pool):
+        """测试二选一抽样不会选中候选中期望耗时最高的代理"""
+        pool.config.selection_candidates = 3
+        slow = pool._snapshot.top(1)[0]
+        for _ in range(3):
+            pool.report_result(slow.proxy, True, latency=8.0, domain="https://api.bilibili.com/x")
+        picked = {pool.get_working_proxy("www.bilibili.com").proxy for _ in range(200)}
+        assert slow.proxy not in picked
+        assert len(picked) == 2
+
+    def test_selection_does_not_wait_for_lock(self, pool):
+        """测试其他线程持有锁（如正在刷新）时取代理不被阻塞"""
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with pool._lock:
+                held.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        held.wait(5)
+        try:
+            start = time.monotonic()
+            assert pool.get_working_proxy() is not None
+            assert time.monotonic() - start < 1
+        finally:
+            release.set()
+            thread.join()
+
+    def test_failed_proxy_excluded(self, pool):
+        """测试标记失败的代理不再被选中"""
+        best = pool._snapshot.top(1)[0]
+        pool.mark_proxy_failed(best.proxy)
+        assert all(pool.get_working_proxy().proxy != best.proxy for _ in range(100))
+
+    def test_empty_pool_requests_refresh(self, tmp_path):
+        """测试代理池为空时通知后台刷新而不是同步获取"""
+        pool = ProxyPool(ProxyConfig(proxy_file=str(tmp_path / "empty.json")), background_refresh=False)
+        assert pool.get_working_proxy() is None
+        assert pool._wake_event.is_set()
+
+
+class TestAdaptiveScoring:
+    """EWMA评分与熔断测试"""
+
+    @pytest.mark.parametrize(
+        "url,domain",
+        [
+            ("https://api.bilibili.com/x/space", "bilibili.com"),
+            ("https://www.douyin.com/user/1", "douyin.com"),
+            ("edith.xiaohongshu.com", "xiaohongshu.com"),
+            ("https://news.sina.com.cn/", "sina.com.cn"),
+            ("http://10.0.0.1:8080/ip", "10.0.0.1"),
+            (None, GLOBAL_DOMAIN),
+        ],
+    )
+    def test_target_domain(self, url, domain):
+        """测试按站点归一化分桶"""
+        assert target_domain(url) == domain
+
+    def test_ewma_tracks_recent_latency(self):
+        """测试EWMA延迟随近期结果变化"""
+        health = ProxyHealth()
+        config = ProxyConfig(ewma_alpha=0.5)
+        health.record(True, 1.0, config, now=0)
+        health.record(True, 3.0, config, now=0)
+        assert health.latency == pytest.approx(2.0)
+        health.record(False, None, config, now=0)
+        assert health.success == pytest.approx(0.5)
+
+    def test_circuit_breaker_half_open(self):
+        """测试连续失败熔断，冷却后放行一次试探，试探失败冷却时间翻倍"""
+        config = ProxyConfig(breaker_failure_threshold=2, breaker_cooldown=10, breaker_max_cooldown=100)
+        health = ProxyHealth()
+        health.record(False, None, config, now=0)
+        assert health.state is CircuitState.CLOSED
+        health.record(False, None, config, now=0)
+        assert health.state is CircuitState.OPEN
+        assert not health.allows(now=5)
+
+        assert health.claim_trial(now=10)
+        assert health.state is CircuitState.HALF_OPEN
+        assert not health.claim_trial(now=11)
+
+        health.record(False, None, config, now=12)
+        assert health.state is CircuitState.OPEN
+        assert health.cooldown == 20
+        assert health.claim_trial(now=32)
+        health.record(True, 0.5, config, now=33)
+        assert health.state is CircuitState.CLOSED
+
+    def test_domain_rejection_is_isolated(self, pool):
+        """测试某站点拒绝代理只熔断该站点，不影响其他站点"""
+        proxy = pool._snapshot.top(1)[0].proxy
+        for _ in range(pool.config.breaker_failure_threshold):
+            pool.report_result(proxy, False, domain="www.douyin.com", status_code=403)
+
+        assert not pool.is_proxy_available(proxy, "https://www.douyin.com/")
+        assert pool.is_proxy_available(proxy, "https://api.bilibili.com/")
+        assert all(pool.get_working_proxy("douyin.com").proxy != proxy for _ in range(100))
+        assert pool.get_health(proxy)["douyin.com"]["state"] == "open"
+
+    def test_transport_failures_open_global_breaker(self, pool):
+        """测试连接层失败计入全局桶，所有站点都跳过该代理"""
+        proxy = pool._snapshot.top(1)[0].proxy
+        for _ in range(pool.config.breaker_failure_threshold):
+            pool.report_result(proxy, False, domain="www.douyin.com")
+        assert not pool.is_proxy_available(proxy, "bilibili.com")
+
+    def test_score_follows_recent_results(self, pool):
+        """测试历史成功很多但近期变慢、变差的代理评分下降"""
+        proxy_info = pool._snapshot.top(1)[0]
+        proxy_info.success_count = 100
+        proxy_info.response_time = 0.5
+        before = pool._calculate_proxy_score(proxy_info)
+        for _ in range(5):
+            pool.report_result(proxy_info.proxy, True, latency=9.0)
+            pool.report_result(proxy_info.proxy, False)
+        assert proxy_info.ewma_samples == 10
+        assert proxy_info.score < before
+
+
+class TestBackgroundRefresh:
+    """后台刷新测试"""
+
+    def test_refresh_once_fetches_and_checks(self, pool, monkeypatch):
+        """测试代理不足时补充代理，到期时做健康检查"""
+        pool.proxies = []
+        pool.refresh_snapshot()
+        fetched = []
+
+        def fake_fetch():
+            fetched.append(1)
+            with pool._lock:
+                pool.proxies = [make_proxy(1, score=60)]
+                pool.refresh_snapshot()
+
+        monkeypatch.setattr(pool, "_fetch_fresh_proxies", fake_fetch)
+        monkeypatch.setattr(pool, "_test_proxy", lambda proxy_info: True)
+        pool._refresh_once()
+
+        assert fetched == [1]
+        assert pool.last_check_time is not None
+        assert pool.get_working_proxy().proxy == "10.0.0.1:8080"
+
+    def test_selection_during_health_check(self, pool, monkeypatch):
+        """测试健康检查探测期间仍可立即取到代理"""
+        probing = threading.Event()
+
+        def slow_probe(proxy_info):
+            probing.set()
+            time.sleep(0.3)
+            return True
+
+        monkeypatch.setattr(pool, "_test_proxy", slow_probe)
+        thread = threading.Thread(target=pool._check_proxy_health)
+        thread.start()
+        probing.wait(5)
+        start = time.monotonic()
+        assert pool.get_working_proxy() is not None
+        assert time.monotonic() - start < 0.1
+        thread.join()
+
+    def test_refresher_thread_lifecycle(self, pool, monkeypatch):
+        """测试后台线程启动、响应刷新通知并能停止"""
+        calls = []
+        monkeypatch.setattr(pool, "_refresh_once", lambda: calls.append(1))
+        pool.background_refresh = True
+        pool.ensure_background_refresh()
+        try:
+            deadline = time.monotonic() + 2
+            while not calls and time.monotonic() < deadline:
+                time.sleep(0.01)
+            pool.request_refresh()
+            while len(calls) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(calls) >= 2
+        finally:
+            pool.stop_background_refresh(timeout=2)
+        assert not pool._refresher.is_alive()
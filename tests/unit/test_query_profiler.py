@@ -0,0 +1,60 @@
+"""
+查询画像测试
+"""
+
+from django.db import connection
+
+import pytest
+
+from utils.query_profiler import fingerprint_sql, profile_queries
+
+
+class TestFingerprint:
+    """SQL指纹测试"""
+
+    def test_literals_and_in_lists_collapsed(self):
+        """测试不同参数的同一语句得到相同指纹"""
+        a = fingerprint_sql("SELECT * FROM t WHERE id = 1 AND name = 'a'")
+        b = fingerprint_sql("SELECT *  FROM t WHERE id = 42 AND name = 'it''s'")
+        assert a == b
+        assert fingerprint_sql("SELECT * FROM t WHERE id IN (%s, %s, %s)") == fingerprint_sql(
+            "SELECT * FROM t WHERE id IN (%s)"
+        )
+
+
+@pytest.mark.django_db
+class TestProfileQueries:
+    """请求查询画像测试"""
+
+    def test_counts_without_debug(self, settings):
+        """测试DEBUG=False时仍能统计查询数和重复查询"""
+        settings.DEBUG = False
+        with profile_queries(sample_rate=1.0) as profile:
+            with connection.cursor() as cursor:
+                for i in range(3):
+                    cursor.execute("SELECT %s", [i])
+                cursor.execute("SELECT 1, 2")
+
+        stats = profile.as_stats()
+        assert stats["total_queries"] == 4
+        assert stats["duplicate_queries"][0]["count"] == 3
+        assert len(stats["slowest_queries"]) == 4
+
+    def test_unsampled_profile_only_counts(self):
+        """测试未采样的请求只计数"""
+        with profile_queries(sample_rate=0.0) as profile:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        stats = profile.as_stats()
+        assert stats["total_queries"] == 1
+        assert "duplicate_queries" not in stats
+
+    def test_nested_profiles_share_request_profile(self, rf):
+        """测试同一请求内嵌套使用时复用外层画像"""
+        request = rf.get("/")
+        with profile_queries(request, sample_rate=1.0) as outer:
+            with profile_queries(request) as inner:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+        assert inner is outer
+        assert outer.count == 1
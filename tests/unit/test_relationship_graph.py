@@ -0,0 +1,149 @@
+"""
+MeetSomeone 关系图谱测试
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from apps.tools.services import relationship_graph as graph_module
+from apps.tools.services.relationship_graph import ProfileRow, RelationshipGraphService, build_graph, diff_graph, graph_version
+
+ALICE = ProfileRow(1, "Alice", "小A", 5, 30)
+BOB = ProfileRow(2, "Bob", None, 3, 0)
+CAROL = ProfileRow(3, "Carol", None, 2, 12)
+
+
+pytestmark = pytest.mark.usefixtures("locmem_cache")
+
+
+def edge_ids(graph):
+    return [edge["id"] for edge in graph["edges"]]
+
+
+class TestBuildGraph:
+    """图谱构建测试"""
+
+    def test_nodes_and_self_edges(self):
+        """测试节点类型取主标签，每个人都与中心节点相连"""
+        graph = build_graph([ALICE, BOB], {1: ["合作伙伴", "朋友"], 2: ["老师"]}, [], {})
+
+        alice = graph["nodes"][1]
+        assert graph["nodes"][0]["id"] == "self"
+        assert alice["name"] == "小A"
+        assert alice["type"] == "colleague"
+        assert alice["size"] == 10 + 5 * 2 + 6
+        assert alice["relationship_tags"] == ["合作伙伴", "朋友"]
+        # 连线类型规则比节点类型规则更窄
+        assert graph["edges"][0]["type"] == "friend"
+        assert graph["nodes"][2]["type"] == "mentor"
+        assert edge_ids(graph) == ["self-1", "self-2"]
+
+    def test_mutual_friends_deduplicated(self):
+        """测试双向登记的共同好友只生成一条连线，忽略自环和其他用户的人物"""
+        graph = build_graph([ALICE, BOB], {}, [(2, 1), (1, 2), (1, 1), (1, 99)], {})
+        acquaintance = graph["edges"][2:]
+        assert len(acquaintance) == 1
+        assert acquaintance[0]["id"] == "1-2"
+        assert (acquaintance[0]["source"], acquaintance[0]["target"]) == (2, 1)
+        assert acquaintance[0]["strength"] == 3.0
+
+    def test_shared_interactions_strengthen_edges(self):
+        """测试一起参与互动的人物之间建立连线，次数越多越强"""
+        participants = {10: {1, 2, 3}, 11: {1, 2}}
+        graph = build_graph([ALICE, BOB, CAROL], {}, [], participants)
+        edges = {edge["id"]: edge for edge in graph["edges"]}
+        assert edges["1-2"]["interaction_count"] == 2
+        assert edges["1-2"]["strength"] == 5.0
+        assert edges["2-3"]["interaction_count"] == 1
+
+    def test_statistics(self):
+        """测试统计信息"""
+        stats = build_graph([ALICE, BOB, CAROL], {}, [], {})["statistics"]
+        assert stats["total_connections"] == 3
+        assert stats["average_importance"] == 3.3
+        assert stats["strongest_connection"] == "小A"
+        assert stats["most_connected"] == "小A"
+        assert build_graph([], {}, [], {})["statistics"]["strongest_connection"] == "无"
+
+
+class TestGraphDelta:
+    """增量计算测试"""
+
+    def test_diff(self):
+        """测试新增、更新、删除的节点和连线"""
+        old = build_graph([ALICE, BOB], {}, [(1, 2)], {})
+        new = build_graph([ALICE._replace(importance_level=4), CAROL], {}, [], {})
+        delta = diff_graph(old, new)
+
+        assert [node["id"] for node in delta["nodes"]["added"]] == [3]
+        assert [node["id"] for node in delta["nodes"]["updated"]] == [1]
+        assert delta["nodes"]["removed"] == [2]
+        assert sorted(delta["edges"]["removed"]) == ["1-2", "self-2"]
+        assert delta["statistics"] == new["statistics"]
+
+    def test_version_is_content_hash(self):
+        """测试内容相同则版本号相同"""
+        assert graph_version(build_graph([ALICE], {}, [], {})) == graph_version(build_graph([ALICE], {}, [], {}))
+        assert graph_version(build_graph([ALICE], {}, [], {})) != graph_version(build_graph([BOB], {}, [], {}))
+
+
+class TestRelationshipGraphService:
+    """图谱缓存测试"""
+
+    @pytest.fixture
+    def rows(self, monkeypatch):
+        data = {"profiles": [ALICE, BOB], "calls": 0}
+
+        def fake_load(user_id):
+            data["calls"] += 1
+            return list(data["profiles"]), {}, [], {}
+
+        monkeypatch.setattr(graph_module, "load_graph_rows", fake_load)
+        return data
+
+    def test_cached_until_invalidated(self, rows):
+        """测试图谱缓存命中，失效后重新构建"""
+        service = RelationshipGraphService()
+        first = service.get_graph(7)
+        assert first["mode"] == "full"
+        assert service.get_graph(7)["version"] == first["version"]
+        assert rows["calls"] == 1
+
+        service.invalidate(7)
+        service.get_graph(7)
+        assert rows["calls"] == 2
+
+    def test_since_returns_unchanged_or_delta(self, rows):
+        """测试带版本号请求时返回未变化或一步增量，版本过旧时返回完整图谱"""
+        service = RelationshipGraphService()
+        v1 = service.get_graph(7)["version"]
+        assert service.get_graph(7, since=v1) == {"version": v1, "mode": "unchanged"}
+
+        rows["profiles"].append(CAROL)
+        service.invalidate(7)
+        result = service.get_graph(7, since=v1)
+        assert result["mode"] == "delta"
+        assert result["delta"]["base_version"] == v1
+        assert [node["id"] for node in result["delta"]["nodes"]["added"]] == [3]
+
+        assert service.get_graph(7, since="stale")["mode"] == "full"
+
+    def test_users_isolated(self, rows):
+        """测试不同用户的缓存互不影响"""
+        service = RelationshipGraphService()
+        service.get_graph(1)
+        service.get_graph(2)
+        service.invalidate(1)
+        service.get_graph(2)
+        assert rows["calls"] == 2
+
+    def test_invalidate_survives_cache_errors(self, monkeypatch):
+        """测试缓存删除出错时信号处理函数不抛出异常"""
+
+        def broken(key):
+            raise ConnectionError("cache down")
+
+        monkeypatch.setattr(graph_module.cache, "delete", broken)
+        graph_module._invalidate_owner(None, SimpleNamespace(user_id=1))
+        graph_module.relationship_graph.invalidate_users([1, 2])
@@ -0,0 +1,95 @@
+"""
+恶意模式扫描引擎测试
+"""
+
+from django.test import RequestFactory
+
+import pytest
+
+from apps.users.security import MaliciousPatternScanner, SecurityMiddleware, SQLInjectionProtector
+
+
+@pytest.fixture
+def factory():
+    return RequestFactory()
+
+
+@pytest.fixture
+def scanner():
+    return MaliciousPatternScanner(max_field_length=8192)
+
+
+class TestMaliciousPatternScanner:
+    """扫描引擎测试"""
+
+    @pytest.mark.parametrize(
+        "content,signature",
+        [
+            ("<script>alert(1)</script>", "xss_tag"),
+            ("<IFRAME src=x>", "xss_tag"),
+            ("<svg/onload=alert(1)>", "xss_tag"),
+            ("JavaScript:alert(1)", "xss_protocol"),
+            ("x onerror = alert(1)", "xss_event"),
+            ("1; DROP TABLE users", "sql_keyword"),
+            ("1 OR 1=1", "sql_tautology_number"),
+            ("1 or 1=1 --", "sql_tautology_number"),
+            ("x' OR 'a'='a'#", "sql_tautology_string"),
+            ("x' AND 'a'='a'/*", "sql_tautology_string"),
+        ],
+    )
+    def test_detects_signatures(self, scanner, content, signature):
+        """测试XSS和SQL注入签名（含原来带注释后缀的变体）"""
+        assert scanner.match(content) == signature
+
+    @pytest.mark.parametrize("content", ["今天天气不错", "order by price", "a < b and c > d", "1 + 1 = 2"])
+    def test_safe_content(self, scanner, content):
+        """测试正常内容不命中"""
+        assert scanner.match(content) is None
+
+    def test_field_length_cap(self):
+        """测试只扫描字段前 max_field_length 个字符"""
+        scanner = MaliciousPatternScanner(max_field_length=100)
+        assert scanner.match("a" * 100 + "<script>") is None
+        assert scanner.match("a" * 50 + "<script>") == "xss_tag"
+
+    def test_header_verdicts_cached(self, scanner):
+        """测试重复的请求头值命中判定缓存"""
+        for _ in range(3):
+            assert scanner.match_header("Mozilla/5.0 (X11; Linux x86_64)") is None
+        info = scanner._cached_match.cache_info()
+        assert info.hits == 2
+        assert info.misses == 1
+
+    def test_scan_request_reports_field(self, scanner, factory):
+        """测试命中时返回来源、字段名和签名类别"""
+        request = factory.post("/submit/", {"title": "hello", "content": "<script>x</script>"})
+        assert scanner.scan_request(request) == ("POST", "content", "xss_tag")
+
+    def test_skips_server_meta_keys(self, scanner, factory):
+        """测试扫描客户端可控的META键，服务器填写的键跳过"""
+        request = factory.get("/", HTTP_X_CUSTOM="<script>")
+        assert scanner.scan_request(request) == ("META", "HTTP_X_CUSTOM", "xss_tag")
+
+        request = factory.post("/", data="x", content_type="text/plain; <script>")
+        assert scanner.scan_request(request) == ("META", "CONTENT_TYPE", "xss_tag")
+
+        request = factory.get("/")
+        request.META["SERVER_SOFTWARE"] = "<script>"
+        assert scanner.scan_request(request) is None
+
+
+class TestSecurityMiddlewareScanning:
+    """中间件接入测试"""
+
+    def test_has_malicious_content(self, factory):
+        """测试中间件使用扫描引擎判定请求"""
+        middleware = SecurityMiddleware(lambda request: None)
+        assert middleware._has_malicious_content(factory.get("/search/", {"q": "1 OR 1=1"}))
+        assert not middleware._has_malicious_content(factory.get("/search/", {"q": "旅行攻略"}))
+        assert middleware._contains_malicious_pattern("javascript:void(0)")
+
+    def test_sql_injection_protector(self):
+        """测试SQL注入检测使用合并后的规则"""
+        assert SQLInjectionProtector.check_sql_injection("admin' OR 'a'='a'")
+        assert SQLInjectionProtector.check_sql_injection("UNION select password")
+        assert not SQLInjectionProtector.check_sql_injection("hello world")
@@ -0,0 +1,113 @@
+"""
+并行数据获取阶段测试
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from apps.tools.services.llm_gateway import current_deadline, deadline_scope
+from apps.tools.services.real_data_travel_service import RealDataTravelService
+from apps.tools.services.stage_fanout import Stage, run_stages
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=6)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def slow(value, seconds):
+    def func():
+        time.sleep(seconds)
+        return value
+
+    return func
+
+
+class TestRunStages:
+    """阶段执行测试"""
+
+    def test_runs_in_parallel(self, executor):
+        """测试各阶段同时运行，总耗时接近最慢的阶段"""
+        stages = [Stage(f"s{i}", slow(i, 0.3), lambda: "fallback") for i in range(4)]
+        started = time.monotonic()
+        results, report = run_stages(stages, timeout=5, executor=executor)
+        assert time.monotonic() - started < 0.9
+        assert results == {"s0": 0, "s1": 1, "s2": 2, "s3": 3}
+        assert list(report) == ["s0", "s1", "s2", "s3"]
+        assert all(item["status"] == "ok" and item["seconds"] >= 0.3 for item in report.values())
+
+    def test_straggler_uses_fallback(self, executor):
+        """测试超过截止时间的阶段使用备用数据，不等待其完成"""
+        stages = [Stage("fast", slow("real", 0), lambda: "x"), Stage("slow", slow("real", 2), lambda: "备用")]
+        started = time.monotonic()
+        results, report = run_stages(stages, timeout=0.3, executor=executor)
+        assert time.monotonic() - started < 1
+        assert results == {"fast": "real", "slow": "备用"}
+        assert report["slow"]["status"] == "timeout"
+
+    def test_error_uses_fallback(self, executor):
+        """测试阶段抛出异常时使用备用数据，备用数据也失败时结果为None"""
+
+        def boom():
+            raise RuntimeError("boom")
+
+        def broken_fallback():
+            raise ValueError("bad")
+
+        results, report = run_stages(
+            [Stage("a", boom, lambda: []), Stage("b", boom, broken_fallback)], timeout=5, executor=executor
+        )
+        assert results == {"a": [], "b": None}
+        assert report["a"]["status"] == "error"
+
+    def test_deadline_propagated_to_workers(self, executor):
+        """测试worker线程内的大模型调用继承总截止时间和外层的更早截止时间"""
+        seen = {}
+
+        def remaining(name):
+            def func():
+                seen[name] = current_deadline() - time.monotonic()
+
+            return func
+
+        run_stages([Stage("inner", remaining("inner"), lambda: None)], timeout=30, executor=executor)
+        with deadline_scope(5):
+            run_stages([Stage("outer", remaining("outer"), lambda: None)], timeout=30, executor=executor)
+        assert 25 < seen["inner"] <= 30
+        assert seen["outer"] <= 5
+
+
+class TestTravelGuideFanout:
+    """旅游攻略并行获取测试"""
+
+    def test_guide_fetches_in_parallel(self, monkeypatch):
+        """测试各部分数据并行获取，慢的部分使用备用数据并记录在耗时和数据来源中"""
+        service = RealDataTravelService()
+        service.fetch_deadline = 0.5
+        # 返回空数据时按原逻辑改用备用数据
+        for name in (
+            "_get_real_attractions_with_deepseek",
+            "_get_real_foods_with_deepseek",
+            "_get_real_accommodations_with_deepseek",
+        ):
+            monkeypatch.setattr(service, name, lambda *args: time.sleep(0.2) or [])
+        weather, geo = service._get_fallback_weather_data, service._get_fallback_geo_data
+        monkeypatch.setattr(service, "_get_real_weather_data", lambda destination: time.sleep(0.2) or weather(destination))
+        monkeypatch.setattr(service, "_get_geolocation_info", lambda destination: time.sleep(0.2) or geo(destination))
+        monkeypatch.setattr(service, "_get_real_transport_with_deepseek", lambda *args: time.sleep(2) or {"x": 1})
+        monkeypatch.setattr(service, "_generate_complete_guide_with_deepseek", lambda *args: "完整攻略")
+
+        started = time.monotonic()
+        guide = service.get_real_travel_guide("杭州", "文化", "中等", "3天", ["美食"])
+        assert time.monotonic() - started < 1.5
+
+        timings = guide["stage_timings"]
+        assert timings["transport"]["status"] == "timeout"
+        assert timings["foods"]["status"] == "ok"
+        assert "complete_guide" in timings
+        assert guide["data_sources"]["transport"] == "备用数据"
+        assert guide["complete_guide"] == "完整攻略"
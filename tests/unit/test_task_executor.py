@@ -0,0 +1,72 @@
+"""
+有界任务执行器测试
+"""
+
+import threading
+
+import pytest
+
+from apps.tools.services.task_executor import BoundedTaskExecutor, TaskQueueFullError
+
+
+class TestBoundedTaskExecutor:
+    """有界任务执行器测试"""
+
+    @pytest.fixture
+    def blocked_executor(self):
+        """单工作线程执行器，第一个任务阻塞直到测试放行"""
+        executor = BoundedTaskExecutor(max_workers=1, max_queue_size=3, max_pending_per_user=2, default_duration=10)
+        gate = threading.Event()
+        started = threading.Event()
+
+        def blocker():
+            started.set()
+            gate.wait(5)
+
+        executor.submit("blocker", blocker, user_id="system")
+        assert started.wait(5)
+        yield executor, gate
+        gate.set()
+
+    def test_queue_full_rejected(self, blocked_executor):
+        """测试队列满时拒绝新任务"""
+        executor, _ = blocked_executor
+        for i in range(3):
+            executor.submit(f"t{i}", lambda: None, user_id=f"user{i}")
+        with pytest.raises(TaskQueueFullError) as exc_info:
+            executor.submit("overflow", lambda: None, user_id="user9")
+        assert exc_info.value.retry_after > 0
+
+    def test_per_user_limit(self, blocked_executor):
+        """测试单个用户排队任务数上限"""
+        executor, _ = blocked_executor
+        executor.submit("a1", lambda: None, user_id="alice")
+        executor.submit("a2", lambda: None, user_id="alice")
+        with pytest.raises(TaskQueueFullError):
+            executor.submit("a3", lambda: None, user_id="alice")
+
+    def test_fair_and_priority_ordering(self, blocked_executor):
+        """测试不同用户交替排队，高优先级任务插队"""
+        executor, _ = blocked_executor
+        executor.submit("a1", lambda: None, user_id="alice")
+        executor.submit("a2", lambda: None, user_id="alice")
+        executor.submit("b1", lambda: None, user_id="bob")
+
+        positions = executor.queue_positions()
+        assert positions["a1"]["queue_position"] == 0
+        assert positions["b1"]["queue_position"] == 1
+        assert positions["a2"]["queue_position"] == 2
+        assert positions["a1"]["eta_seconds"] < positions["a2"]["eta_seconds"]
+
+        assert executor.cancel("a2")
+        executor.submit("vip", lambda: None, user_id="carol", priority=-1)
+        assert executor.queue_positions()["vip"]["queue_position"] == 0
+
+    def test_tasks_run_after_release(self, blocked_executor):
+        """测试放行后排队任务全部执行"""
+        executor, gate = blocked_executor
+        done = threading.Event()
+        executor.submit("last", done.set, user_id="alice")
+        assert executor.get_stats()["queued"] == 1
+        gate.set()
+        assert done.wait(5)
@@ -0,0 +1,94 @@
+"""
+异步任务存储后端测试
+"""
+
+import threading
+
+import fakeredis
+import pytest
+
+from apps.tools.services.task_store import RedisTaskStore, SQLiteTaskStore
+
+
+def _make_task(task_id, status="pending", created_at="2025-01-01T00:00:00"):
+    return {"id": task_id, "status": status, "progress": 0, "created_at": created_at, "result": None}
+
+
+class TestSQLiteTaskStore:
+    """SQLite WAL任务存储测试"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return SQLiteTaskStore(str(tmp_path / "tasks.sqlite3"))
+
+    def test_create_and_get(self, store):
+        """测试创建和读取任务"""
+        store.create(_make_task("t1"))
+        task = store.get("t1")
+        assert task["id"] == "t1"
+        assert task["status"] == "pending"
+        assert store.get("missing") is None
+
+    def test_update_merges_fields(self, store):
+        """测试更新只修改指定字段"""
+        store.create(_make_task("t1"))
+        assert store.update("t1", status="running", progress=15)
+        task = store.get("t1")
+        assert task["status"] == "running"
+        assert task["progress"] == 15
+        assert task["created_at"] == "2025-01-01T00:00:00"
+
+    def test_update_deleted_task_returns_false(self, store):
+        """测试已删除任务不会被进度更新复活"""
+        store.create(_make_task("t1"))
+        assert store.delete("t1")
+        assert store.update("t1", progress=50) is False
+        assert store.get("t1") is None
+
+    def test_list_filters_by_status(self, store):
+        """测试按状态过滤任务"""
+        store.create(_make_task("t1", status="pending"))
+        store.create(_make_task("t2", status="completed"))
+        store.create(_make_task("t3", status="running"))
+        ids = {task["id"] for task in store.list(statuses=["pending", "running"])}
+        assert ids == {"t1", "t3"}
+        assert store.count() == 3
+
+    def test_shared_between_store_instances(self, tmp_path):
+        """测试多个存储实例（模拟多个worker）共享同一份任务视图"""
+        db_path = str(tmp_path / "tasks.sqlite3")
+        worker_a = SQLiteTaskStore(db_path)
+        worker_b = SQLiteTaskStore(db_path)
+        worker_a.create(_make_task("t1"))
+        worker_b.update("t1", progress=30)
+        assert worker_a.get("t1")["progress"] == 30
+
+    def test_concurrent_updates_are_atomic(self, store):
+        """测试并发更新不会互相覆盖"""
+        store.create(_make_task("t1"))
+
+        def worker(field):
+            for i in range(20):
+                store.update("t1", **{field: i})
+
+        threads = [threading.Thread(target=worker, args=(f"field_{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        task = store.get("t1")
+        for n in range(4):
+            assert task[f"field_{n}"] == 19
+
+
+class TestRedisTaskStore:
+    """Redis任务存储测试"""
+
+    def test_update_without_fields_checks_existence(self):
+        """测试不带字段的更新只返回任务是否存在"""
+        store = RedisTaskStore(fakeredis.FakeRedis(), prefix="test_task")
+        store.create(_make_task("t1"))
+        assert store.update("t1") is True
+        assert store.update("missing") is False
+        assert store.get("t1")["status"] == "pending"
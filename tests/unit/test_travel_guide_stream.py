@@ -0,0 +1,100 @@
+"""
+旅游攻略流式生成测试
+"""
+
+import pytest
+
+from apps.tools.services import enhanced_travel_service_v2 as travel_module
+from apps.tools.services.enhanced_travel_service_v2 import MultiAPITravelService
+from apps.tools.services.llm_gateway import LLMGatewayError
+from apps.tools.services.markdown_sections import MarkdownSectionParser
+
+GUIDE = "# 杭州旅游攻略\n\n## 必去景点\n西湖\n灵隐寺\n\n## 特色美食\n西湖醋鱼\n\n### 交通指南 ###\n地铁1号线"
+
+
+def feed_all(parser, text, size):
+    sections = []
+    for i in range(0, len(text), size):
+        sections.extend(parser.feed(text[i : i + size]))
+    return sections
+
+
+class TestMarkdownSectionParser:
+    """分节测试"""
+
+    def test_sections_completed_at_next_heading(self):
+        """测试出现下一个标题时返回上一节，结束时返回最后一节"""
+        parser = MarkdownSectionParser()
+        assert parser.feed("## 必去景点\n西湖\n") == []
+        assert parser.feed("## 特色美食\n") == [{"index": 0, "title": "必去景点", "content": "西湖"}]
+        assert parser.feed("西湖醋鱼") == []
+        assert parser.close() == [{"index": 1, "title": "特色美食", "content": "西湖醋鱼"}]
+
+    def test_chunk_boundaries_do_not_matter(self):
+        """测试文本任意切分时结果相同，只有标题的大标题不单独成节"""
+        expected = None
+        for size in (1, 3, 7, len(GUIDE)):
+            parser = MarkdownSectionParser()
+            sections = feed_all(parser, GUIDE, size) + parser.close()
+            assert parser.text == GUIDE
+            if expected is None:
+                expected = sections
+            assert sections == expected
+        assert [(s["title"], s["content"]) for s in expected] == [
+            ("必去景点", "西湖\n灵隐寺"),
+            ("特色美食", "西湖醋鱼"),
+            ("交通指南", "地铁1号线"),
+        ]
+
+    def test_text_without_headings(self):
+        """测试没有标题的文本整体作为一节"""
+        parser = MarkdownSectionParser()
+        parser.feed("1. 西湖\n2. 灵隐寺")
+        assert parser.close() == [{"index": 0, "title": "", "content": "1. 西湖\n2. 灵隐寺"}]
+        assert MarkdownSectionParser().close() == []
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = MultiAPITravelService()
+    monkeypatch.setattr(service.overview_service, "get_overview_data", lambda destination: {})
+    monkeypatch.setattr(service, "_get_cached_guide", lambda cache_key: None)
+    monkeypatch.setattr(service, "_save_to_cache", lambda *args: None)
+    return service
+
+
+class TestStreamTravelGuide:
+    """流式生成攻略测试"""
+
+    def test_events_then_guide(self, service, monkeypatch):
+        """测试先产出文本片段和小节，最后产出完整攻略"""
+        calls = []
+
+        def fake_stream(messages, **kwargs):
+            calls.append(kwargs)
+            yield from ["## 必去景点\n西", "湖\n## 特色", "美食\n醋鱼"]
+
+        monkeypatch.setattr(travel_module.llm_gateway, "stream_chat", fake_stream)
+        events = list(service.stream_travel_guide("某小城", "文化", budget_range="中等", travel_duration="2天"))
+
+        names = [name for name, _ in events]
+        assert names[-1] == "guide"
+        assert names.count("delta") == 3
+        assert [data["title"] for name, data in events if name == "section"] == ["必去景点", "特色美食"]
+
+        guide = events[-1][1]
+        assert guide["api_used"] == "deepseek"
+        assert guide["detailed_guide"] == "## 必去景点\n西湖\n## 特色美食\n醋鱼"
+        assert calls[0]["feature"] == "travel"
+
+    def test_failure_falls_back(self, service, monkeypatch):
+        """测试DeepSeek失败时产出真实备用数据的攻略"""
+
+        def failing_stream(messages, **kwargs):
+            raise LLMGatewayError("API调用失败: 500", status_code=500)
+            yield
+
+        monkeypatch.setattr(travel_module.llm_gateway, "stream_chat", failing_stream)
+        events = list(service.stream_travel_guide("杭州", "文化"))
+        assert [name for name, _ in events] == ["guide"]
+        assert events[0][1]["api_used"] == "real_fallback"
@@ -0,0 +1,242 @@
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# 对数分桶：第i个桶的上界为 RATIO**i 毫秒，相对误差不超过20%，覆盖1ms~60s
+HISTOGRAM_RATIO = 1.2
+HISTOGRAM_MAX_BUCKET = int(math.ceil(math.log(60000) / math.log(HISTOGRAM_RATIO)))
+
+COUNTER_FIELDS = ("count", "total_queries", "slow_count", "error_count")
+
+
+def latency_bucket(milliseconds):
+    """返回延迟（毫秒）所在的桶序号"""
+    if milliseconds <= 1:
+        return 0
+    return min(HISTOGRAM_MAX_BUCKET, int(math.ceil(math.log(milliseconds) / math.log(HISTOGRAM_RATIO))))
+
+
+def bucket_upper_bound(index):
+    """桶的上界（毫秒）"""
+    return HISTOGRAM_RATIO**index
+
+
+def histogram_percentile(buckets, percentile):
+    """根据分桶计数估算百分位延迟（毫秒）"""
+    total = sum(buckets.values())
+    if not total:
+        return 0.0
+    threshold = total * percentile / 100.0
+    cumulative = 0
+    for index in sorted(buckets):
+        cumulative += buckets[index]
+        if cumulative >= threshold:
+            return bucket_upper_bound(index)
+    return bucket_upper_bound(max(buckets))
+
+
+def _new_route_stats():
+    return {"count": 0, "total_time": 0.0, "total_queries": 0, "slow_count": 0, "error_count": 0, "buckets": defaultdict(int)}
+
+
+def _merge_route_stats(target, source):
+    for field in COUNTER_FIELDS:
+        target[field] += source[field]
+    target["total_time"] += source["total_time"]
+    for index, value in source["buckets"].items():
+        target["buckets"][index] += value
+
+
+class _Shard:
+    __slots__ = ("lock", "routes")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+
+class RequestMetricsAggregator:
+    """
+    请求指标聚合器
+
+    每个请求只在进程内存中累加计数和延迟分桶（按线程分片，锁几乎无竞争），
+    后台线程定期用一个Redis pipeline批量 HINCRBY 到共享哈希中，避免每个请求两次Redis往返，
+    且多个worker并发时增量不会丢失。没有Redis时退化为进程内统计。
+    """
+
+    ROUTES_KEY = "perf_metrics:routes"
+
+    def __init__(self, flush_interval=10, ttl=3600, shard_count=16):
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._shards = [_Shard() for _ in range(shard_count)]
+        self._shard_counter = itertools.count()
+        self._thread_shard = threading.local()
+        self._local_totals = defaultdict(_new_route_stats)
+        self._flush_lock = threading.Lock()
+        self._flusher_started = False
+        self._flusher_start_lock = threading.Lock()
+
+    def _shard(self):
+        # 线程首次记录时轮流分配分片（线程ident按页对齐，直接取模会全部落在同一分片）
+        shard = getattr(self._thread_shard, "shard", None)
+        if shard is None:
+            shard = self._thread_shard.shard = self._shards[next(self._shard_counter) % len(self._shards)]
+        return shard
+
+    def record(self, method, path, execution_time, query_count, is_slow, is_error):
+        """记录一次请求（只操作内存）"""
+        self._ensure_flusher()
+        shard = self._shard()
+        route = f"{method} {path}"
+        with shard.lock:
+            stats = shard.routes.get(route)
+            if stats is None:
+                stats = shard.routes[route] = _new_route_stats()
+            stats["count"] += 1
+            stats["total_time"] += execution_time
+            stats["total_queries"] += query_count
+            if is_slow:
+                stats["slow_count"] += 1
+            if is_error:
+                stats["error_count"] += 1
+            stats["buckets"][latency_bucket(execution_time * 1000)] += 1
+
+    def _ensure_flusher(self):
+        if self._flusher_started:
+            return
+        with self._flusher_start_lock:
+            if self._flusher_started:
+                return
+
+            def flush_worker():
+                while True:
+                    time.sleep(self.flush_interval)
+                    try:
+                        self.flush()
+                    except Exception as e:
+                        logger.error(f"Failed to flush performance metrics: {e}")
+
+            threading.Thread(target=flush_worker, name="perf-metrics-flusher", daemon=True).start()
+            self._flusher_started = True
+
+    def _drain(self):
+        """取出所有分片中尚未刷新的数据"""
+        pending = defaultdict(_new_route_stats)
+        for shard in self._shards:
+            with shard.lock:
+                routes, shard.routes = shard.routes, {}
+            for route, stats in routes.items():
+                _merge_route_stats(pending[route], stats)
+        return pending
+
+    def flush(self):
+        """把内存中的增量写入Redis（或进程内汇总）"""
+        with self._flush_lock:
+            pending = self._drain()
+            if not pending:
+                return 0
+
+            client = get_redis_client()
+            if client is None:
+                for route, stats in pending.items():
+                    _merge_route_stats(self._local_totals[route], stats)
+                return len(pending)
+
+            try:
+                routes_key = cache.make_key(self.ROUTES_KEY)
+                pipe = client.pipeline(transaction=False)
+                for route, stats in pending.items():
+                    stats_key = cache.make_key(f"perf_metrics:{route}")
+                    hist_key = cache.make_key(f"perf_metrics_hist:{route}")
+                    for field in COUNTER_FIELDS:
+                        if stats[field]:
+                            pipe.hincrby(stats_key, field, stats[field])
+                    pipe.hincrbyfloat(stats_key, "total_time", stats["total_time"])
+                    for index, value in stats["buckets"].items():
+                        pipe.hincrby(hist_key, index, value)
+                    pipe.expire(stats_key, self.ttl)
+                    pipe.expire(hist_key, self.ttl)
+                    pipe.sadd(routes_key, route)
+                pipe.expire(routes_key, self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Failed to flush performance metrics to redis: {e}")
+            return len(pending)
+
+    def _load_routes(self, routes=None):
+        """读取已刷新的聚合数据"""
+        client = get_redis_client()
+        if client is None:
+            if routes is None:
+                routes = list(self._local_totals)
+            return {route: self._local_totals[route] for route in routes if route in self._local_totals}
+
+        if routes is None:
+            routes = [r.decode() if isinstance(r, bytes) else r for r in client.smembers(cache.make_key(self.ROUTES_KEY))]
+
+        pipe = client.pipeline(transaction=False)
+        for route in routes:
+            pipe.hgetall(cache.make_key(f"perf_metrics:{route}"))
+            pipe.hgetall(cache.make_key(f"perf_metrics_hist:{route}"))
+        raw = pipe.execute()
+
+        result = {}
+        for i, route in enumerate(routes):
+            raw_stats, raw_hist = raw[2 * i], raw[2 * i + 1]
+            if not raw_stats:
+                continue
+            stats = _new_route_stats()
+            for key, value in raw_stats.items():
+                key = key.decode() if isinstance(key, bytes) else key
+                if key == "total_time":
+                    stats[key] = float(value)
+                elif key in COUNTER_FIELDS:
+                    stats[key] = int(value)
+            for key, value in raw_hist.items():
+                stats["buckets"][int(key)] = int(value)
+            result[route] = stats
+        return result
+
+    @staticmethod
+    def summarize(stats):
+        """把原始计数转换为对外的统计结果（时间单位：秒）"""
+        count = stats["count"]
+        return {
+            "count": count,
+            "total_time": stats["total_time"],
+            "total_queries": stats["total_queries"],
+            "avg_time": stats["total_time"] / count if count else 0,
+            "avg_queries": stats["total_queries"] / count if count else 0,
+            "slow_count": stats["slow_count"],
+            "error_count": stats["error_count"],
+            "p50": histogram_percentile(stats["buckets"], 50) / 1000,
+            "p95": histogram_percentile(stats["buckets"], 95) / 1000,
+            "p99": histogram_percentile(stats["buckets"], 99) / 1000,
+        }
+
+    def get_route_metrics(self, method, path):
+        self.flush()
+        route = f"{method} {path}"
+        stats = self._load_routes([route]).get(route)
+        return self.summarize(stats) if stats else {}
+
+    def get_all_metrics(self):
+        self.flush()
+        return {route: self.summarize(stats) for route, stats in self._load_routes().items()}
+
+
+request_metrics = RequestMetricsAggregator(
+    flush_interval=getattr(settings, "PERFORMANCE_METRICS_FLUSH_INTERVAL", 10),
+    ttl=getattr(settings, "PERFORMANCE_METRICS_TTL", 3600),
+)
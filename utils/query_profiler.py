@@ -0,0 +1,118 @@
+import heapq
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# 用于生成SQL指纹：折叠字面量和 IN (%s, %s, ...) 列表，使同一条语句的不同参数归为一类
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\$\d+)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint_sql(sql):
+    """生成SQL指纹"""
+    sql = _STRING_LITERAL_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+class QueryProfile:
+    """
+    单个请求的查询画像，作为 connection.execute_wrapper 安装
+
+    不依赖 DEBUG=True 下的 connection.queries，生产环境也能统计；
+    detailed=False 时只计数和计时，detailed=True 时额外记录重复指纹（N+1）和最慢语句。
+    """
+
+    def __init__(self, detailed=True, slow_threshold=1.0, keep_slowest=5, max_sql_length=500):
+        self.detailed = detailed
+        self.slow_threshold = slow_threshold
+        self.keep_slowest = keep_slowest
+        self.max_sql_length = max_sql_length
+        self.count = 0
+        self.total_time = 0.0
+        self.slow_count = 0
+        self.fingerprints = Counter()
+        self._slowest = []  # 小顶堆 (耗时, 序号, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total_time += duration
+            if duration > self.slow_threshold:
+                self.slow_count += 1
+            if self.detailed:
+                self.fingerprints[fingerprint_sql(sql)] += 1
+                item = (duration, self.count, sql[: self.max_sql_length])
+                if len(self._slowest) < self.keep_slowest:
+                    heapq.heappush(self._slowest, item)
+                elif duration > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, item)
+
+    def duplicate_queries(self, min_count=2):
+        """重复执行的查询指纹，通常意味着N+1问题"""
+        return [
+            {"fingerprint": fingerprint, "count": count}
+            for fingerprint, count in self.fingerprints.most_common()
+            if count >= min_count
+        ]
+
+    def slowest_queries(self):
+        return [{"sql": sql, "time": round(duration, 6)} for duration, _, sql in sorted(self._slowest, reverse=True)]
+
+    def as_stats(self):
+        """转换为与 DatabaseOptimizer.analyze_queries 兼容的统计结构"""
+        stats = {
+            "total_queries": self.count,
+            "total_time": self.total_time,
+            "avg_time": self.total_time / self.count if self.count else 0,
+            "slow_queries": self.slow_count,
+            "slow_query_threshold": self.slow_threshold,
+            "sampled": self.detailed,
+        }
+        if self.detailed:
+            stats["duplicate_queries"] = self.duplicate_queries()
+            stats["slowest_queries"] = self.slowest_queries()
+        return stats
+
+
+@contextmanager
+def profile_queries(request=None, sample_rate=None):
+    """
+    在一个请求内对所有数据库连接安装查询画像
+
+    同一个请求被多个中间件包裹时复用最外层的画像，避免重复安装wrapper
+    """
+    existing = getattr(request, "_query_profile", None) if request is not None else None
+    if existing is not None:
+        yield existing
+        return
+
+    if sample_rate is None:
+        sample_rate = getattr(settings, "QUERY_PROFILE_SAMPLE_RATE", 0.1)
+    profile = QueryProfile(
+        detailed=random.random() < sample_rate,
+        slow_threshold=getattr(settings, "SLOW_QUERY_THRESHOLD", 1.0),
+    )
+
+    if request is not None:
+        request._query_profile = profile
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            yield profile
+    finally:
+        if request is not None:
+            request._query_profile = None
@@ -0,0 +1,28 @@
+import logging
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis_client(alias="default"):
+    """
+    获取缓存后端底层的Redis客户端，用于pipeline/Lua等Django缓存API不支持的操作
+
+    同时兼容django_redis和Django内置的RedisCache；非Redis后端（如测试用的LocMemCache）返回None
+    """
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(alias)
+    except Exception:
+        pass
+
+    try:
+        backend = getattr(caches[alias], "_cache", None)
+        if backend is not None and hasattr(backend, "get_client"):
+            return backend.get_client(write=True)
+    except Exception as e:
+        logger.debug(f"Redis client unavailable for cache '{alias}': {e}")
+
+    return None